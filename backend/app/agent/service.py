@@ -6,9 +6,14 @@ from typing import Dict, Any, Optional, List, Tuple
 from app.browser.browser import browser_manager
 from app.controller.service import controller_service
 from app.core.config import settings
+from app.llm.cache import planning_cache_input
 from app.llm.service import LLMService
 from app.llm.parser import LLMResponseParser, ActionValidationError
+from app.llm.router import model_router
+from app.llm.streaming import StreamedActionPlan
+from app.llm.prompts import prompt_registry
 from app.agent.message_manager import MessageManager
+from app.agent.step_resolver import step_resolver
 import base64
 import logging
 import json
@@ -20,6 +25,13 @@ from app.services.task_manager import task_manager
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Name of the agent system prompt in the prompt registry
+AGENT_SYSTEM_PROMPT = "agent_system"
+prompt_registry.register(AGENT_SYSTEM_PROMPT, os.path.join(os.path.dirname(__file__), "system_prompt.md"))
+
+# Actions expected in the response to a single step
+STEP_ACTIONS = [action for action in LLMResponseParser.VALID_ACTIONS if action not in ("plan_task", "plan_actions")]
+
 class AgentService:
     """
     Agent service that orchestrates browser automation tasks.
@@ -296,6 +308,48 @@ class AgentService:
             logger.error(error_msg)
             return {"status": "error", "message": error_msg}
     
+    async def click_element_by_index(self, element_index: int, timeout: int = 10000) -> Dict[str, Any]:
+        """
+        Click on an element identified by its index in the extracted DOM tree.
+        
+        Element indexes are assigned once per element and stay stable across
+        extractions of the same document.
+        
+        Args:
+            element_index: Index of the element to click
+            timeout: Maximum time to wait for the element in milliseconds
+            
+        Returns:
+            Dictionary with click results
+        """
+        try:
+            action_result = await self.controller.execute_action("click_element_by_index", {
+                "element_index": int(element_index),
+                "timeout": timeout
+            })
+            
+            if action_result.get("status") != "success":
+                self.current_state["last_error"] = action_result.get("message", "Click failed")
+                return {"status": "error", "message": action_result.get("message", "Click failed")}
+            
+            self.current_state["history"].append({
+                "action": "click_element_by_index",
+                "element_index": int(element_index),
+                "timestamp": time.time()
+            })
+            
+            logger.info(f"Clicked element with index: {element_index}")
+            return {
+                "status": "success",
+                "element_index": int(element_index),
+                "page_state": action_result.get("page_state", {})
+            }
+        except Exception as e:
+            error_msg = f"Click error: {str(e)}"
+            self.current_state["last_error"] = error_msg
+            logger.error(error_msg)
+            return {"status": "error", "message": error_msg}
+    
     async def input_text(self, selector: str, text: str, delay: int = 50) -> Dict[str, Any]:
         """
         Enter text into an input field.
@@ -603,13 +657,38 @@ class AgentService:
             logger.error(error_msg)
             return {"status": "error", "message": error_msg}
     
-    async def interpret_task(self, task_description: str, page_state: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def _format_page_context(self, page_state: Dict[str, Any]) -> str:
+        """Prepare a simplified representation of the page state for the LLM."""
+        page_context = f"""
+                Current page: {page_state.get('url', 'Unknown')}
+                Page title: {page_state.get('title', 'Unknown')}
+                Available elements:
+                """
+        
+        # Add information about interactive elements if available
+        if "elements" in page_state:
+            for i, element in enumerate(page_state["elements"]):
+                element_type = element.get("type", "unknown")
+                element_text = element.get("text", "")[:50]  # Truncate long text
+                page_context += f"  {i}: {element_type} - {element_text}\n"
+        
+        return page_context
+    
+    def _get_system_prompt(self) -> str:
+        """Get the current version of the agent system prompt."""
+        prompt = prompt_registry.get(AGENT_SYSTEM_PROMPT)
+        logger.debug(f"Using system prompt {prompt.id}")
+        return prompt.text
+    
+    async def interpret_task(self, task_description: str, page_state: Optional[Dict[str, Any]] = None,
+                             bypass_cache: bool = False) -> Dict[str, Any]:
         """
         Use LLM to interpret a natural language task description and convert it to an action plan.
         
         Args:
             task_description: Natural language description of the task
             page_state: Optional current page state to provide context to the LLM
+            bypass_cache: Whether to ask the LLM even if an identical prompt was answered before
             
         Returns:
             Dictionary with the action plan
@@ -618,29 +697,12 @@ class AgentService:
             if not self.llm_service or not self.message_manager or not self.response_parser:
                 raise ValueError("LLM components not initialized. Call initialize() first.")
                 
-            # Read system prompt
-            system_prompt_path = os.path.join(os.path.dirname(__file__), "system_prompt.md")
-            with open(system_prompt_path, "r") as f:
-                system_prompt = f.read()
+            system_prompt = self._get_system_prompt()
             
             # Add page state context if available
             if page_state:
-                # Prepare a simplified representation of the page state for the LLM
-                page_context = f"""
-                Current page: {page_state.get('url', 'Unknown')}
-                Page title: {page_state.get('title', 'Unknown')}
-                Available elements:
-                """
-                
-                # Add information about interactive elements if available
-                if "elements" in page_state:
-                    for i, element in enumerate(page_state["elements"]):
-                        element_type = element.get("type", "unknown")
-                        element_text = element.get("text", "")[:50]  # Truncate long text
-                        page_context += f"  {i}: {element_type} - {element_text}\n"
-                
                 # Add page context to the task description
-                augmented_task = f"Current page state:\n{page_context}\n\nUser task: {task_description}"
+                augmented_task = f"Current page state:\n{self._format_page_context(page_state)}\n\nUser task: {task_description}"
             else:
                 augmented_task = task_description
                 
@@ -651,7 +713,12 @@ class AgentService:
             llm_response = await self.llm_service.generate_response(
                 system_prompt=system_prompt,
                 user_input=augmented_task,
-                conversation_history=self.message_manager.get_messages()[:-1]  # Exclude the message we just added
+                conversation_history=self.message_manager.get_messages()[:-1],  # Exclude the message we just added
+                use_cache=not bypass_cache,
+                route_kind="interpret",
+                confidence=self.response_parser.confidence,
+                validate=self.response_parser.parse_response,
+                cache_input=planning_cache_input("interpret", task_description, page_state)
             )
             
             # Parse the response
@@ -676,13 +743,15 @@ class AgentService:
             logger.error(error_msg)
             return {"status": "error", "message": error_msg}
     
-    async def create_task_plan(self, task_description: str, current_state: Dict[str, Any] = None) -> Dict[str, Any]:
+    async def create_task_plan(self, task_description: str, current_state: Dict[str, Any] = None,
+                               bypass_cache: bool = False) -> Dict[str, Any]:
         """
         Use LLM to create a plan for a natural language task.
         
         Args:
             task_description: Natural language description of the task
             current_state: Optional current state to provide context to the LLM
+            bypass_cache: Whether to ask the LLM even if an identical prompt was answered before
             
         Returns:
             Dictionary with the plan without raw LLM response
@@ -691,30 +760,13 @@ class AgentService:
             if not self.llm_service or not self.message_manager or not self.response_parser:
                 raise ValueError("LLM components not initialized. Call initialize() first.")
                 
-            # Read system prompt
-            system_prompt_path = os.path.join(os.path.dirname(__file__), "system_prompt.md")
-            with open(system_prompt_path, "r") as f:
-                system_prompt = f.read()
+            system_prompt = self._get_system_prompt()
             
             # Add page state context if available
             page_state = current_state.get("page_state", {}) if current_state else {}
             if page_state:
-                # Prepare a simplified representation of the page state for the LLM
-                page_context = f"""
-                Current page: {page_state.get('url', 'Unknown')}
-                Page title: {page_state.get('title', 'Unknown')}
-                Available elements:
-                """
-                
-                # Add information about interactive elements if available
-                if "elements" in page_state:
-                    for i, element in enumerate(page_state["elements"]):
-                        element_type = element.get("type", "unknown")
-                        element_text = element.get("text", "")[:50]  # Truncate long text
-                        page_context += f"  {i}: {element_type} - {element_text}\n"
-                
                 # Add page context to the task description
-                augmented_task = f"Current page state:\n{page_context}\n\nUser task: {task_description}"
+                augmented_task = f"Current page state:\n{self._format_page_context(page_state)}\n\nUser task: {task_description}"
             else:
                 augmented_task = task_description
                 
@@ -725,7 +777,12 @@ class AgentService:
             llm_response = await self.llm_service.generate_response(
                 system_prompt=system_prompt,
                 user_input=augmented_task,
-                conversation_history=self.message_manager.get_messages()[:-1]  # Exclude the message we just added
+                conversation_history=self.message_manager.get_messages()[:-1],  # Exclude the message we just added
+                use_cache=not bypass_cache,
+                route_kind="plan",
+                confidence=self.response_parser.confidence,
+                validate=self.response_parser.parse_response,
+                cache_input=planning_cache_input("plan", task_description, page_state)
             )
             
             # Parse the response
@@ -771,6 +828,95 @@ class AgentService:
             logger.error(error_msg)
             return {"status": "error", "message": error_msg}
     
+    async def create_action_plan(self, task_description: str, current_state: Dict[str, Any] = None,
+                                 completed_actions: Optional[List[Dict[str, Any]]] = None,
+                                 failure: Optional[str] = None,
+                                 bypass_cache: bool = False) -> Dict[str, Any]:
+        """
+        Use LLM to plan the concrete actions of a natural language task in a single call.
+        
+        Args:
+            task_description: Natural language description of the task
+            current_state: Optional current state to provide context to the LLM
+            completed_actions: Actions already executed, when re-planning
+            failure: Why the previous plan could not be continued, when re-planning
+            bypass_cache: Whether to ask the LLM even if an identical prompt was answered before
+            
+        Returns:
+            Dictionary with the planned actions
+        """
+        try:
+            if not self.llm_service or not self.message_manager or not self.response_parser:
+                raise ValueError("LLM components not initialized. Call initialize() first.")
+            
+            system_prompt = self._get_system_prompt()
+            
+            page_state = current_state.get("page_state", {}) if current_state else {}
+            prompt = f"User task: {task_description}"
+            if page_state:
+                prompt = f"Current page state:\n{self._format_page_context(page_state)}\n\n{prompt}"
+            if current_state and current_state.get("current_url"):
+                prompt += f"\nCurrent URL: {current_state.get('current_url')}"
+            
+            if failure:
+                completed = "\n".join(
+                    f"  {position + 1}. {planned['action']} {json.dumps(self._get_safe_params_for_logging(planned['action'], planned.get('parameters', {})))}"
+                    for position, planned in enumerate(completed_actions or [])
+                ) or "  None"
+                prompt += (
+                    f"\n\nActions completed so far:\n{completed}"
+                    f"\nThe plan could not be continued: {failure}"
+                    "\nRespond with a plan_actions action listing the remaining actions from the current page."
+                )
+                # A re-plan answers a new situation, an earlier answer does not apply
+                bypass_cache = True
+            else:
+                prompt += "\n\nRespond with a plan_actions action listing every action needed to complete the task."
+            
+            self.message_manager.add_user_message(task_description if not failure else f"Re-plan: {failure}")
+            
+            llm_response = await self.llm_service.generate_response(
+                system_prompt=system_prompt,
+                user_input=prompt,
+                conversation_history=self.message_manager.get_messages()[:-1],  # Exclude the message we just added
+                use_cache=not bypass_cache,
+                route_kind="action_plan",
+                confidence=self.response_parser.confidence,
+                validate=self.response_parser.parse_response,
+                cache_input=planning_cache_input(
+                    "action_plan", task_description, page_state,
+                    current_url=current_state.get("current_url") if current_state else None
+                )
+            )
+            
+            action_plan = self.response_parser.parse_response(llm_response)
+            self.message_manager.add_assistant_message(llm_response)
+            
+            if action_plan["action"] == "plan_actions":
+                actions = action_plan["parameters"]["actions"]
+            elif action_plan["action"] not in self.response_parser.PLANNING_ACTIONS:
+                # A task that takes a single action
+                actions = [{"action": action_plan["action"], "parameters": action_plan["parameters"]}]
+            else:
+                raise ActionValidationError(f"Expected plan_actions, got {action_plan['action']}")
+            
+            logger.info(f"Planned {len(actions)} actions for task: {task_description}")
+            return {
+                "status": "success",
+                "actions": actions,
+                "thought": action_plan.get("thought", "")
+            }
+        except ActionValidationError as e:
+            error_msg = f"Invalid action plan: {str(e)}"
+            self.current_state["last_error"] = error_msg
+            logger.error(error_msg)
+            return {"status": "error", "message": error_msg}
+        except Exception as e:
+            error_msg = f"Action planning error: {str(e)}"
+            self.current_state["last_error"] = error_msg
+            logger.error(error_msg)
+            return {"status": "error", "message": error_msg}
+    
     async def execute_step(self, step: Dict[str, Any], task_id: str = None) -> Dict[str, Any]:
         """
         Execute a specific step in a task plan.
@@ -792,40 +938,87 @@ class AgentService:
                 self.message_manager.add_system_message(f"Executing step: {step_description}")
             
             # Generate action plan for this step
-            system_prompt_path = os.path.join(os.path.dirname(__file__), "system_prompt.md")
-            with open(system_prompt_path, "r") as f:
-                system_prompt = f.read()
+            system_prompt = self._get_system_prompt()
                 
             # Generate the step action plan
             step_action_prompt = f"Execute this step: {step_description}"
             if self.current_state.get("current_url"):
                 step_action_prompt += f"\nCurrent URL: {self.current_state.get('current_url')}"
                 
-            llm_response = await self.llm_service.generate_response(
-                system_prompt=system_prompt,
-                user_input=step_action_prompt,
-                conversation_history=self.message_manager.get_messages()
-            )
-            
-            # Parse response into an action plan
-            action_plan = self.response_parser.parse_response(llm_response)
-            
-            # Add message to history
-            self.message_manager.add_assistant_message(llm_response)
+            # Mechanical steps are resolved without the LLM when their target is unambiguous
+            action_plan = await step_resolver.resolve(step_description) if settings.AGENT_STEP_FAST_PATH else None
+            
+            streamed_response = None
+            if action_plan is not None:
+                # Keep the history as if the model had answered
+                self.message_manager.add_assistant_message(json.dumps(action_plan))
+            elif settings.LLM_STREAMING:
+                # The action plan resolves as soon as action and parameters are complete,
+                # so the action runs while the model is still writing its thought
+                streamed_response = StreamedActionPlan(
+                    self.llm_service.stream_response(
+                        system_prompt=system_prompt,
+                        user_input=step_action_prompt,
+                        conversation_history=self.message_manager.get_messages(),
+                        route_kind="step",
+                        route_input=step_description
+                    ),
+                    self.response_parser
+                )
+                try:
+                    action_plan = await streamed_response.action_plan()
+                except ActionValidationError:
+                    if not self.llm_service.uses_fast_model("step", step_description):
+                        raise
+                    # The fast model answered with an invalid action, ask the main model instead
+                    model_router.record_escalation("step")
+                    streamed_response = None
+            
+            if action_plan is None and streamed_response is None:
+                llm_response = await self.llm_service.generate_response(
+                    system_prompt=system_prompt,
+                    user_input=step_action_prompt,
+                    conversation_history=self.message_manager.get_messages(),
+                    route_kind="step" if not settings.LLM_STREAMING else None,
+                    route_input=step_description,
+                    confidence=self._step_confidence
+                )
+                
+                # Parse response into an action plan
+                action_plan = self.response_parser.parse_response(llm_response)
+                
+                # Add message to history
+                self.message_manager.add_assistant_message(llm_response)
             
             # Execute the action based on the action plan
             action_name = action_plan.get("action", "")
             action_params = action_plan.get("parameters", {})
             
-            if action_name == "execute_step":
-                # Handle nested execute_step (common for multi-step tasks)
-                inner_action = action_params.get("action", "")
-                inner_params = action_params.get("parameters", {})
-                
-                result = await self.execute_action(inner_action, inner_params, task_id)
-            else:
-                # Execute the action directly
-                result = await self.execute_action(action_name, action_params, task_id)
+            try:
+                if action_name == "execute_step":
+                    # Handle nested execute_step (common for multi-step tasks)
+                    inner_action = action_params.get("action", "")
+                    inner_params = action_params.get("parameters", {})
+                    
+                    result = await self.execute_action(inner_action, inner_params, task_id)
+                else:
+                    # Execute the action directly
+                    result = await self.execute_action(action_name, action_params, task_id)
+            except Exception:
+                if streamed_response is not None:
+                    # Do not leave the rest of the response streaming in the background
+                    await streamed_response.cancel()
+                raise
+            
+            if streamed_response is not None:
+                # Add the full response to history once the stream has ended
+                try:
+                    llm_response = await streamed_response.text()
+                except Exception as e:
+                    # The action has run, so a stream failing after the action plan does not fail the step
+                    logger.warning(f"Response stream failed after the action was dispatched: {str(e)}")
+                    llm_response = json.dumps(action_plan)
+                self.message_manager.add_assistant_message(llm_response)
             
             # Record the result
             return {
@@ -844,13 +1037,26 @@ class AgentService:
                 "description": step.get("description", "Unknown step")
             }
     
-    async def execute_from_natural_language(self, task_description: str, task_id: str = None) -> Dict[str, Any]:
+    def _step_confidence(self, response: str) -> float:
+        """Score a step response, which should hold a single action rather than a new plan."""
+        return self.response_parser.confidence(response, expected_actions=STEP_ACTIONS)
+    
+    async def execute_from_natural_language(self, task_description: str, task_id: str = None,
+                                            bypass_cache: bool = False,
+                                            planning_mode: Optional[str] = None) -> Dict[str, Any]:
         """
         Execute a task described in natural language by creating and executing a plan.
         
+        In the "actions" planning mode the LLM plans the concrete actions of all steps
+        at once and is only asked again when an action fails or the page diverges from
+        what the plan expected. In the "steps" mode the LLM plans step descriptions and
+        is asked for the action of each step.
+        
         Args:
             task_description: Natural language description of the task to execute
             task_id: Optional task ID for tracking
+            bypass_cache: Whether to plan with the LLM even if the same task was planned before
+            planning_mode: "actions" or "steps", defaults to AGENT_PLANNING_MODE
             
         Returns:
             Dictionary with execution results
@@ -870,10 +1076,14 @@ class AgentService:
                 task.log(f"Processing task: {task_description}")
                 task.update_progress(0.1)  # 10% - Starting
             
+            if (planning_mode or settings.AGENT_PLANNING_MODE) == "actions":
+                return await self._execute_action_plan(task_description, task_id, task, bypass_cache)
+            
             # Parse the task using the LLM
             plan_result = await self.create_task_plan(
                 task_description, 
-                current_state=self.current_state
+                current_state=self.current_state,
+                bypass_cache=bypass_cache
             )
             
             if plan_result["status"] != "success":
@@ -959,6 +1169,137 @@ class AgentService:
             logger.error(error_msg, exc_info=True)
             return {"status": "error", "message": error_msg}
 
+    async def _execute_action_plan(self, task_description: str, task_id: Optional[str], task: Any,
+                                   bypass_cache: bool = False) -> Dict[str, Any]:
+        """
+        Plan all actions of a task with one LLM call and execute them, re-planning on failure.
+        
+        Args:
+            task_description: Natural language description of the task to execute
+            task_id: Optional task ID for tracking
+            task: The tracked task, if any
+            bypass_cache: Whether to plan with the LLM even if the same task was planned before
+            
+        Returns:
+            Dictionary with execution results
+        """
+        plan_result = await self.create_action_plan(
+            task_description,
+            current_state=self.current_state,
+            bypass_cache=bypass_cache
+        )
+        if plan_result["status"] != "success":
+            return {"status": "error", "message": plan_result.get("message", "Failed to create action plan")}
+        
+        actions = plan_result["actions"]
+        if task:
+            task.log(f"Planned {len(actions)} actions")
+            task.update_progress(0.2)  # 20% - Plan created
+        
+        completed = []
+        results = []
+        replans = 0
+        position = 0
+        while position < len(actions):
+            planned = actions[position]
+            action_name = planned["action"]
+            action_params = planned.get("parameters", {})
+            if action_name == "done":
+                break
+            
+            action_number = len(completed) + 1
+            action_total = len(completed) + len(actions) - position
+            description = planned.get("description") or action_name
+            if task:
+                task.log(f"Executing action {action_number}/{action_total}: {description}")
+                task.update_progress(0.2 + (0.7 * (action_number / action_total)))  # 20% - 90% based on action progress
+            logger.info(f"Executing action {action_number}/{action_total}: {description}")
+            
+            result = await self.execute_action(action_name, action_params, task_id)
+            results.append({
+                "status": result.get("status", "error"),
+                "action": action_name,
+                "description": description,
+                "message": result.get("message", ""),
+                "result": result
+            })
+            
+            if result.get("status") != "success":
+                failure = f"{action_name} failed: {result.get('message', 'Unknown error')}"
+            else:
+                failure = await self._check_expectation(planned.get("expect"), result)
+            
+            if failure is None:
+                completed.append(planned)
+                position += 1
+                continue
+            
+            logger.warning(f"Action {action_number} did not go as planned: {failure}")
+            if task:
+                task.log(f"Action did not go as planned: {failure}")
+            if replans >= settings.AGENT_MAX_REPLANS:
+                return {
+                    "status": "error",
+                    "message": f"Action {action_number} failed after {replans} re-plans: {failure}",
+                    "results": results
+                }
+            
+            replans += 1
+            plan_result = await self.create_action_plan(
+                task_description,
+                current_state=self.current_state,
+                completed_actions=completed,
+                failure=failure
+            )
+            if plan_result["status"] != "success":
+                return {"status": "error", "message": plan_result.get("message", "Failed to re-plan"), "results": results}
+            actions = plan_result["actions"]
+            position = 0
+        
+        # Capture final screenshot and DOM state
+        final_screenshot = await self.capture_screenshot()
+        final_dom = await self.get_dom()
+        
+        if task:
+            task.log("Task completed successfully")
+            task.update_progress(1.0)  # 100% - Complete
+        
+        logger.info(f"Task executed successfully with {len(completed)} actions and {replans} re-plans")
+        return {
+            "status": "success",
+            "message": "Task executed successfully",
+            "step_count": len(completed),
+            "replans": replans,
+            "results": results,
+            "screenshot": final_screenshot.get("screenshot"),
+            "page_state": final_dom.get("page_state") if final_dom["status"] == "success" else None
+        }
+    
+    async def _check_expectation(self, expect: Optional[Dict[str, Any]], result: Dict[str, Any]) -> Optional[str]:
+        """
+        Check that the page matches what the plan expected after an action.
+        
+        Args:
+            expect: Expected page state, with optional url_contains and title_contains
+            result: The result of the action
+            
+        Returns:
+            A description of the divergence, or None if the page is as expected
+        """
+        if not expect:
+            return None
+        
+        page_state = result.get("page_state")
+        if not page_state:
+            page_state = await self.browser.get_page_state()
+        
+        for key, field in (("url_contains", "url"), ("title_contains", "title")):
+            expected = expect.get(key)
+            actual = page_state.get(field) or ""
+            if expected and str(expected).lower() not in actual.lower():
+                return f"expected the page {field} to contain '{expected}', but it is '{actual}'"
+        return None
+    
     async def execute_action(self, action_name: str, action_params: Dict[str, Any], task_id: str = None) -> Dict[str, Any]:
         """
         Execute a single browser action.
@@ -1000,6 +1341,14 @@ class AgentService:
                 timeout = action_params.get("timeout", 10000)
                 result = await self.click_element(selector, index, timeout)
                 
+            elif action_name == "click_element_by_index":
+                element_index = action_params.get("element_index")
+                if element_index is None:
+                    return {"status": "error", "message": "Missing required parameter: element_index"}
+                
+                timeout = action_params.get("timeout", 10000)
+                result = await self.click_element_by_index(element_index, timeout)
+                
             elif action_name == "input_text":
                 selector = action_params.get("selector")
                 text = action_params.get("text")
@@ -0,0 +1,197 @@
+"""
+Rule-based resolution of mechanical plan steps.
+Many planned steps are mechanical ("Navigate to https://...", "Wait 2 seconds",
+"Click the Search button"). Such steps are matched against common phrasings
+and, for clicks and text input, against the indexed elements of the current
+page. A step resolves to an action only when its target is unambiguous;
+every other step is left to the LLM.
+"""
+import logging
+import re
+from typing import Dict, Any, List, Optional
+
+from app.dom.service import dom_processing_service
+from app.llm.parser import LLMResponseParser, ActionValidationError
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+_QUOTES = "\"'“”‘’`"
+
+# Numbering the planner puts before a step ("Step 1: ", "1. ", "2) ")
+STEP_NUMBER_PATTERN = re.compile(r"^\s*(?:step\s*\d+\s*[:.)-]?|\d+\s*[:.)])\s*", re.IGNORECASE)
+
+NAVIGATE_PATTERN = re.compile(
+    r"^(?:navigate|go|open|visit|browse|load)\s+(?:to\s+)?(?:the\s+)?(?:url\s+|page\s+|website\s+|site\s+)?"
+    r"<?(?P<url>(?:https?://|www\.)\S+|[\w-]+(?:\.[\w-]+)*\.[a-z]{2,}(?:/\S*)?)>?$",
+    re.IGNORECASE
+)
+
+# Top-level domains a URL without a scheme or "www." may end in, so that
+# file names such as "settings.py" are not taken for websites
+KNOWN_TLDS = frozenset([
+    "com", "org", "net", "edu", "gov", "info", "biz", "io", "ai", "app", "dev", "co", "me", "tv",
+    "uk", "de", "fr", "es", "it", "nl", "be", "ch", "at", "se", "no", "dk", "fi", "ie", "eu",
+    "us", "ca", "au", "nz", "jp", "cn", "in", "br", "mx", "ru"
+])
+
+WAIT_PATTERN = re.compile(
+    r"^wait(?:\s+for)?\s+(?P<amount>\d+(?:\.\d+)?)\s*(?P<unit>milliseconds?|ms|seconds?|secs?|s)$",
+    re.IGNORECASE
+)
+
+CLICK_PATTERN = re.compile(
+    r"^(?:click|press|tap|select)(?:\s+on)?\s+(?:the\s+)?(?P<target>.+?)"
+    r"(?:\s+(?:button|link|tab|checkbox|icon|menu item))?$",
+    re.IGNORECASE
+)
+
+TYPE_PATTERN = re.compile(
+    r"^(?:type|enter|input|fill in|write)\s+[\"'“‘](?P<text>.+?)[\"'”’]\s+(?:in|into)\s+"
+    r"(?:the\s+)?(?P<target>.+?)(?:\s+(?:field|box|input|textbox|text box|text field))?$",
+    re.IGNORECASE
+)
+
+# Fields an element can be named by in a step, for clicks and for text input
+CLICK_FIELDS = ["text", "aria-label", "title", "alt", "name"]
+INPUT_FIELDS = ["label", "placeholder", "aria-label", "name", "title"]
+
+
+def _strip(text: str) -> str:
+    """Remove the step numbering, surrounding whitespace, quotes and final punctuation of a phrase."""
+    text = STEP_NUMBER_PATTERN.sub("", text, count=1)
+    return text.strip().rstrip(".!").strip().strip(_QUOTES).strip()
+
+
+def _is_website(url: str) -> bool:
+    """Check if a URL matched in a step names a website rather than, for example, a file."""
+    if re.match(r"^(?:https?://|www\.)", url, re.IGNORECASE):
+        return True
+    host = url.split("/", 1)[0]
+    return host.rsplit(".", 1)[-1].lower() in KNOWN_TLDS
+
+
+class StepResolver:
+    """
+    Resolves mechanical steps to actions without calling the LLM, and reports its hit rate.
+    """
+
+    def __init__(self, dom_service=dom_processing_service):
+        """
+        Initialize the resolver.
+
+        Args:
+            dom_service: Service extracting and searching the DOM of the current page
+        """
+        self.dom_service = dom_service
+        self.response_parser = LLMResponseParser()
+        self._attempts = 0
+        self._hits: Dict[str, int] = {}
+
+    async def resolve(self, step_description: str) -> Optional[Dict[str, Any]]:
+        """
+        Resolve a step to an action plan.
+
+        Args:
+            step_description: The description of the step
+
+        Returns:
+            The action plan, or None if the step should be resolved by the LLM
+        """
+        self._attempts += 1
+        description = _strip(step_description)
+
+        try:
+            action_plan = await self._resolve(description)
+            if action_plan is not None:
+                # Apply the same validation and normalization as to the actions of the LLM
+                action_plan = self.response_parser.parse_fields(action_plan)
+        except ActionValidationError as e:
+            logger.debug(f"Step '{description}' resolved to an invalid action: {str(e)}")
+            action_plan = None
+        except Exception as e:
+            logger.debug(f"Could not resolve step '{description}' by rule: {str(e)}")
+            action_plan = None
+
+        if action_plan is not None:
+            rule = action_plan["action"]
+            self._hits[rule] = self._hits.get(rule, 0) + 1
+            action_plan["thought"] = f"Resolved '{description}' by the {rule} rule"
+            logger.info(f"Resolved step by rule: {description} -> {rule}")
+        return action_plan
+
+    async def _resolve(self, description: str) -> Optional[Dict[str, Any]]:
+        match = NAVIGATE_PATTERN.match(description)
+        if match and _is_website(match.group("url")):
+            return {"action": "go_to_url", "parameters": {"url": match.group("url")}}
+
+        match = WAIT_PATTERN.match(description)
+        if match:
+            amount = float(match.group("amount"))
+            unit = match.group("unit").lower()
+            milliseconds = amount if unit in ("ms", "millisecond", "milliseconds") else amount * 1000
+            return {"action": "wait", "parameters": {"time": int(milliseconds)}}
+
+        match = TYPE_PATTERN.match(description)
+        if match:
+            selector = await self._find_selector(_strip(match.group("target")), ["inputs"], INPUT_FIELDS)
+            if selector is None:
+                return None
+            return {"action": "input_text", "parameters": {"selector": selector, "text": match.group("text")}}
+
+        match = CLICK_PATTERN.match(description)
+        if match:
+            selector = await self._find_selector(_strip(match.group("target")), ["clickable", "navigational"],
+                                                 CLICK_FIELDS)
+            if selector is None:
+                return None
+            return {"action": "click_element", "parameters": {"selector": selector}}
+
+        return None
+
+    async def _find_selector(self, target: str, categories: List[str], fields: List[str]) -> Optional[str]:
+        """
+        Find the selector of the only element of the page named exactly like a target.
+
+        Args:
+            target: The name of the element in the step
+            categories: Interactive element categories to search
+            fields: Fields the element may be named by
+
+        Returns:
+            The CSS selector of the element, or None if no element or several elements match
+        """
+        if not target:
+            return None
+
+        dom_tree = await self.dom_service.extract_dom()
+        if not isinstance(dom_tree, dict) or "error" in dom_tree:
+            return None
+
+        matches = self.dom_service.search_elements(dom_tree, target, categories, limit=5,
+                                                   fields=fields, fuzzy=False)
+        exact = [match for match in matches if match["match"] == "exact"]
+        if len(exact) != 1:
+            return None
+
+        entry, element = exact[0]["entry"], exact[0]["element"]
+        return entry.get("selector") or element.get("css_selector")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the fast path statistics.
+
+        Returns:
+            Dictionary with the resolved and attempted steps, the hit rate and the hits by rule
+        """
+        hits = sum(self._hits.values())
+        return {
+            "attempts": self._attempts,
+            "hits": hits,
+            "hit_rate": hits / self._attempts if self._attempts else 0.0,
+            "by_rule": dict(self._hits)
+        }
+
+
+# Create a singleton instance
+step_resolver = StepResolver()
@@ -10,6 +10,7 @@ import uuid
 import time
 
 from app.agent.service import agent_service
+from app.agent.step_resolver import step_resolver
 from app.services.task_manager import task_manager, Task, TaskStatus
 from app.api.auth import get_api_key, get_authenticated_user
 from app.core.config import settings
@@ -95,6 +96,11 @@ class TaskRequest(BaseModel):
     """Task request model"""
     task_id: Optional[str] = None
     description: str
+    bypass_cache: bool = Field(False, description="Plan with the LLM even if the same task was planned before")
+    planning_mode: Optional[str] = Field(
+        None, pattern="^(actions|steps)$",
+        description="Plan all actions in one LLM call (actions) or one call per step (steps), defaults to AGENT_PLANNING_MODE"
+    )
 
 # Helper function to run agent actions as background tasks
 async def run_agent_action(task_id: str, action_name: str, action_func, *args, **kwargs):
@@ -430,7 +436,9 @@ async def execute_task(task: TaskRequest) -> TaskResponse:
                 # Execute task
                 result = await agent_service.execute_from_natural_language(
                     task.description,
-                    task_id
+                    task_id,
+                    bypass_cache=task.bypass_cache,
+                    planning_mode=task.planning_mode
                 )
                 
                 # Handle execution result
@@ -650,6 +658,13 @@ async def reset_task_plan(
         logger.error(f"Error resetting task plan: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error resetting task plan: {str(e)}")
 
+@router.get("/step-fast-path", response_model=Dict[str, Any])
+async def get_step_fast_path_stats(
+    user: Dict[str, Any] = Depends(get_authenticated_user)
+):
+    """Get the hit rate of the rule-based step resolution, which executes mechanical steps without the LLM."""
+    return step_resolver.stats()
+
 @router.get("/available-actions", response_model=Dict[str, Any])
 async def list_available_actions(
     user: Dict[str, Any] = Depends(get_authenticated_user)
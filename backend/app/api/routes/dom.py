@@ -1,11 +1,14 @@
 """
 API routes for DOM processing functionality.
 """
+import json
 from typing import Dict, Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from app.dom.service import dom_processing_service
+from app.dom.tree import DOMTree
 
 router = APIRouter()
 
@@ -18,6 +21,14 @@ class DOMExtractionOptions(BaseModel):
     include_visibility: Optional[bool] = Field(True, description="Include visibility information")
     include_accessibility: Optional[bool] = Field(True, description="Include accessibility information")
     max_text_length: Optional[int] = Field(150, description="Maximum length of text content to include")
+    viewport_only: Optional[bool] = Field(False, description="Only include elements within the viewport")
+    viewport_margin: Optional[int] = Field(200, description="Extra margin around the viewport in pixels")
+    prune_offscreen: Optional[bool] = Field(True, description="Skip whole subtrees that lie outside the viewport")
+    max_nodes: Optional[int] = Field(0, description="Maximum number of nodes to extract (0 for unlimited)")
+    interactive_reserve: Optional[float] = Field(0.25, description="Fraction of max_nodes reserved for interactive elements")
+    include_shadow_dom: Optional[bool] = Field(True, description="Descend into open shadow roots")
+    include_frames: Optional[bool] = Field(True, description="Extract child frames and merge them into the tree")
+    backend: Optional[str] = Field("script", description="Extraction backend: 'script' (JavaScript walker) or 'snapshot' (Chrome DevTools Protocol)")
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert to camelCase dictionary for browser script."""
@@ -28,7 +39,15 @@ class DOMExtractionOptions(BaseModel):
             "includePosition": self.include_position,
             "includeVisibility": self.include_visibility,
             "includeAccessibility": self.include_accessibility,
-            "maxTextLength": self.max_text_length
+            "maxTextLength": self.max_text_length,
+            "viewportOnly": self.viewport_only,
+            "viewportMargin": self.viewport_margin,
+            "pruneOffscreen": self.prune_offscreen,
+            "maxNodes": self.max_nodes,
+            "interactiveReserve": self.interactive_reserve,
+            "includeShadowDom": self.include_shadow_dom,
+            "includeFrames": self.include_frames,
+            "backend": self.backend
         }
 
 class ElementHighlightRequest(BaseModel):
@@ -53,10 +72,23 @@ async def extract_dom(options: Optional[DOMExtractionOptions] = None):
     try:
         options_dict = options.to_dict() if options else None
         result = await dom_processing_service.extract_dom(options_dict)
-        return result
+        return result.to_dict() if isinstance(result, DOMTree) else result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to extract DOM tree: {str(e)}")
 
+@router.post("/extract/stream")
+async def stream_dom(options: Optional[DOMExtractionOptions] = None, chunk_size: int = Query(500, ge=1, description="Maximum number of nodes per chunk")):
+    """
+    Extract the DOM tree of the current page in chunks, streamed as newline-delimited JSON.
+    """
+    options_dict = options.to_dict() if options else None
+
+    async def generate_chunks():
+        async for chunk in dom_processing_service.stream_dom(options_dict, chunk_size):
+            yield json.dumps(chunk) + "\n"
+
+    return StreamingResponse(generate_chunks(), media_type="application/x-ndjson")
+
 @router.get("/interactive-elements", response_model=Dict[str, List[Dict[str, Any]]])
 async def get_interactive_elements():
     """
@@ -189,11 +221,28 @@ async def get_forms():
         # First extract the DOM
         dom_tree = await dom_processing_service.extract_dom()
         
-        # Get form elements
-        forms = dom_processing_service.get_elements_by_tag(dom_tree, "form")
-        
         # Analyze forms
-        form_analyses = dom_processing_service._analyze_forms(forms)
-        return form_analyses
+        return dom_processing_service.analyze_dom(dom_tree)["forms"]
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to analyze forms: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to analyze forms: {str(e)}") 
+
+@router.get("/lookup-cache", response_model=Dict[str, Any])
+async def get_lookup_cache_stats():
+    """
+    Get the statistics of the xpath/selector lookup cache.
+    """
+    return dom_processing_service.get_lookup_cache_stats()
+
+@router.get("/extraction-cache", response_model=Dict[str, Any])
+async def get_extraction_cache_stats():
+    """
+    Get the statistics of the cache of DOM extractions reused while the page is unchanged.
+    """
+    return dom_processing_service.get_extraction_cache_stats()
+
+@router.delete("/extraction-cache", response_model=Dict[str, Any])
+async def clear_extraction_cache():
+    """
+    Drop all cached DOM extractions, forcing the next extraction to run in the browser.
+    """
+    return {"dropped": dom_processing_service.clear_extraction_cache()}
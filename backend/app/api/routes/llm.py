@@ -6,6 +6,13 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
 
 from app.dom.service import dom_processing_service
+from app.dom.tree import DOMTree
+from app.llm.cache import llm_response_cache
+from app.llm.cassette import llm_cassette
+from app.llm.client import llm_client_pool
+from app.llm.prefix import prompt_cache_usage
+from app.llm.prompts import prompt_registry
+from app.llm.router import model_router
 from app.core.config import settings
 
 router = APIRouter()
@@ -17,6 +24,7 @@ class DOMQueryRequest(BaseModel):
     max_depth: int = Field(3, description="Maximum depth of the DOM tree to include")
     include_interactive_only: bool = Field(False, description="Whether to limit the response to interactive elements only")
     include_page_analysis: bool = Field(True, description="Whether to include page structure analysis")
+    token_budget: Optional[int] = Field(None, description="Serialize the DOM as indexed lines within this many tokens instead of a tree")
 
 class DOMElementQueryRequest(BaseModel):
     """Request to find elements in the DOM based on a natural language query."""
@@ -88,13 +96,16 @@ async def extract_dom_for_llm(request: DOMQueryRequest):
                     for el in interactive_elements.get("forms", [])
                 ]
             }
+        # Otherwise include the DOM serialized within the token budget if requested
+        elif request.token_budget is not None:
+            response["dom"] = dom_processing_service.serialize_for_llm(dom_tree, request.token_budget, request.query)
         # Otherwise include the simplified DOM tree if requested
         elif request.simplify:
             simplified_dom = dom_processing_service.create_simplified_dom(dom_tree, request.max_depth)
             response["dom"] = simplified_dom
-        # Otherwise include the full DOM tree
+        # Otherwise include the full DOM tree, with compact nodes converted back to dictionaries
         else:
-            response["dom"] = dom_tree
+            response["dom"] = dom_tree.to_dict() if isinstance(dom_tree, DOMTree) else dom_tree
         
         # Include page analysis if requested
         if request.include_page_analysis:
@@ -112,181 +123,78 @@ async def extract_dom_for_llm(request: DOMQueryRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to extract DOM for LLM: {str(e)}")
 
+# Search categories of the element types accepted by /find-element
+ELEMENT_TYPE_CATEGORIES = {
+    "clickable": ["clickable"],
+    "input": ["inputs"],
+    "form": ["forms"]
+}
+
+# Descriptions of the fields an element can match in
+MATCH_FIELD_DESCRIPTIONS = {
+    "text": "Text content",
+    "label": "Associated label",
+    "placeholder": "Placeholder",
+    "aria-label": "ARIA label",
+    "name": "Name attribute",
+    "title": "Title attribute",
+    "alt": "Alt text",
+    "attributes": "An attribute",
+    "controls": "An input field of the form"
+}
+
+def _format_element_match(match: Dict[str, Any]) -> Dict[str, Any]:
+    """Format an element search match for the find-element response."""
+    element = match["element"]
+    entry = match["entry"]
+    attributes = element.get("attributes", {})
+    
+    result = {
+        "id": entry.get("id"),
+        "tag": entry.get("tagName") or element.get("tagName", ""),
+        "selector": entry.get("selector") or element.get("css_selector", ""),
+        "xpath": entry.get("xpath") or element.get("xpath", "")
+    }
+    if match["category"] == "inputs":
+        result.update({
+            "type": attributes.get("type", "text"),
+            "name": attributes.get("name", ""),
+            "placeholder": attributes.get("placeholder", "")
+        })
+    elif match["category"] == "forms":
+        result.update({
+            "action": attributes.get("action", ""),
+            "method": attributes.get("method", "get")
+        })
+    else:
+        result["text"] = element.get("textContent", "")
+    
+    relation = "matches" if match["match"] == "exact" else "contains" if match["match"] == "contains" else "is similar to"
+    result["match_reason"] = f"{MATCH_FIELD_DESCRIPTIONS.get(match['field'], match['field'])} {relation} the query"
+    result["match_score"] = match["score"]
+    return result
+
 @router.post("/find-element", response_model=List[Dict[str, Any]])
 async def find_element_for_llm(request: DOMElementQueryRequest):
     """
     Find elements in the DOM based on a natural language query.
-    Combines different search strategies to find the most relevant elements.
+    Elements are ranked by how well their text, labels and attributes match the query.
     """
     try:
         # Extract the DOM tree
         dom_tree = await dom_processing_service.extract_dom()
         
-        results = []
-        query = request.query.lower()
-        
-        # Use different strategies based on the element type
-        if request.element_type == "clickable" or not request.element_type:
-            # Find clickable elements matching the query
-            clickable_elements = dom_processing_service.get_interactive_elements(dom_tree).get("clickable", [])
-            
-            for element in clickable_elements:
-                element_id = element.get("id")
-                full_element = dom_processing_service.get_element_by_id(dom_tree, element_id) if element_id else None
-                
-                if not full_element:
-                    continue
-                
-                # Check text content
-                text_content = full_element.get("textContent", "").lower()
-                if query in text_content:
-                    results.append({
-                        "id": element_id,
-                        "tag": element.get("tagName", ""),
-                        "text": full_element.get("textContent", ""),
-                        "selector": element.get("selector", ""),
-                        "xpath": element.get("xpath", ""),
-                        "match_reason": "Text content contains the query",
-                        "match_score": 1.0 if query == text_content else 0.8
-                    })
-                
-                # Check attributes
-                attributes = full_element.get("attributes", {})
-                for attr_name, attr_value in attributes.items():
-                    if isinstance(attr_value, str) and query in attr_value.lower():
-                        results.append({
-                            "id": element_id,
-                            "tag": element.get("tagName", ""),
-                            "text": full_element.get("textContent", ""),
-                            "selector": element.get("selector", ""),
-                            "xpath": element.get("xpath", ""),
-                            "match_reason": f"Attribute '{attr_name}' contains the query",
-                            "match_score": 0.7
-                        })
-                        break
-        
-        if request.element_type == "input" or not request.element_type:
-            # Find input elements matching the query
-            input_elements = dom_processing_service.get_interactive_elements(dom_tree).get("inputs", [])
-            
-            for element in input_elements:
-                element_id = element.get("id")
-                full_element = dom_processing_service.get_element_by_id(dom_tree, element_id) if element_id else None
-                
-                if not full_element:
-                    continue
-                
-                attributes = full_element.get("attributes", {})
-                
-                # Check placeholder
-                placeholder = attributes.get("placeholder", "").lower()
-                if query in placeholder:
-                    results.append({
-                        "id": element_id,
-                        "tag": element.get("tagName", ""),
-                        "type": attributes.get("type", "text"),
-                        "name": attributes.get("name", ""),
-                        "placeholder": attributes.get("placeholder", ""),
-                        "selector": element.get("selector", ""),
-                        "xpath": element.get("xpath", ""),
-                        "match_reason": "Placeholder contains the query",
-                        "match_score": 0.9
-                    })
-                
-                # Check name attribute
-                name = attributes.get("name", "").lower()
-                if query in name:
-                    results.append({
-                        "id": element_id,
-                        "tag": element.get("tagName", ""),
-                        "type": attributes.get("type", "text"),
-                        "name": attributes.get("name", ""),
-                        "placeholder": attributes.get("placeholder", ""),
-                        "selector": element.get("selector", ""),
-                        "xpath": element.get("xpath", ""),
-                        "match_reason": "Name attribute contains the query",
-                        "match_score": 0.85
-                    })
-                
-                # Check for associated label
-                all_elements = dom_processing_service._get_all_elements(dom_tree["tree"])
-                for label_el in all_elements:
-                    if label_el.get("tagName") == "label" and label_el.get("attributes", {}).get("for") == element_id:
-                        label_text = label_el.get("textContent", "").lower()
-                        if query in label_text:
-                            results.append({
-                                "id": element_id,
-                                "tag": element.get("tagName", ""),
-                                "type": attributes.get("type", "text"),
-                                "name": attributes.get("name", ""),
-                                "placeholder": attributes.get("placeholder", ""),
-                                "selector": element.get("selector", ""),
-                                "xpath": element.get("xpath", ""),
-                                "match_reason": "Associated label contains the query",
-                                "match_score": 0.95
-                            })
-                            break
-        
-        if request.element_type == "form" or not request.element_type:
-            # Find form elements matching the query
-            forms = dom_processing_service.get_elements_by_tag(dom_tree, "form")
-            
-            for form in forms:
-                form_id = form.get("id")
-                
-                # Check form attributes
-                attributes = form.get("attributes", {})
-                for attr_name, attr_value in attributes.items():
-                    if isinstance(attr_value, str) and query in attr_value.lower():
-                        results.append({
-                            "id": form_id,
-                            "tag": "form",
-                            "action": attributes.get("action", ""),
-                            "method": attributes.get("method", "get"),
-                            "selector": form.get("css_selector", ""),
-                            "xpath": form.get("xpath", ""),
-                            "match_reason": f"Form attribute '{attr_name}' contains the query",
-                            "match_score": 0.75
-                        })
-                        break
-                
-                # Check for input fields within the form that match the query
-                inputs = []
-                dom_processing_service._find_form_controls_recursive(form, inputs, [])
-                
-                for input_el in inputs:
-                    input_attributes = input_el.get("attributes", {})
-                    
-                    # Check name and placeholder
-                    input_name = input_attributes.get("name", "").lower()
-                    input_placeholder = input_attributes.get("placeholder", "").lower()
-                    
-                    if query in input_name or query in input_placeholder:
-                        results.append({
-                            "id": form_id,
-                            "tag": "form",
-                            "action": attributes.get("action", ""),
-                            "method": attributes.get("method", "get"),
-                            "selector": form.get("css_selector", ""),
-                            "xpath": form.get("xpath", ""),
-                            "match_reason": "Form contains an input field matching the query",
-                            "match_score": 0.7
-                        })
-                        break
-        
-        # Sort by match score and limit results
-        results.sort(key=lambda x: x.get("match_score", 0), reverse=True)
-        results = results[:request.limit]
+        # Search the element index for the requested element type
+        categories = None
+        if request.element_type:
+            categories = ELEMENT_TYPE_CATEGORIES.get(request.element_type)
+            if not categories:
+                return []
+        matches = dom_processing_service.search_elements(
+            dom_tree, request.query, categories, limit=request.limit
+        )
         
-        # Deduplicate by ID
-        seen_ids = set()
-        unique_results = []
-        for result in results:
-            if result["id"] not in seen_ids:
-                seen_ids.add(result["id"])
-                unique_results.append(result)
-        
-        return unique_results
+        return [_format_element_match(match) for match in matches]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to find element for LLM: {str(e)}")
 
@@ -342,4 +250,53 @@ async def suggest_action_for_llm(request: DOMElementQueryRequest):
             "suggestion": suggestion
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to suggest action: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to suggest action: {str(e)}")
+
+@router.get("/response-cache", response_model=Dict[str, Any])
+async def get_response_cache_stats():
+    """
+    Get the statistics of the cache of LLM planning responses.
+    """
+    return llm_response_cache.stats()
+
+@router.delete("/response-cache", response_model=Dict[str, Any])
+async def clear_response_cache():
+    """
+    Drop all cached LLM planning responses.
+    """
+    return {"dropped": llm_response_cache.invalidate()}
+
+@router.get("/prompts", response_model=Dict[str, Any])
+async def get_prompt_versions():
+    """
+    Get the ids and hashes of the registered prompt versions.
+    """
+    return prompt_registry.versions()
+
+@router.get("/client-stats", response_model=Dict[str, Any])
+async def get_client_stats():
+    """
+    Get the call statistics of each model, with queue wait and model latency reported separately.
+    """
+    return llm_client_pool.stats()
+
+@router.get("/prompt-cache", response_model=Dict[str, Any])
+async def get_prompt_cache_usage():
+    """
+    Get the prompt tokens of each model that were served from the provider prefix cache.
+    """
+    return prompt_cache_usage.stats()
+
+@router.get("/cassette", response_model=Dict[str, Any])
+async def get_cassette_stats():
+    """
+    Get the recorded and replayed LLM requests, with the model time recorded and saved by replays.
+    """
+    return llm_cassette.stats()
+
+@router.get("/routing", response_model=Dict[str, Any])
+async def get_routing_stats():
+    """
+    Get the calls, latency, tokens and cost of each model route, and the escalations to the main model.
+    """
+    return model_router.stats()
@@ -9,6 +9,7 @@ import logging
 from functools import wraps
 import base64
 from app.browser.browser import browser_manager
+from app.dom import browser_executor
 from app.core.config import settings
 from app.services.websocket_manager import websocket_manager
 from app.services.task_manager import task_manager
@@ -196,6 +197,7 @@ class ControllerService:
         self.actions = {
             "go_to_url": self._go_to_url,
             "click_element": self._click_element,
+            "click_element_by_index": self._click_element_by_index,
             "input_text": self._input_text,
             "get_dom": self._get_dom,
             "capture_screenshot": self._capture_screenshot,
@@ -340,6 +342,53 @@ class ControllerService:
             logger.error(f"Error clicking element: {str(e)}")
             return {"status": "error", "message": str(e)}
     
+    async def _click_element_by_index(self, element_index: int, timeout: int = 10000) -> Dict[str, Any]:
+        """
+        Click an element by the stable index assigned during DOM extraction.
+        
+        Args:
+            element_index: Index of the element in the extracted DOM tree
+            timeout: Maximum time to wait for the element to be clickable in milliseconds
+            
+        Returns:
+            Dictionary with click results
+        """
+        try:
+            logger.info(f"Clicking element with index: {element_index}")
+            
+            element = await browser_executor.get_element_handle_by_index(element_index)
+            if element is None:
+                return {
+                    "success": False,
+                    "status": "error",
+                    "message": f"Element with index {element_index} not found or no longer attached"
+                }
+            
+            box = await element.bounding_box()
+            await element.click(timeout=timeout)
+            
+            page_state = await self.browser.get_page_state()
+            
+            # Broadcast click action feedback if we have a task ID
+            task_id = await self._get_current_task_id()
+            if task_id:
+                action_data = {"element_index": element_index}
+                if box:
+                    action_data.update({
+                        "x": box["x"] + box["width"] / 2,
+                        "y": box["y"] + box["height"] / 2
+                    })
+                await self._broadcast_action_feedback(task_id, "click", action_data)
+            
+            return {
+                "status": "success",
+                "element_index": element_index,
+                "page_state": page_state
+            }
+        except Exception as e:
+            logger.error(f"Error clicking element by index: {str(e)}")
+            return {"success": False, "status": "error", "message": str(e)}
+    
     async def _input_text(self, selector: str, text: str, delay: int = 50) -> Dict[str, Any]:
         """
         Input text into an element.
@@ -3,7 +3,7 @@ Configuration settings for the application.
 Manages environment variables and application defaults.
 """
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -40,6 +40,44 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: Optional[str] = Field(default=None, description="OpenAI API key for language model integration")
     ANTHROPIC_API_KEY: Optional[str] = Field(default=None, description="Anthropic API key for language model integration")
     LLM_MODEL: str = Field(default="gpt-4", description="Language model to use for instruction processing")
+    LLM_PROVIDER: Optional[str] = Field(default=None, description="Set to 'fake' to answer with the scripted offline model instead of a provider")
+    LLM_FAKE_SCRIPT: Optional[str] = Field(default=None, description="JSON script of responses and simulated latency of the fake LLM provider")
+    LLM_FAST_MODEL: Optional[str] = Field(default=None, description="Smaller, faster model of the same provider for low-complexity calls (unset to use the main model for every call)")
+    LLM_FAST_ROUTE_KINDS: List[str] = Field(default=["step"], description="Kinds of LLM calls (interpret, plan, action_plan, step) that may go to the fast model")
+    LLM_FAST_ROUTE_MAX_TOKENS: int = Field(default=200, description="Maximum estimated input tokens of a call routed to the fast model")
+    LLM_FAST_ROUTE_MIN_CONFIDENCE: float = Field(default=0.75, description="Minimum parser confidence in a fast model response, below which the call is escalated to the main model")
+    LLM_MODEL_PRICES: Dict[str, Dict[str, float]] = Field(
+        default={
+            "claude-3-sonnet-20240229": {"input": 3.0, "output": 15.0},
+            "claude-3-haiku-20240307": {"input": 0.25, "output": 1.25},
+            "gpt-4": {"input": 30.0, "output": 60.0},
+            "gpt-3.5-turbo": {"input": 0.5, "output": 1.5}
+        },
+        description="Input and output prices per million tokens by model, for the routing cost statistics"
+    )
+    LLM_STREAMING: bool = Field(default=True, description="Stream step responses and start executing the action before the model finishes its thought")
+    LLM_MAX_CONCURRENCY: int = Field(default=4, description="Maximum number of concurrent LLM calls per provider and model")
+    LLM_REQUESTS_PER_MINUTE: float = Field(default=60.0, description="Maximum LLM request rate per provider and model (0 for no limit)")
+    LLM_RATE_LIMIT_BURST: float = Field(default=5.0, description="Number of LLM requests that may be sent at once before the rate limit applies")
+    LLM_MAX_RETRIES: int = Field(default=3, description="Maximum number of retries of LLM calls failing with rate limit, overload or timeout errors")
+    LLM_RETRY_BASE_DELAY: float = Field(default=1.0, description="Backoff before the first LLM retry in seconds, doubled on each retry")
+    LLM_RETRY_MAX_DELAY: float = Field(default=30.0, description="Maximum backoff between LLM retries in seconds")
+    LLM_CASSETTE_MODE: Optional[str] = Field(default=None, description="Record LLM requests and responses to the cassette (record) or answer requests from it (replay)")
+    LLM_CASSETTE_PATH: str = Field(default="llm_cassette.jsonl", description="Append-only JSON lines log of recorded LLM traffic")
+    LLM_CACHE_SIZE: int = Field(default=256, description="Maximum number of cached planning responses (0 to disable)")
+    LLM_CACHE_TTL: float = Field(default=3600.0, description="Maximum age in seconds of a cached planning response (0 for no limit)")
+    LLM_CACHE_PATH: Optional[str] = Field(default=None, description="Optional SQLite file persisting cached planning responses")
+    PROMPT_HOT_RELOAD: bool = Field(default=False, description="Re-read prompt files when they change on disk")
+    AGENT_PLANNING_MODE: str = Field(default="steps", description="Plan all actions of a task in one LLM call (actions) or one call per step (steps)")
+    AGENT_MAX_REPLANS: int = Field(default=2, description="Maximum number of re-plans of a task after failed or unexpected actions")
+    AGENT_STEP_FAST_PATH: bool = Field(default=True, description="Resolve mechanical plan steps (navigate, wait, click or type into a uniquely named element) without calling the LLM")
+    
+    # DOM Processing Settings
+    DOM_LOOKUP_CACHE_SIZE: int = Field(default=1024, description="Maximum number of cached xpath/selector lookups")
+    DOM_COMPACT_NODES: bool = Field(default=True, description="Store extracted DOM trees as compact nodes instead of nested dictionaries")
+    DOM_EXTRACTION_CACHE_SIZE: int = Field(default=8, description="Maximum number of DOM extractions reused while the page is unchanged (0 to disable)")
+    DOM_EXTRACTION_CACHE_TTL: float = Field(default=30.0, description="Maximum age in seconds of a reused DOM extraction (0 for no limit)")
+    DOM_LLM_TOKEN_BUDGET: int = Field(default=2000, description="Default token budget of the DOM serialized for LLM prompts")
     
     # Logging Settings
     LOG_LEVEL: str = Field(default="INFO", description="Logging level")
@@ -0,0 +1,348 @@
+"""
+Single-pass DOM analysis.
+Runs a set of pluggable analyzers over an extracted DOM tree in one traversal,
+each analyzer receiving enter/leave events for every node.
+"""
+from typing import Dict, Any, List, Optional, Type, Iterable
+from collections import Counter
+import logging
+
+from app.dom.traversal import iter_events
+
+logger = logging.getLogger(__name__)
+
+# Identifiers of common page sections, checked against element id, tag, class and role
+SECTION_IDENTIFIERS = {
+    "header": ["header", "head", "top", "banner"],
+    "footer": ["footer", "foot", "bottom"],
+    "main": ["main", "content", "main-content"],
+    "navigation": ["nav", "navigation", "menu", "navbar"],
+    "sidebar": ["sidebar", "side", "aside"],
+}
+
+FORM_INPUT_TAGS = ("input", "textarea", "select")
+
+
+class DOMAnalyzer:
+    """
+    Base class for analyzers run by the DOM analysis pipeline.
+
+    Subclasses set ``name`` (the key of their result) and override the hooks they need.
+    A new analyzer instance is created for every run, so analyzers can keep state.
+    """
+
+    name = ""
+
+    def start(self, dom_tree: Dict[str, Any]) -> None:
+        """Called once before the traversal with the full extraction result."""
+        pass
+
+    def enter(self, node: Dict[str, Any], depth: int) -> None:
+        """Called for every node (elements and text) in document order, before its children."""
+        pass
+
+    def leave(self, node: Dict[str, Any], depth: int) -> None:
+        """Called for every node after all of its children have been visited."""
+        pass
+
+    def result(self) -> Any:
+        """Get the result of the analysis."""
+        return None
+
+
+class ElementCountAnalyzer(DOMAnalyzer):
+    """Counts elements by tag name."""
+
+    name = "element_counts"
+
+    def __init__(self):
+        self.counter = Counter()
+
+    def enter(self, node: Dict[str, Any], depth: int) -> None:
+        if node.get("type") == "element" and "tagName" in node:
+            self.counter[node["tagName"]] += 1
+
+    def result(self) -> Dict[str, int]:
+        return dict(self.counter)
+
+
+class TextAnalyzer(DOMAnalyzer):
+    """Collects the text of the page, joining the text of each node with a space."""
+
+    name = "text"
+
+    def __init__(self):
+        self.parts: List[str] = []
+
+    def enter(self, node: Dict[str, Any], depth: int) -> None:
+        if depth > 0:
+            self.parts.append(" ")
+        node_type = node.get("type")
+        if node_type == "text":
+            self.parts.append(node.get("content", ""))
+        elif node_type == "element":
+            self.parts.append(node.get("textContent", ""))
+
+    def result(self) -> str:
+        return "".join(self.parts)
+
+
+class SectionAnalyzer(DOMAnalyzer):
+    """Identifies major page sections like header, footer, main content and navigation."""
+
+    name = "sections"
+
+    def __init__(self):
+        self.sections: Dict[str, List[Dict[str, Any]]] = {section_type: [] for section_type in SECTION_IDENTIFIERS}
+
+    def enter(self, node: Dict[str, Any], depth: int) -> None:
+        if node.get("type") != "element":
+            return
+
+        element_id = node.get("id", "").lower()
+        tag_name = node.get("tagName", "").lower()
+        element_class = node.get("attributes", {}).get("class", "").lower()
+        element_role = (node.get("accessibility") or {}).get("role", "").lower()
+
+        for section_type, identifiers in SECTION_IDENTIFIERS.items():
+            reason = None
+            id_match = next((i for i in identifiers if i in element_id), None)
+            if id_match:
+                reason = f"id contains '{id_match}'"
+            elif tag_name in identifiers:
+                reason = f"tag is '{tag_name}'"
+            else:
+                class_match = next((i for i in identifiers if i in element_class), None)
+                if class_match:
+                    reason = f"class contains '{class_match}'"
+                elif element_role in identifiers:
+                    reason = f"role is '{element_role}'"
+
+            if reason:
+                self.sections[section_type].append({
+                    "type": section_type,
+                    "element_id": node.get("id"),
+                    "tag": node.get("tagName"),
+                    "selector": node.get("css_selector"),
+                    "reason": reason
+                })
+
+    def result(self) -> List[Dict[str, Any]]:
+        return [section for sections in self.sections.values() for section in sections]
+
+
+def summarize_form(form: Dict[str, Any], inputs: List[Dict[str, Any]], buttons: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Summarize a form from its controls.
+
+    Args:
+        form: The form element
+        inputs: The input, textarea and select elements of the form
+        buttons: The button elements of the form
+
+    Returns:
+        Form analysis with its inputs and submission method
+    """
+    return {
+        "id": form.get("id"),
+        "selector": form.get("css_selector"),
+        "input_count": len(inputs),
+        "button_count": len(buttons),
+        "inputs": [
+            {
+                "type": input_el.get("attributes", {}).get("type", "text"),
+                "name": input_el.get("attributes", {}).get("name"),
+                "id": input_el.get("id"),
+                "placeholder": input_el.get("attributes", {}).get("placeholder"),
+                "required": "required" in input_el.get("attributes", {})
+            }
+            for input_el in inputs
+        ],
+        "submission": next((
+            {
+                "type": "button",
+                "id": button.get("id"),
+                "text": button.get("textContent")
+            }
+            for button in buttons
+            if button.get("attributes", {}).get("type") == "submit" or
+            "submit" in button.get("textContent", "").lower()
+        ), {"type": "unknown"})
+    }
+
+
+class FormAnalyzer(DOMAnalyzer):
+    """Analyzes the forms of the page and their controls."""
+
+    name = "forms"
+
+    def __init__(self):
+        self.forms: List[Optional[Dict[str, Any]]] = []
+        self.open_forms: List[Dict[str, Any]] = []
+
+    def enter(self, node: Dict[str, Any], depth: int) -> None:
+        if node.get("type") != "element":
+            return
+
+        tag_name = node.get("tagName")
+        if tag_name in FORM_INPUT_TAGS:
+            for form in self.open_forms:
+                form["inputs"].append(node)
+        elif tag_name == "button":
+            for form in self.open_forms:
+                form["buttons"].append(node)
+
+        if (tag_name or "").lower() == "form":
+            # Reserve the slot so forms are reported in document order even when nested
+            self.open_forms.append({"node": node, "slot": len(self.forms), "inputs": [], "buttons": []})
+            self.forms.append(None)
+
+    def leave(self, node: Dict[str, Any], depth: int) -> None:
+        if self.open_forms and self.open_forms[-1]["node"] is node:
+            form = self.open_forms.pop()
+            self.forms[form["slot"]] = summarize_form(node, form["inputs"], form["buttons"])
+
+    def result(self) -> List[Dict[str, Any]]:
+        return list(self.forms)
+
+
+class InteractiveSummaryAnalyzer(DOMAnalyzer):
+    """Summarizes the interactive elements collected during extraction."""
+
+    name = "interactive_elements"
+
+    def __init__(self):
+        self.summary = {"total": 0, "by_type": {}}
+
+    def start(self, dom_tree: Dict[str, Any]) -> None:
+        interactive_elements = dom_tree.get("interactiveElements") or {
+            "clickable": [],
+            "inputs": [],
+            "forms": [],
+            "navigational": []
+        }
+        by_type = {k: len(v) for k, v in interactive_elements.items()}
+        self.summary = {"total": sum(by_type.values()), "by_type": by_type}
+
+    def result(self) -> Dict[str, Any]:
+        return self.summary
+
+
+class TermAnalyzer(DOMAnalyzer):
+    """
+    Collects the distinct strings of the extraction result with their number of occurrences.
+
+    Covers the keys and string values of every node (including attributes and
+    accessibility information) as well as the top-level fields of the result, so
+    the structure of a page can be scanned without serializing it. Not part of
+    DEFAULT_ANALYZERS, it is run for page type classification only.
+    """
+
+    name = "terms"
+
+    def __init__(self):
+        self.terms = Counter()
+
+    def start(self, dom_tree: Dict[str, Any]) -> None:
+        for key, value in dom_tree.items():
+            self.terms[key] += 1
+            if key != "tree":
+                self._collect(value)
+
+    def enter(self, node: Dict[str, Any], depth: int) -> None:
+        for key, value in node.items():
+            self.terms[key] += 1
+            if key != "children":
+                self._collect(value)
+
+    def _collect(self, value: Any) -> None:
+        stack = [value]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, str):
+                self.terms[value] += 1
+            elif isinstance(value, dict):
+                for key, item in value.items():
+                    self.terms[key] += 1
+                    stack.append(item)
+            elif isinstance(value, (list, tuple)):
+                stack.extend(value)
+
+    def result(self) -> Counter:
+        return self.terms
+
+
+DEFAULT_ANALYZERS: List[Type[DOMAnalyzer]] = [
+    ElementCountAnalyzer,
+    TextAnalyzer,
+    SectionAnalyzer,
+    FormAnalyzer,
+    InteractiveSummaryAnalyzer,
+]
+
+
+def run_analyzers(dom_tree: Dict[str, Any], analyzer_classes: Iterable[Type[DOMAnalyzer]]) -> Dict[str, Any]:
+    """
+    Run analyzers over a DOM tree in a single traversal.
+
+    Args:
+        dom_tree: The DOM tree structure
+        analyzer_classes: The analyzer classes to run
+
+    Returns:
+        Dictionary mapping each analyzer name to its result
+    """
+    analyzers = [analyzer_class() for analyzer_class in analyzer_classes]
+    for analyzer in analyzers:
+        analyzer.start(dom_tree)
+
+    for node, depth, leaving in iter_events(dom_tree.get("tree")):
+        if leaving:
+            for analyzer in analyzers:
+                analyzer.leave(node, depth)
+        else:
+            for analyzer in analyzers:
+                analyzer.enter(node, depth)
+
+    return {analyzer.name: analyzer.result() for analyzer in analyzers}
+
+
+class DOMAnalysisPipeline:
+    """
+    A registry of analyzers that are run together in one traversal.
+    """
+
+    def __init__(self, analyzer_classes: Optional[Iterable[Type[DOMAnalyzer]]] = None):
+        """
+        Initialize the pipeline.
+
+        Args:
+            analyzer_classes: The analyzers to run (defaults to DEFAULT_ANALYZERS)
+        """
+        self.analyzer_classes: List[Type[DOMAnalyzer]] = list(
+            analyzer_classes if analyzer_classes is not None else DEFAULT_ANALYZERS
+        )
+
+    def register(self, analyzer_class: Type[DOMAnalyzer]) -> None:
+        """
+        Add an analyzer, replacing any analyzer with the same name.
+
+        Args:
+            analyzer_class: The analyzer class to add
+        """
+        self.analyzer_classes = [
+            existing for existing in self.analyzer_classes if existing.name != analyzer_class.name
+        ]
+        self.analyzer_classes.append(analyzer_class)
+
+    def run(self, dom_tree: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run all registered analyzers over a DOM tree.
+
+        Args:
+            dom_tree: The DOM tree structure
+
+        Returns:
+            Dictionary mapping each analyzer name to its result
+        """
+        return run_analyzers(dom_tree, self.analyzer_classes)
@@ -4,12 +4,45 @@ This module handles the execution of JavaScript in the browser context.
 """
 import os
 import json
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, AsyncIterator
 from pathlib import Path
 
+from app.dom.snapshot import SNAPSHOT_COMPUTED_STYLES, FRAME_INDEX_STRIDE, build_dom_tree_from_snapshot
+from app.dom.traversal import iter_elements
+
 logger = logging.getLogger(__name__)
 
+# Reports the state of the current document. The first call in a window installs a
+# MutationObserver and scroll and resize listeners, which all increment one change
+# counter; later calls only read it, so the check does not walk the DOM. A new
+# window (after a navigation or reload) starts a new counter, which the navigation
+# count of the executor tells apart.
+DOCUMENT_STATE_SCRIPT = """
+() => {
+    let state = window.__midprintDocumentState;
+    if (!state) {
+        state = window.__midprintDocumentState = {document: null, counter: 0, observer: null};
+        const change = () => { state.counter += 1; };
+        state.observer = new MutationObserver(records => { state.counter += records.length; });
+        window.addEventListener('scroll', change, {capture: true, passive: true});
+        window.addEventListener('resize', change, {passive: true});
+    }
+    if (state.document !== document) {
+        // The window shows a new document (document.open), observe it instead
+        state.observer.disconnect();
+        state.observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+        if (state.document) state.counter += 1;
+        state.document = document;
+    }
+    // Count mutations whose records have not been delivered yet
+    state.counter += state.observer.takeRecords().length;
+    return {url: location.href, counter: state.counter};
+}
+"""
+
+
 class BrowserExecutor:
     """
     Executes JavaScript in the browser context and returns the results.
@@ -25,6 +58,13 @@ class BrowserExecutor:
         self.browser = browser_manager
         self._script_cache = {}
         
+        # Number of frame navigations seen on the watched page
+        self.navigation_count = 0
+        self._watched_page = None
+        
+        # Child frames of the last extraction, by the frame number encoded in their element indexes
+        self._indexed_frames: Dict[int, Any] = {}
+        
         # Get the path to the DOM extraction script
         self.script_dir = Path(os.path.dirname(os.path.abspath(__file__)))
         self.dom_extraction_script_path = self.script_dir / "buildDomTree.js"
@@ -52,13 +92,14 @@ class BrowserExecutor:
             logger.error(f"Error loading script {script_path}: {str(e)}")
             raise
     
-    async def execute_script(self, script: str, args: Optional[list] = None) -> Any:
+    async def execute_script(self, script: str, args: Optional[list] = None, frame: Any = None) -> Any:
         """
         Execute JavaScript in the browser context.
         
         Args:
             script: JavaScript to execute
             args: Optional arguments to pass to the script
+            frame: Optional frame to execute the script in (defaults to the main frame)
             
         Returns:
             The result of the script execution
@@ -71,18 +112,48 @@ class BrowserExecutor:
             if args is None:
                 args = []
             
-            result = await self.browser.page.evaluate(script, *args)
+            target = frame if frame is not None else self.browser.page
+            result = await target.evaluate(script, *args)
             return result
         except Exception as e:
             logger.error(f"Error executing script: {str(e)}")
             raise
     
+    def _watch_navigation(self) -> None:
+        """Count the frame navigations of the current page, subscribing once per page."""
+        page = self.browser.page
+        if page is None or page is self._watched_page:
+            return
+        
+        def on_navigated(frame: Any) -> None:
+            self.navigation_count += 1
+        
+        page.on("framenavigated", on_navigated)
+        self._watched_page = page
+        # Navigations of the previous page were not seen, so treat the switch as one
+        self.navigation_count += 1
+    
+    async def get_document_state(self) -> Dict[str, Any]:
+        """
+        Get the state of the current document, used to tell whether a previous extraction is still valid.
+        
+        Returns:
+            Dictionary with the URL, the change counter of the document (DOM mutations,
+            scrolling and resizing) and the navigation count
+        """
+        self._watch_navigation()
+        state = await self.execute_script(DOCUMENT_STATE_SCRIPT)
+        state["navigationCount"] = self.navigation_count
+        return state
+    
     async def extract_dom_tree(self, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Extract the DOM tree of the current page using the DOM extraction script.
         
         Args:
-            options: Optional configuration for the DOM extraction
+            options: Optional configuration for the DOM extraction. When
+                ``includeFrames`` is set, every frame of the page is extracted
+                concurrently and merged into the main tree.
             
         Returns:
             The extracted DOM tree structure
@@ -94,20 +165,254 @@ class BrowserExecutor:
             # Load the DOM extraction script
             script = await self.load_script(self.dom_extraction_script_path)
             
-            # Create a script that first loads the extraction function, then calls it with options
-            execution_script = f"""
-            {script}
-            return extractDomTree({json.dumps(options)});
-            """
+            if options.get("includeFrames"):
+                child_frames = self._get_child_frames()
+                if child_frames:
+                    return await self._extract_frames(script, options, child_frames)
             
             # Execute the script in the browser context
-            result = await self.execute_script(execution_script)
+            result = await self.execute_script(self._build_extraction_script(script, options))
             
             return result
         except Exception as e:
             logger.error(f"Error extracting DOM tree: {str(e)}")
             raise
     
+    def _build_extraction_script(self, script: str, options: Dict[str, Any]) -> str:
+        """
+        Build the expression that loads the extraction function and calls it with the options.
+        
+        The script is wrapped in a function so it can be evaluated as a single expression.
+        """
+        return f"""
+            () => {{
+            {script}
+            return extractDomTree({json.dumps(options)});
+            }}
+            """
+
+    async def stream_dom_tree(self, options: Optional[Dict[str, Any]] = None,
+                              chunk_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Extract the DOM tree of the main frame in chunks.
+        
+        The page-side walker is resumed with one evaluate call per chunk, so the
+        tree never has to be serialized as a single message. Each chunk holds
+        ``{parentIndex, node}`` records in document order; see DOMTreeAssembler for
+        rebuilding the tree. Closing the generator early cancels the page-side walk.
+        
+        Args:
+            options: Optional configuration for the DOM extraction
+            chunk_size: Maximum number of nodes per chunk
+            
+        Yields:
+            Chunks with the node records, the interactive elements found in the chunk,
+            the page url, title and timestamp, and the truncation report on the last chunk
+        """
+        if options is None:
+            options = {}
+        
+        script = await self.load_script(self.dom_extraction_script_path)
+        stream = await self.execute_script(f"""
+            () => {{
+            {script}
+            return startDomStream({json.dumps(options)});
+            }}
+            """)
+        stream_id = stream["streamId"]
+        metadata = {key: stream.get(key) for key in ("url", "title", "timestamp")}
+        
+        done = False
+        try:
+            while not done:
+                chunk = await self.execute_script(
+                    "([streamId, chunkSize]) => window.nextDomChunk(streamId, chunkSize)",
+                    [[stream_id, chunk_size]]
+                )
+                done = chunk.get("done", False)
+                chunk.update(metadata)
+                yield chunk
+        finally:
+            if not done:
+                try:
+                    await self.execute_script(
+                        "(streamId) => window.cancelDomStream && window.cancelDomStream(streamId)",
+                        [stream_id]
+                    )
+                except Exception as e:
+                    logger.warning(f"Error cancelling DOM stream {stream_id}: {str(e)}")
+    
+    async def extract_dom_snapshot(self, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Extract the DOM tree through the Chrome DevTools Protocol instead of walking the page in JavaScript.
+
+        DOMSnapshot.captureSnapshot and Accessibility.getFullAXTree are captured
+        concurrently and converted into the buildDomTree.js schema. Only available
+        on Chromium; other browsers raise when the CDP session is opened.
+
+        Args:
+            options: Optional configuration for the DOM extraction
+
+        Returns:
+            The extracted DOM tree structure
+        """
+        if options is None:
+            options = {}
+
+        if not self.browser.is_initialized:
+            logger.error("Browser is not initialized, cannot capture DOM snapshot")
+            raise RuntimeError("Browser is not initialized")
+
+        page = self.browser.page
+        session = await page.context.new_cdp_session(page)
+        try:
+            calls = [session.send("DOMSnapshot.captureSnapshot", {
+                "computedStyles": SNAPSHOT_COMPUTED_STYLES,
+                "includeDOMRects": False
+            })]
+            if options.get("includeAccessibility", True):
+                calls.append(session.send("Accessibility.getFullAXTree"))
+            results = await asyncio.gather(*calls)
+        finally:
+            await session.detach()
+
+        ax_nodes = results[1].get("nodes", []) if len(results) > 1 else []
+        return build_dom_tree_from_snapshot(results[0], ax_nodes, options, page.viewport_size)
+
+    def _get_child_frames(self) -> List[Any]:
+        """Get the attached child frames of the current page, in page order."""
+        page = self.browser.page
+        main_frame = page.main_frame
+        return [
+            frame for frame in page.frames
+            if frame is not main_frame and not frame.is_detached()
+        ]
+    
+    async def _extract_frames(self, script: str, options: Dict[str, Any], child_frames: List[Any]) -> Dict[str, Any]:
+        """
+        Extract the main frame and all child frames concurrently and merge the results.
+        
+        Element ids of child frames are qualified with the frame id (``frame-1:el-3``) and their
+        indexes offset by the frame number, and each child frame tree is attached under the
+        iframe element hosting it.
+        
+        Args:
+            script: The DOM extraction script
+            options: Configuration for the DOM extraction
+            child_frames: The child frames to extract
+            
+        Returns:
+            The merged DOM tree structure
+        """
+        page = self.browser.page
+        frame_ids = {page.main_frame: None}
+        for index, frame in enumerate(child_frames, start=1):
+            frame_ids[frame] = f"frame-{index}"
+        self._indexed_frames = dict(enumerate(child_frames, start=1))
+        
+        main_task = self.execute_script(self._build_extraction_script(script, options))
+        frame_tasks = [
+            self._extract_child_frame(script, options, frame, frame_ids[frame], number)
+            for number, frame in enumerate(child_frames, start=1)
+        ]
+        results = await asyncio.gather(main_task, *frame_tasks, return_exceptions=True)
+        
+        # The main frame is required, child frames are best effort
+        main_result = results[0]
+        if isinstance(main_result, Exception):
+            raise main_result
+        
+        trees = {None: main_result.get("tree")}
+        frames_info = []
+        attached = []
+        
+        for frame, frame_result in zip(child_frames, results[1:]):
+            frame_id = frame_ids[frame]
+            info = {
+                "id": frame_id,
+                "url": frame.url,
+                "name": frame.name,
+                "parent": frame_ids.get(frame.parent_frame)
+            }
+            
+            if isinstance(frame_result, Exception):
+                logger.warning(f"Error extracting DOM tree from frame {frame_id} ({frame.url}): {str(frame_result)}")
+                info["error"] = str(frame_result)
+                frames_info.append(info)
+                continue
+            
+            result, host_index = frame_result
+            tree = result.get("tree")
+            if tree is not None:
+                tree["frameId"] = frame_id
+                tree["frameUrl"] = frame.url
+            trees[frame_id] = tree
+            attached.append((info["parent"], host_index, tree))
+            
+            # Merge the interactive elements, tagged with their frame
+            for element_type, elements in (result.get("interactiveElements") or {}).items():
+                merged = main_result.setdefault("interactiveElements", {}).setdefault(element_type, [])
+                for element in elements:
+                    element["frame"] = frame_id
+                    merged.append(element)
+            
+            frames_info.append(info)
+        
+        # Attach each frame tree under its host iframe element in the parent frame
+        hosts = {
+            parent_id: self._find_frame_hosts(parent_tree)
+            for parent_id, parent_tree in trees.items()
+        }
+        for parent_id, host_index, tree in attached:
+            if tree is None:
+                continue
+            host = hosts.get(parent_id, {}).get(host_index)
+            if host is None:
+                # Fall back to the root of the main tree if the host element was not extracted
+                host = trees.get(None)
+            if host is not None:
+                host.setdefault("children", []).append(tree)
+        
+        main_result["frames"] = frames_info
+        return main_result
+    
+    async def _extract_child_frame(self, script: str, options: Dict[str, Any], frame: Any, frame_id: str,
+                                   frame_number: int) -> tuple:
+        """
+        Extract the DOM tree of a child frame and locate its host element in the parent frame.
+        
+        Returns:
+            Tuple of the extraction result and the index of the host iframe element
+            among the frame elements of the parent document (-1 if unknown)
+        """
+        frame_options = dict(options, idPrefix=f"{frame_id}:", indexOffset=frame_number * FRAME_INDEX_STRIDE)
+        frame_options.pop("includeFrames", None)
+        
+        result, host_index = await asyncio.gather(
+            self.execute_script(self._build_extraction_script(script, frame_options), frame=frame),
+            self._get_frame_host_index(frame)
+        )
+        return result, host_index
+    
+    async def _get_frame_host_index(self, frame: Any) -> int:
+        """Get the index of the element hosting a frame among the frame elements of its document."""
+        try:
+            frame_element = await frame.frame_element()
+            return await frame_element.evaluate(
+                "el => Array.from(el.ownerDocument.querySelectorAll('iframe, frame')).indexOf(el)"
+            )
+        except Exception as e:
+            logger.debug(f"Could not locate host element of frame {frame.url}: {str(e)}")
+            return -1
+    
+    def _find_frame_hosts(self, tree: Optional[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """Find the iframe elements of an extracted tree, keyed by their frame index."""
+        hosts = {}
+        for node in iter_elements(tree):
+            if "frameIndex" in node and node.get("frameIndex", -1) >= 0:
+                hosts[node["frameIndex"]] = node
+        return hosts
+    
     async def highlight_element(self, selector: str, highlight_style: Optional[Dict[str, str]] = None, 
                                duration_ms: int = 2000) -> bool:
         """
@@ -157,6 +462,107 @@ class BrowserExecutor:
         
         return await self.execute_script(script, [selector, highlight_style, duration_ms])
     
+    # Resolves an element from the registry kept by buildDomTree.js, so indexes from
+    # an earlier extraction still point at the same element as long as it is attached
+    _RESOLVE_INDEX_SCRIPT = """
+        (index) => {
+            const registry = window.__midprintElementRegistry;
+            if (!registry) return null;
+            const ref = registry.elements.get(index);
+            if (!ref) return null;
+            const element = typeof WeakRef !== 'undefined' && ref instanceof WeakRef ? ref.deref() : ref;
+            return element && element.isConnected ? element : null;
+        }
+    """
+    
+    async def get_element_handle_by_index(self, index: int) -> Optional[Any]:
+        """
+        Get a handle to an element by the stable index assigned during DOM extraction.
+        
+        Indexes of child frame elements are resolved in the frame that owns them.
+        
+        Args:
+            index: The element index from the extracted DOM tree
+            
+        Returns:
+            ElementHandle for the element, or None if it is unknown or detached
+        """
+        if not self.browser.is_initialized:
+            logger.error("Browser is not initialized, cannot resolve element")
+            raise RuntimeError("Browser is not initialized")
+        
+        frame, local_index = self._resolve_index_frame(int(index))
+        if frame is None:
+            return None
+        
+        handle = await frame.evaluate_handle(self._RESOLVE_INDEX_SCRIPT, local_index)
+        element = handle.as_element()
+        if element is None:
+            await handle.dispose()
+        return element
+    
+    def _resolve_index_frame(self, index: int) -> tuple:
+        """
+        Split an element index into the frame owning the element and the index within that frame.
+        
+        Returns:
+            Tuple of the page or frame to resolve the index in (None if the frame is unknown
+            or detached) and the index within it
+        """
+        frame_number, local_index = divmod(index, FRAME_INDEX_STRIDE)
+        if frame_number == 0:
+            return self.browser.page, local_index
+        
+        frame = self._indexed_frames.get(frame_number)
+        if frame is None or frame.is_detached():
+            logger.warning(f"Frame of element index {index} is no longer attached")
+            return None, local_index
+        return frame, local_index
+    
+    async def get_element_by_index(self, index: int) -> Optional[Dict[str, Any]]:
+        """
+        Get an element by its stable extraction index and return its basic properties.
+        
+        Args:
+            index: The element index from the extracted DOM tree
+            
+        Returns:
+            Object with element properties, or None if element not found
+        """
+        script = """
+        (index) => {
+            const resolve = %s;
+            const element = resolve(index);
+            if (!element) return null;
+            
+            const rect = element.getBoundingClientRect();
+            const textContent = element.textContent ? element.textContent.trim() : '';
+            
+            return {
+                index,
+                tagName: element.tagName.toLowerCase(),
+                id: element.id || null,
+                classes: Array.from(element.classList || []),
+                position: {
+                    x: Math.round(rect.left + window.scrollX),
+                    y: Math.round(rect.top + window.scrollY),
+                    width: Math.round(rect.width),
+                    height: Math.round(rect.height)
+                },
+                textContent: textContent.length > 100 ? textContent.substring(0, 100) + '...' : textContent
+            };
+        }
+        """ % self._RESOLVE_INDEX_SCRIPT.strip()
+        
+        frame, local_index = self._resolve_index_frame(int(index))
+        if frame is None:
+            return None
+        
+        element = await self.execute_script(script, [local_index], frame=frame)
+        if element is not None:
+            element["index"] = int(index)
+        return element
+    
     async def get_element_by_xpath(self, xpath: str) -> Dict[str, Any]:
         """
         Get an element by XPath and return its basic properties.
@@ -5,7 +5,9 @@
  */
 
 /**
- * Main function to extract DOM tree and interactive elements
+ * Create a walker that extracts the DOM tree and interactive elements.
+ * The walk is a generator yielding one record per extracted node, so it can be run to completion
+ * or resumed in chunks across evaluate calls.
  * @param {Object} options - Configuration options
  * @param {boolean} options.includeText - Whether to include text content (default: true)
  * @param {boolean} options.includeAttributes - Whether to include element attributes (default: true)
@@ -16,9 +18,21 @@
  * @param {string[]} options.attributeFilter - Specific attributes to include (if empty, include all)
  * @param {number} options.maxDepth - Maximum depth to traverse (default: 25)
  * @param {number} options.maxTextLength - Maximum text content length (default: 150)
- * @returns {Object} Structured DOM tree with element metadata
+ * @param {boolean} options.viewportOnly - Only include elements within the viewport (default: false)
+ * @param {number} options.viewportMargin - Extra margin around the viewport in pixels (default: 200)
+ * @param {boolean} options.pruneOffscreen - With viewportOnly, skip whole subtrees whose bounding box is outside
+ *     the viewport instead of only the offscreen elements themselves (default: true)
+ * @param {number} options.maxNodes - Maximum number of nodes to include, 0 for unlimited (default: 0)
+ * @param {number} options.interactiveReserve - Fraction of maxNodes reserved for interactive elements (default: 0.25)
+ * @param {boolean} options.includeShadowDom - Whether to descend into open shadow roots (default: true)
+ * @param {string} options.idPrefix - Prefix for element ids, used to qualify ids of child frames (default: '')
+ * @param {number} options.indexOffset - Offset added to element indexes, so indexes of child frames do not
+ *     collide with those of the main frame (default: 0)
+ * @param {boolean} retainTree - Whether to link extracted nodes into a nested tree. Streaming walkers
+ *     leave it off so nodes can be released once they have been sent (default: true)
+ * @returns {Object} Walker with the walk generator, the root collector and result accessors
  */
-function extractDomTree(options = {}) {
+function createDomWalker(options = {}, retainTree = true) {
     // Default options
     const config = {
         includeText: options.includeText !== undefined ? options.includeText : true,
@@ -29,7 +43,39 @@ function extractDomTree(options = {}) {
         includeAccessibility: options.includeAccessibility !== undefined ? options.includeAccessibility : true,
         attributeFilter: options.attributeFilter || [],
         maxDepth: options.maxDepth || 25,
-        maxTextLength: options.maxTextLength || 150
+        maxTextLength: options.maxTextLength || 150,
+        viewportOnly: options.viewportOnly !== undefined ? options.viewportOnly : false,
+        viewportMargin: options.viewportMargin !== undefined ? options.viewportMargin : 200,
+        maxNodes: options.maxNodes || 0,
+        interactiveReserve: options.interactiveReserve !== undefined ? options.interactiveReserve : 0.25,
+        includeShadowDom: options.includeShadowDom !== undefined ? options.includeShadowDom : true,
+        idPrefix: options.idPrefix || '',
+        indexOffset: options.indexOffset || 0
+    };
+    config.pruneOffscreen = options.pruneOffscreen !== undefined ? options.pruneOffscreen : true;
+
+    // Node budget: regular nodes stop at the soft limit, interactive elements may use the rest
+    const hardLimit = config.maxNodes > 0 ? config.maxNodes : Infinity;
+    const softLimit = config.maxNodes > 0 ?
+        Math.max(1, Math.floor(config.maxNodes * (1 - config.interactiveReserve))) :
+        Infinity;
+
+    // Bookkeeping for what was left out of the result
+    const truncation = {
+        nodeCount: 0,
+        budgetExhausted: false,
+        droppedByBudget: 0,
+        prunedOffscreen: 0,
+        depthLimited: 0
+    };
+    let walkAborted = false;
+
+    // Viewport bounds (in client coordinates) used for viewport-only extraction
+    const viewport = {
+        top: -config.viewportMargin,
+        left: -config.viewportMargin,
+        bottom: window.innerHeight + config.viewportMargin,
+        right: window.innerWidth + config.viewportMargin
     };
 
     // Track all interactive elements for easy access
@@ -40,16 +86,23 @@ function extractDomTree(options = {}) {
         navigational: []
     };
 
-    // Element indexing to support unique identification
-    let elementIndex = 0;
-    const elementMap = new Map();
+    // Element indexing to support unique identification. The registry lives on the window so
+    // an element keeps the same index and id across extractions of the same document.
+    const registry = getElementRegistry();
+
+    // Number of shadow roots enclosing the node currently being processed
+    let shadowDepth = 0;
+
+    // Frame elements of this document, used to link child frames back to their host element
+    let frameElements = null;
 
     /**
      * Check if an element is visible
      * @param {Element} element - DOM element to check
+     * @param {DOMRect} rect - Optional precomputed bounding rectangle
      * @returns {boolean} Whether the element is visible
      */
-    function isElementVisible(element) {
+    function isElementVisible(element, rect) {
         if (!config.includeVisibility) return true;
         
         if (!element || !element.getBoundingClientRect) return false;
@@ -59,11 +112,23 @@ function extractDomTree(options = {}) {
             return false;
         }
 
-        const rect = element.getBoundingClientRect();
+        rect = rect || element.getBoundingClientRect();
         const hasSize = rect.width > 0 && rect.height > 0;
         return hasSize;
     }
 
+    /**
+     * Check if a bounding rectangle intersects the (margin-extended) viewport
+     * @param {DOMRect} rect - Bounding rectangle in client coordinates
+     * @returns {boolean} Whether the rectangle is within the viewport bounds
+     */
+    function isInViewport(rect) {
+        return rect.bottom >= viewport.top &&
+            rect.top <= viewport.bottom &&
+            rect.right >= viewport.left &&
+            rect.left <= viewport.right;
+    }
+
     /**
      * Check if an element is interactive
      * @param {Element} element - DOM element to check
@@ -312,13 +377,13 @@ function extractDomTree(options = {}) {
      * @param {Element} element - DOM element
      * @returns {Object|null} Object with element position or null if not available
      */
-    function getElementPosition(element) {
+    function getElementPosition(element, rect) {
         if (!config.includePosition || !element.getBoundingClientRect) {
             return null;
         }
 
         try {
-            const rect = element.getBoundingClientRect();
+            rect = rect || element.getBoundingClientRect();
             return {
                 x: Math.round(rect.left + window.scrollX),
                 y: Math.round(rect.top + window.scrollY),
@@ -434,40 +499,109 @@ function extractDomTree(options = {}) {
     }
 
     /**
-     * Process a DOM node and its children recursively
+     * Check whether the node budget still has room for a node
+     * @param {boolean} interactive - Whether the node is an interactive element
+     * @returns {boolean} Whether the node may be added to the result
+     */
+    function hasBudgetFor(interactive) {
+        const limit = interactive ? hardLimit : softLimit;
+        if (truncation.nodeCount < limit) {
+            return true;
+        }
+        truncation.budgetExhausted = true;
+        truncation.droppedByBudget++;
+        if (truncation.nodeCount >= hardLimit) {
+            walkAborted = true;
+        }
+        return false;
+    }
+
+    /**
+     * Get the index of a frame element among the frame elements of its document
+     * @param {Element} element - iframe or frame element
+     * @returns {number} Index of the frame element, or -1 if not found
+     */
+    function getFrameIndex(element) {
+        if (frameElements === null) {
+            frameElements = Array.from(document.querySelectorAll('iframe, frame'));
+        }
+        return frameElements.indexOf(element);
+    }
+
+    /**
+     * Record an extracted node under its parent
+     * @param {Object} parent - Representation of the parent element
+     * @param {Object} data - Representation of the extracted node
+     * @returns {Object} Stream record with the parent index and the node. The index is used
+     *     rather than the id, as ids taken from the document are not guaranteed to be unique
+     */
+    function emit(parent, data) {
+        if (retainTree) {
+            parent.children.push(data);
+        }
+        return { parentIndex: parent.index !== undefined ? parent.index : null, node: data };
+    }
+
+    /**
+     * Process the children of a node, including the children of its open shadow root
+     * @param {Node} node - DOM node whose children should be processed
+     * @param {number} depth - Depth of the children in the tree
+     * @param {Object} parent - Representation the children are attached to
+     */
+    function* processChildren(node, depth, parent) {
+        if (node.childNodes) {
+            for (let i = 0; i < node.childNodes.length && !walkAborted; i++) {
+                yield* processNode(node.childNodes[i], depth, parent);
+            }
+        }
+
+        if (config.includeShadowDom && node.shadowRoot) {
+            shadowDepth++;
+            const shadowChildren = node.shadowRoot.childNodes;
+            for (let i = 0; i < shadowChildren.length && !walkAborted; i++) {
+                yield* processNode(shadowChildren[i], depth, parent);
+            }
+            shadowDepth--;
+        }
+    }
+
+    /**
+     * Process a DOM node and its children recursively, yielding a record for every extracted node
      * @param {Node} node - DOM node to process
      * @param {number} depth - Current depth in the tree
-     * @returns {Object|null} Node representation or null if node should be skipped
+     * @param {Object} parent - Representation the node is attached to. When an element is
+     *     dropped because of the node budget, its children are attached here instead.
+     * @param {boolean} isRoot - Whether the node is the root of the extraction
      */
-    function processNode(node, depth = 0) {
+    function* processNode(node, depth, parent, isRoot = false) {
+        if (walkAborted) {
+            return;
+        }
+
         // Skip if we've reached max depth
         if (depth > config.maxDepth) {
-            return null;
+            truncation.depthLimited++;
+            return;
         }
 
         // Handle text nodes
         if (node.nodeType === Node.TEXT_NODE) {
             const text = node.textContent.trim();
-            if (text && config.includeText) {
-                return {
+            if (text && config.includeText && hasBudgetFor(false)) {
+                truncation.nodeCount++;
+                yield emit(parent, {
                     type: 'text',
                     content: text.length > config.maxTextLength ? 
                         text.substring(0, config.maxTextLength) + '...' : 
                         text
-                };
+                });
             }
-            return null;
+            return;
         }
 
         // Skip non-element nodes (comments, etc.)
         if (node.nodeType !== Node.ELEMENT_NODE) {
-            return null;
-        }
-
-        // Check if element is visible
-        const visible = isElementVisible(node);
-        if (!visible && config.includeVisibility) {
-            return null;
+            return;
         }
 
         const tagName = node.tagName.toLowerCase();
@@ -475,31 +609,71 @@ function extractDomTree(options = {}) {
         // Skip certain elements that are unlikely to be important for interaction
         const skipTags = ['script', 'style', 'noscript', 'svg', 'path'];
         if (skipTags.includes(tagName)) {
-            return null;
+            return;
         }
 
-        // Get the element ID or create one if it doesn't exist
-        let id = node.id;
-        if (!id) {
-            id = `el-${elementIndex++}`;
+        // Check if element is visible
+        const rect = node.getBoundingClientRect ? node.getBoundingClientRect() : null;
+        const visible = isElementVisible(node, rect);
+        if (!visible && config.includeVisibility) {
+            return;
+        }
+
+        // Prune subtrees that lie completely outside the viewport
+        const offscreen = config.viewportOnly && !isRoot && rect && !isInViewport(rect);
+        if (offscreen && config.pruneOffscreen) {
+            truncation.prunedOffscreen++;
+            return;
+        }
+
+        if (offscreen) {
+            // Without pruning, offscreen elements are dropped but their children are still visited
+            truncation.prunedOffscreen++;
+            yield* processChildren(node, depth + 1, parent);
+            return;
+        }
+
+        // Check if element is interactive
+        const interactiveInfo = getInteractiveInfo(node);
+
+        if (!isRoot && !hasBudgetFor(interactiveInfo.interactive)) {
+            // Keep walking so interactive descendants can still use the reserved budget
+            yield* processChildren(node, depth + 1, parent);
+            return;
         }
+        truncation.nodeCount++;
 
-        // Store element in map for later reference
-        elementMap.set(id, node);
+        // Get the stable element ID, assigned the first time the element is seen
+        const identity = registerElement(registry, node);
+        const id = config.idPrefix + identity.id;
 
         // Create element representation
         const elementData = {
             id,
+            index: config.indexOffset + identity.index,
             type: 'element',
             tagName,
             attributes: getElementAttributes(node),
-            position: getElementPosition(node),
+            position: getElementPosition(node, rect),
             css_selector: generateSelector(node),
-            xpath: generateXPath(node),
+            xpath: shadowDepth > 0 ? null : generateXPath(node),
             accessibility: getAccessibilityInfo(node),
             children: []
         };
 
+        // XPath does not pierce shadow roots, so elements inside one are flagged instead
+        if (shadowDepth > 0) {
+            elementData.inShadowRoot = true;
+        }
+        if (config.includeShadowDom && node.shadowRoot) {
+            elementData.shadowHost = true;
+        }
+
+        // Record the frame index so the extraction of the child frame can be attached here
+        if (tagName === 'iframe' || tagName === 'frame') {
+            elementData.frameIndex = getFrameIndex(node);
+        }
+
         // Get text content
         if (config.includeText && node.childNodes.length === 1 && node.firstChild.nodeType === Node.TEXT_NODE) {
             const text = node.textContent.trim();
@@ -510,8 +684,6 @@ function extractDomTree(options = {}) {
             }
         }
 
-        // Check if element is interactive
-        const interactiveInfo = getInteractiveInfo(node);
         if (interactiveInfo.interactive) {
             elementData.interactive = true;
             elementData.interactiveTypes = interactiveInfo.interactiveTypes;
@@ -531,35 +703,262 @@ function extractDomTree(options = {}) {
             });
         }
 
+        yield emit(parent, elementData);
+
         // Process child nodes
-        if (node.childNodes && node.childNodes.length > 0) {
-            for (let i = 0; i < node.childNodes.length; i++) {
-                const childNode = processNode(node.childNodes[i], depth + 1);
-                if (childNode) {
-                    elementData.children.push(childNode);
-                }
-            }
-        }
+        yield* processChildren(node, depth + 1, elementData);
+    }
 
-        return elementData;
+    // Pseudo parent collecting the root of the extraction
+    const root = { id: null, children: [] };
+
+    /**
+     * Walk the document from the body, yielding a record for every extracted node
+     */
+    function* walk() {
+        yield* processNode(document.body, 0, root, true);
+        sweepElementRegistry(registry);
     }
 
-    // Start processing from the document body
-    const domTree = processNode(document.body);
+    /**
+     * Get the report of what was left out of the extraction
+     * @returns {Object} Truncation report
+     */
+    function getTruncation() {
+        return {
+            truncated: truncation.budgetExhausted || truncation.prunedOffscreen > 0 || truncation.depthLimited > 0,
+            nodeCount: truncation.nodeCount,
+            maxNodes: config.maxNodes,
+            budgetExhausted: truncation.budgetExhausted,
+            droppedByBudget: truncation.droppedByBudget,
+            prunedOffscreen: truncation.prunedOffscreen,
+            depthLimited: truncation.depthLimited,
+            viewportOnly: config.viewportOnly,
+            viewport: config.viewportOnly ? {
+                width: window.innerWidth,
+                height: window.innerHeight,
+                scrollX: Math.round(window.scrollX),
+                scrollY: Math.round(window.scrollY),
+                margin: config.viewportMargin
+            } : null
+        };
+    }
+
+    /**
+     * Get the interactive elements found since the previous call and reset the collection
+     * @returns {Object} Interactive elements grouped by type
+     */
+    function takeInteractiveElements() {
+        const taken = {};
+        Object.keys(interactiveElements).forEach(type => {
+            taken[type] = interactiveElements[type];
+            interactiveElements[type] = [];
+        });
+        return taken;
+    }
+
+    return {
+        walk,
+        root,
+        interactiveElements,
+        getTruncation,
+        takeInteractiveElements
+    };
+}
+
+/**
+ * Extract the DOM tree and interactive elements in a single pass
+ * @param {Object} options - Configuration options, see createDomWalker
+ * @returns {Object} Structured DOM tree with element metadata
+ */
+function extractDomTree(options = {}) {
+    const walker = createDomWalker(options);
+
+    // Start processing from the document body; the tree is built in place while walking
+    const iterator = walker.walk();
+    while (!iterator.next().done) {
+        continue;
+    }
 
     return {
         url: window.location.href,
         title: document.title,
         timestamp: new Date().toISOString(),
-        tree: domTree,
-        interactiveElements
+        tree: walker.root.children.length > 0 ? walker.root.children[0] : null,
+        interactiveElements: walker.interactiveElements,
+        truncation: walker.getTruncation()
+    };
+}
+
+/**
+ * Get the open DOM extraction streams of the current document
+ * @returns {Object} Streams by id and the next stream id
+ */
+function getDomStreams() {
+    if (!window.__midprintDomStreams) {
+        window.__midprintDomStreams = {
+            streams: new Map(),
+            nextId: 1
+        };
+    }
+    return window.__midprintDomStreams;
+}
+
+/**
+ * Start a chunked DOM extraction. Nodes are pulled with nextDomChunk, so no single
+ * evaluate call has to serialize the whole tree.
+ * @param {Object} options - Configuration options, see createDomWalker
+ * @returns {Object} Stream id and page metadata
+ */
+function startDomStream(options = {}) {
+    const domStreams = getDomStreams();
+    const walker = createDomWalker(options, false);
+    const streamId = domStreams.nextId++;
+    domStreams.streams.set(streamId, {
+        walker,
+        iterator: walker.walk(),
+        sequence: 0
+    });
+
+    return {
+        streamId,
+        url: window.location.href,
+        title: document.title,
+        timestamp: new Date().toISOString()
+    };
+}
+
+/**
+ * Continue a chunked DOM extraction
+ * @param {number} streamId - Id returned by startDomStream
+ * @param {number} chunkSize - Maximum number of nodes in the chunk (default: 500)
+ * @returns {Object} Chunk with node records ({parentIndex, node}) in document order, the interactive
+ *     elements found in the chunk, and the truncation report once the walk is done
+ */
+function nextDomChunk(streamId, chunkSize = 500) {
+    const domStreams = getDomStreams();
+    const stream = domStreams.streams.get(streamId);
+    if (!stream) {
+        throw new Error(`Unknown DOM stream: ${streamId}`);
+    }
+
+    // Every chunk makes progress, whatever size is asked for
+    chunkSize = Math.max(1, Math.floor(chunkSize) || 1);
+
+    const nodes = [];
+    let done = false;
+    while (nodes.length < chunkSize) {
+        const step = stream.iterator.next();
+        if (step.done) {
+            done = true;
+            break;
+        }
+        nodes.push(step.value);
+    }
+
+    if (done) {
+        domStreams.streams.delete(streamId);
+    }
+
+    return {
+        streamId,
+        sequence: stream.sequence++,
+        nodes,
+        interactiveElements: stream.walker.takeInteractiveElements(),
+        done,
+        truncation: done ? stream.walker.getTruncation() : null
     };
 }
 
+/**
+ * Abandon a chunked DOM extraction
+ * @param {number} streamId - Id returned by startDomStream
+ * @returns {boolean} Whether the stream was open
+ */
+function cancelDomStream(streamId) {
+    const domStreams = getDomStreams();
+    const stream = domStreams.streams.get(streamId);
+    if (!stream) {
+        return false;
+    }
+    stream.iterator.return();
+    domStreams.streams.delete(streamId);
+    return true;
+}
+
+/**
+ * Get the element registry of the current document, creating it on first use.
+ * The registry maps elements to stable indexes and ids, and indexes back to elements.
+ * @returns {Object} The element registry
+ */
+function getElementRegistry() {
+    if (!window.__midprintElementRegistry) {
+        window.__midprintElementRegistry = {
+            identities: new WeakMap(),
+            elements: new Map(),
+            nextIndex: 0
+        };
+    }
+    return window.__midprintElementRegistry;
+}
+
+/**
+ * Get the stable identity of an element, registering it if it has not been seen before
+ * @param {Object} registry - The element registry
+ * @param {Element} element - DOM element
+ * @returns {Object} Object with the element index and id
+ */
+function registerElement(registry, element) {
+    let identity = registry.identities.get(element);
+    if (!identity) {
+        const index = registry.nextIndex++;
+        identity = {
+            index,
+            id: element.id || `el-${index}`
+        };
+        registry.identities.set(element, identity);
+    }
+    // Also restores the entry of an element swept while detached and attached again since
+    if (!registry.elements.has(identity.index)) {
+        registry.elements.set(identity.index, typeof WeakRef !== 'undefined' ? new WeakRef(element) : element);
+    }
+    return identity;
+}
+
+/**
+ * Look up a registered element by its stable index
+ * @param {number} index - The element index
+ * @returns {Element|null} The element, or null if it is unknown or no longer in the document
+ */
+function getElementByIndex(index) {
+    const registry = getElementRegistry();
+    const ref = registry.elements.get(index);
+    if (!ref) return null;
+    const element = typeof WeakRef !== 'undefined' && ref instanceof WeakRef ? ref.deref() : ref;
+    return element && element.isConnected ? element : null;
+}
+
+/**
+ * Drop registry entries for elements that have been garbage collected or removed from the document
+ * @param {Object} registry - The element registry
+ */
+function sweepElementRegistry(registry) {
+    for (const [index, ref] of registry.elements) {
+        const element = typeof WeakRef !== 'undefined' && ref instanceof WeakRef ? ref.deref() : ref;
+        if (!element || element.isConnected === false) {
+            registry.elements.delete(index);
+        }
+    }
+}
+
 // Export the function
 if (typeof module !== 'undefined' && module.exports) {
-    module.exports = { extractDomTree };
+    module.exports = { extractDomTree, getElementByIndex, startDomStream, nextDomChunk, cancelDomStream };
 } else {
     // When running in browser context
     window.extractDomTree = extractDomTree;
+    window.getElementByIndex = getElementByIndex;
+    window.startDomStream = startDomStream;
+    window.nextDomChunk = nextDomChunk;
+    window.cancelDomStream = cancelDomStream;
 } 
\ No newline at end of file
@@ -0,0 +1,214 @@
+"""
+Bounded caches for extracted DOM trees and the lookups derived from them.
+Lookups are keyed by the version of the tree they were computed from, so they
+never hold on to the trees themselves and can be dropped when a page is re-extracted.
+Extracted trees are kept with the state of the document they were extracted from,
+and are only reused while the document has not changed.
+"""
+from typing import Dict, Any, Callable, Hashable, Optional
+from collections import OrderedDict
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedLRUCache:
+    """
+    Least-recently-used cache keyed by (tree version, key).
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of entries kept
+        """
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[tuple, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_compute(self, version: int, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Get a cached value, computing and storing it on a miss.
+
+        Args:
+            version: The version of the tree the value derives from
+            key: The lookup key
+            compute: Function computing the value on a miss
+
+        Returns:
+            The cached or computed value
+        """
+        entry_key = (version, key)
+        if entry_key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(entry_key)
+            return self._entries[entry_key]
+
+        self.misses += 1
+        value = compute()
+        self._entries[entry_key] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def invalidate(self, version: Optional[int] = None) -> int:
+        """
+        Drop cached entries.
+
+        Args:
+            version: Drop only the entries of this tree version, or everything if None
+
+        Returns:
+            The number of entries dropped
+        """
+        if version is None:
+            dropped = len(self._entries)
+            self._entries.clear()
+        else:
+            stale = [entry_key for entry_key in self._entries if entry_key[0] == version]
+            for entry_key in stale:
+                del self._entries[entry_key]
+            dropped = len(stale)
+
+        if dropped:
+            self.invalidations += 1
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the cache statistics.
+
+        Returns:
+            Dictionary with the size, limits and hit/miss counters
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DOMExtractionCache:
+    """
+    Cache of extracted DOM trees, reused while the page is unchanged.
+
+    Each entry is stored with the document state at extraction time (see
+    BrowserExecutor.get_document_state): the URL, the change counter of the
+    document, counting mutations, scrolling and resizing, and the navigation
+    count. An entry is only returned when the current state is identical and the entry is not older
+    than the time-to-live.
+    """
+
+    def __init__(self, maxsize: int = 8, ttl: float = 30.0):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of extractions kept (one per set of options)
+            ttl: Maximum age of a reused extraction in seconds (0 for no limit)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, state: Dict[str, Any]) -> Optional[Any]:
+        """
+        Get a cached extraction if the document has not changed since.
+
+        Args:
+            key: The cache key of the extraction options
+            state: The current document state
+
+        Returns:
+            The cached extraction, or None on a miss
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            cached_state, extracted_at, value = entry
+            if cached_state != state:
+                self.stale += 1
+                del self._entries[key]
+            elif self.ttl and time.monotonic() - extracted_at > self.ttl:
+                self.expired += 1
+                del self._entries[key]
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return value
+
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, state: Dict[str, Any], value: Any) -> None:
+        """
+        Store an extraction.
+
+        Args:
+            key: The cache key of the extraction options
+            state: The document state before the extraction
+            value: The extraction result
+        """
+        self._entries[key] = (dict(state), time.monotonic(), value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self) -> int:
+        """
+        Drop all cached extractions.
+
+        Returns:
+            The number of entries dropped
+        """
+        dropped = len(self._entries)
+        self._entries.clear()
+        if dropped:
+            self.invalidations += 1
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the cache statistics.
+
+        Returns:
+            Dictionary with the size, limits and hit/miss counters, and the URLs of the cached extractions
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stale": self.stale,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "urls": [state.get("url") for state, _, _ in self._entries.values()]
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,128 @@
+"""
+Page type classification.
+Scores page types by how often their feature phrases occur in the page text and
+structure, using one compiled pattern for all features instead of a scan per feature.
+"""
+from typing import Dict, List, Mapping
+from collections import Counter
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Feature phrases of each page type
+PAGE_TYPE_FEATURES = {
+    "login": ["login", "sign in", "signin", "username", "password", "email", "forgot password"],
+    "product": ["product", "price", "buy", "add to cart", "purchase", "shipping"],
+    "article": ["article", "blog", "news", "author", "published", "date", "comments"],
+    "search": ["search", "results", "query", "filter", "sort", "no results"],
+    "form": ["form", "submit", "input", "required", "select", "radio", "checkbox"],
+    "landing": ["hero", "cta", "sign up", "free trial", "learn more", "get started"],
+    "listing": ["list", "grid", "pagination", "next", "previous", "showing"]
+}
+
+# Occurrences in the page text weigh more than occurrences in the structure
+TEXT_WEIGHT = 2
+STRUCTURE_WEIGHT = 1
+
+
+class PageTypeClassifier:
+    """
+    Classifies pages by counting feature phrases.
+
+    All features are matched by a single regular expression alternation, longest
+    feature first. A match also counts every other feature it contains (e.g.
+    "forgot password" counts "password" too), so the counts equal counting each
+    feature separately, apart from occurrences that straddle a longer match.
+    """
+
+    def __init__(self, page_types: Mapping[str, List[str]] = PAGE_TYPE_FEATURES):
+        """
+        Initialize the classifier.
+
+        Args:
+            page_types: Mapping of page type to its feature phrases
+        """
+        self.page_types = {page_type: [f.lower() for f in features] for page_type, features in page_types.items()}
+
+        phrases = sorted({f for features in self.page_types.values() for f in features}, key=len, reverse=True)
+        self.pattern = re.compile("|".join(re.escape(phrase) for phrase in phrases))
+
+        # Page type counts credited for each matched phrase
+        self._credits: Dict[str, Counter] = {}
+        for phrase in phrases:
+            credits = Counter()
+            for page_type, features in self.page_types.items():
+                for feature in features:
+                    occurrences = phrase.count(feature)
+                    if occurrences:
+                        credits[page_type] += occurrences
+            self._credits[phrase] = credits
+
+    def count(self, text: str) -> Counter:
+        """
+        Count the feature occurrences of each page type in a text.
+
+        Args:
+            text: The lowercase text to scan
+
+        Returns:
+            Counter of feature occurrences by page type
+        """
+        counts = Counter()
+        for phrase in self.pattern.findall(text):
+            counts.update(self._credits[phrase])
+        return counts
+
+    def count_terms(self, terms: Mapping[str, int]) -> Counter:
+        """
+        Count the feature occurrences of each page type in a collection of strings.
+
+        Each distinct string is scanned once and its counts are multiplied by the
+        number of times it occurs.
+
+        Args:
+            terms: Mapping of string to its number of occurrences
+
+        Returns:
+            Counter of feature occurrences by page type
+        """
+        counts = Counter()
+        for term, occurrences in terms.items():
+            for page_type, count in self.count(term.lower()).items():
+                counts[page_type] += count * occurrences
+        return counts
+
+    def classify(self, text: str, terms: Mapping[str, int]) -> Dict[str, float]:
+        """
+        Classify a page from its text and structure.
+
+        Args:
+            text: The text of the page
+            terms: The strings of the page structure with their number of occurrences
+
+        Returns:
+            Dictionary with page type classifications and confidence scores
+        """
+        text_counts = self.count(text.lower())
+        structure_counts = self.count_terms(terms)
+
+        scores = {
+            page_type: text_counts[page_type] * TEXT_WEIGHT + structure_counts[page_type] * STRUCTURE_WEIGHT
+            for page_type in self.page_types
+        }
+
+        # Normalize scores to add up to 1.0
+        total_score = sum(scores.values())
+        if total_score == 0:
+            return {"unknown": 1.0}
+
+        return {
+            page_type: score / total_score
+            for page_type, score in scores.items()
+            if score > 0  # Only include non-zero scores
+        }
+
+
+# Create a singleton instance
+page_type_classifier = PageTypeClassifier()
@@ -0,0 +1,288 @@
+"""
+Compact representation of extracted DOM nodes.
+Nodes extracted by the browser scripts are nested dictionaries with about ten
+keys each. DOMNode stores the same data in two slots: a shape (the key layout,
+shared by every node with the same keys) and a tuple of values. Nested
+dictionaries such as attributes, positions and accessibility information are
+packed the same way and only materialized into dictionaries when accessed.
+Node shapes are shared between trees; the shapes of nested dictionaries belong
+to the tree they were packed for.
+"""
+from typing import Dict, Any, List, Iterator, Optional, Tuple
+from collections import OrderedDict
+from collections.abc import Mapping
+import sys
+import logging
+
+from app.dom.traversal import iter_postorder
+
+logger = logging.getLogger(__name__)
+
+class _Shape:
+    """The key layout of a packed mapping, shared by all mappings with the same keys."""
+
+    __slots__ = ("keys", "positions")
+
+    def __init__(self, keys: Tuple[str, ...]):
+        self.keys = keys
+        self.positions = {key: position for position, key in enumerate(keys)}
+
+
+# Node-level shapes, shared between trees: node dictionaries have one of a few
+# fixed key layouts, the least recently used ones are dropped above the limit
+MAX_NODE_SHAPES = 64
+_node_shapes: "OrderedDict[Tuple[str, ...], _Shape]" = OrderedDict()
+
+# Memo entry holding the shapes of the nested dictionaries of one tree, whose
+# keys (attribute names, for instance) are page-specific
+_TREE_SHAPES = object()
+
+
+def _get_node_shape(keys: Tuple[str, ...]) -> _Shape:
+    shape = _node_shapes.get(keys)
+    if shape is None:
+        shape = _node_shapes[keys] = _Shape(tuple(sys.intern(key) for key in keys))
+        if len(_node_shapes) > MAX_NODE_SHAPES:
+            _node_shapes.popitem(last=False)
+    else:
+        _node_shapes.move_to_end(keys)
+    return shape
+
+
+def _get_shape(keys: Tuple[str, ...], memo: Dict[Any, Any]) -> _Shape:
+    shapes = memo.get(_TREE_SHAPES)
+    if shapes is None:
+        shapes = memo[_TREE_SHAPES] = {}
+    shape = shapes.get(keys)
+    if shape is None:
+        shape = shapes[keys] = _Shape(tuple(memo.setdefault(key, key) for key in keys))
+    return shape
+
+
+class _PackedDict:
+    """A nested dictionary packed as a shape and a tuple of values."""
+
+    __slots__ = ("shape", "values")
+
+    def __init__(self, shape: _Shape, values: Tuple[Any, ...]):
+        self.shape = shape
+        self.values = values
+
+    def get(self, key: str, default: Any = None) -> Any:
+        position = self.shape.positions.get(key)
+        if position is None:
+            return default
+        return _unpack(self.values[position])
+
+
+def _pack(value: Any, memo: Dict[Any, Any]) -> Any:
+    """
+    Pack a nested value: dictionaries become packed dictionaries and lists become tuples.
+
+    Equal strings and packed values are shared through ``memo``, since values like
+    class names, roles and interactive types repeat across the nodes of a page.
+    """
+    value_class = value.__class__
+    if value_class is str:
+        return memo.setdefault(value, value)
+    if value_class is dict:
+        shape = _get_shape(tuple(value), memo)
+        values = tuple([_pack(item, memo) for item in value.values()])
+        try:
+            packed = memo.get((shape, values))
+            if packed is None:
+                packed = memo[(shape, values)] = _PackedDict(shape, values)
+            return packed
+        except TypeError:
+            # Values that are not hashable are not shared
+            return _PackedDict(shape, values)
+    if value_class is list:
+        values = tuple([_pack(item, memo) for item in value])
+        try:
+            return memo.setdefault(values, values)
+        except TypeError:
+            return values
+    return value
+
+
+def _unpack(value: Any) -> Any:
+    """Materialize a packed value into dictionaries and lists."""
+    if isinstance(value, _PackedDict):
+        return {key: _unpack(item) for key, item in zip(value.shape.keys, value.values)}
+    if isinstance(value, tuple):
+        return [_unpack(item) for item in value]
+    return value
+
+
+class DOMNode(Mapping):
+    """
+    A read-only, compact DOM node that behaves like the node dictionary.
+
+    Lookups such as ``node["tagName"]``, ``node.get("attributes", {})`` and
+    ``"children" in node`` work as with the dictionary. Children are kept as a
+    list of DOMNode (and text nodes); other nested dictionaries and lists are
+    materialized on access, so modifying them does not modify the node.
+    Use ``to_dict`` to get the plain dictionary back.
+    """
+
+    __slots__ = ("_shape", "_values")
+
+    def __init__(self, shape: _Shape, values: Tuple[Any, ...]):
+        self._shape = shape
+        self._values = values
+
+    @classmethod
+    def from_dict(cls, node: Dict[str, Any], children: Optional[List["DOMNode"]] = None,
+                  memo: Optional[Dict[Any, Any]] = None) -> "DOMNode":
+        """
+        Create a compact node from a node dictionary.
+
+        Args:
+            node: The node dictionary
+            children: The already converted children of the node, used instead of its children
+            memo: Values shared between the nodes being converted
+
+        Returns:
+            The compact node
+        """
+        if memo is None:
+            memo = {}
+        values = tuple([
+            (children if children is not None else []) if key == "children" else _pack(value, memo)
+            for key, value in node.items()
+        ])
+        return cls(_get_node_shape(tuple(node)), values)
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._values[self._shape.positions[key]]
+        if value.__class__ is list:
+            return value
+        return _unpack(value)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        position = self._shape.positions.get(key)
+        if position is None:
+            return default
+        value = self._values[position]
+        if value.__class__ is list:
+            return value
+        return _unpack(value)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._shape.positions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._shape.keys)
+
+    def __len__(self) -> int:
+        return len(self._shape.keys)
+
+    @property
+    def tag_name(self) -> Optional[str]:
+        """The tag name of the node, or None for text nodes."""
+        return self.get("tagName")
+
+    def get_attribute(self, name: str, default: Any = None) -> Any:
+        """
+        Get a single attribute without materializing the attribute dictionary.
+
+        Args:
+            name: The attribute name
+            default: Value returned when the attribute is not set
+
+        Returns:
+            The attribute value
+        """
+        position = self._shape.positions.get("attributes")
+        attributes = self._values[position] if position is not None else None
+        if isinstance(attributes, _PackedDict):
+            return attributes.get(name, default)
+        return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the node and its descendants back to plain dictionaries.
+
+        Returns:
+            The node dictionary
+        """
+        converted: Dict[int, Dict[str, Any]] = {}
+        for node, _ in iter_postorder(self):
+            if not isinstance(node, DOMNode):
+                converted[id(node)] = node
+                continue
+            result = {}
+            for key, value in zip(node._shape.keys, node._values):
+                if key == "children" and value.__class__ is list:
+                    result[key] = [converted.pop(id(child), child) for child in value]
+                else:
+                    result[key] = _unpack(value)
+            converted[id(node)] = result
+        return converted[id(self)]
+
+    def __repr__(self) -> str:
+        return f"DOMNode(tagName={self.get('tagName')!r}, id={self.get('id')!r})"
+
+
+def compact_tree(root: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Convert an extracted tree into compact nodes.
+
+    Every node becomes a DOMNode; values shared between nodes are stored once.
+    Trees that are already compact are returned unchanged.
+
+    Args:
+        root: The root node of the tree
+
+    Returns:
+        The root of the compact tree
+    """
+    if not root or isinstance(root, DOMNode):
+        return root
+
+    converted: Dict[int, Any] = {}
+    memo: Dict[Any, Any] = {}
+    for node, _ in iter_postorder(root):
+        children = None
+        if "children" in node:
+            children = [converted.pop(id(child)) for child in node["children"] if child]
+        converted[id(node)] = DOMNode.from_dict(node, children, memo)
+    return converted[id(root)]
+
+
+def tree_size(root: Any) -> int:
+    """
+    Estimate the memory used by a tree, following nested containers.
+
+    Interned strings and shared shapes are counted once.
+
+    Args:
+        root: The root node of the tree
+
+    Returns:
+        The approximate size in bytes
+    """
+    seen = set()
+    total = 0
+    stack = [root]
+    while stack:
+        value = stack.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        total += sys.getsizeof(value)
+        if isinstance(value, DOMNode):
+            stack.append(value._shape)
+            stack.append(value._values)
+        elif isinstance(value, _PackedDict):
+            stack.append(value.shape)
+            stack.append(value.values)
+        elif isinstance(value, _Shape):
+            stack.append(value.keys)
+            stack.append(value.positions)
+        elif isinstance(value, dict):
+            stack.extend(value.keys())
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return total
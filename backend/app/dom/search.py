@@ -0,0 +1,380 @@
+"""
+Fuzzy search over the interactive elements of an extracted DOM tree.
+Builds an inverted index over the text, labels and descriptive attributes of
+each element once per tree. Query tokens are expanded to the indexed tokens they
+equal, prefix or resemble (by trigram similarity), so a query only scores the
+elements containing one of those tokens or containing the query literally.
+"""
+from typing import Dict, Any, List, Optional, Iterable, Set, Tuple
+from bisect import bisect_left
+from collections import Counter
+import math
+import re
+import logging
+
+from app.dom.tree import DOMTreeIndex
+
+logger = logging.getLogger(__name__)
+
+# Searchable fields with their weight. The weights follow the confidence the
+# element lookups have historically assigned to a match in each field.
+SEARCH_FIELDS = {
+    "text": 1.0,
+    "label": 0.95,
+    "placeholder": 0.9,
+    "aria-label": 0.9,
+    "name": 0.85,
+    "title": 0.8,
+    "alt": 0.8,
+    "attributes": 0.7,
+    "controls": 0.7,
+}
+
+# Quality of a match in a field, by kind of match
+MATCH_QUALITY = {
+    "exact": 1.0,
+    "contains": 0.8,
+    "tokens": 0.6,
+    "fuzzy": 0.5,
+}
+
+# Categories of interactive elements that are indexed
+SEARCH_CATEGORIES = ("clickable", "inputs", "forms", "navigational")
+
+# Minimum trigram similarity of a fuzzy token match
+FUZZY_THRESHOLD = 0.5
+
+FORM_CONTROL_TAGS = ("input", "textarea", "select")
+
+_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+_SPACE_PATTERN = re.compile(r"\s+")
+
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+
+
+def normalize(text: str) -> str:
+    """Lowercase a text and collapse its whitespace."""
+    return _SPACE_PATTERN.sub(" ", text).strip().lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """Split a normalized text into word tokens."""
+    return _TOKEN_PATTERN.findall(text)
+
+
+def trigrams(text: str) -> Set[str]:
+    """Get the character trigrams of a normalized text, padded so short words have trigrams."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _Document:
+    """A searchable element with its normalized field values."""
+
+    __slots__ = ("number", "position", "element", "entries", "fields", "lengths")
+
+    def __init__(self, number: int, position: int, element: Dict[str, Any]):
+        self.number = number
+        self.position = position
+        self.element = element
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.fields: Dict[str, str] = {}
+        self.lengths: Dict[str, int] = {}
+
+
+class ElementSearchIndex:
+    """
+    Inverted index over the interactive elements of a DOM tree.
+
+    Elements are indexed by the tokens of their text content, labels
+    (``label[for]``, wrapping labels and ``aria-labelledby``), placeholder, name,
+    aria-label, title and alt text. Form elements are also indexed by the names and
+    placeholders of their controls. The index assumes the tree is not modified.
+    """
+
+    def __init__(self, dom_tree: Dict[str, Any], index: DOMTreeIndex):
+        """
+        Build the search index of a tree.
+
+        Args:
+            dom_tree: The DOM tree structure
+            index: The element index of the tree
+        """
+        self.index = index
+        self.documents: List[_Document] = []
+        self._documents_by_element: Dict[int, _Document] = {}
+        self._postings: Dict[str, Dict[int, Dict[str, int]]] = {}
+        self._token_trigrams: Dict[str, Set[str]] = {}
+        self._vocabulary: List[str] = []
+        self._field_lengths: Dict[str, float] = {}
+        self._build(dom_tree)
+
+    def _build(self, dom_tree: Dict[str, Any]) -> None:
+        interactive_elements = dom_tree.get("interactiveElements") or {}
+        labels = self._collect_labels()
+
+        for category in SEARCH_CATEGORIES:
+            for entry in interactive_elements.get(category) or []:
+                element = self.index.get_by_id(entry.get("id")) if entry.get("id") else None
+                if element is not None:
+                    self._add(element, category, entry)
+
+        # Forms are searchable even when the extraction did not report them
+        for form in self.index.get_by_tag("form"):
+            self._add(form, "forms", self._entry_for(form))
+
+        # Labelled controls are searchable even when they were not reported as inputs
+        for element, _ in labels.values():
+            if element.get("tagName") in FORM_CONTROL_TAGS:
+                self._add(element, "inputs", self._entry_for(element))
+
+        for document in self.documents:
+            self._index_document(document, labels)
+
+        self._vocabulary = sorted(self._postings)
+        for token in self._vocabulary:
+            for trigram in trigrams(token):
+                self._token_trigrams.setdefault(trigram, set()).add(token)
+
+        for field in SEARCH_FIELDS:
+            lengths = [document.lengths[field] for document in self.documents if field in document.lengths]
+            self._field_lengths[field] = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    def _entry_for(self, element: Dict[str, Any]) -> Dict[str, Any]:
+        """Create an interactive element entry for an element that has none."""
+        return {
+            "id": element.get("id"),
+            "tagName": element.get("tagName"),
+            "selector": element.get("css_selector"),
+            "xpath": element.get("xpath")
+        }
+
+    def _add(self, element: Dict[str, Any], category: str, entry: Dict[str, Any]) -> None:
+        document = self._documents_by_element.get(id(element))
+        if document is None:
+            document = _Document(len(self.documents), self.index.get_position(element), element)
+            self._documents_by_element[id(element)] = document
+            self.documents.append(document)
+        document.entries.setdefault(category, entry)
+
+    def _collect_labels(self) -> Dict[int, Tuple[Dict[str, Any], List[str]]]:
+        """Resolve the label texts of labelled elements, keyed by element identity."""
+        labels: Dict[int, Tuple[Dict[str, Any], List[str]]] = {}
+
+        def add_label(element: Optional[Dict[str, Any]], text: str) -> None:
+            if element is not None and text:
+                labels.setdefault(id(element), (element, []))[1].append(text)
+
+        for label in self.index.get_by_tag("label"):
+            text = self._element_text(label)
+            target_id = (label.get("attributes") or {}).get("for")
+            if target_id:
+                add_label(self.index.get_by_id(target_id), text)
+            else:
+                # A label without a for attribute labels the control it contains
+                control = next((
+                    element for element in self.index.get_descendants(label)
+                    if element.get("tagName") in FORM_CONTROL_TAGS
+                ), None)
+                add_label(control, text)
+
+        for element in self.index.get_by_attribute("aria-labelledby"):
+            for label_id in element["attributes"]["aria-labelledby"].split():
+                label = self.index.get_by_id(label_id)
+                if label is not None:
+                    add_label(element, self._element_text(label))
+
+        return labels
+
+    def _element_text(self, element: Dict[str, Any]) -> str:
+        """Get the text of an element, including the text of its descendants."""
+        parts = [element.get("textContent", "")]
+        for child in element.get("children") or []:
+            if child and child.get("type") == "text":
+                parts.append(child.get("content", ""))
+        parts.extend(descendant.get("textContent", "") for descendant in self.index.get_descendants(element))
+        return " ".join(part for part in parts if part)
+
+    def _index_document(self, document: _Document, labels: Dict[int, Tuple[Dict[str, Any], List[str]]]) -> None:
+        element = document.element
+        attributes = element.get("attributes") or {}
+        accessibility = element.get("accessibility") or {}
+
+        values = {
+            "text": element.get("textContent", ""),
+            "label": " ".join(labels.get(id(element), (None, []))[1]),
+            "placeholder": attributes.get("placeholder", ""),
+            "aria-label": attributes.get("aria-label") or accessibility.get("aria-label", ""),
+            "name": attributes.get("name", ""),
+            "title": attributes.get("title", ""),
+            "alt": attributes.get("alt", ""),
+            "attributes": " ".join(
+                value for name, value in attributes.items()
+                if isinstance(value, str) and name not in SEARCH_FIELDS and name not in ("class", "style")
+            ),
+        }
+        if "forms" in document.entries:
+            values["controls"] = " ".join(
+                " ".join(filter(None, [
+                    (control.get("attributes") or {}).get("name", ""),
+                    (control.get("attributes") or {}).get("placeholder", "")
+                ]))
+                for control in self.index.get_descendants(element)
+                if control.get("tagName") in FORM_CONTROL_TAGS
+            )
+
+        for field, value in values.items():
+            value = normalize(value) if isinstance(value, str) else ""
+            if not value:
+                continue
+            tokens = tokenize(value)
+            document.fields[field] = value
+            document.lengths[field] = len(tokens)
+            for token, count in Counter(tokens).items():
+                self._postings.setdefault(token, {}).setdefault(document.number, {})[field] = count
+
+    def _expand(self, token: str, fuzzy: bool) -> Dict[str, Tuple[str, float]]:
+        """
+        Find the indexed tokens matching a query token.
+
+        Args:
+            token: The query token
+            fuzzy: Whether to include similar tokens
+
+        Returns:
+            Mapping of indexed token to the kind of match ("token" for equal tokens
+            and tokens the query token is a prefix of, "fuzzy" for similar tokens)
+            and its similarity
+        """
+        expansions: Dict[str, Tuple[str, float]] = {}
+        start = bisect_left(self._vocabulary, token)
+        for vocabulary_token in self._vocabulary[start:]:
+            if not vocabulary_token.startswith(token):
+                break
+            expansions[vocabulary_token] = ("token", 1.0)
+
+        if fuzzy and len(token) >= 3:
+            token_trigrams = trigrams(token)
+            shared = Counter()
+            for trigram in token_trigrams:
+                shared.update(self._token_trigrams.get(trigram, ()))
+            for vocabulary_token, count in shared.items():
+                if vocabulary_token in expansions:
+                    continue
+                similarity = 2 * count / (len(token_trigrams) + len(vocabulary_token) + 1)
+                if similarity >= FUZZY_THRESHOLD:
+                    expansions[vocabulary_token] = ("fuzzy", similarity)
+        return expansions
+
+    def _bm25(self, field: str, frequency: int, length: int, document_frequency: int) -> float:
+        """BM25 weight of a token occurring in a field."""
+        average_length = self._field_lengths[field] or 1.0
+        idf = math.log(1 + (len(self.documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+        return idf * frequency * (_K1 + 1) / (frequency + _K1 * (1 - _B + _B * length / average_length))
+
+    def search(self, query: str, categories: Optional[Iterable[str]] = None, limit: int = 5,
+               fields: Optional[Iterable[str]] = None, fuzzy: bool = True) -> List[Dict[str, Any]]:
+        """
+        Find the elements matching a query, best match first.
+
+        A field matches when it equals the query, contains it, or contains every
+        query token (as a word, a word prefix or, with ``fuzzy``, a similar word).
+        The score is the quality of the best matching field times its weight, with
+        the BM25 relevance of the element breaking ties.
+
+        Args:
+            query: The text to search for
+            categories: Interactive element categories to search (all by default)
+            limit: Maximum number of matches to return
+            fields: Fields to match the query in (all by default)
+            fuzzy: Whether to include fuzzy (trigram similarity) matches
+
+        Returns:
+            List of matches, each with the element, its interactive element entry and
+            category, the best matching field, the kind of match and the score
+        """
+        query = normalize(query)
+        if not query or limit <= 0:
+            return []
+
+        categories = tuple(categories) if categories else SEARCH_CATEGORIES
+        fields = tuple(fields) if fields else tuple(SEARCH_FIELDS)
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+
+        # Best match of each query token, by document and field
+        hits: Dict[int, Dict[str, Dict[int, Tuple[str, float]]]] = {}
+        relevance = Counter()
+        for position, token in enumerate(query_tokens):
+            for vocabulary_token, (kind, similarity) in self._expand(token, fuzzy).items():
+                postings = self._postings[vocabulary_token]
+                for number, field_counts in postings.items():
+                    for field, count in field_counts.items():
+                        if field not in fields:
+                            continue
+                        field_hits = hits.setdefault(number, {}).setdefault(field, {})
+                        previous = field_hits.get(position)
+                        if previous is None or similarity > previous[1]:
+                            field_hits[position] = (kind, similarity)
+                        relevance[number] += SEARCH_FIELDS[field] * similarity * self._bm25(
+                            field, count, self.documents[number].lengths[field], len(postings)
+                        )
+
+        # Fields containing the query literally match even where no token does,
+        # e.g. a query inside a word; queries without words can only match this way
+        numbers: Set[int] = set(hits)
+        numbers.update(
+            document.number for document in self.documents
+            if document.number not in numbers
+            and any(query in document.fields.get(field, "") for field in fields)
+        )
+
+        matches = []
+        for number in numbers:
+            document = self.documents[number]
+            category = next((category for category in categories if category in document.entries), None)
+            if category is None:
+                continue
+
+            best_field, best_match, best_quality = None, None, 0.0
+            document_hits = hits.get(number, {})
+            for field in fields:
+                value = document.fields.get(field)
+                if not value:
+                    continue
+
+                if value == query:
+                    match, quality = "exact", MATCH_QUALITY["exact"]
+                elif query in value:
+                    match, quality = "contains", MATCH_QUALITY["contains"]
+                else:
+                    field_hits = document_hits.get(field)
+                    if not field_hits or len(field_hits) < len(query_tokens):
+                        continue
+                    if all(kind == "token" for kind, _ in field_hits.values()):
+                        match, quality = "tokens", MATCH_QUALITY["tokens"]
+                    else:
+                        similarity = sum(similarity for _, similarity in field_hits.values()) / len(field_hits)
+                        match, quality = "fuzzy", MATCH_QUALITY["fuzzy"] * similarity
+
+                quality *= SEARCH_FIELDS[field]
+                if quality > best_quality:
+                    best_field, best_match, best_quality = field, match, quality
+
+            if best_field is None:
+                continue
+
+            score = relevance[number]
+            matches.append((document.position, {
+                "element": document.element,
+                "entry": document.entries[category],
+                "category": category,
+                "field": best_field,
+                "match": best_match,
+                "score": round(best_quality + 0.05 * score / (1 + score), 6)
+            }))
+
+        # Best score first, document order between equal scores
+        matches.sort(key=lambda match: (-match[1]["score"], match[0]))
+        return [match for _, match in matches[:limit]]
@@ -0,0 +1,500 @@
+"""
+CSS selector engine for extracted DOM trees.
+Parses selectors once into compiled matchers and evaluates them against a
+DOMTreeIndex, so selector queries run on the in-memory tree without a browser.
+"""
+from typing import Dict, Any, List, Optional, Tuple, Callable
+from functools import lru_cache
+import logging
+import re
+
+from app.dom.tree import DOMTreeIndex
+
+logger = logging.getLogger(__name__)
+
+_IDENT = re.compile(r'(?:[-\w\u00a0-\uffff]|\\.)+')
+_ATTRIBUTE = re.compile(
+    r'\[\s*((?:[-\w\u00a0-\uffff:]|\\.)+)\s*'
+    r'(?:([~|^$*]?=)\s*(?:"((?:[^"\\]|\\.)*)"|\'((?:[^\'\\]|\\.)*)\'|((?:[-\w\u00a0-\uffff]|\\.)+))\s*([iIsS])?\s*)?\]'
+)
+_COMBINATOR = re.compile(r'\s*([>+~])\s*|\s+')
+_NTH = re.compile(r'^([+-]?\d*)?n(?:\s*([+-])\s*(\d+))?$')
+_ESCAPE = re.compile(r'\\(.)')
+
+
+class SelectorSyntaxError(ValueError):
+    """Exception raised when a selector cannot be parsed."""
+    pass
+
+
+def _unescape(value: str) -> str:
+    return _ESCAPE.sub(r'\1', value)
+
+
+def _parse_nth(expression: str) -> Tuple[int, int]:
+    """
+    Parse an an+b expression.
+
+    Args:
+        expression: The expression, e.g. ``odd``, ``3`` or ``2n+1``
+
+    Returns:
+        The (a, b) coefficients
+    """
+    expression = expression.strip().lower().replace(" ", "")
+    if expression == "odd":
+        return 2, 1
+    if expression == "even":
+        return 2, 0
+    if re.fullmatch(r'[+-]?\d+', expression):
+        return 0, int(expression)
+
+    match = _NTH.match(expression)
+    if not match:
+        raise SelectorSyntaxError(f"Invalid nth expression: {expression}")
+    a_part, sign, b_part = match.groups()
+    if a_part in (None, "", "+"):
+        a = 1
+    elif a_part == "-":
+        a = -1
+    else:
+        a = int(a_part)
+    b = int(b_part) * (-1 if sign == "-" else 1) if b_part else 0
+    return a, b
+
+
+def _nth_matches(a: int, b: int, position: int) -> bool:
+    """Check whether a one-based position satisfies an+b for some n >= 0."""
+    if a == 0:
+        return position == b
+    return (position - b) % a == 0 and (position - b) // a >= 0
+
+
+def _attribute_matcher(name: str, operator: Optional[str], value: Optional[str],
+                       ignore_case: bool) -> Callable[[Dict[str, Any]], bool]:
+    """Build a predicate for an attribute selector."""
+    def get(node: Dict[str, Any]) -> Optional[str]:
+        attributes = node.get("attributes") or {}
+        attr_value = attributes.get(name)
+        if attr_value is None and name == "id":
+            attr_value = node.get("id")
+        if attr_value is not None and not isinstance(attr_value, str):
+            attr_value = str(attr_value)
+        return attr_value
+
+    if operator is None:
+        return lambda node: get(node) is not None
+
+    expected = value.lower() if ignore_case else value
+
+    def test(actual: str) -> bool:
+        if operator == "=":
+            return actual == expected
+        if operator == "~=":
+            return expected in actual.split()
+        if operator == "|=":
+            return actual == expected or actual.startswith(expected + "-")
+        if operator == "^=":
+            return bool(expected) and actual.startswith(expected)
+        if operator == "$=":
+            return bool(expected) and actual.endswith(expected)
+        return bool(expected) and expected in actual
+
+    def matcher(node: Dict[str, Any]) -> bool:
+        actual = get(node)
+        if actual is None:
+            return False
+        return test(actual.lower() if ignore_case else actual)
+
+    return matcher
+
+
+class CompoundSelector:
+    """
+    A sequence of simple selectors that all apply to the same element, e.g. ``a.nav-link[href]``.
+    """
+
+    __slots__ = ("tag", "element_id", "classes", "attributes", "predicates", "source")
+
+    def __init__(self):
+        self.tag: Optional[str] = None
+        self.element_id: Optional[str] = None
+        self.classes: List[str] = []
+        self.attributes: List[str] = []
+        self.predicates: List[Callable[[Dict[str, Any], DOMTreeIndex], bool]] = []
+        self.source = ""
+
+    def matches(self, node: Dict[str, Any], index: DOMTreeIndex) -> bool:
+        """
+        Check whether an element matches all simple selectors.
+
+        Args:
+            node: The element
+            index: The index of the tree containing the element
+
+        Returns:
+            Whether the element matches
+        """
+        if self.tag is not None and node.get("tagName", "").lower() != self.tag:
+            return False
+        if self.element_id is not None and node.get("id") != self.element_id:
+            return False
+        if self.classes:
+            class_names = (node.get("attributes") or {}).get("class", "").split()
+            if any(class_name not in class_names for class_name in self.classes):
+                return False
+        return all(predicate(node, index) for predicate in self.predicates)
+
+    def candidates(self, index: DOMTreeIndex) -> List[Dict[str, Any]]:
+        """
+        Get the elements that may match, using the most selective index available.
+
+        Args:
+            index: The index of the tree
+
+        Returns:
+            Candidate elements in document order
+        """
+        if self.element_id is not None:
+            element = index.get_by_id(self.element_id)
+            return [element] if element is not None else []
+
+        options = [index.by_class.get(class_name, []) for class_name in self.classes]
+        if self.tag is not None:
+            options.append(index.by_tag.get(self.tag, []))
+        options.extend(index.by_attribute.get(name, []) for name in self.attributes if name != "id")
+        if options:
+            return min(options, key=len)
+        return index.elements
+
+
+class ComplexSelector:
+    """
+    Compound selectors joined by combinators, matched from right to left.
+    """
+
+    __slots__ = ("compounds", "combinators", "source")
+
+    def __init__(self, compounds: List[CompoundSelector], combinators: List[str], source: str):
+        self.compounds = compounds
+        self.combinators = combinators
+        self.source = source
+
+    def select(self, index: DOMTreeIndex) -> List[Dict[str, Any]]:
+        """Get the matching elements in document order."""
+        subject = self.compounds[-1]
+        return [
+            node for node in subject.candidates(index)
+            if subject.matches(node, index) and self._matches_left(node, len(self.compounds) - 2, index)
+        ]
+
+    def matches(self, node: Dict[str, Any], index: DOMTreeIndex) -> bool:
+        """Check whether an element matches the selector."""
+        return self.compounds[-1].matches(node, index) and self._matches_left(node, len(self.compounds) - 2, index)
+
+    def _matches_left(self, node: Dict[str, Any], position: int, index: DOMTreeIndex) -> bool:
+        """Check the compounds left of ``position + 1`` against the relatives of a matched element."""
+        if position < 0:
+            return True
+
+        compound = self.compounds[position]
+        combinator = self.combinators[position]
+
+        if combinator == ">":
+            parent = index.get_parent(node)
+            return parent is not None and compound.matches(parent, index) and \
+                self._matches_left(parent, position - 1, index)
+
+        if combinator == " ":
+            ancestor = index.get_parent(node)
+            while ancestor is not None:
+                if compound.matches(ancestor, index) and self._matches_left(ancestor, position - 1, index):
+                    return True
+                ancestor = index.get_parent(ancestor)
+            return False
+
+        siblings = index.get_siblings(node)
+        sibling_position = index.get_sibling_position(node)
+
+        if combinator == "+":
+            if sibling_position == 0:
+                return False
+            previous = siblings[sibling_position - 1]
+            return compound.matches(previous, index) and self._matches_left(previous, position - 1, index)
+
+        # General sibling combinator (~)
+        for previous in reversed(siblings[:sibling_position]):
+            if compound.matches(previous, index) and self._matches_left(previous, position - 1, index):
+                return True
+        return False
+
+
+class CompiledSelector:
+    """
+    A parsed selector list, ready to be evaluated against any indexed tree.
+    """
+
+    __slots__ = ("selectors", "source")
+
+    def __init__(self, selectors: List[ComplexSelector], source: str):
+        self.selectors = selectors
+        self.source = source
+
+    def select(self, index: DOMTreeIndex) -> List[Dict[str, Any]]:
+        """
+        Find all elements matching any selector of the list.
+
+        Args:
+            index: The index of the tree to search
+
+        Returns:
+            Matching elements in document order, without duplicates
+        """
+        if len(self.selectors) == 1:
+            return self.selectors[0].select(index)
+
+        found: Dict[int, Dict[str, Any]] = {}
+        for selector in self.selectors:
+            for node in selector.select(index):
+                found.setdefault(id(node), node)
+        return sorted(found.values(), key=index.get_position)
+
+    def select_one(self, index: DOMTreeIndex) -> Optional[Dict[str, Any]]:
+        """Find the first matching element in document order."""
+        results = self.select(index)
+        return results[0] if results else None
+
+    def matches(self, node: Dict[str, Any], index: DOMTreeIndex) -> bool:
+        """Check whether an element matches any selector of the list."""
+        return any(selector.matches(node, index) for selector in self.selectors)
+
+
+class _SelectorParser:
+    """Recursive descent parser for the supported subset of CSS selectors."""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.position = 0
+
+    def error(self, message: str) -> SelectorSyntaxError:
+        return SelectorSyntaxError(f"{message} at position {self.position} in selector {self.source!r}")
+
+    def parse_list(self, terminator: Optional[str] = None) -> List[ComplexSelector]:
+        selectors = []
+        while True:
+            self.skip_whitespace()
+            start = self.position
+            compounds, combinators = self.parse_complex(terminator)
+            selectors.append(ComplexSelector(compounds, combinators, self.source[start:self.position].strip()))
+            self.skip_whitespace()
+            if self.peek() == ",":
+                self.position += 1
+                continue
+            if self.position >= len(self.source) or (terminator and self.peek() == terminator):
+                return selectors
+            raise self.error(f"Unexpected character {self.peek()!r}")
+
+    def parse_complex(self, terminator: Optional[str]) -> Tuple[List[CompoundSelector], List[str]]:
+        compounds = [self.parse_compound()]
+        combinators = []
+        while self.position < len(self.source):
+            match = _COMBINATOR.match(self.source, self.position)
+            if not match:
+                break
+            following = self.source[match.end():match.end() + 1]
+            if following in ("", ",") or (terminator and following == terminator):
+                break
+            self.position = match.end()
+            combinators.append(match.group(1) or " ")
+            compounds.append(self.parse_compound())
+        return compounds, combinators
+
+    def parse_compound(self) -> CompoundSelector:
+        compound = CompoundSelector()
+        start = self.position
+
+        if self.peek() == "*":
+            self.position += 1
+        else:
+            match = _IDENT.match(self.source, self.position)
+            if match:
+                compound.tag = _unescape(match.group()).lower()
+                self.position = match.end()
+
+        while self.position < len(self.source):
+            char = self.peek()
+            if char == "#":
+                compound.element_id = self.parse_ident(1)
+            elif char == ".":
+                compound.classes.append(self.parse_ident(1))
+            elif char == "[":
+                self.parse_attribute(compound)
+            elif char == ":":
+                self.parse_pseudo(compound)
+            else:
+                break
+
+        if self.position == start:
+            raise self.error("Expected a selector")
+        compound.source = self.source[start:self.position]
+        return compound
+
+    def parse_ident(self, offset: int) -> str:
+        match = _IDENT.match(self.source, self.position + offset)
+        if not match:
+            raise self.error("Expected an identifier")
+        self.position = match.end()
+        return _unescape(match.group())
+
+    def parse_attribute(self, compound: CompoundSelector) -> None:
+        match = _ATTRIBUTE.match(self.source, self.position)
+        if not match:
+            raise self.error("Invalid attribute selector")
+        self.position = match.end()
+
+        name, operator, double_quoted, single_quoted, bare, flag = match.groups()
+        name = _unescape(name)
+        value = next((v for v in (double_quoted, single_quoted, bare) if v is not None), None)
+        if value is not None:
+            value = _unescape(value)
+        ignore_case = flag is not None and flag.lower() == "i"
+
+        compound.attributes.append(name)
+        matcher = _attribute_matcher(name, operator, value, ignore_case)
+        compound.predicates.append(lambda node, index: matcher(node))
+
+    def parse_pseudo(self, compound: CompoundSelector) -> None:
+        name = self.parse_ident(1).lower()
+        argument = None
+        if self.peek() == "(":
+            end = self.find_closing_paren()
+            argument = self.source[self.position + 1:end]
+            self.position = end + 1
+
+        if name in ("first-child", "last-child", "only-child", "first-of-type", "last-of-type", "only-of-type"):
+            if argument is not None:
+                raise self.error(f"Unexpected argument for :{name}")
+            compound.predicates.append(_structural_predicate(name))
+        elif name in ("nth-child", "nth-last-child", "nth-of-type", "nth-last-of-type"):
+            if argument is None:
+                raise self.error(f"Missing argument for :{name}")
+            a, b = _parse_nth(argument)
+            compound.predicates.append(_nth_predicate(name, a, b))
+        elif name == "not":
+            if argument is None:
+                raise self.error("Missing argument for :not")
+            negated = CompiledSelector(_SelectorParser(argument).parse_list(), argument)
+            compound.predicates.append(lambda node, index: not negated.matches(node, index))
+        elif name == "empty":
+            compound.predicates.append(lambda node, index: not node.get("children") and not node.get("textContent"))
+        elif name in ("checked", "disabled", "enabled", "required"):
+            attribute = "disabled" if name == "enabled" else name
+            present = name != "enabled"
+            compound.predicates.append(
+                lambda node, index: (attribute in (node.get("attributes") or {})) == present
+            )
+        else:
+            raise self.error(f"Unsupported pseudo-class :{name}")
+
+    def find_closing_paren(self) -> int:
+        depth = 0
+        for position in range(self.position, len(self.source)):
+            char = self.source[position]
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+                if depth == 0:
+                    return position
+        raise self.error("Unbalanced parenthesis")
+
+    def peek(self) -> str:
+        return self.source[self.position] if self.position < len(self.source) else ""
+
+    def skip_whitespace(self) -> None:
+        while self.position < len(self.source) and self.source[self.position].isspace():
+            self.position += 1
+
+
+def _structural_predicate(name: str) -> Callable[[Dict[str, Any], DOMTreeIndex], bool]:
+    """Build a predicate for a structural pseudo-class without argument."""
+    of_type = name.endswith("of-type")
+    first = name.startswith("first") or name.startswith("only")
+    last = name.startswith("last") or name.startswith("only")
+
+    def predicate(node: Dict[str, Any], index: DOMTreeIndex) -> bool:
+        siblings = _typed_siblings(node, index) if of_type else index.get_siblings(node)
+        if first and siblings[0] is not node:
+            return False
+        if last and siblings[-1] is not node:
+            return False
+        return True
+
+    return predicate
+
+
+def _nth_predicate(name: str, a: int, b: int) -> Callable[[Dict[str, Any], DOMTreeIndex], bool]:
+    """Build a predicate for an :nth-* pseudo-class."""
+    of_type = name.endswith("of-type")
+    from_end = "-last-" in name
+
+    def predicate(node: Dict[str, Any], index: DOMTreeIndex) -> bool:
+        if of_type:
+            siblings = _typed_siblings(node, index)
+            position = next(i for i, sibling in enumerate(siblings) if sibling is node)
+        else:
+            siblings = index.get_siblings(node)
+            position = index.get_sibling_position(node)
+        if from_end:
+            position = len(siblings) - 1 - position
+        return _nth_matches(a, b, position + 1)
+
+    return predicate
+
+
+def _typed_siblings(node: Dict[str, Any], index: DOMTreeIndex) -> List[Dict[str, Any]]:
+    tag_name = node.get("tagName", "").lower()
+    return [sibling for sibling in index.get_siblings(node) if sibling.get("tagName", "").lower() == tag_name]
+
+
+@lru_cache(maxsize=512)
+def compile_selector(selector: str) -> CompiledSelector:
+    """
+    Parse a CSS selector into a compiled selector. Results are cached by selector string.
+
+    Supported: type, universal, #id, .class and attribute selectors (=, ~=, |=, ^=, $=, *=,
+    with the i flag), descendant, child (>), adjacent (+) and general sibling (~) combinators,
+    selector lists, and the :first-child, :last-child, :only-child, :nth-child, :nth-last-child,
+    the *-of-type variants, :not, :empty, :checked, :disabled, :enabled and :required pseudo-classes.
+    Structural pseudo-classes count only the elements present in the extracted tree.
+
+    Args:
+        selector: The CSS selector
+
+    Returns:
+        The compiled selector
+
+    Raises:
+        SelectorSyntaxError: If the selector is invalid or uses unsupported syntax
+    """
+    source = selector.strip()
+    if not source:
+        raise SelectorSyntaxError("Empty selector")
+    return CompiledSelector(_SelectorParser(source).parse_list(), source)
+
+
+def select(index: DOMTreeIndex, selector: str) -> List[Dict[str, Any]]:
+    """
+    Find the elements of an indexed tree matching a CSS selector.
+
+    Args:
+        index: The index of the tree to search
+        selector: The CSS selector
+
+    Returns:
+        Matching elements in document order
+
+    Raises:
+        SelectorSyntaxError: If the selector is invalid or uses unsupported syntax
+    """
+    return compile_selector(selector).select(index)
@@ -0,0 +1,329 @@
+"""
+Token-budgeted serialization of extracted DOM trees for LLM prompts.
+The page is flattened into candidate lines in three tiers: interactive elements,
+labelled containers (landmarks, forms, headings) and free text. Candidates are
+packed greedily into the token budget, tier by tier, ranked by relevance to the
+task query and proximity to the viewport, and the packed lines are emitted in
+document order:
+
+    # Checkout - https://shop.example.com/checkout
+    <form aria-label="Payment">
+    [12]<input type="text" name="card" placeholder="Card number">
+    [13]<button type="submit">Pay now
+    Your card is charged when the order ships.
+
+Interactive elements are prefixed with their extraction index, so the model can
+refer to them and the caller can map the index back to the element.
+"""
+from typing import Dict, Any, List, Optional, Callable
+import math
+import logging
+
+from app.core.config import settings
+from app.dom.search import normalize, tokenize
+from app.dom.traversal import iter_events
+
+logger = logging.getLogger(__name__)
+
+# Candidate tiers, packed in this order
+TIER_INTERACTIVE = 0
+TIER_CONTAINER = 1
+TIER_TEXT = 2
+TIER_NAMES = ("interactive", "containers", "text")
+
+# Containers that are serialized when they carry a label
+CONTAINER_TAGS = {
+    "form", "nav", "header", "footer", "main", "section", "article", "aside",
+    "dialog", "fieldset", "table", "ul", "ol", "menu"
+}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6", "legend", "label", "caption"}
+CONTAINER_ROLES = {
+    "navigation", "main", "banner", "contentinfo", "complementary", "region",
+    "search", "form", "dialog", "alertdialog", "menu", "menubar", "tablist", "list"
+}
+
+# Attributes shown on element lines, in this order
+LINE_ATTRIBUTES = (
+    "type", "name", "role", "placeholder", "aria-label", "title", "alt", "href", "value", "checked", "disabled"
+)
+CONTAINER_LABEL_ATTRIBUTES = ("aria-label", "title", "name", "id")
+
+MAX_TEXT_CHARS = 80
+MAX_ATTRIBUTE_CHARS = 40
+
+# Average number of characters per token of the serialized format
+CHARS_PER_TOKEN = 4
+
+# Weight of query relevance relative to viewport proximity
+RELEVANCE_WEIGHT = 2.0
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of a text.
+
+    Args:
+        text: The text
+
+    Returns:
+        The estimated token count
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _truncate(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+class _Candidate:
+    """A line that may be included in the serialized DOM."""
+
+    __slots__ = ("order", "tier", "node", "depth", "text_parts", "proximity", "line", "score", "index")
+
+    def __init__(self, order: int, tier: int, node: Dict[str, Any], depth: int, proximity: float):
+        self.order = order
+        self.tier = tier
+        self.node = node
+        self.depth = depth
+        self.text_parts: List[str] = []
+        self.proximity = proximity
+        self.line = ""
+        self.score = 0.0
+        self.index: Optional[int] = None
+
+
+class DOMSerializer:
+    """
+    Serializes a DOM tree into indexed lines that fit a token budget.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int] = estimate_tokens):
+        """
+        Initialize the serializer.
+
+        Args:
+            count_tokens: Function counting the tokens of a text, e.g. the tokenizer of the model
+        """
+        self.count_tokens = count_tokens
+
+    def serialize(self, dom_tree: Dict[str, Any], token_budget: int,
+                  query: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Serialize a DOM tree within a token budget.
+
+        Args:
+            dom_tree: The DOM tree structure
+            token_budget: Maximum number of tokens of the serialized text
+            query: Optional task description; matching content is packed first
+
+        Returns:
+            Dictionary with the serialized text, the tokens used, the elements by
+            line index and the number of included and omitted lines per tier
+        """
+        header = f"# {dom_tree.get('title', '')} - {dom_tree.get('url', '')}"
+        viewport_height = self._viewport_height(dom_tree)
+        query_tokens = set(tokenize(normalize(query))) if query else set()
+
+        candidates = self._collect(dom_tree.get("tree"), viewport_height)
+        for candidate in candidates:
+            candidate.score = self._score(candidate, query_tokens)
+
+        tokens_used = self.count_tokens(header)
+        included = [False] * len(candidates)
+        omitted = [0, 0, 0]
+        ranked = sorted(candidates, key=lambda candidate: (candidate.tier, -candidate.score, candidate.order))
+        for candidate in ranked:
+            # One token for the line break
+            cost = self.count_tokens(candidate.line) + 1
+            if tokens_used + cost <= token_budget:
+                included[candidate.order] = True
+                tokens_used += cost
+            else:
+                omitted[candidate.tier] += 1
+
+        lines = [header]
+        elements = {}
+        counts = [0, 0, 0]
+        for candidate in candidates:
+            if not included[candidate.order]:
+                continue
+            lines.append(candidate.line)
+            counts[candidate.tier] += 1
+            if candidate.tier == TIER_INTERACTIVE:
+                node = candidate.node
+                elements[candidate.index] = {
+                    "id": node.get("id", ""),
+                    "tagName": node.get("tagName", ""),
+                    "xpath": node.get("xpath", ""),
+                    "selector": node.get("css_selector", "")
+                }
+
+        if any(omitted):
+            logger.debug(f"DOM serialization omitted {sum(omitted)} lines to fit {token_budget} tokens")
+
+        return {
+            "text": "\n".join(lines),
+            "tokens_used": tokens_used,
+            "token_budget": token_budget,
+            "elements": elements,
+            "included": dict(zip(TIER_NAMES, counts)),
+            "omitted": dict(zip(TIER_NAMES, omitted)),
+            "truncated": any(omitted)
+        }
+
+    def _viewport_height(self, dom_tree: Dict[str, Any]) -> Optional[int]:
+        """Get the viewport height recorded by the extraction, if any."""
+        viewport = (dom_tree.get("truncation") or {}).get("viewport") or {}
+        return viewport.get("height")
+
+    def _proximity(self, node: Dict[str, Any], viewport_height: Optional[int]) -> Optional[float]:
+        """Get how close an element is to the viewport: 1 inside it, decaying with the distance."""
+        position = node.get("position")
+        if not position or "viewportY" not in position:
+            return None
+        height = viewport_height or settings.DEFAULT_VIEWPORT_HEIGHT
+        top = position["viewportY"]
+        bottom = top + position.get("height", 0)
+        if bottom >= 0 and top <= height:
+            return 1.0
+        distance = -bottom if bottom < 0 else top - height
+        return 1.0 / (1.0 + distance / height)
+
+    def _classify(self, node: Dict[str, Any]) -> Optional[int]:
+        """Get the tier of an element, or None if it has no line of its own."""
+        if node.get("interactive"):
+            return TIER_INTERACTIVE
+        tag_name = (node.get("tagName") or "").lower()
+        if tag_name in HEADING_TAGS:
+            return TIER_CONTAINER
+        attributes = node.get("attributes") or {}
+        if tag_name in CONTAINER_TAGS or attributes.get("role") in CONTAINER_ROLES:
+            if any(attributes.get(name) for name in CONTAINER_LABEL_ATTRIBUTES):
+                return TIER_CONTAINER
+        return None
+
+    def _collect(self, root: Optional[Dict[str, Any]], viewport_height: Optional[int]) -> List[_Candidate]:
+        """Flatten a tree into candidate lines in document order."""
+        candidates: List[_Candidate] = []
+        # Open elements: (candidate or None, proximity)
+        open_elements: List[tuple] = []
+        # Candidates collecting the text of their descendants
+        absorbing: List[_Candidate] = []
+        # Indexes already shown for interactive elements
+        used_indexes: set = set()
+
+        for node, depth, leaving in iter_events(root):
+            if node.get("type") == "text":
+                if leaving:
+                    continue
+                content = node.get("content", "").strip()
+                if not content:
+                    continue
+                if absorbing:
+                    absorbing[-1].text_parts.append(content)
+                    continue
+                proximity = open_elements[-1][1] if open_elements else None
+                candidate = _Candidate(len(candidates), TIER_TEXT, node, depth, proximity)
+                candidate.line = _truncate(content, MAX_TEXT_CHARS)
+                candidates.append(candidate)
+                continue
+
+            if node.get("type") != "element":
+                continue
+
+            if leaving:
+                candidate, _ = open_elements.pop()
+                if candidate is not None:
+                    candidate.line = self._element_line(candidate)
+                    if absorbing and absorbing[-1] is candidate:
+                        absorbing.pop()
+                continue
+
+            proximity = self._proximity(node, viewport_height)
+            if proximity is None and open_elements:
+                proximity = open_elements[-1][1]
+
+            tier = self._classify(node)
+            candidate = None
+            if tier is not None:
+                candidate = _Candidate(len(candidates), tier, node, depth, proximity)
+                candidates.append(candidate)
+                if tier == TIER_INTERACTIVE:
+                    candidate.index = self._line_index(node, candidate, used_indexes)
+                tag_name = (node.get("tagName") or "").lower()
+                if tier == TIER_INTERACTIVE or tag_name in HEADING_TAGS:
+                    absorbing.append(candidate)
+                    if node.get("textContent"):
+                        candidate.text_parts.append(node["textContent"])
+            elif node.get("textContent") and not node.get("children"):
+                # Text of elements extracted without their text node
+                if absorbing:
+                    absorbing[-1].text_parts.append(node["textContent"])
+                else:
+                    text = _Candidate(len(candidates), TIER_TEXT, node, depth, proximity)
+                    text.line = _truncate(node["textContent"], MAX_TEXT_CHARS)
+                    candidates.append(text)
+            open_elements.append((candidate, proximity))
+
+        return candidates
+
+    def _line_index(self, node: Dict[str, Any], candidate: _Candidate, used_indexes: set) -> int:
+        """
+        Get the index shown for an interactive element: its extraction index, or its line number.
+        An index already shown for another element is never reused, so each index names one element.
+        """
+        index = node.get("index")
+        if not isinstance(index, int) or index in used_indexes:
+            index = candidate.order
+            if index in used_indexes:
+                index = max(used_indexes) + 1
+        used_indexes.add(index)
+        return index
+
+    def _element_line(self, candidate: _Candidate) -> str:
+        """Format the line of an interactive element or container."""
+        node = candidate.node
+        tag_name = (node.get("tagName") or "").lower()
+        attributes = node.get("attributes") or {}
+        parts = [tag_name]
+        for name in LINE_ATTRIBUTES:
+            value = attributes.get(name)
+            if value is None or (value == "" and name not in ("checked", "disabled")):
+                continue
+            if value == "":
+                parts.append(name)
+            else:
+                parts.append(f'{name}="{_truncate(str(value), MAX_ATTRIBUTE_CHARS)}"')
+        if candidate.tier == TIER_CONTAINER and not any(attributes.get(name) for name in LINE_ATTRIBUTES):
+            for name in CONTAINER_LABEL_ATTRIBUTES:
+                if attributes.get(name):
+                    parts.append(f'{name}="{_truncate(str(attributes[name]), MAX_ATTRIBUTE_CHARS)}"')
+                    break
+
+        # Text parts repeat when the element has both textContent and a text node
+        text = _truncate(" ".join(dict.fromkeys(candidate.text_parts)), MAX_TEXT_CHARS)
+        line = f"<{' '.join(parts)}>{text}"
+        if candidate.tier == TIER_INTERACTIVE:
+            line = f"[{candidate.index}]{line}"
+        return line
+
+    def _score(self, candidate: _Candidate, query_tokens: set) -> float:
+        """Rank a candidate within its tier by query relevance and viewport proximity."""
+        proximity = candidate.proximity if candidate.proximity is not None else 0.5
+        if not query_tokens:
+            return proximity
+
+        line_tokens = set(tokenize(normalize(candidate.line)))
+        matched = 0
+        for token in query_tokens:
+            if token in line_tokens or any(
+                line_token.startswith(token) or token.startswith(line_token)
+                for line_token in line_tokens if len(line_token) >= 3
+            ):
+                matched += 1
+        return RELEVANCE_WEIGHT * matched / len(query_tokens) + proximity
+
+
+# Create a singleton instance
+dom_serializer = DOMSerializer()
@@ -3,15 +3,21 @@ DOM Processing Service for analyzing web page structures.
 This service provides methods for extracting and analyzing DOM trees,
 identifying interactive elements, and providing simplified representations.
 """
-from typing import Dict, Any, List, Optional, Tuple, Union, Set
+from typing import Dict, Any, List, Optional, Tuple, Union, Set, AsyncIterator, Type
 import logging
 import json
-import re
-from collections import defaultdict, Counter
-from functools import lru_cache
 
 from app.dom.browser_executor import BrowserExecutor
 from app.dom import browser_executor
+from app.dom.streaming import DOMTreeAssembler
+from app.dom.tree import DOMTree, DOMTreeIndex
+from app.dom.selector import compile_selector, SelectorSyntaxError
+from app.dom.cache import VersionedLRUCache, DOMExtractionCache
+from app.dom.classifier import page_type_classifier
+from app.dom.traversal import iter_elements, iter_postorder
+from app.dom.search import ElementSearchIndex
+from app.dom.serializer import dom_serializer
+from app.dom.analysis import DOMAnalysisPipeline, DOMAnalyzer, TermAnalyzer, run_analyzers
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -29,17 +35,139 @@ class DOMProcessingService:
             browser_executor: The browser executor instance
         """
         self.browser_executor = browser_executor
+        
+        # Index of the last plain dictionary tree queried, keyed by identity
+        self._last_tree: Optional[Dict[str, Any]] = None
+        self._last_index: Optional[DOMTreeIndex] = None
+        
+        # Extractions, reused while the page is unchanged
+        self.extraction_cache = DOMExtractionCache(
+            settings.DOM_EXTRACTION_CACHE_SIZE,
+            settings.DOM_EXTRACTION_CACHE_TTL
+        )
+        
+        # xpath/selector lookups, keyed by tree version
+        self.lookup_cache = VersionedLRUCache(settings.DOM_LOOKUP_CACHE_SIZE)
+        
+        # Single-pass analysis, memoized per tree version
+        self.analysis_pipeline = DOMAnalysisPipeline()
+        self._analysis_cache = VersionedLRUCache(maxsize=16)
+        
+        # Element search indexes, keyed by tree version
+        self._search_cache = VersionedLRUCache(maxsize=4)
     
-    async def extract_dom(self, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    async def extract_dom(self, options: Optional[Dict[str, Any]] = None, use_cache: bool = True) -> Dict[str, Any]:
         """
         Extract the DOM tree from the current page.
         
+        Extractions are cached per set of options and reused as long as the page
+        has not navigated, mutated, scrolled or resized since.
+        
         Args:
-            options: Optional configuration for the DOM extraction
+            options: Optional configuration for the DOM extraction. Set
+                ``backend`` to ``"snapshot"`` to extract through the Chrome
+                DevTools Protocol instead of the JavaScript walker.
+            use_cache: Whether to reuse a cached extraction of the unchanged page
             
         Returns:
             The extracted DOM tree structure
         """
+        options = self._apply_default_options(options)
+        
+        cache_key = None
+        document_state = None
+        if use_cache and self.extraction_cache.maxsize > 0:
+            cache_key = json.dumps(options, sort_keys=True)
+            document_state = await self._get_document_state()
+            if document_state is not None:
+                cached = self.extraction_cache.get(cache_key, document_state)
+                if cached is not None:
+                    logger.debug(f"Reusing cached DOM extraction of {document_state.get('url')}")
+                    return cached
+        
+        try:
+            # Use the browser executor to extract the DOM tree
+            if options.get("backend") == "snapshot":
+                result = await self._extract_dom_snapshot(options)
+            else:
+                result = await self.browser_executor.extract_dom_tree(options)
+            if isinstance(result, dict):
+                result = self._prepare_tree(result)
+            
+            # Lookups and analyses computed for earlier extractions are stale now
+            self.lookup_cache.invalidate()
+            self._analysis_cache.invalidate()
+            self._search_cache.invalidate()
+            if document_state is not None and isinstance(result, DOMTree):
+                self.extraction_cache.put(cache_key, document_state, result)
+            logger.info(f"Extracted DOM tree from {result.get('url', 'unknown URL')}")
+            
+            truncation = result.get("truncation") or {}
+            if truncation.get("truncated"):
+                logger.info(
+                    f"DOM extraction truncated: {truncation.get('nodeCount')} nodes kept, "
+                    f"{truncation.get('droppedByBudget', 0)} dropped by budget, "
+                    f"{truncation.get('prunedOffscreen', 0)} pruned offscreen, "
+                    f"{truncation.get('depthLimited', 0)} beyond max depth"
+                )
+            return result
+        except Exception as e:
+            logger.error(f"Error extracting DOM tree: {str(e)}")
+            raise
+    
+    async def _get_document_state(self) -> Optional[Dict[str, Any]]:
+        """Get the state of the current document, or None if it cannot be determined."""
+        try:
+            state = await self.browser_executor.get_document_state()
+        except Exception as e:
+            logger.debug(f"Could not get the document state, not using the extraction cache: {str(e)}")
+            return None
+        return state if isinstance(state, dict) else None
+    
+    def get_extraction_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get the statistics of the extraction cache.
+        
+        Returns:
+            Dictionary with the cache statistics
+        """
+        return self.extraction_cache.stats()
+    
+    def clear_extraction_cache(self) -> int:
+        """
+        Drop all cached extractions, forcing the next extraction to run in the browser.
+        
+        Returns:
+            The number of extractions dropped
+        """
+        return self.extraction_cache.invalidate()
+    
+    def _prepare_tree(self, result: Dict[str, Any]) -> DOMTree:
+        """
+        Wrap an extraction result as an indexed tree, converting it to compact nodes if enabled.
+        
+        Args:
+            result: The extraction result
+            
+        Returns:
+            The DOM tree
+        """
+        if not isinstance(result, DOMTree):
+            result = DOMTree(result)
+        if settings.DOM_COMPACT_NODES:
+            result.compact()
+        return result
+    
+    def _apply_default_options(self, options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Fill in the default DOM extraction options that are not provided.
+        
+        Args:
+            options: Optional configuration for the DOM extraction
+            
+        Returns:
+            The options with defaults applied
+        """
         if options is None:
             options = {}
         
@@ -51,6 +179,8 @@ class DOMProcessingService:
             "includePosition": True,
             "includeVisibility": True,
             "includeAccessibility": True,
+            "includeShadowDom": True,
+            "includeFrames": True,
             "maxTextLength": 150
         }
         
@@ -58,14 +188,78 @@ class DOMProcessingService:
             if key not in options:
                 options[key] = value
         
+        return options
+    
+    async def _extract_dom_snapshot(self, options: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Extract the DOM tree with the CDP snapshot backend, falling back to the JavaScript walker.
+        
+        Args:
+            options: Configuration for the DOM extraction
+            
+        Returns:
+            The extracted DOM tree structure
+        """
         try:
-            # Use the browser executor to extract the DOM tree
-            result = await self.browser_executor.extract_dom_tree(options)
-            logger.info(f"Extracted DOM tree from {result.get('url', 'unknown URL')}")
-            return result
+            return await self.browser_executor.extract_dom_snapshot(options)
         except Exception as e:
-            logger.error(f"Error extracting DOM tree: {str(e)}")
-            raise
+            logger.warning(f"Snapshot DOM extraction unavailable, falling back to script extraction: {str(e)}")
+            return await self.browser_executor.extract_dom_tree(options)
+    
+    async def stream_dom(self, options: Optional[Dict[str, Any]] = None,
+                         chunk_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Extract the DOM tree of the main frame in chunks, for pages too large to extract in one message.
+        
+        Args:
+            options: Optional configuration for the DOM extraction
+            chunk_size: Maximum number of nodes per chunk
+            
+        Yields:
+            Chunks of node records, see DOMTreeAssembler
+        """
+        options = self._apply_default_options(options)
+        async for chunk in self.browser_executor.stream_dom_tree(options, chunk_size):
+            yield chunk
+    
+    async def extract_dom_streamed(self, options: Optional[Dict[str, Any]] = None,
+                                   chunk_size: int = 500) -> Dict[str, Any]:
+        """
+        Extract the DOM tree in chunks and assemble the complete result.
+        
+        Args:
+            options: Optional configuration for the DOM extraction
+            chunk_size: Maximum number of nodes per chunk
+            
+        Returns:
+            The extracted DOM tree structure, in the same format as extract_dom
+        """
+        assembler = DOMTreeAssembler()
+        async for chunk in self.stream_dom(options, chunk_size):
+            assembler.add_chunk(chunk)
+        
+        logger.info(
+            f"Extracted DOM tree from {assembler.url or 'unknown URL'} in "
+            f"{assembler.chunk_count} chunks ({assembler.node_count} nodes)"
+        )
+        return self._prepare_tree(assembler.result())
+    
+    async def stream_interactive_elements(self, options: Optional[Dict[str, Any]] = None,
+                                          chunk_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield interactive elements as soon as the chunk containing them has been extracted.
+        
+        Args:
+            options: Optional configuration for the DOM extraction
+            chunk_size: Maximum number of nodes per chunk
+            
+        Yields:
+            Interactive element entries, with their category (clickable, inputs, forms or navigational)
+        """
+        async for chunk in self.stream_dom(options, chunk_size):
+            for category, elements in (chunk.get("interactiveElements") or {}).items():
+                for element in elements:
+                    yield {"category": category, **element}
     
     def get_interactive_elements(self, dom_tree: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
         """
@@ -98,26 +292,36 @@ class DOMProcessingService:
         Returns:
             The element if found, None otherwise
         """
-        if not dom_tree or "tree" not in dom_tree:
+        index = self.get_index(dom_tree)
+        if index is None:
             return None
         
-        return self._find_element_by_id_recursive(dom_tree["tree"], element_id)
+        return index.get_by_id(element_id)
     
-    def _find_element_by_id_recursive(self, node: Dict[str, Any], element_id: str) -> Optional[Dict[str, Any]]:
-        """Recursively search for an element by ID in the DOM tree."""
-        if not node:
-            return None
+    def get_index(self, dom_tree: Dict[str, Any]) -> Optional[DOMTreeIndex]:
+        """
+        Get the element index of a DOM tree, building it if needed.
         
-        if node.get("id") == element_id:
-            return node
+        Trees returned by extract_dom carry their own index. For plain dictionaries the
+        index of the most recently queried tree is kept, so repeated queries against the
+        same tree only build it once. Trees are assumed not to change after extraction.
         
-        if "children" in node:
-            for child in node["children"]:
-                result = self._find_element_by_id_recursive(child, element_id)
-                if result:
-                    return result
+        Args:
+            dom_tree: The DOM tree structure
+            
+        Returns:
+            The element index, or None if the DOM tree is invalid
+        """
+        if not dom_tree or "tree" not in dom_tree:
+            return None
         
-        return None
+        if isinstance(dom_tree, DOMTree):
+            return dom_tree.index
+        
+        if self._last_tree is not dom_tree or self._last_index.root is not dom_tree["tree"]:
+            self._last_index = DOMTreeIndex(dom_tree["tree"])
+            self._last_tree = dom_tree
+        return self._last_index
     
     def get_elements_by_tag(self, dom_tree: Dict[str, Any], tag_name: str) -> List[Dict[str, Any]]:
         """
@@ -130,24 +334,11 @@ class DOMProcessingService:
         Returns:
             List of matching elements
         """
-        if not dom_tree or "tree" not in dom_tree:
+        index = self.get_index(dom_tree)
+        if index is None:
             return []
         
-        results = []
-        self._find_elements_by_tag_recursive(dom_tree["tree"], tag_name.lower(), results)
-        return results
-    
-    def _find_elements_by_tag_recursive(self, node: Dict[str, Any], tag_name: str, results: List[Dict[str, Any]]) -> None:
-        """Recursively search for elements by tag name in the DOM tree."""
-        if not node or node.get("type") != "element":
-            return
-        
-        if node.get("tagName", "").lower() == tag_name:
-            results.append(node)
-        
-        if "children" in node:
-            for child in node["children"]:
-                self._find_elements_by_tag_recursive(child, tag_name, results)
+        return index.get_by_tag(tag_name)
     
     def count_element_types(self, dom_tree: Dict[str, Any]) -> Dict[str, int]:
         """
@@ -159,111 +350,81 @@ class DOMProcessingService:
         Returns:
             Dictionary with counts of each element type
         """
-        if not dom_tree or "tree" not in dom_tree:
+        index = self.get_index(dom_tree)
+        if index is None:
             return {}
         
-        counter = Counter()
-        self._count_element_types_recursive(dom_tree["tree"], counter)
-        return dict(counter)
-    
-    def _count_element_types_recursive(self, node: Dict[str, Any], counter: Counter) -> None:
-        """Recursively count element types in the DOM tree."""
-        if not node:
-            return
-        
-        if node.get("type") == "element" and "tagName" in node:
-            counter[node["tagName"]] += 1
-        
-        if "children" in node:
-            for child in node["children"]:
-                self._count_element_types_recursive(child, counter)
+        return dict(index.tag_counts)
     
     def find_elements_by_selector(self, dom_tree: Dict[str, Any], selector: str) -> List[Dict[str, Any]]:
         """
-        Find elements by CSS selector, using selector heuristics from the local DOM representation.
-        Note: This is not a full CSS selector implementation, but a simplified version.
+        Find elements by CSS selector in the local DOM representation, without a browser round-trip.
+        
+        Selectors are compiled once and cached; see compile_selector for the supported syntax.
+        Selectors the engine cannot parse are compared with the generated css_selector of each element.
         
         Args:
             dom_tree: The DOM tree structure
             selector: The CSS selector
             
         Returns:
-            List of matching elements
+            List of matching elements in document order
         """
-        if not dom_tree or "tree" not in dom_tree:
+        index = self.get_index(dom_tree)
+        if index is None:
             return []
         
-        # Break down the selector into its components
         selector = selector.strip()
-        results = []
-        
-        # Handle ID selectors (#id)
-        if selector.startswith('#'):
-            element_id = selector[1:]
-            element = self.get_element_by_id(dom_tree, element_id)
-            if element:
-                results.append(element)
-            return results
-        
-        # Handle class selectors (.class)
-        if selector.startswith('.'):
-            class_name = selector[1:]
-            all_elements = self._get_all_elements(dom_tree["tree"])
-            for element in all_elements:
-                attributes = element.get("attributes", {})
-                if "class" in attributes and class_name in attributes["class"].split():
-                    results.append(element)
-            return results
-        
-        # Handle tag selectors (tag) - possibly with additional filters
-        match = re.match(r'^(\w+)(?:\[([^\]]+)\])?$', selector)
-        if match:
-            tag_name = match.group(1)
-            attr_filter = match.group(2)
-            
-            elements = self.get_elements_by_tag(dom_tree, tag_name)
-            
-            # Apply attribute filter if present
-            if attr_filter:
-                filtered_elements = []
-                attr_match = re.match(r'^([^=]+)(?:=[\'\"]([^\'\"]+)[\'\"])?$', attr_filter)
-                if attr_match:
-                    attr_name = attr_match.group(1)
-                    attr_value = attr_match.group(2)
-                    
-                    for element in elements:
-                        attributes = element.get("attributes", {})
-                        if attr_name in attributes:
-                            if attr_value is None or attributes[attr_name] == attr_value:
-                                filtered_elements.append(element)
-                
-                return filtered_elements
-            
-            return elements
-        
-        # For more complex selectors, find elements that have a matching css_selector property
-        # This is a fallback and not a true selector engine
-        all_elements = self._get_all_elements(dom_tree["tree"])
-        for element in all_elements:
-            if element.get("css_selector") == selector:
-                results.append(element)
+        try:
+            compiled = compile_selector(selector)
+        except SelectorSyntaxError as e:
+            logger.debug(f"Falling back to css_selector comparison: {str(e)}")
+            return list(index.by_css_selector.get(selector, []))
         
-        return results
+        return compiled.select(index)
     
     def _get_all_elements(self, node: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Recursively get all elements in the DOM tree."""
+        """Get all elements of a subtree in document order."""
         if not node:
             return []
         
-        results = []
-        if node.get("type") == "element":
-            results.append(node)
+        if self._last_index is not None and self._last_index.root is node:
+            return list(self._last_index.elements)
         
-        if "children" in node:
-            for child in node["children"]:
-                results.extend(self._get_all_elements(child))
+        return list(iter_elements(node))
+    
+    def analyze_dom(self, dom_tree: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run the analysis pipeline over a DOM tree in a single traversal.
         
-        return results
+        Results are memoized per tree version, so repeated analyses of the same
+        extraction do not walk the tree again.
+        
+        Args:
+            dom_tree: The DOM tree structure
+            
+        Returns:
+            Dictionary mapping each analyzer name to its result
+        """
+        index = self.get_index(dom_tree)
+        if index is None:
+            return {}
+        
+        return self._analysis_cache.get_or_compute(
+            index.version,
+            "analysis",
+            lambda: self.analysis_pipeline.run(dom_tree)
+        )
+    
+    def register_analyzer(self, analyzer_class: Type[DOMAnalyzer]) -> None:
+        """
+        Add an analyzer to the analysis pipeline.
+        
+        Args:
+            analyzer_class: The analyzer class, its results are available under its name
+        """
+        self.analysis_pipeline.register(analyzer_class)
+        self._analysis_cache.invalidate()
     
     def analyze_page_structure(self, dom_tree: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -278,168 +439,71 @@ class DOMProcessingService:
         if not dom_tree or "tree" not in dom_tree:
             return {"error": "Invalid DOM tree"}
         
+        results = self.analyze_dom(dom_tree)
         analysis = {
             "title": dom_tree.get("title", ""),
             "url": dom_tree.get("url", ""),
             "timestamp": dom_tree.get("timestamp", ""),
-            "element_counts": self.count_element_types(dom_tree),
-            "page_sections": self._identify_page_sections(dom_tree["tree"]),
-            "interactive_elements": {
-                "total": sum(len(elements) for elements in self.get_interactive_elements(dom_tree).values()),
-                "by_type": {k: len(v) for k, v in self.get_interactive_elements(dom_tree).items()}
-            }
+            "element_counts": results["element_counts"],
+            "page_sections": results["sections"],
+            "interactive_elements": results["interactive_elements"]
         }
         
         # Add form analysis if forms are present
-        forms = self.get_elements_by_tag(dom_tree, "form")
-        if forms:
-            analysis["forms"] = self._analyze_forms(forms)
+        if results["forms"]:
+            analysis["forms"] = results["forms"]
         
         return analysis
     
-    def _identify_page_sections(self, tree: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def get_search_index(self, dom_tree: Dict[str, Any]) -> Optional[ElementSearchIndex]:
         """
-        Identify major page sections like header, footer, main content, etc.
+        Get the element search index of a DOM tree, building it on first use.
         
         Args:
-            tree: The DOM tree structure
+            dom_tree: The DOM tree structure
             
         Returns:
-            List of identified sections
+            The search index, or None for an invalid tree
         """
-        sections = []
-        
-        # Look for common section elements by ID, role, or tag
-        section_identifiers = {
-            "header": ["header", "head", "top", "banner"],
-            "footer": ["footer", "foot", "bottom"],
-            "main": ["main", "content", "main-content"],
-            "navigation": ["nav", "navigation", "menu", "navbar"],
-            "sidebar": ["sidebar", "side", "aside"],
-        }
-        
-        all_elements = self._get_all_elements(tree)
-        
-        for section_type, identifiers in section_identifiers.items():
-            for element in all_elements:
-                # Check element id
-                element_id = element.get("id", "").lower()
-                if any(identifier in element_id for identifier in identifiers):
-                    sections.append({
-                        "type": section_type,
-                        "element_id": element.get("id"),
-                        "tag": element.get("tagName"),
-                        "selector": element.get("css_selector"),
-                        "reason": f"id contains '{next(i for i in identifiers if i in element_id)}'"
-                    })
-                    continue
-                
-                # Check element tag
-                if element.get("tagName", "").lower() in identifiers:
-                    sections.append({
-                        "type": section_type,
-                        "element_id": element.get("id"),
-                        "tag": element.get("tagName"),
-                        "selector": element.get("css_selector"),
-                        "reason": f"tag is '{element.get('tagName', '').lower()}'"
-                    })
-                    continue
-                
-                # Check element class
-                element_class = element.get("attributes", {}).get("class", "").lower()
-                if any(identifier in element_class for identifier in identifiers):
-                    sections.append({
-                        "type": section_type,
-                        "element_id": element.get("id"),
-                        "tag": element.get("tagName"),
-                        "selector": element.get("css_selector"),
-                        "reason": f"class contains '{next(i for i in identifiers if i in element_class)}'"
-                    })
-                    continue
-                
-                # Check accessibility role
-                element_role = element.get("accessibility", {}).get("role", "").lower()
-                if element_role in identifiers:
-                    sections.append({
-                        "type": section_type,
-                        "element_id": element.get("id"),
-                        "tag": element.get("tagName"),
-                        "selector": element.get("css_selector"),
-                        "reason": f"role is '{element_role}'"
-                    })
+        index = self.get_index(dom_tree)
+        if index is None:
+            return None
         
-        return sections
+        return self._search_cache.get_or_compute(
+            index.version,
+            "search",
+            lambda: ElementSearchIndex(dom_tree, index)
+        )
     
-    def _analyze_forms(self, forms: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def search_elements(self, dom_tree: Dict[str, Any], query: str, categories: Optional[List[str]] = None,
+                        limit: int = 5, fields: Optional[List[str]] = None, fuzzy: bool = True) -> List[Dict[str, Any]]:
         """
-        Analyze forms in the DOM tree.
+        Find interactive elements matching a query, ranked by relevance.
         
         Args:
-            forms: List of form elements
+            dom_tree: The DOM tree structure
+            query: The text to search for
+            categories: Interactive element categories to search (clickable, inputs, forms, navigational)
+            limit: Maximum number of matches to return
+            fields: Fields to match the query in, see SEARCH_FIELDS
+            fuzzy: Whether to include fuzzy matches
             
         Returns:
-            List of form analyses
-        """
-        form_analyses = []
-        
-        for form in forms:
-            inputs = []
-            buttons = []
-            
-            # Find inputs and buttons in the form
-            if "children" in form:
-                self._find_form_controls_recursive(form, inputs, buttons)
-            
-            form_analysis = {
-                "id": form.get("id"),
-                "selector": form.get("css_selector"),
-                "input_count": len(inputs),
-                "button_count": len(buttons),
-                "inputs": [
-                    {
-                        "type": input_el.get("attributes", {}).get("type", "text"),
-                        "name": input_el.get("attributes", {}).get("name"),
-                        "id": input_el.get("id"),
-                        "placeholder": input_el.get("attributes", {}).get("placeholder"),
-                        "required": "required" in input_el.get("attributes", {})
-                    }
-                    for input_el in inputs
-                ],
-                "submission": next((
-                    {
-                        "type": "button",
-                        "id": button.get("id"),
-                        "text": button.get("textContent")
-                    }
-                    for button in buttons
-                    if button.get("attributes", {}).get("type") == "submit" or
-                    "submit" in button.get("textContent", "").lower()
-                ), {"type": "unknown"})
-            }
-            
-            form_analyses.append(form_analysis)
-        
-        return form_analyses
-    
-    def _find_form_controls_recursive(self, node: Dict[str, Any], inputs: List[Dict[str, Any]], buttons: List[Dict[str, Any]]) -> None:
-        """Recursively find input and button elements in a form."""
-        if not node:
-            return
-        
-        if node.get("type") == "element":
-            if node.get("tagName") == "input" or node.get("tagName") == "textarea" or node.get("tagName") == "select":
-                inputs.append(node)
-            elif node.get("tagName") == "button":
-                buttons.append(node)
+            List of matches, see ElementSearchIndex.search
+        """
+        search_index = self.get_search_index(dom_tree)
+        if search_index is None:
+            return []
         
-        if "children" in node:
-            for child in node["children"]:
-                self._find_form_controls_recursive(child, inputs, buttons)
+        return search_index.search(query, categories, limit, fields, fuzzy)
     
     def find_clickable_path(self, dom_tree: Dict[str, Any], target_text: str) -> Optional[Dict[str, Any]]:
         """
         Find a clickable element that matches the target text.
         
+        Matches of the text content rank before matches of the title, alt,
+        aria-label or placeholder of the element.
+        
         Args:
             dom_tree: The DOM tree structure
             target_text: The text to search for
@@ -450,40 +514,11 @@ class DOMProcessingService:
         if not dom_tree or "tree" not in dom_tree:
             return None
         
-        # Get all clickable elements from the interactive elements collection
-        clickable_elements = self.get_interactive_elements(dom_tree).get("clickable", [])
-        
-        # First, try to find exact matches
-        for element in clickable_elements:
-            element_id = element.get("id")
-            full_element = self.get_element_by_id(dom_tree, element_id) if element_id else None
-            
-            if full_element and "textContent" in full_element:
-                if target_text.lower() == full_element["textContent"].lower():
-                    return element
-        
-        # If no exact match, try partial matches
-        for element in clickable_elements:
-            element_id = element.get("id")
-            full_element = self.get_element_by_id(dom_tree, element_id) if element_id else None
-            
-            if full_element and "textContent" in full_element:
-                if target_text.lower() in full_element["textContent"].lower():
-                    return element
-        
-        # If still no match, try to find elements with matching attributes
-        for element in clickable_elements:
-            element_id = element.get("id")
-            full_element = self.get_element_by_id(dom_tree, element_id) if element_id else None
-            
-            if full_element:
-                # Check various attributes that might contain text
-                for attr_name in ["title", "alt", "aria-label", "placeholder"]:
-                    attr_value = full_element.get("attributes", {}).get(attr_name, "")
-                    if attr_value and target_text.lower() in attr_value.lower():
-                        return element
-        
-        return None
+        matches = self.search_elements(
+            dom_tree, target_text, ["clickable"], limit=1,
+            fields=["text", "aria-label", "title", "alt", "placeholder"]
+        )
+        return matches[0]["entry"] if matches else None
     
     def get_navigation_path(self, dom_tree: Dict[str, Any], start_element: Dict[str, Any], end_element: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
@@ -515,8 +550,9 @@ class DOMProcessingService:
             return []
         
         # Build the DOM tree ancestry path for both elements
-        start_path = self._build_ancestry_path(dom_tree["tree"], start_id)
-        end_path = self._build_ancestry_path(dom_tree["tree"], end_id)
+        index = self.get_index(dom_tree)
+        start_path = index.get_ancestry_path(start_full)
+        end_path = index.get_ancestry_path(end_full)
         
         if not start_path or not end_path:
             return []
@@ -542,37 +578,13 @@ class DOMProcessingService:
         
         return navigation_path
     
-    def _build_ancestry_path(self, root: Dict[str, Any], target_id: str, current_path: Optional[List[Dict[str, Any]]] = None) -> Optional[List[Dict[str, Any]]]:
-        """Build a path from the root to the target element."""
-        if not root:
-            return None
-        
-        # Initialize path
-        if current_path is None:
-            current_path = []
-        
-        # Add current node to path
-        current_path.append(root)
-        
-        # If this is the target, return the path
-        if root.get("id") == target_id:
-            return current_path
-        
-        # If this node has children, search them
-        if "children" in root:
-            for child in root["children"]:
-                if child.get("type") == "element":  # Only consider element nodes
-                    child_path = self._build_ancestry_path(child, target_id, current_path.copy())
-                    if child_path:
-                        return child_path
-        
-        # If we get here, the target was not found in this subtree
-        return None
-    
     def find_input_field(self, dom_tree: Dict[str, Any], field_name: str) -> Optional[Dict[str, Any]]:
         """
         Find an input field by name, label, or placeholder.
         
+        Labels are associated with their inputs through ``for``, by wrapping the
+        input or through ``aria-labelledby``.
+        
         Args:
             dom_tree: The DOM tree structure
             field_name: The name of the field to find
@@ -583,73 +595,31 @@ class DOMProcessingService:
         if not dom_tree or "tree" not in dom_tree:
             return None
         
-        # Get all input elements
-        input_elements = self.get_interactive_elements(dom_tree).get("inputs", [])
-        
-        # Try to match by name attribute
-        for element in input_elements:
-            element_id = element.get("id")
-            full_element = self.get_element_by_id(dom_tree, element_id) if element_id else None
-            
-            if not full_element:
-                continue
-            
-            attributes = full_element.get("attributes", {})
-            name_attr = attributes.get("name", "")
-            
-            if name_attr.lower() == field_name.lower():
-                return element
+        matches = self.search_elements(
+            dom_tree, field_name, ["inputs"], limit=1,
+            fields=["label", "placeholder", "aria-label", "name"]
+        )
+        return matches[0]["entry"] if matches else None
+    
+    def get_labels_for(self, dom_tree: Dict[str, Any], element_id: str) -> List[Dict[str, Any]]:
+        """
+        Get the label elements associated with an element through their ``for`` attribute.
         
-        # Try to match by placeholder attribute
-        for element in input_elements:
-            element_id = element.get("id")
-            full_element = self.get_element_by_id(dom_tree, element_id) if element_id else None
-            
-            if not full_element:
-                continue
-            
-            attributes = full_element.get("attributes", {})
-            placeholder = attributes.get("placeholder", "")
+        Args:
+            dom_tree: The DOM tree structure
+            element_id: The ID of the labelled element
             
-            if placeholder.lower() == field_name.lower() or field_name.lower() in placeholder.lower():
-                return element
-        
-        # Try to match by associated label
-        # This is a simplified approach, a real implementation would need to follow label-for relationships
-        all_elements = self._get_all_elements(dom_tree["tree"])
-        for element in all_elements:
-            if element.get("tagName") == "label":
-                label_text = element.get("textContent", "")
-                
-                if label_text.lower() == field_name.lower() or field_name.lower() in label_text.lower():
-                    # Get the for attribute
-                    for_id = element.get("attributes", {}).get("for")
-                    if for_id:
-                        # Find the input element with this ID
-                        input_el = self.get_element_by_id(dom_tree, for_id)
-                        if input_el:
-                            return {
-                                "id": input_el.get("id"),
-                                "tagName": input_el.get("tagName"),
-                                "selector": input_el.get("css_selector"),
-                                "xpath": input_el.get("xpath")
-                            }
-        
-        # Try aria-label attributes as a last resort
-        for element in input_elements:
-            element_id = element.get("id")
-            full_element = self.get_element_by_id(dom_tree, element_id) if element_id else None
-            
-            if not full_element:
-                continue
-            
-            accessibility = full_element.get("accessibility", {})
-            aria_label = accessibility.get("aria-label", "")
-            
-            if aria_label.lower() == field_name.lower() or field_name.lower() in aria_label.lower():
-                return element
+        Returns:
+            List of label elements
+        """
+        index = self.get_index(dom_tree)
+        if index is None or not element_id:
+            return []
         
-        return None
+        return [
+            element for element in index.get_by_attribute("for", element_id)
+            if element.get("tagName") == "label"
+        ]
     
     def create_simplified_dom(self, dom_tree: Dict[str, Any], max_depth: int = 3) -> Dict[str, Any]:
         """
@@ -704,7 +674,7 @@ class DOMProcessingService:
         simplified["interactive_summary"] = interactive_summary
         
         # Add page structure analysis
-        page_sections = self._identify_page_sections(dom_tree["tree"])
+        page_sections = self.analyze_dom(dom_tree)["sections"]
         simplified["page_structure"] = {
             "sections": [
                 {
@@ -717,11 +687,45 @@ class DOMProcessingService:
         
         return simplified
     
+    def serialize_for_llm(self, dom_tree: Dict[str, Any], token_budget: Optional[int] = None,
+                          query: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Serialize the DOM tree into compact indexed lines that fit a token budget.
+        
+        Interactive elements are packed first, then labelled containers, then text,
+        each ranked by relevance to the query and proximity to the viewport.
+        
+        Args:
+            dom_tree: The DOM tree structure
+            token_budget: Maximum number of tokens, defaults to DOM_LLM_TOKEN_BUDGET
+            query: Optional task description used to rank the content
+            
+        Returns:
+            Dictionary with the serialized text, the tokens used and the elements by index
+        """
+        if not dom_tree or "tree" not in dom_tree:
+            return {"error": "Invalid DOM tree"}
+        
+        if token_budget is None:
+            token_budget = settings.DOM_LLM_TOKEN_BUDGET
+        return dom_serializer.serialize(dom_tree, token_budget, query)
+    
     def _simplify_node(self, node: Dict[str, Any], current_depth: int, max_depth: int) -> Optional[Dict[str, Any]]:
-        """Recursively create a simplified version of a DOM node."""
+        """Create a simplified version of a DOM node, building children before their parents."""
         if not node or current_depth > max_depth:
             return None
         
+        simplified_nodes = {}
+        for current, depth in iter_postorder(node, max_depth - current_depth):
+            simplified_nodes[id(current)] = self._simplify_single_node(
+                current, current_depth + depth, max_depth, simplified_nodes
+            )
+        
+        return simplified_nodes[id(node)]
+    
+    def _simplify_single_node(self, node: Dict[str, Any], current_depth: int, max_depth: int,
+                              simplified_nodes: Dict[int, Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """Create a simplified version of a single DOM node from its already simplified children."""
         # Skip text nodes at deeper levels
         if node.get("type") == "text" and current_depth > 0:
             return {
@@ -748,11 +752,11 @@ class DOMProcessingService:
             
             # Add children if within depth limit
             if "children" in node and current_depth < max_depth:
-                children = []
-                for child in node["children"]:
-                    simplified_child = self._simplify_node(child, current_depth + 1, max_depth)
-                    if simplified_child:
-                        children.append(simplified_child)
+                children = [
+                    simplified_nodes.get(id(child))
+                    for child in node["children"] if child
+                ]
+                children = [child for child in children if child]
                 
                 # Only add non-empty children array
                 if children:
@@ -813,11 +817,12 @@ class DOMProcessingService:
         
         return results
     
-    @lru_cache(maxsize=128)
     def get_element_xpath(self, dom_tree: Dict[str, Any], selector: str) -> Optional[str]:
         """
         Get the XPath for an element identified by a CSS selector.
         
+        Results are cached per tree version.
+        
         Args:
             dom_tree: The DOM tree structure
             selector: CSS selector to find the element
@@ -825,17 +830,22 @@ class DOMProcessingService:
         Returns:
             XPath string or None if element not found
         """
-        elements = self.find_elements_by_selector(dom_tree, selector)
-        if not elements:
+        index = self.get_index(dom_tree)
+        if index is None:
             return None
         
-        return elements[0].get("xpath")
+        def lookup() -> Optional[str]:
+            elements = self.find_elements_by_selector(dom_tree, selector)
+            return elements[0].get("xpath") if elements else None
+        
+        return self.lookup_cache.get_or_compute(index.version, ("xpath", selector), lookup)
     
-    @lru_cache(maxsize=128)
     def get_element_selector(self, dom_tree: Dict[str, Any], xpath: str) -> Optional[str]:
         """
         Get the CSS selector for an element identified by XPath.
         
+        Results are cached per tree version.
+        
         Args:
             dom_tree: The DOM tree structure
             xpath: XPath to find the element
@@ -843,12 +853,24 @@ class DOMProcessingService:
         Returns:
             CSS selector string or None if element not found
         """
-        all_elements = self._get_all_elements(dom_tree["tree"])
-        for element in all_elements:
-            if element.get("xpath") == xpath:
-                return element.get("css_selector")
+        index = self.get_index(dom_tree)
+        if index is None:
+            return None
         
-        return None
+        def lookup() -> Optional[str]:
+            element = index.by_xpath.get(xpath)
+            return element.get("css_selector") if element is not None else None
+        
+        return self.lookup_cache.get_or_compute(index.version, ("selector", xpath), lookup)
+    
+    def get_lookup_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get the statistics of the xpath/selector lookup cache.
+        
+        Returns:
+            Dictionary with the cache size and hit/miss counters
+        """
+        return self.lookup_cache.stats()
     
     def classify_page_type(self, dom_tree: Dict[str, Any]) -> Dict[str, float]:
         """
@@ -863,67 +885,16 @@ class DOMProcessingService:
         if not dom_tree or "tree" not in dom_tree:
             return {"unknown": 1.0}
         
-        # Define features for different page types
-        page_types = {
-            "login": ["login", "sign in", "signin", "username", "password", "email", "forgot password"],
-            "product": ["product", "price", "buy", "add to cart", "purchase", "shipping"],
-            "article": ["article", "blog", "news", "author", "published", "date", "comments"],
-            "search": ["search", "results", "query", "filter", "sort", "no results"],
-            "form": ["form", "submit", "input", "required", "select", "radio", "checkbox"],
-            "landing": ["hero", "cta", "sign up", "free trial", "learn more", "get started"],
-            "listing": ["list", "grid", "pagination", "next", "previous", "showing"]
-        }
-        
-        # Extract page text
-        page_text = self._extract_all_text(dom_tree["tree"]).lower()
-        page_html = json.dumps(dom_tree).lower()  # Include structure in analysis
-        
-        # Count occurrences of each feature
-        scores = {}
-        for page_type, features in page_types.items():
-            score = 0
-            for feature in features:
-                text_count = page_text.count(feature.lower())
-                html_count = page_html.count(feature.lower())
-                score += text_count * 2 + html_count
-            
-            scores[page_type] = score
-        
-        # Normalize scores to add up to 1.0
-        total_score = sum(scores.values())
-        if total_score == 0:
-            return {"unknown": 1.0}
-        
-        normalized_scores = {
-            page_type: score / total_score
-            for page_type, score in scores.items()
-            if score > 0  # Only include non-zero scores
-        }
-        
-        # If no scores, return unknown
-        if not normalized_scores:
-            return {"unknown": 1.0}
-        
-        return normalized_scores
-    
-    def _extract_all_text(self, node: Dict[str, Any]) -> str:
-        """Extract all text from a DOM node recursively."""
-        if not node:
-            return ""
-        
-        if node.get("type") == "text":
-            return node.get("content", "")
-        
-        if node.get("type") == "element":
-            text = node.get("textContent", "")
-            
-            if "children" in node:
-                for child in node["children"]:
-                    text += " " + self._extract_all_text(child)
-            
-            return text
-        
-        return ""
+        # Score the page text collected by the analysis pass and the terms of the page,
+        # which are only collected for classification
+        analysis = self.analyze_dom(dom_tree)
+        index = self.get_index(dom_tree)
+        terms = self._analysis_cache.get_or_compute(
+            index.version,
+            "terms",
+            lambda: run_analyzers(dom_tree, [TermAnalyzer])["terms"]
+        )
+        return page_type_classifier.classify(analysis["text"], terms)
 
 # Create a singleton instance
 dom_processing_service = DOMProcessingService(browser_executor) 
\ No newline at end of file
@@ -0,0 +1,578 @@
+"""
+DOM extraction backend built on the Chrome DevTools Protocol.
+Converts the output of DOMSnapshot.captureSnapshot and Accessibility.getFullAXTree
+into the same tree schema produced by buildDomTree.js.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+import math
+from datetime import datetime, timezone
+
+from app.dom.traversal import iter_elements
+
+logger = logging.getLogger(__name__)
+
+# Computed styles requested from the snapshot, in the order they are returned
+SNAPSHOT_COMPUTED_STYLES = ["display", "visibility", "opacity", "cursor"]
+
+ELEMENT_NODE = 1
+TEXT_NODE = 3
+DOCUMENT_FRAGMENT_NODE = 11
+
+SKIP_TAGS = {"script", "style", "noscript", "svg", "path", "head"}
+CLICKABLE_TAGS = {"a", "button", "input", "select", "textarea", "summary", "details"}
+CLICKABLE_ROLES = {"button", "link", "checkbox", "menuitem", "tab", "switch", "option"}
+INPUT_TAGS = {"input", "textarea", "select", "option"}
+INPUT_ROLES = {"textbox", "searchbox", "spinbutton", "slider", "checkbox", "radio", "combobox", "option"}
+FORM_TAGS = {"fieldset", "legend", "label"}
+NAV_TAGS = {"a", "nav", "menu"}
+NAV_ROLES = {"link", "menu", "menubar", "menuitem", "tab", "tablist", "tree", "treeitem"}
+NAV_CLASSES = {"nav", "navbar", "navigation", "menu", "sidebar", "breadcrumb"}
+ACCESSIBILITY_ATTRIBUTES = [
+    "aria-label", "aria-labelledby", "aria-describedby", "aria-hidden",
+    "aria-expanded", "aria-haspopup", "role"
+]
+
+# Element indexes of a child frame are offset by its frame number times this stride,
+# so they do not collide with the indexes of the main frame or of other frames
+FRAME_INDEX_STRIDE = 1000000
+
+# Returned by SnapshotTreeBuilder._build_element for elements left out because of the
+# node budget, whose children are still walked and attached to the parent instead
+_DROPPED_BY_BUDGET = object()
+
+INTERACTIVE_COLLECTIONS = {
+    "clickable": "clickable",
+    "input": "inputs",
+    "form": "forms",
+    "navigation": "navigational"
+}
+
+
+def _rare_boolean(data: Optional[Dict[str, Any]]) -> set:
+    """Convert CDP RareBooleanData into a set of node indexes."""
+    return set(data.get("index", [])) if data else set()
+
+
+def _rare_values(data: Optional[Dict[str, Any]]) -> Dict[int, Any]:
+    """Convert CDP RareStringData/RareIntegerData into a node index -> value map."""
+    if not data:
+        return {}
+    return dict(zip(data.get("index", []), data.get("value", [])))
+
+
+class _SnapshotDocument:
+    """Lookup tables for a single document of a DOM snapshot."""
+
+    def __init__(self, document: Dict[str, Any], strings: List[str]):
+        self.strings = strings
+        nodes = document.get("nodes", {})
+        self.parent_index = nodes.get("parentIndex", [])
+        self.node_type = nodes.get("nodeType", [])
+        self.node_name = nodes.get("nodeName", [])
+        self.node_value = nodes.get("nodeValue", [])
+        self.backend_node_id = nodes.get("backendNodeId", [])
+        self.attributes = nodes.get("attributes", [])
+        self.clickable = _rare_boolean(nodes.get("isClickable"))
+        self.content_document = _rare_values(nodes.get("contentDocumentIndex"))
+        self.shadow_root_type = _rare_values(nodes.get("shadowRootType"))
+        self.scroll_x = document.get("scrollOffsetX", 0) or 0
+        self.scroll_y = document.get("scrollOffsetY", 0) or 0
+        self.url = self.string(document.get("documentURL", -1))
+        self.title = self.string(document.get("title", -1))
+
+        self.children: Dict[int, List[int]] = {}
+        for index, parent in enumerate(self.parent_index):
+            if parent >= 0:
+                self.children.setdefault(parent, []).append(index)
+
+        layout = document.get("layout", {})
+        self.layout: Dict[int, Tuple[List[float], List[int]]] = {}
+        styles = layout.get("styles", [])
+        bounds = layout.get("bounds", [])
+        for position, node_index in enumerate(layout.get("nodeIndex", [])):
+            self.layout[node_index] = (
+                bounds[position] if position < len(bounds) else None,
+                styles[position] if position < len(styles) else []
+            )
+
+    def string(self, index: int) -> str:
+        """Resolve an index into the snapshot string table."""
+        if index is None or index < 0 or index >= len(self.strings):
+            return ""
+        return self.strings[index]
+
+    def tag_name(self, index: int) -> str:
+        return self.string(self.node_name[index]).lower()
+
+    def node_attributes(self, index: int) -> Dict[str, str]:
+        if index >= len(self.attributes):
+            return {}
+        flat = self.attributes[index]
+        return {
+            self.string(flat[i]): self.string(flat[i + 1])
+            for i in range(0, len(flat) - 1, 2)
+        }
+
+    def computed_style(self, index: int) -> Optional[Dict[str, str]]:
+        """Get the requested computed styles of a node, or None if the node has no layout."""
+        entry = self.layout.get(index)
+        if entry is None:
+            return None
+        return {
+            name: self.string(value)
+            for name, value in zip(SNAPSHOT_COMPUTED_STYLES, entry[1])
+        }
+
+    def bounds(self, index: int) -> Optional[List[float]]:
+        entry = self.layout.get(index)
+        return entry[0] if entry else None
+
+    def find_body(self) -> Optional[int]:
+        for index, node_type in enumerate(self.node_type):
+            if node_type == ELEMENT_NODE and self.tag_name(index) == "body":
+                return index
+        return None
+
+
+class SnapshotTreeBuilder:
+    """
+    Builds the buildDomTree.js tree schema from a CDP DOM snapshot.
+
+    Interactivity is derived with the same rules as the JavaScript walker, with
+    Chrome's own click listener detection (isClickable) as an additional signal.
+    Elements are indexed in document order and, like in the JavaScript walker,
+    their id is the HTML id or ``el-<index>``. The node budget is spent the same
+    way too: regular nodes stop at a soft limit and interactive elements may use
+    the reserved rest.
+    """
+
+    def __init__(self, snapshot: Dict[str, Any], ax_nodes: Optional[List[Dict[str, Any]]] = None,
+                 options: Optional[Dict[str, Any]] = None, viewport: Optional[Dict[str, int]] = None):
+        """
+        Initialize the tree builder.
+
+        Args:
+            snapshot: Result of DOMSnapshot.captureSnapshot
+            ax_nodes: Nodes returned by Accessibility.getFullAXTree
+            options: DOM extraction options (same keys as extractDomTree)
+            viewport: Viewport size with width and height, used for viewport-only extraction
+        """
+        options = options or {}
+        self.strings = snapshot.get("strings", [])
+        self.documents = [
+            _SnapshotDocument(document, self.strings)
+            for document in snapshot.get("documents", [])
+        ]
+        self.include_text = options.get("includeText", True)
+        self.include_attributes = options.get("includeAttributes", True)
+        self.include_position = options.get("includePosition", True)
+        self.include_visibility = options.get("includeVisibility", True)
+        self.include_accessibility = options.get("includeAccessibility", True)
+        self.attribute_filter = options.get("attributeFilter") or []
+        self.max_depth = options.get("maxDepth") or 25
+        self.max_text_length = options.get("maxTextLength") or 150
+        self.max_nodes = options.get("maxNodes") or 0
+        interactive_reserve = options.get("interactiveReserve")
+        self.interactive_reserve = 0.25 if interactive_reserve is None else interactive_reserve
+        self.viewport_only = bool(options.get("viewportOnly", False)) and viewport is not None
+        self.viewport_margin = options.get("viewportMargin", 200)
+        self.viewport = viewport or {}
+
+        self.ax_info: Dict[int, Dict[str, str]] = {}
+        for ax_node in ax_nodes or []:
+            backend_id = ax_node.get("backendDOMNodeId")
+            if backend_id is None or ax_node.get("ignored"):
+                continue
+            info = {}
+            role = (ax_node.get("role") or {}).get("value")
+            name = (ax_node.get("name") or {}).get("value")
+            if role:
+                info["computedRole"] = role
+            if name:
+                info["computedName"] = name
+            if info:
+                self.ax_info[backend_id] = info
+
+        self.interactive_elements = {"clickable": [], "inputs": [], "forms": [], "navigational": []}
+        self.truncation = {
+            "nodeCount": 0,
+            "budgetExhausted": False,
+            "droppedByBudget": 0,
+            "prunedOffscreen": 0,
+            "depthLimited": 0
+        }
+
+        # Node budget: regular nodes stop at the soft limit, interactive elements may use the rest
+        self.hard_limit = self.max_nodes if self.max_nodes > 0 else math.inf
+        self.soft_limit = (
+            max(1, math.floor(self.max_nodes * (1 - self.interactive_reserve))) if self.max_nodes > 0 else math.inf
+        )
+        self.walk_aborted = False
+        # Next element index of each document
+        self.next_index: Dict[int, int] = {}
+
+    def build(self) -> Dict[str, Any]:
+        """
+        Build the DOM tree for the main document, with frame documents attached under their iframes.
+
+        Returns:
+            The extracted DOM tree structure
+        """
+        main = self.documents[0] if self.documents else None
+        tree = self._build_document(0) if main else None
+
+        return {
+            "url": main.url if main else "",
+            "title": main.title if main else "",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "tree": tree,
+            "interactiveElements": self.interactive_elements,
+            "backend": "snapshot",
+            "truncation": {
+                "truncated": (
+                    self.truncation["budgetExhausted"] or
+                    self.truncation["prunedOffscreen"] > 0 or
+                    self.truncation["depthLimited"] > 0
+                ),
+                "maxNodes": self.max_nodes,
+                "viewportOnly": self.viewport_only,
+                **self.truncation
+            }
+        }
+
+    def _build_document(self, document_index: int) -> Optional[Dict[str, Any]]:
+        """Build the tree of one snapshot document, starting from its body element."""
+        document = self.documents[document_index]
+        body = document.find_body()
+        if body is None:
+            return None
+
+        root = self._build_element(document_index, body, "/html/body", False, False, is_root=True)
+        if root is None:
+            return None
+
+        # Iterative walk: (node index, depth, output list, positional xpath, in form, in shadow root)
+        stack = [(child, 1, root["children"], "/html/body", False, False)
+                 for child in reversed(document.children.get(body, []))]
+        self._assign_xpath_segments(document, body, "/html/body", stack)
+
+        while stack and not self.walk_aborted:
+            index, depth, output, path, in_form, in_shadow = stack.pop()
+            node_type = document.node_type[index]
+
+            if depth > self.max_depth:
+                self.truncation["depthLimited"] += 1
+                continue
+
+            if node_type == TEXT_NODE:
+                text = document.string(document.node_value[index]).strip()
+                if text and self.include_text and self._has_budget_for(False):
+                    self.truncation["nodeCount"] += 1
+                    output.append({"type": "text", "content": self._truncate(text)})
+                continue
+
+            if node_type == DOCUMENT_FRAGMENT_NODE:
+                # Shadow roots show up as fragments below their host
+                shadow = in_shadow or index in document.shadow_root_type
+                children = document.children.get(index, [])
+                frames = [(child, depth, output, path, in_form, shadow) for child in reversed(children)]
+                self._assign_xpath_segments(document, index, path, frames)
+                stack.extend(frames)
+                continue
+
+            if node_type != ELEMENT_NODE:
+                continue
+
+            element = self._build_element(document_index, index, path, in_form, in_shadow)
+            if element is None:
+                continue
+            child_in_form = in_form or document.tag_name(index) == "form"
+
+            if element is _DROPPED_BY_BUDGET:
+                # Keep walking so interactive descendants can still use the reserved budget
+                children = [
+                    (child, depth + 1, output, path, child_in_form, in_shadow)
+                    for child in reversed(document.children.get(index, []))
+                ]
+                self._assign_xpath_segments(document, index, path, children)
+                stack.extend(children)
+                continue
+            output.append(element)
+
+            if index in document.content_document:
+                frame_tree = self._build_document(document.content_document[index])
+                if frame_tree is not None:
+                    frame_tree["frameId"] = f"frame-{document.content_document[index]}"
+                    element["children"].append(frame_tree)
+
+            children = [
+                (child, depth + 1, element["children"], element["_path"], child_in_form, in_shadow)
+                for child in reversed(document.children.get(index, []))
+            ]
+            self._assign_xpath_segments(document, index, element["_path"], children)
+            stack.extend(children)
+
+        self._strip_paths(root)
+        return root
+
+    def _assign_xpath_segments(self, document: _SnapshotDocument, parent: int, parent_path: str,
+                               entries: List[tuple]) -> None:
+        """Replace the parent path of queued children with their positional xpath."""
+        element_children = [
+            child for child in document.children.get(parent, [])
+            if document.node_type[child] == ELEMENT_NODE
+        ]
+        tag_totals: Dict[str, int] = {}
+        for child in element_children:
+            tag = document.tag_name(child)
+            tag_totals[tag] = tag_totals.get(tag, 0) + 1
+
+        positions: Dict[int, str] = {}
+        seen: Dict[str, int] = {}
+        for child in element_children:
+            tag = document.tag_name(child)
+            seen[tag] = seen.get(tag, 0) + 1
+            segment = f"{tag}[{seen[tag]}]" if tag_totals[tag] > 1 else tag
+            positions[child] = f"{parent_path}/{segment}"
+
+        for position, entry in enumerate(entries):
+            if entry[0] in positions:
+                entries[position] = (entry[0], entry[1], entry[2], positions[entry[0]], entry[4], entry[5])
+
+    def _has_budget_for(self, interactive: bool) -> bool:
+        """Check whether the node budget still has room for a node, counting the dropped ones."""
+        limit = self.hard_limit if interactive else self.soft_limit
+        if self.truncation["nodeCount"] < limit:
+            return True
+        self.truncation["budgetExhausted"] = True
+        self.truncation["droppedByBudget"] += 1
+        if self.truncation["nodeCount"] >= self.hard_limit:
+            self.walk_aborted = True
+        return False
+
+    def _build_element(self, document_index: int, index: int, path: str,
+                       in_form: bool, in_shadow: bool, is_root: bool = False) -> Any:
+        """
+        Build the representation of a single element.
+
+        Returns None if the element and its subtree should be skipped, and
+        _DROPPED_BY_BUDGET if only the element is left out because of the node budget.
+        """
+        document = self.documents[document_index]
+        tag_name = document.tag_name(index)
+        if tag_name in SKIP_TAGS:
+            return None
+
+        style = document.computed_style(index)
+        bounds = document.bounds(index)
+        if self.include_visibility:
+            if style is None or bounds is None:
+                return None
+            if style.get("display") == "none" or style.get("visibility") == "hidden" or style.get("opacity") == "0":
+                return None
+            if bounds[2] <= 0 or bounds[3] <= 0:
+                return None
+
+        if self.viewport_only and bounds is not None and tag_name != "body" and not self._in_viewport(document, bounds):
+            self.truncation["prunedOffscreen"] += 1
+            return None
+
+        attributes = document.node_attributes(index)
+        reasons = self._interactive_reasons(tag_name, attributes, style or {}, in_form,
+                                            index in document.clickable)
+        if not is_root and not self._has_budget_for(bool(reasons)):
+            return _DROPPED_BY_BUDGET
+        self.truncation["nodeCount"] += 1
+
+        local_index = self.next_index.get(document_index, 0)
+        self.next_index[document_index] = local_index + 1
+        id_prefix = f"frame-{document_index}:" if document_index > 0 else ""
+        backend_id = document.backend_node_id[index] if index < len(document.backend_node_id) else index
+
+        element = {
+            "id": id_prefix + (attributes.get("id") or f"el-{local_index}"),
+            "index": document_index * FRAME_INDEX_STRIDE + local_index,
+            "backendNodeId": backend_id,
+            "type": "element",
+            "tagName": tag_name,
+            "attributes": self._filter_attributes(attributes),
+            "position": self._position(document, bounds),
+            "css_selector": self._selector(tag_name, attributes),
+            "xpath": None if in_shadow else (f'//*[@id="{attributes["id"]}"]' if attributes.get("id") else path),
+            "accessibility": self._accessibility(attributes, backend_id),
+            "children": [],
+            "_path": path
+        }
+        if in_shadow:
+            element["inShadowRoot"] = True
+
+        children = document.children.get(index, [])
+        if self.include_text and len(children) == 1 and document.node_type[children[0]] == TEXT_NODE:
+            text = document.string(document.node_value[children[0]]).strip()
+            if text:
+                element["textContent"] = self._truncate(text)
+
+        self._add_interactive_info(element, tag_name, reasons)
+        return element
+
+    def _interactive_reasons(self, tag_name: str, attributes: Dict[str, str], style: Dict[str, str],
+                             in_form: bool, has_click_listener: bool) -> Dict[str, List[str]]:
+        """Classify an element with the same rules as buildDomTree.js, returning the reasons by type."""
+        role = attributes.get("role")
+        classes = attributes.get("class", "").split()
+        html_id = attributes.get("id", "")
+        reasons: Dict[str, List[str]] = {}
+
+        click_reasons = []
+        if tag_name in ("a", "button"):
+            click_reasons.append(f"tag: {tag_name}")
+        if "onclick" in attributes:
+            click_reasons.append("has onclick handler")
+        if role in ("button", "link"):
+            click_reasons.append(f"role: {role}")
+        if style.get("cursor") == "pointer":
+            click_reasons.append("cursor: pointer")
+        if has_click_listener:
+            click_reasons.append("has click listener")
+        if (click_reasons or tag_name in CLICKABLE_TAGS or "onmousedown" in attributes or
+                role in CLICKABLE_ROLES or "btn" in classes or "button" in classes or
+                "btn" in html_id or "button" in html_id):
+            reasons["clickable"] = click_reasons
+
+        input_reasons = []
+        if tag_name in ("input", "textarea", "select"):
+            input_reasons.append(f"tag: {tag_name}")
+        if "contenteditable" in attributes:
+            input_reasons.append("contenteditable")
+        if role in ("textbox", "checkbox"):
+            input_reasons.append(f"role: {role}")
+        if tag_name == "input" and "type" in attributes:
+            input_reasons.append(f"input type: {attributes['type']}")
+        if (tag_name in INPUT_TAGS or role in INPUT_ROLES or
+                ("contenteditable" in attributes and attributes["contenteditable"] != "false")):
+            reasons["input"] = input_reasons
+
+        if tag_name == "form" or tag_name in FORM_TAGS or in_form:
+            form_reasons = []
+            if tag_name == "form":
+                form_reasons.append("tag: form")
+            if tag_name in FORM_TAGS:
+                form_reasons.append(f"tag: {tag_name}")
+            if in_form:
+                form_reasons.append("inside form element")
+            reasons["form"] = form_reasons
+
+        if tag_name in NAV_TAGS or role in NAV_ROLES or NAV_CLASSES.intersection(classes):
+            nav_reasons = []
+            if tag_name in NAV_TAGS:
+                nav_reasons.append(f"tag: {tag_name}")
+            if role in ("link", "menu"):
+                nav_reasons.append(f"role: {role}")
+            for class_name in classes:
+                if class_name in ("nav", "navbar", "menu"):
+                    nav_reasons.append(f"class: {class_name}")
+                    break
+            reasons["navigation"] = nav_reasons
+
+        return reasons
+
+    def _add_interactive_info(self, element: Dict[str, Any], tag_name: str,
+                              reasons: Dict[str, List[str]]) -> None:
+        """Mark an element as interactive and add it to the interactive element collections."""
+        if not reasons:
+            return
+
+        interactive_types = [t for t in ("clickable", "input", "form", "navigation") if t in reasons]
+        element["interactive"] = True
+        element["interactiveTypes"] = interactive_types
+        element["interactiveReasons"] = reasons
+
+        for interactive_type in interactive_types:
+            self.interactive_elements[INTERACTIVE_COLLECTIONS[interactive_type]].append({
+                "id": element["id"],
+                "tagName": tag_name,
+                "selector": element["css_selector"],
+                "xpath": element["xpath"],
+                "interactiveReasons": reasons.get(interactive_type, [])
+            })
+
+    def _filter_attributes(self, attributes: Dict[str, str]) -> Dict[str, str]:
+        if not self.include_attributes:
+            return {}
+        if not self.attribute_filter:
+            return attributes
+        return {name: value for name, value in attributes.items() if name in self.attribute_filter}
+
+    def _position(self, document: _SnapshotDocument, bounds: Optional[List[float]]) -> Optional[Dict[str, int]]:
+        if not self.include_position or not bounds:
+            return None
+        x, y, width, height = bounds[:4]
+        return {
+            "x": round(x),
+            "y": round(y),
+            "width": round(width),
+            "height": round(height),
+            "viewportX": round(x - document.scroll_x),
+            "viewportY": round(y - document.scroll_y)
+        }
+
+    def _in_viewport(self, document: _SnapshotDocument, bounds: List[float]) -> bool:
+        left = bounds[0] - document.scroll_x
+        top = bounds[1] - document.scroll_y
+        margin = self.viewport_margin
+        return (
+            top + bounds[3] >= -margin and
+            top <= self.viewport.get("height", 0) + margin and
+            left + bounds[2] >= -margin and
+            left <= self.viewport.get("width", 0) + margin
+        )
+
+    def _accessibility(self, attributes: Dict[str, str], backend_id: int) -> Optional[Dict[str, str]]:
+        if not self.include_accessibility:
+            return {}
+        accessibility = {name: attributes[name] for name in ACCESSIBILITY_ATTRIBUTES if name in attributes}
+        if "tabindex" in attributes:
+            accessibility["tabindex"] = attributes["tabindex"]
+        accessibility.update(self.ax_info.get(backend_id, {}))
+        return accessibility or None
+
+    def _selector(self, tag_name: str, attributes: Dict[str, str]) -> str:
+        """Generate a CSS selector the same way generateSelector does."""
+        if attributes.get("id"):
+            return f"{tag_name}#{attributes['id']}"
+        selector = tag_name + "".join(f".{c}" for c in attributes.get("class", "").split())
+        for attr in ("type", "name", "placeholder", "value"):
+            value = attributes.get(attr)
+            if attr in attributes and value and len(value) < 30:
+                selector += f'[{attr}="{value}"]'
+                break
+        return selector
+
+    def _truncate(self, text: str) -> str:
+        if len(text) > self.max_text_length:
+            return text[:self.max_text_length] + "..."
+        return text
+
+    def _strip_paths(self, root: Dict[str, Any]) -> None:
+        """Remove the internal positional paths from the built tree."""
+        for node in iter_elements(root):
+            node.pop("_path", None)
+
+
+def build_dom_tree_from_snapshot(snapshot: Dict[str, Any], ax_nodes: Optional[List[Dict[str, Any]]] = None,
+                                 options: Optional[Dict[str, Any]] = None,
+                                 viewport: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """
+    Convert a CDP DOM snapshot into the buildDomTree.js tree schema.
+
+    Args:
+        snapshot: Result of DOMSnapshot.captureSnapshot
+        ax_nodes: Nodes returned by Accessibility.getFullAXTree
+        options: DOM extraction options
+        viewport: Viewport size with width and height
+
+    Returns:
+        The extracted DOM tree structure
+    """
+    return SnapshotTreeBuilder(snapshot, ax_nodes, options, viewport).build()
@@ -0,0 +1,115 @@
+"""
+Assembly of DOM trees extracted in chunks.
+Rebuilds the nested tree structure from the node records produced by the
+chunked DOM extraction, one chunk at a time.
+"""
+from typing import Dict, Any, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE_CATEGORIES = ("clickable", "inputs", "forms", "navigational")
+
+
+class DOMTreeAssembler:
+    """
+    Incrementally rebuilds a DOM tree from streamed chunks.
+
+    The partial tree and the interactive element index are usable after every
+    chunk, so consumers can start working before the walk has finished.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty assembler.
+        """
+        self.url: Optional[str] = None
+        self.title: Optional[str] = None
+        self.timestamp: Optional[str] = None
+        self.tree: Optional[Dict[str, Any]] = None
+        self.interactive_elements: Dict[str, List[Dict[str, Any]]] = {
+            category: [] for category in INTERACTIVE_CATEGORIES
+        }
+        self.truncation: Optional[Dict[str, Any]] = None
+        self.node_count = 0
+        self.chunk_count = 0
+        self.done = False
+        self._elements: Dict[str, Dict[str, Any]] = {}
+        # Elements by their extraction index, which node records refer to their parent by
+        self._indexed: Dict[int, Dict[str, Any]] = {}
+
+    def add_chunk(self, chunk: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Add a chunk of node records to the tree.
+
+        Args:
+            chunk: A chunk produced by the chunked DOM extraction
+
+        Returns:
+            The nodes added by the chunk, in document order
+        """
+        if self.chunk_count == 0:
+            self.url = chunk.get("url")
+            self.title = chunk.get("title")
+            self.timestamp = chunk.get("timestamp")
+        self.chunk_count += 1
+
+        added = []
+        for record in chunk.get("nodes", []):
+            node = record["node"]
+            parent_index = record.get("parentIndex")
+
+            if parent_index is None:
+                self.tree = node
+            else:
+                parent = self._indexed.get(parent_index)
+                if parent is None:
+                    logger.warning(f"Dropping streamed node with unknown parent {parent_index}")
+                    continue
+                parent["children"].append(node)
+
+            if node.get("type") == "element":
+                node.setdefault("children", [])
+                self._elements.setdefault(node["id"], node)
+                if node.get("index") is not None:
+                    self._indexed[node["index"]] = node
+            added.append(node)
+
+        self.node_count += len(added)
+
+        for category, elements in (chunk.get("interactiveElements") or {}).items():
+            self.interactive_elements.setdefault(category, []).extend(elements)
+
+        if chunk.get("done"):
+            self.done = True
+            self.truncation = chunk.get("truncation")
+
+        return added
+
+    def get_element(self, element_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get an element received so far by its ID.
+
+        Args:
+            element_id: The element ID
+
+        Returns:
+            The element or None if it has not been received
+        """
+        return self._elements.get(element_id)
+
+    def result(self) -> Dict[str, Any]:
+        """
+        Get the assembled extraction result, in the same format as a single-pass extraction.
+
+        Returns:
+            The DOM tree structure assembled so far
+        """
+        return {
+            "url": self.url,
+            "title": self.title,
+            "timestamp": self.timestamp,
+            "tree": self.tree,
+            "interactiveElements": self.interactive_elements,
+            "truncation": self.truncation
+        }
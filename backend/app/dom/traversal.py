@@ -0,0 +1,154 @@
+"""
+Traversal primitives for extracted DOM trees.
+All traversals are iterative generators, so they work on arbitrarily deep trees
+without hitting the recursion limit and can be stopped early at no extra cost.
+"""
+from typing import Dict, Any, Iterator, Optional, Tuple, Callable
+from collections import deque
+import logging
+
+logger = logging.getLogger(__name__)
+
+Node = Dict[str, Any]
+
+
+def _children(node: Node, elements_only: bool) -> list:
+    """Get the children of a node that a traversal descends into."""
+    children = node.get("children")
+    if not children:
+        return []
+    if elements_only:
+        return [child for child in children if child and child.get("type") == "element"]
+    return [child for child in children if child]
+
+
+def _is_visited(node: Optional[Node], elements_only: bool) -> bool:
+    return bool(node) and (not elements_only or node.get("type") == "element")
+
+
+def iter_preorder(root: Optional[Node], max_depth: Optional[int] = None,
+                  elements_only: bool = False) -> Iterator[Tuple[Node, int]]:
+    """
+    Iterate over a tree in document order, parents before their children.
+
+    Args:
+        root: The root node
+        max_depth: Maximum depth to visit, relative to the root (None for unlimited)
+        elements_only: Only visit element nodes
+
+    Yields:
+        Tuples of (node, depth)
+    """
+    if not _is_visited(root, elements_only):
+        return
+
+    stack = [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        yield node, depth
+        if max_depth is None or depth < max_depth:
+            stack.extend((child, depth + 1) for child in reversed(_children(node, elements_only)))
+
+
+def iter_postorder(root: Optional[Node], max_depth: Optional[int] = None,
+                   elements_only: bool = False) -> Iterator[Tuple[Node, int]]:
+    """
+    Iterate over a tree with every node visited after all of its children.
+
+    Args:
+        root: The root node
+        max_depth: Maximum depth to visit, relative to the root (None for unlimited)
+        elements_only: Only visit element nodes
+
+    Yields:
+        Tuples of (node, depth)
+    """
+    for node, depth, leaving in iter_events(root, max_depth, elements_only):
+        if leaving:
+            yield node, depth
+
+
+def iter_bfs(root: Optional[Node], max_depth: Optional[int] = None,
+             elements_only: bool = False) -> Iterator[Tuple[Node, int]]:
+    """
+    Iterate over a tree level by level.
+
+    Args:
+        root: The root node
+        max_depth: Maximum depth to visit, relative to the root (None for unlimited)
+        elements_only: Only visit element nodes
+
+    Yields:
+        Tuples of (node, depth)
+    """
+    if not _is_visited(root, elements_only):
+        return
+
+    queue = deque([(root, 0)])
+    while queue:
+        node, depth = queue.popleft()
+        yield node, depth
+        if max_depth is None or depth < max_depth:
+            queue.extend((child, depth + 1) for child in _children(node, elements_only))
+
+
+def iter_events(root: Optional[Node], max_depth: Optional[int] = None,
+                elements_only: bool = False) -> Iterator[Tuple[Node, int, bool]]:
+    """
+    Iterate over enter and leave events of a depth-first traversal.
+
+    Every node is entered in document order and left after all of its children
+    have been entered and left.
+
+    Args:
+        root: The root node
+        max_depth: Maximum depth to visit, relative to the root (None for unlimited)
+        elements_only: Only visit element nodes
+
+    Yields:
+        Tuples of (node, depth, leaving)
+    """
+    if not _is_visited(root, elements_only):
+        return
+
+    stack = [(root, 0, False)]
+    while stack:
+        node, depth, leaving = stack.pop()
+        yield node, depth, leaving
+        if leaving:
+            continue
+
+        stack.append((node, depth, True))
+        if max_depth is None or depth < max_depth:
+            stack.extend((child, depth + 1, False) for child in reversed(_children(node, elements_only)))
+
+
+def iter_elements(root: Optional[Node]) -> Iterator[Node]:
+    """
+    Iterate over the elements of a tree in document order.
+
+    Args:
+        root: The root node
+
+    Yields:
+        Element nodes
+    """
+    for node, _ in iter_preorder(root, elements_only=True):
+        yield node
+
+
+def find_first(root: Optional[Node], predicate: Callable[[Node], bool]) -> Optional[Node]:
+    """
+    Find the first node in document order that matches a predicate.
+
+    Args:
+        root: The root node
+        predicate: Function called with each node
+
+    Returns:
+        The first matching node, or None if there is none
+    """
+    for node, _ in iter_preorder(root):
+        if predicate(node):
+            return node
+    return None
@@ -0,0 +1,264 @@
+"""
+Indexed DOM tree representation.
+Wraps an extracted DOM tree with lookup tables that are built in a single pass,
+so queries by id, tag, class, attribute or ancestry do not re-walk the tree.
+"""
+from typing import Dict, Any, List, Optional
+from collections import Counter
+import itertools
+import logging
+
+from app.dom.node import DOMNode, compact_tree
+from app.dom.traversal import iter_events
+
+logger = logging.getLogger(__name__)
+
+# Source of tree versions; every index built gets a new version
+_tree_versions = itertools.count(1)
+
+
+class DOMTreeIndex:
+    """
+    Lookup tables over the elements of a DOM tree.
+
+    Elements are indexed in document order. Parents are keyed by the identity of
+    the node dict, since element ids are not guaranteed to be unique. The index
+    assumes the tree is not modified after it has been built; each index gets a
+    process-unique ``version`` that caches of derived lookups can be keyed by.
+    """
+
+    def __init__(self, root: Optional[Dict[str, Any]]):
+        """
+        Build the index for a tree.
+
+        Args:
+            root: The root node of the DOM tree
+        """
+        self.root = root
+        self.version = next(_tree_versions)
+        self.elements: List[Dict[str, Any]] = []
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.by_tag: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_class: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_attribute: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_xpath: Dict[str, Dict[str, Any]] = {}
+        self.by_css_selector: Dict[str, List[Dict[str, Any]]] = {}
+        self.tag_counts: Counter = Counter()
+        self._parents: Dict[int, Dict[str, Any]] = {}
+        self._positions: Dict[int, int] = {}
+        self._subtree_ends: Dict[int, int] = {}
+        self._element_children: Dict[int, List[Dict[str, Any]]] = {}
+        self._child_positions: Dict[int, int] = {}
+        self._build()
+
+    def _build(self) -> None:
+        """Walk the tree once in document order and fill the lookup tables."""
+        if not self.root:
+            return
+
+        self._child_positions[id(self.root)] = 0
+
+        # The current path from the root; the last entry is the parent of entered elements
+        path: List[Dict[str, Any]] = []
+        for node, _, leaving in iter_events(self.root, elements_only=True):
+            if leaving:
+                path.pop()
+                self._subtree_ends[id(node)] = len(self.elements)
+                continue
+
+            self._add_element(node, path[-1] if path else None)
+
+            element_children = [
+                child for child in node.get("children") or []
+                if child and child.get("type") == "element"
+            ]
+            self._element_children[id(node)] = element_children
+            for position, child in enumerate(element_children):
+                self._child_positions[id(child)] = position
+
+            path.append(node)
+
+    def _add_element(self, node: Dict[str, Any], parent: Optional[Dict[str, Any]]) -> None:
+        """Add a single element to the lookup tables."""
+        self._positions[id(node)] = len(self.elements)
+        self.elements.append(node)
+        if parent is not None:
+            self._parents[id(node)] = parent
+
+        element_id = node.get("id")
+        if element_id and element_id not in self.by_id:
+            self.by_id[element_id] = node
+
+        tag_name = node.get("tagName")
+        if tag_name:
+            self.tag_counts[tag_name] += 1
+            self.by_tag.setdefault(tag_name.lower(), []).append(node)
+
+        attributes = node.get("attributes") or {}
+        for attr_name in attributes:
+            self.by_attribute.setdefault(attr_name, []).append(node)
+        class_attr = attributes.get("class")
+        if class_attr:
+            for class_name in set(class_attr.split()):
+                self.by_class.setdefault(class_name, []).append(node)
+
+        xpath = node.get("xpath")
+        if xpath and xpath not in self.by_xpath:
+            self.by_xpath[xpath] = node
+
+        css_selector = node.get("css_selector")
+        if css_selector:
+            self.by_css_selector.setdefault(css_selector, []).append(node)
+
+    def get_by_id(self, element_id: str) -> Optional[Dict[str, Any]]:
+        """Get the first element with the given ID in document order."""
+        return self.by_id.get(element_id)
+
+    def get_by_tag(self, tag_name: str) -> List[Dict[str, Any]]:
+        """Get the elements with the given tag name, in document order."""
+        return list(self.by_tag.get(tag_name.lower(), []))
+
+    def get_by_class(self, class_name: str) -> List[Dict[str, Any]]:
+        """Get the elements with the given class, in document order."""
+        return list(self.by_class.get(class_name, []))
+
+    def get_by_attribute(self, attr_name: str, attr_value: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get the elements that have an attribute, optionally with a specific value.
+
+        Args:
+            attr_name: The attribute name
+            attr_value: The attribute value to match, or None to match any value
+
+        Returns:
+            The matching elements, in document order
+        """
+        elements = self.by_attribute.get(attr_name, [])
+        if attr_value is None:
+            return list(elements)
+        return [element for element in elements if element["attributes"].get(attr_name) == attr_value]
+
+    def get_parent(self, node: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Get the parent element of an element."""
+        return self._parents.get(id(node))
+
+    def get_element_children(self, node: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Get the child elements of an element, in document order."""
+        return self._element_children.get(id(node), [])
+
+    def get_siblings(self, node: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Get the elements sharing the parent of an element, including the element itself."""
+        parent = self._parents.get(id(node))
+        if parent is None:
+            return [node] if id(node) in self._positions else []
+        return self._element_children[id(parent)]
+
+    def get_sibling_position(self, node: Dict[str, Any]) -> int:
+        """Get the zero-based position of an element among its sibling elements."""
+        return self._child_positions.get(id(node), 0)
+
+    def get_position(self, node: Dict[str, Any]) -> int:
+        """Get the position of an element in document order."""
+        return self._positions[id(node)]
+
+    def get_ancestry_path(self, node: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Get the elements from the root down to an element.
+
+        Args:
+            node: An element of the tree
+
+        Returns:
+            The path from the root to the element (inclusive), or an empty list if the
+            element is not part of the tree
+        """
+        if id(node) not in self._positions:
+            return []
+
+        path = [node]
+        parent = self._parents.get(id(node))
+        while parent is not None:
+            path.append(parent)
+            parent = self._parents.get(id(parent))
+        path.reverse()
+        return path
+
+    def get_descendants(self, node: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Get the descendant elements of an element, in document order.
+
+        Args:
+            node: An element of the tree
+
+        Returns:
+            The descendant elements, excluding the element itself
+        """
+        position = self._positions.get(id(node))
+        if position is None:
+            return []
+        return self.elements[position + 1:self._subtree_ends[id(node)]]
+
+    def contains(self, node: Dict[str, Any]) -> bool:
+        """Check whether an element is part of the indexed tree."""
+        return id(node) in self._positions
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+
+class DOMTree(dict):
+    """
+    An extraction result with a lazily built element index.
+
+    Behaves exactly like the plain result dictionary, so it can be serialized and
+    passed around unchanged. The index is built on first access; call ``reindex``
+    after modifying the tree in place.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._index: Optional[DOMTreeIndex] = None
+
+    @property
+    def index(self) -> DOMTreeIndex:
+        """The element index of the tree."""
+        if self._index is None or self._index.root is not self.get("tree"):
+            self._index = DOMTreeIndex(self.get("tree"))
+        return self._index
+
+    @property
+    def version(self) -> int:
+        """The version of the tree, which changes whenever the index is rebuilt."""
+        return self.index.version
+
+    def compact(self) -> "DOMTree":
+        """
+        Convert the nodes of the tree into compact nodes, see app.dom.node.DOMNode.
+
+        Returns:
+            The tree itself
+        """
+        self["tree"] = compact_tree(self.get("tree"))
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the tree back to the plain extraction result.
+
+        Returns:
+            The extraction result with all nodes as dictionaries
+        """
+        result = dict(self)
+        if isinstance(result.get("tree"), DOMNode):
+            result["tree"] = result["tree"].to_dict()
+        return result
+
+    def reindex(self) -> DOMTreeIndex:
+        """
+        Rebuild the element index after the tree has been modified.
+
+        Returns:
+            The new element index
+        """
+        self._index = None
+        return self.index
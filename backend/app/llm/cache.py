@@ -0,0 +1,273 @@
+"""
+Cache of LLM responses for planning calls.
+Planning prompts repeat: the system prompt is fixed and recurring tasks send the
+same task text and similar page context. Responses are keyed by a fingerprint of
+the model, the system prompt and the normalized task and compacted page state,
+kept in memory with a time-to-live and optionally persisted to a SQLite file so
+they survive restarts.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from app.core.config import settings
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+_SPACE_PATTERN = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    """Collapse the whitespace of a prompt text, which varies with indentation but not in meaning."""
+    return _SPACE_PATTERN.sub(" ", text).strip()
+
+
+def prompt_fingerprint(model: str,
+                       system_prompt: str,
+                       user_input: str,
+                       conversation_history: Optional[List[Dict[str, str]]] = None) -> str:
+    """
+    Compute the cache key of a prompt.
+
+    Args:
+        model: The name of the language model
+        system_prompt: The system prompt
+        user_input: The user input, including any page context
+        conversation_history: The previous messages of the conversation
+
+    Returns:
+        The hex digest identifying the prompt
+    """
+    key = {
+        "model": model,
+        "system": hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+        "input": _normalize(user_input),
+        "history": [
+            [message.get("role"), _normalize(message.get("content", ""))]
+            for message in conversation_history or []
+        ]
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def compact_page_state(page_state: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Reduce a page state to what identifies the page for planning.
+
+    Args:
+        page_state: The page state given to the planner
+
+    Returns:
+        Dictionary with the URL without its fragment, the title, and the type and
+        truncated text of each element
+    """
+    page_state = page_state or {}
+    return {
+        "url": str(page_state.get("url", "")).split("#", 1)[0],
+        "title": _normalize(str(page_state.get("title", ""))),
+        "elements": [
+            [element.get("type", "unknown"), _normalize(str(element.get("text", ""))[:50])]
+            for element in page_state.get("elements") or []
+        ]
+    }
+
+
+def planning_cache_input(kind: str, task: str, page_state: Optional[Dict[str, Any]] = None,
+                         **context: Any) -> str:
+    """
+    Build the text identifying a planning call in the response cache.
+
+    The conversation history is left out, so the same task on the same page
+    is answered from the cache whatever ran before it.
+
+    Args:
+        kind: The kind of planning call
+        task: The task text
+        page_state: The page state given to the planner
+        **context: Any other input the response depends on
+
+    Returns:
+        The cache input of the call
+    """
+    key = {"kind": kind, "task": _normalize(task), "page": compact_page_state(page_state), "context": context}
+    return json.dumps(key, sort_keys=True)
+
+
+class LLMResponseCache:
+    """
+    Size-bounded LLM response cache with a time-to-live and an optional on-disk backend.
+
+    The most recently used responses are kept in memory. With a path, every
+    response is also written to a SQLite database, which is consulted on memory
+    misses and trimmed to the same size.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 3600.0, path: Optional[str] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of responses kept
+            ttl: Maximum age of a cached response in seconds (0 for no limit)
+            path: Optional path of the SQLite database persisting the responses
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+        if path:
+            self._open(path)
+
+    def _open(self, path: str) -> None:
+        """Open the on-disk backend, falling back to memory only if it is unavailable."""
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not open the LLM response cache at {path}, caching in memory only: {str(e)}")
+            self._db = None
+
+    def _is_expired(self, created_at: float) -> bool:
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Get a cached response.
+
+        Args:
+            key: The prompt fingerprint
+
+        Returns:
+            The cached response, or None on a miss
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            response, created_at = entry
+            if not self._is_expired(created_at):
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return response
+            self.expired += 1
+            del self._entries[key]
+            self._delete(key)
+        elif self._db is not None:
+            row = self._db.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                response, created_at = row
+                if not self._is_expired(created_at):
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._remember(key, response, created_at)
+                    return response
+                self.expired += 1
+                self._delete(key)
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, response: str) -> None:
+        """
+        Store a response.
+
+        Args:
+            key: The prompt fingerprint
+            response: The response text
+        """
+        created_at = time.time()
+        self._remember(key, response, created_at)
+        if self._db is not None:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created_at) VALUES (?, ?, ?)",
+                    (key, response, created_at)
+                )
+                # Keep the newest responses, like the memory cache
+                self._db.execute(
+                    "DELETE FROM responses WHERE key NOT IN "
+                    "(SELECT key FROM responses ORDER BY created_at DESC LIMIT ?)",
+                    (self.maxsize,)
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not persist LLM response: {str(e)}")
+
+    def _remember(self, key: str, response: str, created_at: float) -> None:
+        self._entries[key] = (response, created_at)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _delete(self, key: str) -> None:
+        if self._db is not None:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+
+    def invalidate(self) -> int:
+        """
+        Drop all cached responses, in memory and on disk.
+
+        Returns:
+            The number of responses dropped from memory
+        """
+        dropped = len(self._entries)
+        self._entries.clear()
+        if self._db is not None:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the cache statistics.
+
+        Returns:
+            Dictionary with the size, limits and hit/miss counters
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "path": self.path if self._db is not None else None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Create a singleton instance
+llm_response_cache = LLMResponseCache(
+    maxsize=settings.LLM_CACHE_SIZE,
+    ttl=settings.LLM_CACHE_TTL,
+    path=settings.LLM_CACHE_PATH
+)
@@ -0,0 +1,193 @@
+"""
+Record and replay of LLM traffic.
+In record mode every request and response of LLMService is appended to a JSON
+lines log with its prompt fingerprint, messages, output, latency and token
+usage. In replay mode requests are answered from that log, so recorded task
+traces can be run again for regression and performance testing without live
+model calls. The recorded latencies tell how much of the end-to-end time of a
+trace was spent waiting for the model.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
+
+from app.core.config import settings
+from app.llm.cache import prompt_fingerprint
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ("record", "replay")
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode for a request that was not recorded."""
+    pass
+
+
+def request_fingerprint(system_prompt: str,
+                        user_input: str,
+                        conversation_history: Optional[List[Dict[str, str]]] = None) -> str:
+    """
+    Compute the cassette key of a request.
+
+    The model is not part of the key, so recordings replay whatever provider is configured.
+
+    Args:
+        system_prompt: The system prompt
+        user_input: The user input
+        conversation_history: The previous messages of the conversation
+
+    Returns:
+        The hex digest identifying the request
+    """
+    return prompt_fingerprint("", system_prompt, user_input, conversation_history)
+
+
+class LLMCassette:
+    """
+    Append-only log of LLM requests and responses.
+    """
+
+    def __init__(self, path: str, mode: Optional[str] = None):
+        """
+        Initialize the cassette.
+
+        Args:
+            path: Path of the JSON lines log
+            mode: "record", "replay", or None to neither record nor replay
+        """
+        if mode is not None and mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}. Expected one of: {', '.join(CASSETTE_MODES)}")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        # Recorded responses by request key, in recording order
+        self._entries: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        # Number of responses replayed by request key, so repeated requests replay in order
+        self._replayed: Dict[str, int] = defaultdict(int)
+        self._stats = {
+            "recorded": 0,
+            "replayed": 0,
+            "misses": 0,
+            "recorded_model_time": 0.0,
+            "replayed_model_time": 0.0
+        }
+        if mode == "replay":
+            self._load()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self) -> None:
+        """Read the recorded responses."""
+        if not os.path.exists(self.path):
+            logger.warning(f"LLM cassette {self.path} does not exist, every request will miss")
+            return
+        count = 0
+        with open(self.path, "r") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A trace interrupted while recording ends with a partial line
+                    logger.warning(f"Skipping invalid line {line_number} of LLM cassette {self.path}")
+                    continue
+                self._entries[entry["key"]].append(entry)
+                count += 1
+        logger.info(f"Loaded {count} recorded LLM responses from {self.path}")
+
+    def record(self,
+               key: str,
+               messages: List[Dict[str, str]],
+               output: str,
+               latency: float,
+               model: str,
+               token_usage: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Append a request and its response to the log.
+
+        Args:
+            key: The request key
+            messages: The messages of the request, as role and content
+            output: The response text
+            latency: The model latency in seconds
+            model: The model that answered
+            token_usage: The token usage reported by the provider
+        """
+        entry = {
+            "key": key,
+            "timestamp": time.time(),
+            "model": model,
+            "messages": messages,
+            "output": output,
+            "latency": latency,
+            "token_usage": token_usage or {}
+        }
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(line)
+            self._stats["recorded"] += 1
+            self._stats["recorded_model_time"] += latency
+
+    def replay(self, key: str) -> Dict[str, Any]:
+        """
+        Get the recorded response of a request.
+
+        A request recorded several times replays its responses in recording order,
+        and the last one once they are used up.
+
+        Args:
+            key: The request key
+
+        Returns:
+            The recorded entry
+
+        Raises:
+            CassetteMissError: If the request was not recorded
+        """
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self._stats["misses"] += 1
+                raise CassetteMissError(f"No recorded LLM response for request {key[:12]} in {self.path}")
+            entry = entries[min(self._replayed[key], len(entries) - 1)]
+            self._replayed[key] += 1
+            self._stats["replayed"] += 1
+            self._stats["replayed_model_time"] += entry.get("latency", 0.0)
+            return entry
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the cassette statistics.
+
+        Returns:
+            Dictionary with the mode, recorded and replayed counts, and the model time
+            spent while recording and saved while replaying
+        """
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "path": self.path,
+                "entries": sum(len(entries) for entries in self._entries.values()),
+                **self._stats
+            }
+
+
+# Create a singleton instance
+llm_cassette = LLMCassette(settings.LLM_CASSETTE_PATH, settings.LLM_CASSETTE_MODE)
@@ -0,0 +1,309 @@
+"""
+Process-wide client layer for language model calls.
+Chat models are created once per provider and model and shared by every
+LLMService, so their HTTP connection pools are shared too. Calls go through a
+limiter per provider and model: a semaphore bounds the concurrent requests, a
+token bucket bounds the request rate, and retryable errors (rate limits,
+overload, timeouts) are retried with jittered exponential backoff. The time a
+call waits for the limiter is reported separately from the model latency.
+"""
+import asyncio
+import logging
+import random
+import time
+import weakref
+from typing import Dict, Any, Callable, Awaitable, AsyncIterator, Tuple, TypeVar
+
+from app.core.config import settings
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# HTTP status codes worth retrying
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Exception class names of retryable provider errors, for errors without a status code
+RETRYABLE_ERROR_NAMES = ("RateLimit", "Overloaded", "Timeout", "APIConnection", "ServiceUnavailable", "InternalServer")
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Check whether a failed model call is worth retrying.
+
+    Args:
+        error: The exception raised by the call
+
+    Returns:
+        Whether the error is transient
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status_code, int):
+        return status_code in RETRYABLE_STATUS_CODES
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    return any(name in type(error).__name__ for name in RETRYABLE_ERROR_NAMES)
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter: ``rate`` requests per second with bursts of up to ``capacity``.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initialize the bucket, full.
+
+        Args:
+            rate: Tokens added per second (0 for no limit)
+            capacity: Maximum number of tokens
+        """
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> float:
+        """
+        Take a token, waiting until one is available.
+
+        Returns:
+            The time waited in seconds
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            self._refill()
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return waited
+            delay = (1.0 - self._tokens) / self.rate
+            await asyncio.sleep(delay)
+            waited += delay
+
+
+class _ModelLimiter:
+    """Limits and statistics of the calls to one provider and model."""
+
+    def __init__(self, max_concurrency: int, rate: float, burst: float):
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(rate, burst)
+        # Semaphores are bound to the event loop they are first used in
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self.calls = 0
+        self.retries = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    def record(self, queue_wait: float, latency: float) -> None:
+        self.calls += 1
+        self.queue_wait_total += queue_wait
+        self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "rate_per_second": self.bucket.rate,
+            "queue_wait_avg": self.queue_wait_total / self.calls if self.calls else 0.0,
+            "queue_wait_max": self.queue_wait_max,
+            "latency_avg": self.latency_total / self.calls if self.calls else 0.0,
+            "latency_max": self.latency_max
+        }
+
+
+class LLMClientPool:
+    """
+    Shared chat models and per-model call limits for the whole process.
+    """
+
+    def __init__(self,
+                 max_concurrency: int = 4,
+                 requests_per_minute: float = 60.0,
+                 burst: float = 5.0,
+                 max_retries: int = 3,
+                 retry_base_delay: float = 1.0,
+                 retry_max_delay: float = 30.0):
+        """
+        Initialize the pool.
+
+        Args:
+            max_concurrency: Maximum number of concurrent calls per provider and model
+            requests_per_minute: Maximum request rate per provider and model (0 for no limit)
+            burst: Number of requests that may be sent at once before the rate applies
+            max_retries: Maximum number of retries of a call failing with a retryable error
+            retry_base_delay: Backoff before the first retry in seconds, doubled on each retry
+            retry_max_delay: Maximum backoff in seconds
+        """
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._models: Dict[Tuple[str, str], Any] = {}
+        self._limiters: Dict[Tuple[str, str], _ModelLimiter] = {}
+
+    def get_model(self, provider: str, model_name: str, factory: Callable[[], Any]) -> Any:
+        """
+        Get the shared chat model of a provider and model, creating it on first use.
+
+        Args:
+            provider: The model provider
+            model_name: The model name
+            factory: Function creating the chat model
+
+        Returns:
+            The shared chat model
+        """
+        key = (provider, model_name)
+        model = self._models.get(key)
+        if model is None:
+            logger.info(f"Creating shared {provider} client for {model_name}")
+            model = self._models[key] = factory()
+        return model
+
+    def _limiter(self, provider: str, model_name: str) -> _ModelLimiter:
+        key = (provider, model_name)
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = self._limiters[key] = _ModelLimiter(
+                self.max_concurrency, self.requests_per_minute / 60.0, self.burst
+            )
+        return limiter
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff, so clients retrying together spread out."""
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt)))
+
+    async def call(self, provider: str, model_name: str, request: Callable[[], Awaitable[T]]) -> T:
+        """
+        Make a model call within the limits of its provider and model.
+
+        Args:
+            provider: The model provider
+            model_name: The model name
+            request: Function starting the call; called again for each retry
+
+        Returns:
+            The result of the call
+        """
+        limiter = self._limiter(provider, model_name)
+        queued_at = time.monotonic()
+        async with limiter.semaphore():
+            limiter.in_flight += 1
+            try:
+                for attempt in range(self.max_retries + 1):
+                    await limiter.bucket.acquire()
+                    started_at = time.monotonic()
+                    try:
+                        result = await request()
+                    except Exception as e:
+                        if attempt >= self.max_retries or not is_retryable(e):
+                            limiter.errors += 1
+                            raise
+                        await self._retry(limiter, provider, model_name, attempt, e)
+                        continue
+
+                    queue_wait = started_at - queued_at
+                    latency = time.monotonic() - started_at
+                    limiter.record(queue_wait, latency)
+                    logger.debug(f"{provider}/{model_name} call took {latency:.3f}s after waiting {queue_wait:.3f}s")
+                    return result
+            finally:
+                limiter.in_flight -= 1
+
+    async def stream(self, provider: str, model_name: str,
+                     request: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Stream a model call within the limits of its provider and model.
+
+        The call is retried only until its first chunk has been received.
+
+        Args:
+            provider: The model provider
+            model_name: The model name
+            request: Function starting the streamed call; called again for each retry
+
+        Yields:
+            The chunks of the streamed call
+        """
+        limiter = self._limiter(provider, model_name)
+        queued_at = time.monotonic()
+        async with limiter.semaphore():
+            limiter.in_flight += 1
+            try:
+                for attempt in range(self.max_retries + 1):
+                    await limiter.bucket.acquire()
+                    started_at = time.monotonic()
+                    received = False
+                    try:
+                        async for chunk in request():
+                            received = True
+                            yield chunk
+                    except Exception as e:
+                        if received or attempt >= self.max_retries or not is_retryable(e):
+                            limiter.errors += 1
+                            raise
+                        await self._retry(limiter, provider, model_name, attempt, e)
+                        continue
+
+                    limiter.record(started_at - queued_at, time.monotonic() - started_at)
+                    return
+            finally:
+                limiter.in_flight -= 1
+
+    async def _retry(self, limiter: _ModelLimiter, provider: str, model_name: str,
+                     attempt: int, error: Exception) -> None:
+        limiter.retries += 1
+        delay = self._backoff(attempt)
+        logger.warning(f"{provider}/{model_name} call failed ({type(error).__name__}: {str(error)}), "
+                       f"retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the call statistics.
+
+        Returns:
+            Dictionary of statistics by "provider/model"
+        """
+        return {f"{provider}/{model_name}": limiter.stats()
+                for (provider, model_name), limiter in self._limiters.items()}
+
+
+# Create a singleton instance
+llm_client_pool = LLMClientPool(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+    burst=settings.LLM_RATE_LIMIT_BURST,
+    max_retries=settings.LLM_MAX_RETRIES,
+    retry_base_delay=settings.LLM_RETRY_BASE_DELAY,
+    retry_max_delay=settings.LLM_RETRY_MAX_DELAY
+)
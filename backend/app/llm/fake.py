@@ -0,0 +1,229 @@
+"""
+Offline stand-in for the chat models, for load testing the agent loop.
+Responses come from a local script file instead of a provider, after a
+simulated time to first token and at a simulated token throughput, so the
+orchestration overhead and the concurrency limits of the agent can be
+benchmarked without an API key or network access.
+
+A script is a JSON file with the responses, either as a list used in turn or as
+an object::
+
+    {
+        "responses": [
+            {"match": "search", "response": {"action": "go_to_url", "parameters": {"url": "https://example.com"}}},
+            {"response": "{\\"action\\": \\"done\\", \\"parameters\\": {}}"}
+        ],
+        "latency": {"distribution": "lognormal", "mean": 0.8, "stddev": 0.3},
+        "tokens_per_second": 50,
+        "seed": 1
+    }
+
+A response with a ``match`` regular expression answers the calls whose last
+message matches it; the other responses answer the remaining calls in turn.
+Responses that are not strings are sent as JSON, and entries without a
+"response" key are responses themselves.
+"""
+import asyncio
+import json
+import logging
+import math
+import random
+import re
+import time
+from typing import Dict, Any, List, Optional, AsyncIterator, Iterator
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.pydantic_v1 import PrivateAttr
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+# Response of calls not answered by the script
+DEFAULT_RESPONSE = json.dumps({"action": "done", "parameters": {}, "thought": "Scripted response"})
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+# Rough number of characters per token, as used for the token budget of the DOM serializer
+CHARS_PER_TOKEN = 4
+
+
+def count_tokens(text: str) -> int:
+    """Estimate the number of tokens of a text."""
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN)) if text else 0
+
+
+def sample_latency(spec: Dict[str, Any], rng: random.Random) -> float:
+    """
+    Draw a time to first token from a latency distribution.
+
+    Args:
+        spec: The distribution, with "distribution" (fixed, uniform, normal or lognormal)
+              and "mean" and "stddev", or "min" and "max" for uniform, in seconds
+        rng: The random number generator
+
+    Returns:
+        The latency in seconds, never negative
+    """
+    distribution = spec.get("distribution", "fixed")
+    mean = float(spec.get("mean", 0.0))
+    stddev = float(spec.get("stddev", 0.0))
+
+    if distribution == "fixed":
+        latency = mean
+    elif distribution == "uniform":
+        latency = rng.uniform(float(spec.get("min", 0.0)), float(spec.get("max", mean * 2)))
+    elif distribution == "normal":
+        latency = rng.gauss(mean, stddev)
+    elif distribution == "lognormal":
+        if mean <= 0:
+            return 0.0
+        # Parameters of the underlying normal distribution giving the requested mean and deviation
+        sigma = math.sqrt(math.log(1 + (stddev / mean) ** 2))
+        latency = rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+    else:
+        raise ValueError(f"Unknown latency distribution: {distribution}. "
+                         f"Expected one of: {', '.join(LATENCY_DISTRIBUTIONS)}")
+    return max(0.0, latency)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model answering with scripted responses after a simulated latency.
+    """
+
+    responses: List[Dict[str, Any]] = []
+    default_response: str = DEFAULT_RESPONSE
+    latency: Dict[str, Any] = {"distribution": "fixed", "mean": 0.0}
+    tokens_per_second: float = 0.0
+    seed: Optional[int] = None
+
+    _rng: random.Random = PrivateAttr()
+    _cursor: int = PrivateAttr(default=0)
+    _patterns: List[Optional["re.Pattern"]] = PrivateAttr()
+
+    def __init__(self, **kwargs: Any):
+        """
+        Initialize the model.
+
+        Args:
+            responses: Scripted responses, alone or in dictionaries with "response" and an optional "match"
+            default_response: Response of calls not answered by the script
+            latency: Distribution of the time to first token, see sample_latency
+            tokens_per_second: Simulated output throughput (0 to return the whole response at once)
+            seed: Seed of the latency random number generator
+        """
+        kwargs["responses"] = [
+            response if isinstance(response, dict) and "response" in response else {"response": response}
+            for response in kwargs.get("responses", [])
+        ]
+        super().__init__(**kwargs)
+        for response in self.responses:
+            if not isinstance(response["response"], str):
+                response["response"] = json.dumps(response["response"])
+        self._rng = random.Random(self.seed)
+        self._patterns = [re.compile(response["match"]) if response.get("match") else None
+                          for response in self.responses]
+
+    @classmethod
+    def from_file(cls, path: str, **overrides: Any) -> "FakeChatModel":
+        """
+        Create a model from a script file.
+
+        Args:
+            path: Path of the JSON script
+            overrides: Options replacing those of the script
+
+        Returns:
+            The scripted model
+        """
+        with open(path, "r") as f:
+            script = json.load(f)
+        if isinstance(script, list):
+            script = {"responses": script}
+        script.update(overrides)
+        logger.info(f"Loaded {len(script.get('responses', []))} scripted LLM responses from {path}")
+        return cls(**script)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _combine_llm_outputs(self, llm_outputs: List[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+        token_usage: Dict[str, int] = {}
+        for output in llm_outputs:
+            for key, value in (output or {}).get("token_usage", {}).items():
+                token_usage[key] = token_usage.get(key, 0) + value
+        return {"token_usage": token_usage, "model_name": "fake"}
+
+    def _select_response(self, messages: List[BaseMessage]) -> str:
+        """Get the scripted response of a call."""
+        last_message = messages[-1].content if messages else ""
+        if not isinstance(last_message, str):
+            last_message = json.dumps(last_message)
+
+        for response, pattern in zip(self.responses, self._patterns):
+            if pattern is not None and pattern.search(last_message):
+                return response["response"]
+
+        sequence = [response for response, pattern in zip(self.responses, self._patterns) if pattern is None]
+        if not sequence:
+            return self.default_response
+        response = sequence[self._cursor % len(sequence)]
+        self._cursor += 1
+        return response["response"]
+
+    def _plan_call(self, messages: List[BaseMessage]) -> Dict[str, Any]:
+        """Choose the response and the simulated timings of a call."""
+        text = self._select_response(messages)
+        completion_tokens = count_tokens(text)
+        prompt_tokens = sum(count_tokens(message.content if isinstance(message.content, str)
+                                         else json.dumps(message.content)) for message in messages)
+        return {
+            "text": text,
+            "latency": sample_latency(self.latency, self._rng),
+            "seconds_per_token": 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0,
+            "llm_output": {"token_usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }, "model_name": "fake"}
+        }
+
+    @staticmethod
+    def _chunks(text: str) -> List[str]:
+        """Split a response into stream chunks of about one token."""
+        return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        call = self._plan_call(messages)
+        time.sleep(call["latency"] + call["seconds_per_token"] * count_tokens(call["text"]))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=call["text"]))],
+                          llm_output=call["llm_output"])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        call = self._plan_call(messages)
+        await asyncio.sleep(call["latency"] + call["seconds_per_token"] * count_tokens(call["text"]))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=call["text"]))],
+                          llm_output=call["llm_output"])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        call = self._plan_call(messages)
+        time.sleep(call["latency"])
+        for chunk in self._chunks(call["text"]):
+            time.sleep(call["seconds_per_token"])
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        call = self._plan_call(messages)
+        await asyncio.sleep(call["latency"])
+        for chunk in self._chunks(call["text"]):
+            await asyncio.sleep(call["seconds_per_token"])
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
@@ -40,9 +40,13 @@ class LLMResponseParser:
         
         # LLM planning actions
         "plan_task": ["steps", "thought"],
-        "execute_step": ["step_index", "action", "parameters"]
+        "execute_step": ["step_index", "action", "parameters"],
+        "plan_actions": ["actions"]
     }
     
+    # Actions that plan other actions and cannot be part of an action plan
+    PLANNING_ACTIONS = ("plan_task", "execute_step", "plan_actions")
+    
     def __init__(self):
         """Initialize the LLM response parser."""
         logger.info("LLMResponseParser initialized")
@@ -71,7 +75,58 @@ class LLMResponseParser:
         except Exception as e:
             logger.error(f"Error parsing LLM response: {str(e)}")
             raise ActionValidationError(f"Failed to parse LLM response: {str(e)}")
-    
+
+    def parse_fields(self, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build an action plan from already parsed response fields.
+
+        Used for streamed responses, whose fields are parsed as they arrive.
+
+        Args:
+            fields: The top-level fields of the response JSON parsed so far
+
+        Returns:
+            Dictionary with the validated action plan
+
+        Raises:
+            ActionValidationError: If the fields do not form a valid action plan
+        """
+        action_plan = dict(fields)
+        if isinstance(action_plan.get("parameters"), dict):
+            action_plan["parameters"] = dict(action_plan["parameters"])
+        self._validate_action_plan(action_plan)
+        return action_plan
+
+    def confidence(self, response: str, expected_actions: Optional[List[str]] = None) -> float:
+        """
+        Score how far a response can be trusted as an action plan.
+
+        Used to escalate responses of the fast model to the main model.
+
+        Args:
+            response: The LLM response string
+            expected_actions: Optional actions the response should contain
+
+        Returns:
+            0 for responses that are not a valid action plan, up to 1 for a bare JSON
+            action plan with the expected action and a thought
+        """
+        try:
+            action_plan = self.parse_response(response)
+        except ActionValidationError:
+            return 0.0
+
+        score = 1.0
+        stripped = response.strip()
+        if not (stripped.startswith("{") and stripped.endswith("}")):
+            # The JSON had to be extracted from surrounding text
+            score -= 0.2
+        if not action_plan.get("thought"):
+            score -= 0.1
+        if expected_actions is not None and action_plan["action"] not in expected_actions:
+            score -= 0.5
+        return max(score, 0.0)
+
     def _extract_json(self, text: str) -> Dict[str, Any]:
         """
         Extract JSON from text, handling different formats that LLMs might output.
@@ -287,6 +342,32 @@ class LLMResponseParser:
             except ActionValidationError as e:
                 raise ActionValidationError(f"Invalid nested action in execute_step: {e}")
 
+        if action == "plan_actions":
+            actions = parameters.get("actions")
+            if not isinstance(actions, list) or not actions:
+                raise ActionValidationError(f"Invalid actions: {actions}, must be a non-empty list")
+            
+            for position, planned_action in enumerate(actions):
+                if not isinstance(planned_action, dict):
+                    raise ActionValidationError(f"Invalid action {position} in plan_actions: {planned_action}, must be a dictionary")
+                if planned_action.get("action") in self.PLANNING_ACTIONS:
+                    raise ActionValidationError(f"Invalid action {position} in plan_actions: {planned_action.get('action')} cannot be planned")
+                
+                expect = planned_action.get("expect")
+                if expect is not None and not isinstance(expect, dict):
+                    raise ActionValidationError(f"Invalid expect of action {position} in plan_actions: {expect}, must be a dictionary")
+                
+                # Validate the planned action, keeping any fixed parameters (like URL)
+                nested_action_plan = {
+                    "action": planned_action.get("action"),
+                    "parameters": dict(planned_action.get("parameters") or {})
+                }
+                try:
+                    self._validate_action_plan(nested_action_plan)
+                except ActionValidationError as e:
+                    raise ActionValidationError(f"Invalid action {position} in plan_actions: {e}")
+                planned_action["parameters"] = nested_action_plan["parameters"]
+
     def format_action_for_execution(self, action_plan: Dict[str, Any]) -> Dict[str, Any]:
         """
         Format an action plan for execution by the agent.
@@ -0,0 +1,90 @@
+"""
+Provider-side prompt prefix caching.
+Within a task, every call starts with the same system prompt (including the
+action catalog) and the same early conversation history; only the latest input
+changes. Providers can cache such a prefix and bill it at a reduced rate, as
+OpenAI does automatically for identical prefixes. This module records the
+cached-token counts reported by the providers.
+"""
+import logging
+from typing import Dict, Any, Optional
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+def extract_cache_usage(llm_output: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Get the prompt and cached token counts reported for a call.
+
+    Args:
+        llm_output: The provider output of the generation result
+
+    Returns:
+        Dictionary with prompt_tokens, cached_tokens and cache_write_tokens
+    """
+    llm_output = llm_output or {}
+    usage = llm_output.get("token_usage") or llm_output.get("usage") or {}
+    if not isinstance(usage, dict):
+        usage = getattr(usage, "__dict__", {})
+
+    # OpenAI reports cached tokens as part of the prompt tokens
+    details = usage.get("prompt_tokens_details") or {}
+    if not isinstance(details, dict):
+        details = getattr(details, "__dict__", {})
+    cached = details.get("cached_tokens") or 0
+    prompt = usage.get("prompt_tokens") or 0
+    cache_write = 0
+
+    # Anthropic reports cache reads and writes next to the uncached input tokens
+    if "input_tokens" in usage or "cache_read_input_tokens" in usage:
+        cached = usage.get("cache_read_input_tokens") or 0
+        cache_write = usage.get("cache_creation_input_tokens") or 0
+        prompt = (usage.get("input_tokens") or 0) + cached + cache_write
+
+    return {"prompt_tokens": prompt, "cached_tokens": cached, "cache_write_tokens": cache_write}
+
+
+class PromptCacheUsage:
+    """
+    Cached-token counters per provider and model.
+    """
+
+    def __init__(self):
+        """Initialize the counters."""
+        self._usage: Dict[str, Dict[str, int]] = {}
+
+    def record(self, provider: str, model_name: str, usage: Dict[str, int]) -> None:
+        """
+        Record the token counts of a call.
+
+        Args:
+            provider: The model provider
+            model_name: The model name
+            usage: Token counts as returned by extract_cache_usage
+        """
+        totals = self._usage.setdefault(f"{provider}/{model_name}", {
+            "calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0
+        })
+        totals["calls"] += 1
+        for key in ("prompt_tokens", "cached_tokens", "cache_write_tokens"):
+            totals[key] += usage.get(key, 0)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the cached-token counters.
+
+        Returns:
+            Dictionary of counters and the cached share of prompt tokens by "provider/model"
+        """
+        return {
+            key: {
+                **totals,
+                "cached_ratio": totals["cached_tokens"] / totals["prompt_tokens"] if totals["prompt_tokens"] else 0.0
+            }
+            for key, totals in self._usage.items()
+        }
+
+
+# Create a singleton instance
+prompt_cache_usage = PromptCacheUsage()
@@ -0,0 +1,177 @@
+"""
+Registry of the prompt files sent to the language model.
+Prompts are read, validated and hashed once when registered instead of on
+every request. Each version of a prompt gets a stable id derived from its
+content, which identifies the prompt in logs and in the prompt listing. With hot
+reload enabled, a prompt is re-read when its file changes on disk.
+"""
+import hashlib
+import logging
+import os
+from typing import Dict, Any
+
+from app.core.config import settings
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+class PromptValidationError(Exception):
+    """Exception raised when a prompt file is invalid."""
+    pass
+
+
+class Prompt:
+    """
+    A loaded version of a prompt file.
+    """
+
+    def __init__(self, name: str, path: str, text: str, mtime: float):
+        """
+        Initialize the prompt.
+
+        Args:
+            name: The registered name of the prompt
+            path: The path of the prompt file
+            text: The prompt text
+            mtime: The modification time of the file when it was read
+        """
+        self.name = name
+        self.path = path
+        self.text = text
+        self.mtime = mtime
+        self.sha256 = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @property
+    def id(self) -> str:
+        """Stable id of this version of the prompt."""
+        return f"{self.name}@{self.sha256[:12]}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Describe the prompt version.
+
+        Returns:
+            Dictionary with the id, path, hash, size and modification time
+        """
+        return {
+            "id": self.id,
+            "path": self.path,
+            "sha256": self.sha256,
+            "length": len(self.text),
+            "mtime": self.mtime
+        }
+
+
+class PromptRegistry:
+    """
+    Registry of named prompt files.
+    """
+
+    def __init__(self, hot_reload: bool = False):
+        """
+        Initialize the registry.
+
+        Args:
+            hot_reload: Whether to re-read prompt files when their modification time changes
+        """
+        self.hot_reload = hot_reload
+        self._prompts: Dict[str, Prompt] = {}
+        self.reloads = 0
+
+    def register(self, name: str, path: str) -> Prompt:
+        """
+        Load and register a prompt file.
+
+        Args:
+            name: The name to register the prompt under
+            path: The path of the prompt file
+
+        Returns:
+            The loaded prompt
+
+        Raises:
+            PromptValidationError: If the file cannot be read or is not a valid prompt
+        """
+        prompt = self._load(name, path)
+        self._prompts[name] = prompt
+        logger.info(f"Registered prompt {prompt.id} from {path}")
+        return prompt
+
+    def get(self, name: str) -> Prompt:
+        """
+        Get a registered prompt, re-reading it first if hot reload is enabled and the file changed.
+
+        Args:
+            name: The name of the prompt
+
+        Returns:
+            The current version of the prompt
+
+        Raises:
+            KeyError: If no prompt is registered under the name
+        """
+        prompt = self._prompts[name]
+        if self.hot_reload:
+            prompt = self._reload_if_changed(prompt)
+        return prompt
+
+    def text(self, name: str) -> str:
+        """
+        Get the text of a registered prompt.
+
+        Args:
+            name: The name of the prompt
+
+        Returns:
+            The prompt text
+        """
+        return self.get(name).text
+
+    def versions(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Describe the registered prompts.
+
+        Returns:
+            Dictionary of prompt descriptions by name
+        """
+        return {name: self.get(name).to_dict() for name in self._prompts}
+
+    def _reload_if_changed(self, prompt: Prompt) -> Prompt:
+        """Re-read a prompt whose file changed, keeping the loaded version if the new one is invalid."""
+        try:
+            mtime = os.stat(prompt.path).st_mtime
+        except OSError:
+            return prompt
+        if mtime == prompt.mtime:
+            return prompt
+
+        try:
+            reloaded = self._load(prompt.name, prompt.path)
+        except PromptValidationError as e:
+            logger.warning(f"Keeping prompt {prompt.id}, the changed file is invalid: {str(e)}")
+            return prompt
+
+        self._prompts[prompt.name] = reloaded
+        self.reloads += 1
+        if reloaded.sha256 != prompt.sha256:
+            logger.info(f"Reloaded prompt {prompt.id} as {reloaded.id}")
+        return reloaded
+
+    def _load(self, name: str, path: str) -> Prompt:
+        """Read and validate a prompt file."""
+        try:
+            mtime = os.stat(path).st_mtime
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            raise PromptValidationError(f"Cannot read prompt {name} from {path}: {str(e)}")
+
+        if not text.strip():
+            raise PromptValidationError(f"Prompt {name} in {path} is empty")
+
+        return Prompt(name, path, text, mtime)
+
+
+# Create a singleton instance
+prompt_registry = PromptRegistry(hot_reload=settings.PROMPT_HOT_RELOAD)
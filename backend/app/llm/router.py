@@ -0,0 +1,169 @@
+"""
+Routing of LLM calls between the main model and a smaller, faster model.
+Calls are tagged with their kind (interpret, plan, action_plan, step). Kinds
+listed in the routing rules go to the fast model when their input is short and,
+for steps, names an obvious target such as a URL, a selector or quoted text;
+everything else, including complex planning, stays on the main model. A fast
+response that the parser is not confident about is escalated to the main
+model. Latency, tokens and cost are recorded per route.
+"""
+import logging
+import math
+import re
+from typing import Dict, Any, Optional, Sequence
+
+from app.core.config import settings
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+ROUTE_DEFAULT = "default"
+ROUTE_FAST = "fast"
+
+# A step names an obvious target when it contains a URL, a CSS selector or a quoted text
+OBVIOUS_TARGET_PATTERN = re.compile(
+    r"https?://\S+|www\.\S+|[#.][A-Za-z][\w-]*|\[[\w-]+(?:[~|^$*]?=[^\]]+)?\]|\"[^\"]+\"|'[^']+'"
+)
+
+# Rough number of characters per token, for providers that do not report token usage
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens of a text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def has_obvious_target(text: str) -> bool:
+    """
+    Check whether an instruction names its target explicitly.
+
+    Args:
+        text: The instruction
+
+    Returns:
+        Whether it contains a URL, a CSS selector or a quoted text
+    """
+    return OBVIOUS_TARGET_PATTERN.search(text) is not None
+
+
+class ModelRouter:
+    """
+    Rule-based router between the main and the fast model, with per-route statistics.
+    """
+
+    def __init__(self,
+                 fast_kinds: Sequence[str] = ("step",),
+                 max_fast_tokens: int = 200,
+                 target_kinds: Sequence[str] = ("step",),
+                 min_confidence: float = 0.75,
+                 prices: Optional[Dict[str, Dict[str, float]]] = None):
+        """
+        Initialize the router.
+
+        Args:
+            fast_kinds: Kinds of calls that may go to the fast model
+            max_fast_tokens: Maximum estimated tokens of the input of a fast call
+            target_kinds: Kinds of calls that only go to the fast model when they name an obvious target
+            min_confidence: Minimum parser confidence in a fast response, below which it is escalated
+            prices: Input and output prices per million tokens by model, for the cost statistics
+        """
+        self.fast_kinds = set(fast_kinds)
+        self.max_fast_tokens = max_fast_tokens
+        self.target_kinds = set(target_kinds)
+        self.min_confidence = min_confidence
+        self.prices = prices or {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._escalations: Dict[str, int] = {}
+
+    def route(self, kind: Optional[str], user_input: str) -> str:
+        """
+        Choose the route of a call.
+
+        Args:
+            kind: The kind of call, or None for calls that are never routed
+            user_input: The input of the call
+
+        Returns:
+            ROUTE_FAST or ROUTE_DEFAULT
+        """
+        if kind not in self.fast_kinds:
+            return ROUTE_DEFAULT
+        if estimate_tokens(user_input) > self.max_fast_tokens:
+            return ROUTE_DEFAULT
+        if kind in self.target_kinds and not has_obvious_target(user_input):
+            return ROUTE_DEFAULT
+        return ROUTE_FAST
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """
+        Compute the cost of a call.
+
+        Args:
+            model: The model name
+            prompt_tokens: Number of input tokens
+            completion_tokens: Number of output tokens
+
+        Returns:
+            The cost, 0 for models without a price
+        """
+        price = self.prices.get(model, {})
+        return (prompt_tokens * price.get("input", 0.0) + completion_tokens * price.get("output", 0.0)) / 1_000_000
+
+    def record(self, route: str, model: str, latency: float, prompt_tokens: int, completion_tokens: int) -> None:
+        """
+        Record a call.
+
+        Args:
+            route: The route of the call
+            model: The model that answered
+            latency: The model latency in seconds
+            prompt_tokens: Number of input tokens
+            completion_tokens: Number of output tokens
+        """
+        stats = self._stats.setdefault(route, {
+            "calls": 0, "latency_total": 0.0, "latency_max": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0, "models": {}
+        })
+        stats["calls"] += 1
+        stats["latency_total"] += latency
+        stats["latency_max"] = max(stats["latency_max"], latency)
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+        stats["cost"] += self.cost(model, prompt_tokens, completion_tokens)
+        stats["models"][model] = stats["models"].get(model, 0) + 1
+
+    def record_escalation(self, kind: str) -> None:
+        """
+        Record a fast response escalated to the main model.
+
+        Args:
+            kind: The kind of call
+        """
+        self._escalations[kind] = self._escalations.get(kind, 0) + 1
+        logger.info(f"Escalated {kind} call from the fast model to the main model")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the routing statistics.
+
+        Returns:
+            Dictionary with the statistics of each route and the escalations by kind of call
+        """
+        routes = {}
+        for route, stats in self._stats.items():
+            routes[route] = {
+                key: value for key, value in stats.items() if key != "latency_total"
+            }
+            routes[route]["models"] = dict(stats["models"])
+            routes[route]["latency_avg"] = stats["latency_total"] / stats["calls"] if stats["calls"] else 0.0
+        return {"routes": routes, "escalations": dict(self._escalations)}
+
+
+# Create a singleton instance
+model_router = ModelRouter(
+    fast_kinds=settings.LLM_FAST_ROUTE_KINDS,
+    max_fast_tokens=settings.LLM_FAST_ROUTE_MAX_TOKENS,
+    min_confidence=settings.LLM_FAST_ROUTE_MIN_CONFIDENCE,
+    prices=settings.LLM_MODEL_PRICES
+)
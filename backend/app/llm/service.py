@@ -2,14 +2,21 @@
 LLM service for communicating with language models through LangChain.
 """
 import logging
-from typing import Dict, List, Any, Optional
+import time
+from typing import Dict, List, Any, Optional, AsyncIterator, Tuple, Callable
 
 from langchain.chains import LLMChain
 from langchain_community.chat_models import ChatAnthropic, ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
-from langchain.schema import HumanMessage, SystemMessage, AIMessage
+from langchain.schema import HumanMessage, SystemMessage, AIMessage, BaseMessage
 
 from app.core.config import settings
+from app.llm.cache import llm_response_cache, prompt_fingerprint
+from app.llm.cassette import llm_cassette, request_fingerprint
+from app.llm.client import llm_client_pool
+from app.llm.fake import FakeChatModel
+from app.llm.router import model_router, estimate_tokens, ROUTE_DEFAULT, ROUTE_FAST
+from app.llm.prefix import extract_cache_usage, prompt_cache_usage
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -22,28 +29,105 @@ class LLMService:
     
     def __init__(self):
         """Initialize the LLM service with the appropriate language model."""
+        # Smaller model for low-complexity calls, see app.llm.router
+        self.fast_llm = None
+        self.fast_model_name: Optional[str] = None
         self._initialize_llm()
         
     def _initialize_llm(self):
-        """Initialize the language model based on configuration settings."""
-        if settings.ANTHROPIC_API_KEY:
+        """
+        Initialize the language model based on configuration settings.
+        
+        The chat model is shared by all LLMService instances through the client pool,
+        so its HTTP connections are reused across agents and tasks.
+        """
+        if settings.LLM_PROVIDER == "fake":
+            if not settings.LLM_FAKE_SCRIPT:
+                raise ValueError("LLM_FAKE_SCRIPT must be set to use the fake LLM provider")
+            logger.info(f"Initializing scripted fake model from {settings.LLM_FAKE_SCRIPT}")
+            self.provider = "fake"
+            self.model_name = settings.LLM_FAKE_SCRIPT
+            self.llm = llm_client_pool.get_model(self.provider, self.model_name,
+                                                 lambda: FakeChatModel.from_file(settings.LLM_FAKE_SCRIPT))
+        elif settings.ANTHROPIC_API_KEY:
             logger.info("Initializing Anthropic Claude model")
-            self.llm = ChatAnthropic(
-                model_name="claude-3-sonnet-20240229",  # Using a recommended Claude model
-                anthropic_api_key=settings.ANTHROPIC_API_KEY,
-                temperature=0.7
-            )
+            self.provider = "anthropic"
+            self.model_name = "claude-3-sonnet-20240229"  # Using a recommended Claude model
+            self.llm = self._get_model(self.model_name)
         elif settings.OPENAI_API_KEY:
             logger.info("Initializing OpenAI model")
-            self.llm = ChatOpenAI(
-                model_name=settings.LLM_MODEL,
-                openai_api_key=settings.OPENAI_API_KEY,
-                temperature=0.7
-            )
+            self.provider = "openai"
+            self.model_name = settings.LLM_MODEL
+            self.llm = self._get_model(self.model_name)
+        elif llm_cassette.replaying:
+            # Every request is answered from the cassette
+            logger.info(f"Replaying LLM responses from {llm_cassette.path}")
+            self.provider = "cassette"
+            self.model_name = settings.LLM_MODEL
+            self.llm = None
         else:
             error_msg = "No API key provided for either Anthropic or OpenAI"
             logger.error(error_msg)
             raise ValueError(error_msg)
+        
+        if settings.LLM_FAST_MODEL and self.provider in ("anthropic", "openai"):
+            logger.info(f"Routing low-complexity calls to {settings.LLM_FAST_MODEL}")
+            self.fast_model_name = settings.LLM_FAST_MODEL
+            self.fast_llm = self._get_model(self.fast_model_name)
+    
+    def _get_model(self, model_name: str) -> Any:
+        """
+        Get the shared chat model of the provider.
+        
+        Args:
+            model_name: The model name
+            
+        Returns:
+            The chat model
+        """
+        if self.provider == "anthropic":
+            return llm_client_pool.get_model(self.provider, model_name, lambda: ChatAnthropic(
+                model_name=model_name,
+                anthropic_api_key=settings.ANTHROPIC_API_KEY,
+                temperature=0.7,
+                # Retries are made by the client pool, with its rate limiter and backoff
+                max_retries=0
+            ))
+        return llm_client_pool.get_model(self.provider, model_name, lambda: ChatOpenAI(
+            model_name=model_name,
+            openai_api_key=settings.OPENAI_API_KEY,
+            temperature=0.7,
+            # Retries are made by the client pool, with its rate limiter and backoff
+            max_retries=0
+        ))
+    
+    def uses_fast_model(self, route_kind: Optional[str], user_input: str) -> bool:
+        """
+        Check whether a call is routed to the fast model.
+        
+        Args:
+            route_kind: The kind of call
+            user_input: The input of the call
+            
+        Returns:
+            Whether the fast model answers the call
+        """
+        return self._select_model(route_kind, user_input)[0] == ROUTE_FAST
+    
+    def _select_model(self, route_kind: Optional[str], user_input: str) -> Tuple[str, Any, str]:
+        """
+        Choose the model of a call.
+        
+        Args:
+            route_kind: The kind of call, or None to use the main model
+            user_input: The input of the call
+            
+        Returns:
+            Tuple of the route, the chat model and the model name
+        """
+        if self.fast_llm is not None and model_router.route(route_kind, user_input) == ROUTE_FAST:
+            return ROUTE_FAST, self.fast_llm, self.fast_model_name
+        return ROUTE_DEFAULT, self.llm, self.model_name
             
     def create_chain(self, system_prompt: str, human_prompt: str = "{input}") -> LLMChain:
         """
@@ -66,7 +150,13 @@ class LLMService:
     async def generate_response(self, 
                          system_prompt: str, 
                          user_input: str, 
-                         conversation_history: Optional[List[Dict[str, str]]] = None) -> str:
+                         conversation_history: Optional[List[Dict[str, str]]] = None,
+                         use_cache: bool = False,
+                         route_kind: Optional[str] = None,
+                         confidence: Optional[Callable[[str], float]] = None,
+                         validate: Optional[Callable[[str], Any]] = None,
+                         route_input: Optional[str] = None,
+                         cache_input: Optional[str] = None) -> str:
         """
         Generate a response from the LLM based on the system prompt, user input, and conversation history.
         
@@ -74,10 +164,162 @@ class LLMService:
             system_prompt: The system prompt to guide the LLM's behavior
             user_input: The user's input/query
             conversation_history: Optional list of previous messages in the conversation
+            use_cache: Whether to reuse the cached response of an identical prompt, and cache this one
+            route_kind: The kind of call, to route low-complexity calls to the fast model
+            confidence: Optional function scoring a response from 0 to 1; fast responses scoring
+                        below the configured minimum are escalated to the main model
+            validate: Optional function raising an exception for responses that should not be cached
+            route_input: The text to route the call on, if not the whole user input
+            cache_input: The text identifying the call in the response cache, in place of
+                         the user input and conversation history
             
         Returns:
             The LLM's response as a string
         """
+        route, llm, model_name = self._select_model(route_kind, route_input if route_input is not None else user_input)
+        
+        cache_key = None
+        if use_cache and llm_response_cache.maxsize > 0:
+            if cache_input is not None:
+                cache_key = prompt_fingerprint(model_name, system_prompt, cache_input)
+            else:
+                cache_key = prompt_fingerprint(model_name, system_prompt, user_input, conversation_history)
+        
+        # The cassette is checked before the response cache, so a replay answers the
+        # requests in recording order and a recording includes the cache hits
+        cassette_key = None
+        if llm_cassette.mode:
+            cassette_key = request_fingerprint(system_prompt, user_input, conversation_history)
+            if llm_cassette.replaying:
+                llm_response = llm_cassette.replay(cassette_key)["output"]
+                logger.debug(f"Replayed LLM response: {llm_response}")
+                if cache_key is not None:
+                    self._cache_response(cache_key, llm_response, validate)
+                return llm_response
+        
+        if cache_key is not None:
+            cached = llm_response_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Reusing cached LLM response")
+                if llm_cassette.recording:
+                    llm_cassette.record(
+                        cassette_key,
+                        self._message_log(system_prompt, user_input, conversation_history),
+                        cached,
+                        0.0,
+                        model_name
+                    )
+                return cached
+        
+        messages = self._build_messages(system_prompt, user_input, conversation_history)
+        
+        try:
+            logger.debug(f"Sending message to LLM: {messages}")
+            llm_response, llm_output, latency = await self._call_model(route, llm, model_name, messages)
+            
+            if route == ROUTE_FAST and confidence is not None \
+                    and confidence(llm_response) < model_router.min_confidence:
+                model_router.record_escalation(route_kind)
+                model_name = self.model_name
+                llm_response, llm_output, latency = await self._call_model(ROUTE_DEFAULT, self.llm, model_name, messages)
+            
+            if llm_cassette.recording:
+                llm_cassette.record(
+                    cassette_key,
+                    self._message_log(system_prompt, user_input, conversation_history),
+                    llm_response,
+                    latency,
+                    model_name,
+                    (llm_output or {}).get("token_usage")
+                )
+            if cache_key is not None:
+                self._cache_response(cache_key, llm_response, validate)
+            return llm_response
+        except Exception as e:
+            logger.error(f"Error generating LLM response: {str(e)}")
+            raise
+    
+    def _cache_response(self, cache_key: str, llm_response: str,
+                        validate: Optional[Callable[[str], Any]]) -> None:
+        """Cache a response, unless the validation function rejects it."""
+        if validate is not None:
+            try:
+                validate(llm_response)
+            except Exception as e:
+                logger.debug(f"Not caching invalid LLM response: {str(e)}")
+                return
+        llm_response_cache.put(cache_key, llm_response)
+    
+    async def stream_response(self,
+                              system_prompt: str,
+                              user_input: str,
+                              conversation_history: Optional[List[Dict[str, str]]] = None,
+                              route_kind: Optional[str] = None,
+                              route_input: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Stream a response from the LLM as it is generated.
+        
+        Args:
+            system_prompt: The system prompt to guide the LLM's behavior
+            user_input: The user's input/query
+            conversation_history: Optional list of previous messages in the conversation
+            route_kind: The kind of call, to route low-complexity calls to the fast model
+            route_input: The text to route the call on, if not the whole user input
+            
+        Yields:
+            Chunks of the response text
+        """
+        route, llm, model_name = self._select_model(route_kind, route_input if route_input is not None else user_input)
+        
+        cassette_key = None
+        if llm_cassette.mode:
+            cassette_key = request_fingerprint(system_prompt, user_input, conversation_history)
+            if llm_cassette.replaying:
+                yield llm_cassette.replay(cassette_key)["output"]
+                return
+        
+        messages = self._build_messages(system_prompt, user_input, conversation_history)
+        timing = {}
+        
+        def request():
+            timing["started_at"] = time.monotonic()
+            return llm.astream(messages)
+        
+        try:
+            logger.debug(f"Streaming message to LLM: {messages}")
+            chunks = []
+            async for chunk in llm_client_pool.stream(self.provider, model_name, request):
+                if chunk.content:
+                    chunks.append(chunk.content)
+                    yield chunk.content
+            llm_response = "".join(chunks)
+            latency = time.monotonic() - timing["started_at"]
+            # Streamed chunks carry no token usage
+            model_router.record(route, model_name, latency,
+                                sum(estimate_tokens(str(message.content)) for message in messages),
+                                estimate_tokens(llm_response))
+            if llm_cassette.recording:
+                llm_cassette.record(
+                    cassette_key,
+                    self._message_log(system_prompt, user_input, conversation_history),
+                    llm_response,
+                    latency,
+                    model_name
+                )
+        except Exception as e:
+            logger.error(f"Error streaming LLM response: {str(e)}")
+            raise
+    
+    def _build_messages(self,
+                        system_prompt: str,
+                        user_input: str,
+                        conversation_history: Optional[List[Dict[str, str]]] = None) -> List[BaseMessage]:
+        """
+        Build the chat messages of a request.
+        
+        The system prompt and conversation history come first and the current input
+        last, so consecutive calls of a task share their prefix with the provider cache.
+        """
         messages = [SystemMessage(content=system_prompt)]
         
         # Add conversation history if provided
@@ -91,12 +333,57 @@ class LLMService:
         # Add the current user input
         messages.append(HumanMessage(content=user_input))
         
-        try:
-            logger.debug(f"Sending message to LLM: {messages}")
-            response = await self.llm.agenerate([messages])
-            llm_response = response.generations[0][0].text
-            logger.debug(f"Received response from LLM: {llm_response}")
-            return llm_response
-        except Exception as e:
-            logger.error(f"Error generating LLM response: {str(e)}")
-            raise 
\ No newline at end of file
+        return messages
+    
+    async def _call_model(self, route: str, llm: Any, model_name: str,
+                          messages: List[BaseMessage]) -> Tuple[str, Optional[Dict[str, Any]], float]:
+        """
+        Make a model call through the client pool and record its usage.
+        
+        Args:
+            route: The route of the call
+            llm: The chat model
+            model_name: The model name
+            messages: The messages of the request
+            
+        Returns:
+            Tuple of the response text, the provider output and the model latency in seconds
+        """
+        timing = {}
+        
+        async def request():
+            started_at = time.monotonic()
+            result = await llm.agenerate([messages])
+            timing["latency"] = time.monotonic() - started_at
+            return result
+        
+        response = await llm_client_pool.call(self.provider, model_name, request)
+        llm_response = response.generations[0][0].text
+        logger.debug(f"Received response from {model_name}: {llm_response}")
+        self._record_cache_usage(model_name, response.llm_output)
+        
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        model_router.record(
+            route, model_name, timing["latency"],
+            token_usage.get("prompt_tokens") or sum(estimate_tokens(str(message.content)) for message in messages),
+            token_usage.get("completion_tokens") or estimate_tokens(llm_response)
+        )
+        return llm_response, response.llm_output, timing["latency"]
+    
+    @staticmethod
+    def _message_log(system_prompt: str,
+                     user_input: str,
+                     conversation_history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """Get the messages of a request as role and content, for the cassette."""
+        return ([{"role": "system", "content": system_prompt}]
+                + [{"role": message["role"], "content": message["content"]} for message in conversation_history or []]
+                + [{"role": "user", "content": user_input}])
+    
+    def _record_cache_usage(self, model_name: str, llm_output: Optional[Dict[str, Any]]) -> None:
+        """Record the prompt tokens of a call that were served from the provider prefix cache."""
+        usage = extract_cache_usage(llm_output)
+        if not usage["prompt_tokens"]:
+            return
+        prompt_cache_usage.record(self.provider, model_name, usage)
+        logger.debug(f"Prompt tokens: {usage['prompt_tokens']}, cached: {usage['cached_tokens']}, "
+                     f"cache writes: {usage['cache_write_tokens']}")
@@ -0,0 +1,208 @@
+"""
+Incremental parsing of streamed LLM responses.
+The model writes its action plan as a JSON object. IncrementalJSONParser reads
+the object as the tokens arrive and reports each top-level field as soon as its
+value is complete, so the action can be dispatched while the model is still
+writing the trailing ``thought``.
+"""
+import asyncio
+import json
+import logging
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
+
+from app.llm.parser import LLMResponseParser, ActionValidationError
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+
+class IncrementalJSONParser:
+    """
+    Parser for the first JSON object of a text that arrives in chunks.
+
+    Text before the object, such as an introduction or a code fence, is skipped.
+    Only the top-level fields are reported; nested values are parsed whole once
+    they are complete.
+    """
+
+    def __init__(self):
+        """Initialize the parser."""
+        self.text = ""
+        self.fields: Dict[str, Any] = {}
+        self.started = False
+        self.done = False
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._key: Optional[str] = None
+        self._key_start: Optional[int] = None
+        self._value_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Feed the next chunk of the text.
+
+        Args:
+            chunk: The next chunk of the streamed text
+
+        Returns:
+            The (key, value) pairs of the top-level fields completed by this chunk
+        """
+        self.text += chunk
+        completed = []
+        text = self.text
+        while self._position < len(text) and not self.done:
+            position = self._position
+            char = text[position]
+            self._position += 1
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        if self._key_start is not None:
+                            self._key = json.loads(text[self._key_start:position + 1])
+                            self._key_start = None
+                        elif self._value_start is not None:
+                            self._complete(position + 1, completed)
+                continue
+
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                    self._depth = 1
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    if self._key is None:
+                        self._key_start = position
+                    elif self._value_start is None:
+                        self._value_start = position
+            elif char in "{[":
+                if self._depth == 1 and self._key is not None and self._value_start is None:
+                    self._value_start = position
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._value_start is not None:
+                    self._complete(position + 1, completed)
+                elif self._depth == 0:
+                    if self._value_start is not None:
+                        self._complete(position, completed)
+                    self.done = True
+            elif char == ",":
+                if self._depth == 1 and self._value_start is not None:
+                    self._complete(position, completed)
+            elif not char.isspace() and char != ":":
+                # Start of a number, true, false or null
+                if self._depth == 1 and self._key is not None and self._value_start is None:
+                    self._value_start = position
+
+        return completed
+
+    def _complete(self, end: int, completed: List[Tuple[str, Any]]) -> None:
+        """Parse the value of the current top-level field."""
+        raw = self.text[self._value_start:end]
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            logger.debug(f"Could not parse streamed value of {self._key}: {raw[:100]}")
+        else:
+            self.fields[self._key] = value
+            completed.append((self._key, value))
+        self._key = None
+        self._value_start = None
+
+
+class StreamedActionPlan:
+    """
+    Action plan of a streamed LLM response.
+
+    Consumes the token stream in the background. The action plan resolves as soon
+    as the ``action`` and ``parameters`` fields are complete, while the rest of the
+    response keeps streaming. If the plan cannot be read early, it is parsed from
+    the full response instead.
+    """
+
+    def __init__(self, chunks: AsyncIterator[str], parser: LLMResponseParser):
+        """
+        Start consuming a streamed response.
+
+        Args:
+            chunks: The streamed text chunks of the response
+            parser: Parser used to validate the action plan
+        """
+        self.parser = parser
+        self.json_parser = IncrementalJSONParser()
+        self.dispatched_early = False
+        self._plan_ready = asyncio.Event()
+        self._plan: Optional[Dict[str, Any]] = None
+        self._task = asyncio.ensure_future(self._consume(chunks))
+
+    async def _consume(self, chunks: AsyncIterator[str]) -> str:
+        try:
+            async for chunk in chunks:
+                self.json_parser.feed(chunk)
+                if not self._plan_ready.is_set():
+                    self._try_early_plan()
+        finally:
+            # Waiters fall back to the full response once the stream ends
+            self._plan_ready.set()
+        return self.json_parser.text
+
+    def _try_early_plan(self) -> None:
+        fields = self.json_parser.fields
+        if "action" not in fields or ("parameters" not in fields and not self.json_parser.done):
+            return
+        try:
+            self._plan = self.parser.parse_fields(fields)
+        except ActionValidationError as e:
+            logger.debug(f"Streamed action plan is not valid yet, waiting for the full response: {str(e)}")
+            return
+        self.dispatched_early = True
+        self._plan_ready.set()
+
+    async def action_plan(self) -> Dict[str, Any]:
+        """
+        Wait for the action plan.
+
+        Returns:
+            The validated action plan; the thought may still be streaming
+
+        Raises:
+            ActionValidationError: If the response does not contain a valid action plan
+        """
+        await self._plan_ready.wait()
+        if self._plan is not None:
+            return self._plan
+        return self.parser.parse_response(await self.text())
+
+    async def text(self) -> str:
+        """
+        Wait for the end of the stream.
+
+        Returns:
+            The full response text
+        """
+        return await self._task
+
+    async def cancel(self) -> None:
+        """Stop consuming the stream, if it has not ended yet."""
+        if not self._task.done():
+            self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+    @property
+    def thought(self) -> Optional[str]:
+        """The thought of the response, once it has been streamed."""
+        return self.json_parser.fields.get("thought")
@@ -0,0 +1,84 @@
+"""
+Memory benchmark for the compact DOM node representation.
+
+Builds a synthetic extraction result shaped like the output of buildDomTree.js
+and compares the memory used by the nested dictionaries with the compact nodes.
+
+Run from the backend directory:
+    python -m examples.dom_memory_benchmark --nodes 20000
+"""
+import argparse
+import copy
+import gc
+import time
+import tracemalloc
+from typing import Dict, Any, Callable
+
+from app.dom.node import compact_tree, tree_size
+
+
+def make_element(index: int, depth: int) -> Dict[str, Any]:
+    """Create an element record like the ones produced by the extraction script."""
+    tag_name = ["div", "a", "span", "li", "button"][index % 5]
+    return {
+        "id": f"element-{index}",
+        "index": index,
+        "type": "element",
+        "tagName": tag_name,
+        "attributes": {"class": f"item item-{index % 7}", "data-row": str(index)},
+        "position": {"x": 16, "y": index * 24, "width": 640, "height": 24, "viewportX": 16, "viewportY": index * 24},
+        "css_selector": f"#element-{index}",
+        "xpath": f"/html/body/div[{depth}]/{tag_name}[{index + 1}]",
+        "accessibility": {"role": "listitem"} if tag_name == "li" else None,
+        "children": [{"type": "text", "content": f"Row {index}"}],
+        "textContent": f"Row {index}",
+        **({
+            "interactive": True,
+            "interactiveTypes": ["clickable"],
+            "interactiveReasons": {"clickable": [f"tag is {tag_name}"]},
+        } if tag_name in ("a", "button") else {}),
+    }
+
+
+def make_tree(node_count: int, fan_out: int = 10) -> Dict[str, Any]:
+    """Create a tree of node_count elements, fan_out children per element."""
+    elements = [make_element(i, i // fan_out) for i in range(node_count)]
+    for i in range(1, node_count):
+        elements[(i - 1) // fan_out]["children"].append(elements[i])
+    return elements[0]
+
+
+def measure(build: Callable[[], Any]) -> Dict[str, Any]:
+    """Measure the memory retained by the result of build."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"result": result, "retained": retained, "peak": peak, "seconds": elapsed}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=20000, help="Number of elements in the synthetic tree")
+    args = parser.parse_args()
+
+    tree = make_tree(args.nodes)
+    dicts = measure(lambda: copy.deepcopy(tree))
+    compact = measure(lambda: compact_tree(copy.deepcopy(tree)))
+    restored = measure(lambda: compact["result"].to_dict())
+
+    print(f"{args.nodes} elements")
+    print(f"  dictionaries:  {dicts['retained'] / 1e6:8.2f} MB retained "
+          f"(getsizeof estimate {tree_size(dicts['result']) / 1e6:.2f} MB)")
+    print(f"  compact nodes: {compact['retained'] / 1e6:8.2f} MB retained "
+          f"(getsizeof estimate {tree_size(compact['result']) / 1e6:.2f} MB), "
+          f"peak {compact['peak'] / 1e6:.2f} MB, converted in {compact['seconds'] * 1000:.0f} ms")
+    print(f"  to_dict:       {restored['seconds'] * 1000:8.0f} ms")
+    print(f"  ratio:         {compact['retained'] / dicts['retained']:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,4 +20,24 @@ def event_loop(event_loop_policy):
     """Create an event loop for each test"""
     loop = event_loop_policy.new_event_loop()
     yield loop
-    loop.close() 
\ No newline at end of file
+    loop.close() 
+
+
+@pytest.fixture
+def make_llm_service():
+    """Create LLM services around the given chat models instead of the configured provider"""
+    from unittest.mock import patch
+    from app.llm.service import LLMService
+
+    def make(llm, fast_llm=None, model_name="test-model", fast_model_name=None):
+        def initialize(service):
+            service.provider = "test"
+            service.model_name = model_name
+            service.llm = llm
+            service.fast_model_name = fast_model_name
+            service.fast_llm = fast_llm
+
+        with patch.object(LLMService, "_initialize_llm", initialize):
+            return LLMService()
+
+    return make
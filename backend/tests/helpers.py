@@ -0,0 +1,25 @@
+"""
+Builders of extracted DOM nodes shared by the tests.
+"""
+
+
+def element(element_id, tag_name="div", children=None, attributes=None, text=None, **extra):
+    """Build an extracted element node, with a selector and XPath derived from its id"""
+    node = {
+        "id": element_id,
+        "type": "element",
+        "tagName": tag_name,
+        "attributes": attributes or {},
+        "css_selector": f"#{element_id}",
+        "xpath": f"//*[@id='{element_id}']",
+        "children": children or [],
+    }
+    if text:
+        node["textContent"] = text
+    node.update(extra)
+    return node
+
+
+def entry(node):
+    """Build the interactive element entry of an element node"""
+    return {"id": node["id"], "tagName": node["tagName"], "selector": node["css_selector"], "xpath": node["xpath"]}
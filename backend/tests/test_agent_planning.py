@@ -0,0 +1,119 @@
+"""
+Tests for single-shot action planning and re-planning.
+"""
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.agent.message_manager import MessageManager
+from app.agent.service import AgentService
+from app.llm.parser import LLMResponseParser, ActionValidationError
+
+
+def plan(*actions):
+    return json.dumps({"action": "plan_actions", "parameters": {"actions": list(actions)}, "thought": "Plan"})
+
+
+OPEN = {"action": "go_to_url", "parameters": {"url": "https://example.com"}, "expect": {"url_contains": "example"}}
+SEARCH = {"action": "input_text", "parameters": {"selector": "#q", "text": "cats"}}
+SUBMIT = {"action": "click_element", "parameters": {"selector": "#go"}, "expect": {"title_contains": "results"}}
+
+
+@pytest.fixture
+def agent():
+    agent = AgentService()
+    agent.ensure_initialized = AsyncMock(return_value={"status": "success"})
+    agent.capture_screenshot = AsyncMock(return_value={"status": "success", "screenshot": "base64screenshot"})
+    agent.get_dom = AsyncMock(return_value={"status": "success", "page_state": {}})
+    agent.browser = MagicMock()
+    agent.browser.get_page_state = AsyncMock(return_value={"url": "https://example.com/search", "title": "Search results"})
+    agent.execute_action = AsyncMock(return_value={"status": "success"})
+    agent.llm_service = MagicMock()
+    agent.message_manager = MessageManager()
+    agent.response_parser = LLMResponseParser()
+    return agent
+
+
+def run(agent, responses, **kwargs):
+    agent.llm_service.generate_response = AsyncMock(side_effect=responses)
+    return asyncio.run(agent.execute_from_natural_language("Search for cats", planning_mode="actions", **kwargs))
+
+
+class TestActionPlanning:
+    def test_one_llm_call_for_all_actions(self, agent):
+        """All actions come from a single planning call."""
+        result = run(agent, [plan(OPEN, SEARCH, SUBMIT)])
+
+        assert result["status"] == "success"
+        assert result["step_count"] == 3
+        assert agent.llm_service.generate_response.call_count == 1
+        assert [call.args[0] for call in agent.execute_action.call_args_list] == [
+            "go_to_url", "input_text", "click_element"
+        ]
+
+    def test_replan_after_failure(self, agent):
+        """A failed action re-plans the remaining actions from the current page."""
+        agent.execute_action = AsyncMock(side_effect=[
+            {"status": "success"},
+            {"status": "error", "message": "Element not found: #q"},
+            {"status": "success"},
+            {"status": "success"},
+        ])
+        retry = {"action": "input_text", "parameters": {"selector": "input[name=q]", "text": "cats"}}
+
+        result = run(agent, [plan(OPEN, SEARCH, SUBMIT), plan(retry, SUBMIT)])
+
+        assert result["status"] == "success"
+        assert result["replans"] == 1
+        replan_prompt = agent.llm_service.generate_response.call_args_list[1].kwargs["user_input"]
+        assert "1. go_to_url" in replan_prompt
+        assert "Element not found: #q" in replan_prompt
+        assert not agent.llm_service.generate_response.call_args_list[1].kwargs["use_cache"]
+
+    def test_replan_after_divergence(self, agent):
+        """A page that does not match the expectation of an action re-plans."""
+        agent.browser.get_page_state = AsyncMock(return_value={"url": "https://example.com/login", "title": "Sign in"})
+
+        result = run(agent, [plan(OPEN, SEARCH, SUBMIT), plan(SUBMIT), plan(SUBMIT)])
+
+        assert result["status"] == "error"
+        assert "title to contain 'results'" in result["message"]
+        assert agent.llm_service.generate_response.call_count == 3
+
+    def test_single_action_response(self, agent):
+        """A response with a single action is executed as a one-action plan."""
+        result = run(agent, [json.dumps({"action": "go_to_url", "parameters": {"url": "example.com"}})])
+
+        assert result["status"] == "success"
+        agent.execute_action.assert_called_once_with("go_to_url", {"url": "https://example.com"}, None)
+
+
+class TestPlanActionsValidation:
+    def test_nested_actions_are_validated(self):
+        """Planned actions are validated like single actions."""
+        parser = LLMResponseParser()
+        action_plan = parser.parse_response(plan({"action": "wait", "parameters": {"time": "50"}}))
+
+        assert action_plan["parameters"]["actions"][0]["parameters"]["time"] == 100
+
+        with pytest.raises(ActionValidationError):
+            parser.parse_response(plan({"action": "click_element", "parameters": {}}))
+        with pytest.raises(ActionValidationError):
+            parser.parse_response(plan({"action": "plan_task", "parameters": {"steps": ["a"], "thought": ""}}))
+        with pytest.raises(ActionValidationError):
+            parser.parse_response(json.dumps({"action": "plan_actions", "parameters": {"actions": []}}))
+
+
+class TestPlanningMode:
+    def test_steps_mode_by_default(self, agent):
+        """Without a planning mode, tasks are planned step by step."""
+        agent._execute_action_plan = AsyncMock()
+        agent.create_task_plan = AsyncMock(return_value={"status": "error", "message": "No plan"})
+
+        result = asyncio.run(agent.execute_from_natural_language("Search for cats"))
+
+        assert result["status"] == "error"
+        agent.create_task_plan.assert_called_once()
+        agent._execute_action_plan.assert_not_called()
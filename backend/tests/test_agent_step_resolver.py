@@ -0,0 +1,125 @@
+"""
+Tests for the rule-based step fast path.
+"""
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.agent.message_manager import MessageManager
+from app.agent.service import AgentService
+from app.agent.step_resolver import StepResolver
+from app.dom.service import DOMProcessingService
+from app.dom.tree import DOMTree
+from app.llm.parser import LLMResponseParser
+from helpers import element, entry
+
+
+@pytest.fixture
+def dom_service():
+    clickable = [
+        element("search", "button", text="Search"),
+        element("next", "a", text="Next", attributes={"href": "/page/2"}),
+        element("next-bottom", "a", text="Next", attributes={"href": "/page/2"}),
+    ]
+    query = element("q", "input", attributes={"name": "q", "placeholder": "Search products"})
+    tree = DOMTree({
+        "tree": element("body", "body", children=[query, *clickable]),
+        "interactiveElements": {
+            "clickable": [entry(node) for node in clickable],
+            "inputs": [entry(query)],
+            "forms": [],
+            "navigational": [],
+        }
+    })
+    service = DOMProcessingService(MagicMock())
+    service.extract_dom = AsyncMock(return_value=tree)
+    return service
+
+
+def resolve(resolver, description):
+    return asyncio.run(resolver.resolve(description))
+
+
+class TestStepResolver:
+    def test_navigate_and_wait(self, dom_service):
+        """Navigation and waits are resolved without the DOM."""
+        resolver = StepResolver(dom_service)
+
+        assert resolve(resolver, "Navigate to https://example.com/search.")["parameters"] == {
+            "url": "https://example.com/search"
+        }
+        assert resolve(resolver, "Go to example.com")["parameters"] == {"url": "https://example.com"}
+        assert resolve(resolver, "Navigate to www.google.com")["parameters"] == {"url": "https://www.google.com"}
+        assert resolve(resolver, "Wait 2 seconds")["parameters"] == {"time": 2000}
+        assert resolve(resolver, "Wait for 500 ms")["parameters"] == {"time": 500}
+        dom_service.extract_dom.assert_not_called()
+
+    def test_planner_step_numbering(self, dom_service):
+        """Steps numbered the way the planner writes them are resolved."""
+        resolver = StepResolver(dom_service)
+
+        assert resolve(resolver, "Step 1: Navigate to https://example.com")["parameters"] == {
+            "url": "https://example.com"
+        }
+        assert resolve(resolver, "1. Wait 2 seconds")["parameters"] == {"time": 2000}
+        assert resolve(resolver, "3) Click the Search button")["parameters"] == {"selector": "#search"}
+        assert resolve(resolver, "Step 2 - Type 'mouse' into the Search products field")["parameters"] == {
+            "selector": "#q", "text": "mouse"
+        }
+
+    def test_click_and_type(self, dom_service):
+        """Clicks and text input resolve to the only element named like their target."""
+        resolver = StepResolver(dom_service)
+
+        click = resolve(resolver, "Click the Search button")
+        assert click["action"] == "click_element"
+        assert click["parameters"] == {"selector": "#search"}
+
+        typing = resolve(resolver, "Type 'wireless mouse' into the Search products field")
+        assert typing["action"] == "input_text"
+        assert typing["parameters"] == {"selector": "#q", "text": "wireless mouse"}
+
+    def test_fallback_to_llm(self, dom_service):
+        """Ambiguous, unknown or unmatched steps are left to the LLM."""
+        resolver = StepResolver(dom_service)
+
+        assert resolve(resolver, "Click Next") is None
+        assert resolve(resolver, "Click the Checkout button") is None
+        assert resolve(resolver, "Find the cheapest flight to Paris") is None
+        assert resolve(resolver, "Wait for the page to load") is None
+        assert resolve(resolver, "Open settings.py") is None
+
+        dom_service.extract_dom = AsyncMock(side_effect=RuntimeError("Browser not initialized"))
+        assert resolve(resolver, "Click the Search button") is None
+
+    def test_hit_rate(self, dom_service):
+        resolver = StepResolver(dom_service)
+        for description in ("Wait 1 second", "Click the Search button", "Click Next", "Log in"):
+            resolve(resolver, description)
+
+        assert resolver.stats() == {
+            "attempts": 4, "hits": 2, "hit_rate": 0.5, "by_rule": {"wait": 1, "click_element": 1}
+        }
+
+
+class TestExecuteStepFastPath:
+    def test_resolved_step_skips_the_llm(self, dom_service):
+        """A resolved step is executed without an LLM call and recorded in the history."""
+        agent = AgentService()
+        agent.execute_action = AsyncMock(return_value={"status": "success"})
+        agent.llm_service = MagicMock()
+        agent.llm_service.generate_response = AsyncMock()
+        agent.llm_service.stream_response = MagicMock()
+        agent.message_manager = MessageManager()
+        agent.response_parser = LLMResponseParser()
+
+        with patch("app.agent.service.step_resolver", StepResolver(dom_service)):
+            result = asyncio.run(agent.execute_step({"description": "Click the Search button"}))
+
+        assert result["status"] == "success"
+        agent.execute_action.assert_called_once_with("click_element", {"selector": "#search"}, None)
+        agent.llm_service.generate_response.assert_not_called()
+        agent.llm_service.stream_response.assert_not_called()
+        assert json.loads(agent.message_manager.get_messages()[-1]["content"])["action"] == "click_element"
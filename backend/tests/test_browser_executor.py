@@ -3,7 +3,10 @@ Tests for the browser executor module that handles JavaScript execution in the b
 """
 import pytest
 import asyncio
+import json
 import os
+import shutil
+import subprocess
 from unittest.mock import MagicMock, AsyncMock, patch
 
 from app.dom.browser_executor import BrowserExecutor
@@ -277,4 +280,226 @@ async def test_find_elements_by_text(browser_executor, mock_browser_manager):
     
     assert result[1]["tagName"] == "a"
     assert result[1]["id"] == "learn-more"
-    assert "Learn more about our examples" in result[1]["text"] 
\ No newline at end of file
+    assert "Learn more about our examples" in result[1]["text"] 
+
+
+@pytest.mark.asyncio
+async def test_extract_dom_tree_passes_budget_options(browser_executor, mock_browser_manager):
+    """Test that viewport and node budget options reach the extraction script"""
+    browser_executor.execute_script = AsyncMock(return_value={
+        "url": "https://example.com",
+        "title": "Example Domain",
+        "timestamp": "2023-01-01T00:00:00.000Z",
+        "tree": {"id": "body", "type": "element", "tagName": "body", "children": []},
+        "interactiveElements": {"clickable": [], "inputs": [], "forms": [], "navigational": []},
+        "truncation": {
+            "truncated": True,
+            "nodeCount": 50,
+            "maxNodes": 50,
+            "budgetExhausted": True,
+            "droppedByBudget": 120,
+            "prunedOffscreen": 8,
+            "depthLimited": 0
+        }
+    })
+    
+    result = await browser_executor.extract_dom_tree({"viewportOnly": True, "viewportMargin": 100, "maxNodes": 50})
+    
+    # The script is evaluated as a function expression with the options inlined
+    script = browser_executor.execute_script.call_args[0][0]
+    assert script.strip().startswith("() =>")
+    assert '"viewportOnly": true' in script
+    assert '"maxNodes": 50' in script
+    
+    # Truncation details are passed through to the caller
+    assert result["truncation"]["truncated"] is True
+    assert result["truncation"]["droppedByBudget"] == 120
+
+@pytest.mark.asyncio
+async def test_extract_dom_tree_merges_child_frames(browser_executor, mock_browser_manager):
+    """Test that child frames are extracted and attached under their host iframe"""
+    main_frame = MagicMock()
+    child_frame = MagicMock()
+    child_frame.url = "https://example.com/embed"
+    child_frame.name = "embed"
+    child_frame.parent_frame = main_frame
+    child_frame.is_detached.return_value = False
+    frame_element = AsyncMock()
+    frame_element.evaluate.return_value = 0
+    child_frame.frame_element = AsyncMock(return_value=frame_element)
+    
+    mock_browser_manager.page = MagicMock()
+    mock_browser_manager.page.main_frame = main_frame
+    mock_browser_manager.page.frames = [main_frame, child_frame]
+    
+    main_result = {
+        "url": "https://example.com",
+        "title": "Example Domain",
+        "tree": {
+            "id": "el-0", "type": "element", "tagName": "body",
+            "children": [
+                {"id": "el-1", "type": "element", "tagName": "iframe", "frameIndex": 0, "children": []}
+            ]
+        },
+        "interactiveElements": {"clickable": [], "inputs": [], "forms": [], "navigational": []}
+    }
+    frame_result = {
+        "url": "https://example.com/embed",
+        "title": "Embed",
+        "tree": {
+            "id": "frame-1:el-0", "type": "element", "tagName": "body",
+            "children": [
+                {"id": "frame-1:el-1", "type": "element", "tagName": "button", "children": []}
+            ]
+        },
+        "interactiveElements": {
+            "clickable": [{"id": "frame-1:el-1", "tagName": "button", "selector": "button"}],
+            "inputs": [], "forms": [], "navigational": []
+        }
+    }
+    
+    async def fake_execute(script, args=None, frame=None):
+        return frame_result if frame is child_frame else main_result
+    
+    browser_executor.execute_script = AsyncMock(side_effect=fake_execute)
+    
+    result = await browser_executor.extract_dom_tree({"includeFrames": True})
+    
+    # One extraction per frame, with ids of the child frame qualified by the frame id
+    assert browser_executor.execute_script.call_count == 2
+    frame_script = next(
+        call.args[0] for call in browser_executor.execute_script.call_args_list
+        if call.kwargs.get("frame") is child_frame
+    )
+    assert '"idPrefix": "frame-1:"' in frame_script
+    assert '"indexOffset": 1000000' in frame_script
+    
+    # The frame tree is attached under its iframe element
+    iframe = result["tree"]["children"][0]
+    assert iframe["children"][0]["frameId"] == "frame-1"
+    assert iframe["children"][0]["children"][0]["id"] == "frame-1:el-1"
+    
+    # Interactive elements of the frame are merged and tagged
+    assert result["interactiveElements"]["clickable"] == [
+        {"id": "frame-1:el-1", "tagName": "button", "selector": "button", "frame": "frame-1"}
+    ]
+    assert result["frames"] == [
+        {"id": "frame-1", "url": "https://example.com/embed", "name": "embed", "parent": None}
+    ]
+
+@pytest.mark.asyncio
+async def test_get_element_handle_by_index(browser_executor, mock_browser_manager):
+    """Test resolving an element handle from its stable extraction index"""
+    element = MagicMock()
+    handle = MagicMock()
+    handle.as_element.return_value = element
+    mock_browser_manager.page.evaluate_handle = AsyncMock(return_value=handle)
+    
+    result = await browser_executor.get_element_handle_by_index(3)
+    
+    assert result is element
+    script, index = mock_browser_manager.page.evaluate_handle.call_args[0]
+    assert "__midprintElementRegistry" in script
+    assert index == 3
+    
+    # Unknown or detached elements resolve to None
+    handle.as_element.return_value = None
+    handle.dispose = AsyncMock()
+    assert await browser_executor.get_element_handle_by_index(99) is None
+    handle.dispose.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_get_element_handle_by_frame_index(browser_executor, mock_browser_manager):
+    """Test that indexes of child frame elements are resolved in their own frame"""
+    child_frame = MagicMock()
+    child_frame.is_detached.return_value = False
+    element = MagicMock()
+    handle = MagicMock()
+    handle.as_element.return_value = element
+    child_frame.evaluate_handle = AsyncMock(return_value=handle)
+    mock_browser_manager.page.evaluate_handle = AsyncMock()
+    browser_executor._indexed_frames = {1: child_frame}
+    
+    assert await browser_executor.get_element_handle_by_index(1000003) is element
+    assert child_frame.evaluate_handle.call_args[0][1] == 3
+    mock_browser_manager.page.evaluate_handle.assert_not_called()
+    
+    # Elements of unknown or detached frames are not resolved in the main frame
+    child_frame.is_detached.return_value = True
+    assert await browser_executor.get_element_handle_by_index(1000003) is None
+    assert await browser_executor.get_element_handle_by_index(2000003) is None
+    mock_browser_manager.page.evaluate_handle.assert_not_called()
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="Node.js is not installed")
+def test_reattached_element_keeps_its_index(browser_executor):
+    """Test that an element swept from the registry while detached resolves again once re-attached"""
+    script = """
+    const vm = require('vm');
+    const fs = require('fs');
+    const context = {};
+    context.window = context;
+    vm.createContext(context);
+    vm.runInContext(fs.readFileSync(process.argv[1], 'utf8'), context);
+
+    const registry = context.getElementRegistry();
+    const element = {id: '', isConnected: true};
+    const first = context.registerElement(registry, element);
+    element.isConnected = false;
+    context.sweepElementRegistry(registry);
+    const detached = context.getElementByIndex(first.index);
+    element.isConnected = true;
+    const second = context.registerElement(registry, element);
+    console.log(JSON.stringify({
+        sameIndex: first.index === second.index,
+        detached: detached === null,
+        resolved: context.getElementByIndex(second.index) === element
+    }));
+    """
+    output = subprocess.run(
+        ["node", "-e", script, str(browser_executor.dom_extraction_script_path)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    
+    assert json.loads(output) == {"sameIndex": True, "detached": True, "resolved": True}
+
+@pytest.mark.asyncio
+async def test_stream_dom_tree(browser_executor, mock_browser_manager):
+    """Test that the DOM tree is pulled from the page chunk by chunk"""
+    browser_executor.execute_script = AsyncMock(side_effect=[
+        {"streamId": 7, "url": "https://example.com", "title": "Example Domain", "timestamp": "t"},
+        {"streamId": 7, "sequence": 0, "done": False, "truncation": None,
+         "nodes": [{"parentIndex": None, "node": {"id": "el-0", "index": 0, "type": "element", "tagName": "body", "children": []}}],
+         "interactiveElements": {"clickable": []}},
+        {"streamId": 7, "sequence": 1, "done": True, "truncation": {"truncated": False, "nodeCount": 2},
+         "nodes": [{"parentIndex": 0, "node": {"type": "text", "content": "Hello"}}],
+         "interactiveElements": {"clickable": []}}
+    ])
+    
+    chunks = [chunk async for chunk in browser_executor.stream_dom_tree({"maxDepth": 5}, chunk_size=1)]
+    
+    assert [chunk["sequence"] for chunk in chunks] == [0, 1]
+    assert all(chunk["url"] == "https://example.com" for chunk in chunks)
+    
+    start_script = browser_executor.execute_script.call_args_list[0][0][0]
+    assert "startDomStream" in start_script
+    assert '"maxDepth": 5' in start_script
+    assert browser_executor.execute_script.call_args_list[1][0][1] == [[7, 1]]
+    # A completed stream is not cancelled
+    assert browser_executor.execute_script.call_count == 3
+
+@pytest.mark.asyncio
+async def test_stream_dom_tree_cancelled_when_closed_early(browser_executor, mock_browser_manager):
+    """Test that closing the stream early cancels the page-side walk"""
+    browser_executor.execute_script = AsyncMock(side_effect=[
+        {"streamId": 3, "url": "https://example.com", "title": "Example Domain", "timestamp": "t"},
+        {"streamId": 3, "sequence": 0, "done": False, "truncation": None, "nodes": [], "interactiveElements": {}},
+        True
+    ])
+    
+    stream = browser_executor.stream_dom_tree()
+    await stream.__anext__()
+    await stream.aclose()
+    
+    cancel_call = browser_executor.execute_script.call_args_list[-1]
+    assert "cancelDomStream" in cancel_call[0][0]
+    assert cancel_call[0][1] == [3]
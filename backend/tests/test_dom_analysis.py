@@ -0,0 +1,126 @@
+"""
+Tests for the single-pass DOM analysis pipeline.
+"""
+import pytest
+from unittest.mock import MagicMock, patch
+
+from app.dom.analysis import DOMAnalyzer, DOMAnalysisPipeline, FormAnalyzer, run_analyzers
+from app.dom.service import DOMProcessingService
+from app.dom.tree import DOMTree
+from helpers import element
+
+
+@pytest.fixture
+def page():
+    return {
+        "url": "https://example.com/login",
+        "title": "Login",
+        "tree": element("body", "body", [
+            element("top", "header", [{"type": "text", "content": "Welcome"}]),
+            element("login", "form", [
+                element("user", "input", attributes={"name": "user", "required": ""}),
+                element("search", "form", [
+                    element("q", "input", attributes={"type": "search"}),
+                ]),
+                element("send", "button", attributes={"type": "submit"}, textContent="Sign in"),
+            ]),
+        ]),
+        "interactiveElements": {"clickable": [{"id": "send"}], "inputs": [{"id": "user"}, {"id": "q"}]},
+    }
+
+
+class TestRunAnalyzers:
+    def test_default_results(self, page):
+        """All default analyzers report in a single run."""
+        results = DOMAnalysisPipeline().run(page)
+
+        assert results["element_counts"] == {"body": 1, "header": 1, "form": 2, "input": 2, "button": 1}
+        assert "Welcome" in results["text"]
+        assert [section["element_id"] for section in results["sections"]] == ["top"]
+        assert results["interactive_elements"] == {"total": 3, "by_type": {"clickable": 1, "inputs": 2}}
+
+    def test_forms_in_document_order(self, page):
+        """Nested forms are reported in document order and include nested controls."""
+        forms = run_analyzers(page, [FormAnalyzer])["forms"]
+
+        assert [form["id"] for form in forms] == ["login", "search"]
+        assert forms[0]["input_count"] == 2
+        assert forms[0]["inputs"][0]["required"] is True
+        assert forms[0]["submission"] == {"type": "button", "id": "send", "text": "Sign in"}
+        assert forms[1]["input_count"] == 1
+        assert forms[1]["submission"] == {"type": "unknown"}
+
+    def test_custom_analyzer(self, page):
+        """Registered analyzers receive enter and leave events for every node."""
+        class DepthAnalyzer(DOMAnalyzer):
+            name = "max_depth"
+
+            def __init__(self):
+                self.max_depth = 0
+                self.open = 0
+
+            def enter(self, node, depth):
+                self.open += 1
+                self.max_depth = max(self.max_depth, depth)
+
+            def leave(self, node, depth):
+                self.open -= 1
+
+            def result(self):
+                return {"max_depth": self.max_depth, "balanced": self.open == 0}
+
+        pipeline = DOMAnalysisPipeline()
+        pipeline.register(DepthAnalyzer)
+
+        assert pipeline.run(page)["max_depth"] == {"max_depth": 3, "balanced": True}
+
+
+class TestServiceAnalysis:
+    def test_analysis_is_memoized_per_tree(self, page):
+        """The tree is analyzed once per version."""
+        service = DOMProcessingService(MagicMock())
+        service.analysis_pipeline.run = MagicMock(wraps=service.analysis_pipeline.run)
+        dom_tree = DOMTree(page)
+
+        structure = service.analyze_page_structure(dom_tree)
+        service.create_simplified_dom(dom_tree)
+        service.classify_page_type(dom_tree)
+
+        assert service.analysis_pipeline.run.call_count == 1
+        assert [form["id"] for form in structure["forms"]] == ["login", "search"]
+
+        dom_tree.reindex()
+        service.analyze_dom(dom_tree)
+        assert service.analysis_pipeline.run.call_count == 2
+
+    def test_terms_are_collected_for_classification_only(self, page):
+        """The term counts are not part of the analysis and are collected once per version."""
+        service = DOMProcessingService(MagicMock())
+        dom_tree = DOMTree(page)
+
+        assert "terms" not in service.analyze_dom(dom_tree)
+
+        with patch("app.dom.service.run_analyzers", wraps=run_analyzers) as run:
+            service.classify_page_type(dom_tree)
+            service.classify_page_type(dom_tree)
+
+        assert run.call_count == 1
+
+    def test_register_analyzer_invalidates(self, page):
+        """Registering an analyzer makes its results available for analyzed trees."""
+        class TitleAnalyzer(DOMAnalyzer):
+            name = "title_length"
+
+            def start(self, dom_tree):
+                self.length = len(dom_tree.get("title", ""))
+
+            def result(self):
+                return self.length
+
+        service = DOMProcessingService(MagicMock())
+        dom_tree = DOMTree(page)
+        service.analyze_dom(dom_tree)
+
+        service.register_analyzer(TitleAnalyzer)
+
+        assert service.analyze_dom(dom_tree)["title_length"] == 5
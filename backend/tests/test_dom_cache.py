@@ -0,0 +1,170 @@
+"""
+Tests for the versioned DOM lookup cache and the DOM extraction cache.
+"""
+import asyncio
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+
+from app.dom.cache import VersionedLRUCache, DOMExtractionCache
+from app.dom.service import DOMProcessingService
+from app.dom.tree import DOMTree
+
+
+class TestVersionedLRUCache:
+    def test_hits_and_misses(self):
+        """Values are computed once per version and key."""
+        cache = VersionedLRUCache(maxsize=10)
+        compute = MagicMock(return_value="/html/body")
+
+        assert cache.get_or_compute(1, "body", compute) == "/html/body"
+        assert cache.get_or_compute(1, "body", compute) == "/html/body"
+        assert cache.get_or_compute(2, "body", compute) == "/html/body"
+
+        assert compute.call_count == 2
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 2
+        assert stats["size"] == 2
+
+    def test_bounded_size(self):
+        """The least recently used entry is evicted."""
+        cache = VersionedLRUCache(maxsize=2)
+        cache.get_or_compute(1, "a", lambda: "a")
+        cache.get_or_compute(1, "b", lambda: "b")
+        cache.get_or_compute(1, "a", lambda: "a")
+        cache.get_or_compute(1, "c", lambda: "c")
+
+        assert len(cache) == 2
+        assert cache.stats()["evictions"] == 1
+        assert cache.get_or_compute(1, "b", lambda: "recomputed") == "recomputed"
+
+    def test_invalidate(self):
+        """Entries can be dropped per version or all at once."""
+        cache = VersionedLRUCache()
+        cache.get_or_compute(1, "a", lambda: "a")
+        cache.get_or_compute(2, "a", lambda: "a")
+
+        assert cache.invalidate(1) == 1
+        assert len(cache) == 1
+        assert cache.invalidate() == 1
+        assert len(cache) == 0
+        assert cache.stats()["invalidations"] == 2
+
+
+class TestServiceLookupCache:
+    def test_lookups_are_cached_per_tree(self):
+        """xpath/selector lookups are cached for each tree version."""
+        tree = DOMTree({
+            "tree": {
+                "id": "body", "type": "element", "tagName": "body", "xpath": "/html/body", "css_selector": "body",
+                "attributes": {}, "children": [
+                    {"id": "go", "type": "element", "tagName": "button", "xpath": "/html/body/button",
+                     "css_selector": "button#go", "attributes": {"id": "go"}, "children": []}
+                ]
+            }
+        })
+        service = DOMProcessingService(MagicMock())
+
+        assert service.get_element_xpath(tree, "button#go") == "/html/body/button"
+        assert service.get_element_xpath(tree, "button#go") == "/html/body/button"
+        assert service.get_element_selector(tree, "/html/body/button") == "button#go"
+        assert service.get_lookup_cache_stats()["hits"] == 1
+
+        # A rebuilt index is a new version
+        tree["tree"]["children"][0]["xpath"] = "/html/body/button[1]"
+        tree.reindex()
+        assert service.get_element_xpath(tree, "button#go") == "/html/body/button[1]"
+
+    @pytest.mark.asyncio
+    async def test_reextraction_invalidates(self):
+        """Extracting the DOM again drops cached lookups."""
+        executor = MagicMock()
+        executor.extract_dom_tree = AsyncMock(return_value={"url": "https://example.com", "tree": None})
+        service = DOMProcessingService(executor)
+        service.lookup_cache.get_or_compute(1, ("xpath", "a"), lambda: "/html/body/a")
+
+        await service.extract_dom()
+
+        assert len(service.lookup_cache) == 0
+
+
+STATE = {"url": "https://example.com", "counter": 0, "navigationCount": 1}
+
+
+class TestDOMExtractionCache:
+    def test_reused_while_unchanged(self):
+        """An extraction is returned while the document state is identical."""
+        cache = DOMExtractionCache()
+        cache.put("options", STATE, "tree")
+
+        assert cache.get("options", dict(STATE)) == "tree"
+        assert cache.get("other options", STATE) is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["urls"] == ["https://example.com"]
+
+    def test_changed_document_is_stale(self):
+        """Document changes, navigations and URL changes make an extraction stale."""
+        cache = DOMExtractionCache()
+        for change in ({"counter": 3}, {"navigationCount": 2}, {"url": "https://example.com/next"}):
+            cache.put("options", STATE, "tree")
+            assert cache.get("options", {**STATE, **change}) is None
+
+        assert len(cache) == 0
+        assert cache.stats()["stale"] == 3
+
+    def test_expired(self, monkeypatch):
+        """Extractions older than the time-to-live are not reused."""
+        now = [100.0]
+        monkeypatch.setattr("app.dom.cache.time.monotonic", lambda: now[0])
+        cache = DOMExtractionCache(ttl=30.0)
+        cache.put("options", STATE, "tree")
+
+        now[0] += 31.0
+        assert cache.get("options", STATE) is None
+        assert cache.stats()["expired"] == 1
+
+    def test_bounded_size(self):
+        """The least recently used extraction is evicted."""
+        cache = DOMExtractionCache(maxsize=1)
+        cache.put("a", STATE, "tree a")
+        cache.put("b", STATE, "tree b")
+
+        assert cache.get("a", STATE) is None
+        assert cache.get("b", STATE) == "tree b"
+        assert cache.stats()["evictions"] == 1
+
+
+class TestServiceExtractionCache:
+    def make_service(self, states):
+        executor = MagicMock()
+        executor.extract_dom_tree = AsyncMock(side_effect=lambda options: {
+            "url": "https://example.com",
+            "tree": {"id": "body", "type": "element", "tagName": "body", "attributes": {}, "children": []}
+        })
+        executor.get_document_state = AsyncMock(side_effect=states)
+        return DOMProcessingService(executor), executor
+
+    def test_unchanged_page_is_extracted_once(self):
+        """Repeated extractions of an unchanged page run the extraction once."""
+        service, executor = self.make_service([STATE, STATE, {**STATE, "counter": 1}])
+
+        first = asyncio.run(service.extract_dom())
+        second = asyncio.run(service.extract_dom())
+        third = asyncio.run(service.extract_dom())
+
+        assert second is first
+        assert third is not first
+        assert executor.extract_dom_tree.call_count == 2
+        assert service.get_extraction_cache_stats()["hits"] == 1
+
+    def test_bypass_and_clear(self):
+        """The cache can be bypassed per call and cleared."""
+        service, executor = self.make_service([STATE, STATE])
+
+        asyncio.run(service.extract_dom())
+        asyncio.run(service.extract_dom(use_cache=False))
+        assert executor.extract_dom_tree.call_count == 2
+
+        assert service.clear_extraction_cache() == 1
+        asyncio.run(service.extract_dom())
+        assert executor.extract_dom_tree.call_count == 3
@@ -0,0 +1,52 @@
+"""
+Tests for the page type classifier.
+"""
+import json
+from collections import Counter
+
+from app.dom.analysis import run_analyzers, TermAnalyzer, TextAnalyzer
+from app.dom.classifier import PageTypeClassifier, PAGE_TYPE_FEATURES
+
+
+def count_separately(text):
+    """Count the features of each page type with one scan per feature."""
+    return Counter({
+        page_type: sum(text.count(feature) for feature in features)
+        for page_type, features in PAGE_TYPE_FEATURES.items()
+        if any(feature in text for feature in features)
+    })
+
+
+class TestPageTypeClassifier:
+    def test_contained_features_are_counted(self):
+        """A longer feature also counts the features it contains."""
+        classifier = PageTypeClassifier()
+        text = "forgot password? no results found. sign in with your email to submit the form"
+
+        assert classifier.count(text) == count_separately(text)
+
+    def test_structure_matches_serialized_counts(self):
+        """Scanning the collected terms counts the same features as scanning the serialized tree."""
+        dom_tree = {
+            "url": "https://example.com/search?query=shoes",
+            "tree": {
+                "id": "body", "type": "element", "tagName": "body", "attributes": {},
+                "children": [
+                    {"id": "q", "type": "element", "tagName": "input",
+                     "attributes": {"type": "search", "placeholder": "Search products"}, "children": []},
+                    {"type": "text", "content": "Showing 10 results, sort by price"},
+                ],
+            },
+        }
+        classifier = PageTypeClassifier()
+        results = run_analyzers(dom_tree, [TextAnalyzer, TermAnalyzer])
+
+        assert classifier.count_terms(results["terms"]) == count_separately(json.dumps(dom_tree).lower())
+
+        scores = classifier.classify(results["text"], results["terms"])
+        assert max(scores, key=scores.get) == "search"
+        assert abs(sum(scores.values()) - 1.0) < 1e-9
+
+    def test_unknown(self):
+        """Pages without any features are unknown."""
+        assert PageTypeClassifier().classify("nothing to see", Counter({"div": 3})) == {"unknown": 1.0}
@@ -0,0 +1,109 @@
+"""
+Tests for the compact DOM node representation.
+"""
+import copy
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.dom import node as node_module
+from app.dom.node import DOMNode, compact_tree, tree_size
+from app.dom.service import DOMProcessingService
+from app.dom.tree import DOMTree
+
+
+def make_element(index, children=None):
+    return {
+        "id": f"el-{index}",
+        "index": index,
+        "type": "element",
+        "tagName": "a" if index % 3 == 0 else "div",
+        "attributes": {"class": "item link", "href": f"/items/{index}"},
+        "position": {"x": index, "y": index * 20, "width": 100, "height": 20, "viewportX": index, "viewportY": 0},
+        "css_selector": f"#el-{index}",
+        "xpath": f"/html/body/div[{index + 1}]",
+        "accessibility": {"role": "link"},
+        "children": children or [],
+        "textContent": f"Item {index}",
+        "interactive": True,
+        "interactiveTypes": ["clickable", "navigational"],
+        "interactiveReasons": {"clickable": ["tag is a"], "navigational": ["has href"]},
+    }
+
+
+def make_page(count):
+    return make_element(0, [
+        make_element(i, [{"type": "text", "content": f"Item {i}"}]) for i in range(1, count)
+    ])
+
+
+class TestDOMNode:
+    def test_behaves_like_dict(self):
+        """Compact nodes expose the same keys and values as the node dictionary."""
+        page = make_page(5)
+        node = compact_tree(copy.deepcopy(page))
+
+        assert isinstance(node, DOMNode)
+        assert node["tagName"] == "a"
+        assert node.get("attributes", {})["href"] == "/items/0"
+        assert node.get_attribute("class") == "item link"
+        assert node.get_attribute("missing", "") == ""
+        assert "children" in node and "frameIndex" not in node
+        assert node["interactiveTypes"] == ["clickable", "navigational"]
+        assert list(node) == list(page)
+        assert node == page
+        assert node["children"][0]["children"][0] == {"type": "text", "content": "Item 1"}
+
+    def test_round_trip(self):
+        """to_dict returns the original tree."""
+        page = make_page(20)
+
+        assert compact_tree(copy.deepcopy(page)).to_dict() == page
+
+    def test_materialized_values_are_copies(self):
+        """Modifying a materialized attribute dictionary does not modify the node."""
+        node = compact_tree(make_page(2))
+        node["attributes"]["href"] = "/changed"
+
+        assert node["attributes"]["href"] == "/items/0"
+
+    def test_shapes_are_not_retained(self):
+        """Attribute layouts stay with their tree and the shared node shapes are capped."""
+        for index in range(node_module.MAX_NODE_SHAPES + 10):
+            compact_tree({"tagName": "div", "attributes": {f"data-{index}": "1"}, f"key-{index}": 1})
+
+        assert len(node_module._node_shapes) <= node_module.MAX_NODE_SHAPES
+        assert not any("data-" in key for keys in node_module._node_shapes for key in keys)
+
+    def test_memory(self):
+        """Compact trees use much less memory than the dictionaries."""
+        page = make_page(2000)
+        compact = compact_tree(copy.deepcopy(page))
+
+        assert tree_size(compact) < tree_size(page) * 0.6
+
+
+class TestServiceCompactTrees:
+    @pytest.fixture
+    def dom_tree(self):
+        tree = DOMTree({"url": "https://example.com", "title": "Items", "tree": make_page(10)})
+        return tree.compact()
+
+    def test_queries(self, dom_tree):
+        """Service queries work on compact trees."""
+        service = DOMProcessingService(MagicMock())
+
+        assert service.get_element_by_id(dom_tree, "el-3")["xpath"] == "/html/body/div[4]"
+        assert len(service.find_elements_by_selector(dom_tree, "a.link[href^='/items']")) == 4
+        assert service.count_element_types(dom_tree) == {"a": 4, "div": 6}
+        assert service.get_element_xpath(dom_tree, "#el-2") == "/html/body/div[3]"
+        assert service.create_simplified_dom(dom_tree, max_depth=1)["tree"]["children"][0]["id"] == "el-1"
+        assert "listing" in service.classify_page_type(dom_tree) or service.classify_page_type(dom_tree)
+
+    def test_to_dict(self, dom_tree):
+        """The tree converts back to plain dictionaries for API responses."""
+        result = dom_tree.to_dict()
+
+        assert type(result) is dict
+        assert result["tree"] == make_page(10)
+        assert type(result["tree"]) is dict
@@ -0,0 +1,126 @@
+"""
+Tests for the element search index.
+"""
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.dom.search import ElementSearchIndex
+from app.dom.service import DOMProcessingService
+from app.dom.tree import DOMTree
+from helpers import element, entry
+
+
+@pytest.fixture
+def dom_tree():
+    buttons = [
+        element("save", "button", text="Save changes"),
+        element("save-draft", "button", text="Save as draft"),
+        element("cancel", "button", text="Cancel", attributes={"title": "Discard your changes"}),
+        element("help", "a", attributes={"href": "/help", "aria-label": "Open the help center"}),
+    ]
+    inputs = [
+        element("city", "input", attributes={"name": "city"}),
+        element("zip", "input", attributes={"name": "postal", "placeholder": "Postal code"}),
+        element("phone", "input", attributes={"name": "tel"}),
+    ]
+    tree = element("body", "body", [
+        element("checkout", "form", [
+            element("city-label", "label", attributes={"for": "city"}, text="Shipping city"),
+            inputs[0],
+            element("zip-wrapper", "label", [{"type": "text", "content": "ZIP"}, inputs[1]]),
+            element("phone-caption", "span", text="Mobile number"),
+            {**inputs[2], "attributes": {"name": "tel", "aria-labelledby": "phone-caption"}},
+            element("newsletter", "input", attributes={"type": "checkbox"}),
+            element("newsletter-label", "label", attributes={"for": "newsletter"}, text="Send me offers"),
+        ], attributes={"name": "checkout", "action": "/checkout"}),
+        *buttons,
+    ])
+    phone = tree["children"][0]["children"][4]
+    return DOMTree({
+        "tree": tree,
+        "interactiveElements": {
+            "clickable": [entry(node) for node in buttons],
+            "inputs": [entry(node) for node in inputs[:2]] + [entry(phone)],
+            "forms": [],
+            "navigational": [entry(buttons[3])],
+        }
+    })
+
+
+class TestElementSearchIndex:
+    def test_ranking(self, dom_tree):
+        """Exact matches rank before partial matches, in document order between equals."""
+        search_index = ElementSearchIndex(dom_tree, dom_tree.index)
+
+        matches = search_index.search("save", ["clickable"])
+        assert [match["entry"]["id"] for match in matches] == ["save", "save-draft"]
+        assert matches[0]["match"] == "contains"
+
+        assert search_index.search("save as draft")[0]["entry"]["id"] == "save-draft"
+        assert search_index.search("save as draft")[0]["match"] == "exact"
+
+    def test_attributes_and_prefixes(self, dom_tree):
+        """Titles, aria-labels and token prefixes are matched."""
+        search_index = ElementSearchIndex(dom_tree, dom_tree.index)
+
+        assert search_index.search("discard")[0]["entry"]["id"] == "cancel"
+        assert search_index.search("help center", ["clickable"])[0]["field"] == "aria-label"
+        assert search_index.search("canc")[0]["entry"]["id"] == "cancel"
+
+    def test_substrings(self, dom_tree):
+        """Queries found literally inside a word or across words are matched like before indexing."""
+        search_index = ElementSearchIndex(dom_tree, dom_tree.index)
+
+        match = search_index.search("ostal", ["inputs"], fuzzy=False)[0]
+        assert match["entry"]["id"] == "zip"
+        assert match["match"] == "contains"
+        assert search_index.search("al co", ["inputs"], fuzzy=False)[0]["entry"]["id"] == "zip"
+        assert search_index.search("hange", fuzzy=False)[0]["entry"]["id"] == "save"
+
+    def test_fuzzy(self, dom_tree):
+        """Misspelled queries match by trigram similarity, unrelated queries do not."""
+        search_index = ElementSearchIndex(dom_tree, dom_tree.index)
+
+        match = search_index.search("cancle")[0]
+        assert match["entry"]["id"] == "cancel"
+        assert match["match"] == "fuzzy"
+        assert search_index.search("cancle", fuzzy=False) == []
+        assert search_index.search("unrelated words") == []
+
+    def test_label_association(self, dom_tree):
+        """Inputs are found by label for, wrapping labels and aria-labelledby."""
+        search_index = ElementSearchIndex(dom_tree, dom_tree.index)
+
+        assert search_index.search("shipping city", ["inputs"])[0]["entry"]["id"] == "city"
+        assert search_index.search("zip", ["inputs"])[0]["entry"]["id"] == "zip"
+        assert search_index.search("mobile number", ["inputs"])[0]["entry"]["id"] == "phone"
+
+        # Labelled inputs that were not reported as interactive are still found
+        match = search_index.search("offers", ["inputs"])[0]
+        assert match["entry"] == entry(dom_tree.index.get_by_id("newsletter"))
+
+    def test_forms(self, dom_tree):
+        """Forms are found by their attributes and the fields they contain."""
+        search_index = ElementSearchIndex(dom_tree, dom_tree.index)
+
+        assert search_index.search("checkout", ["forms"])[0]["entry"]["id"] == "checkout"
+        match = search_index.search("postal", ["forms"])[0]
+        assert match["entry"]["id"] == "checkout"
+        assert match["field"] == "controls"
+
+
+class TestServiceSearch:
+    def test_index_is_built_once_per_tree(self, dom_tree):
+        """The search index is cached for each tree version."""
+        service = DOMProcessingService(MagicMock())
+
+        assert service.get_search_index(dom_tree) is service.get_search_index(dom_tree)
+        assert service.find_clickable_path(dom_tree, "Cancel")["id"] == "cancel"
+        assert service.find_input_field(dom_tree, "postal code")["id"] == "zip"
+        assert service.find_input_field(dom_tree, "Save changes") is None
+        assert service.find_input_field(dom_tree, "obile")["id"] == "phone"
+
+        search_index = service.get_search_index(dom_tree)
+        dom_tree.reindex()
+        assert service.get_search_index(dom_tree) is not search_index
@@ -0,0 +1,85 @@
+"""
+Tests for the CSS selector engine.
+"""
+import pytest
+
+from app.dom.selector import compile_selector, select, SelectorSyntaxError
+from app.dom.tree import DOMTreeIndex
+from helpers import element
+
+
+@pytest.fixture
+def index():
+    tree = element("body", "body", children=[
+        element("nav", "nav", attributes={"class": "main-nav", "aria-label": "Main"}, children=[
+            element("menu", "ul", attributes={"class": "menu"}, children=[
+                element("li-1", "li", attributes={"class": "item first"}, children=[element("home", "a", attributes={"href": "/", "lang": "en-US"})]),
+                element("li-2", "li", attributes={"class": "item"}, children=[element("about", "a", attributes={"href": "/about"})]),
+                element("li-3", "li", attributes={"class": "item"}, children=[element("docs", "a", attributes={"href": "https://docs.example.com"})]),
+            ]),
+        ]),
+        element("signup", "form", children=[
+            element("email-label", "label", attributes={"for": "email"}, text="Email"),
+            element("email", "input", attributes={"type": "email", "name": "email", "required": ""}),
+            element("password", "input", attributes={"type": "Password", "name": "password"}),
+            element("submit", "button", attributes={"type": "submit", "disabled": ""}),
+        ]),
+        {"type": "text", "content": "Footer"},
+        element("empty", "p"),
+    ])
+    return DOMTreeIndex(tree)
+
+
+def ids(elements):
+    return [node["id"] for node in elements]
+
+
+class TestSelectorEngine:
+    @pytest.mark.parametrize("selector,expected", [
+        ("a", ["home", "about", "docs"]),
+        ("#email", ["email"]),
+        (".item", ["li-1", "li-2", "li-3"]),
+        ("li.item.first", ["li-1"]),
+        ("*", ["body", "nav", "menu", "li-1", "home", "li-2", "about", "li-3", "docs",
+               "signup", "email-label", "email", "password", "submit", "empty"]),
+        ("nav a", ["home", "about", "docs"]),
+        ("nav > a", []),
+        ("ul > li > a", ["home", "about", "docs"]),
+        ("label + input", ["email"]),
+        ("label ~ input", ["email", "password"]),
+        ("input, label", ["email-label", "email", "password"]),
+        ('input[type="email"]', ["email"]),
+        ("input[type=password i]", ["password"]),
+        ("[required]", ["email"]),
+        ("a[href^='https']", ["docs"]),
+        ('a[href$="/about"]', ["about"]),
+        ("a[href*=docs]", ["docs"]),
+        ("li[class~=first]", ["li-1"]),
+        ("a[lang|=en]", ["home"]),
+        ("li:first-child", ["li-1"]),
+        ("li:last-child", ["li-3"]),
+        ("li:nth-child(2)", ["li-2"]),
+        ("li:nth-child(odd)", ["li-1", "li-3"]),
+        ("li:nth-child(2n)", ["li-2"]),
+        ("li:nth-last-child(1)", ["li-3"]),
+        ("input:nth-of-type(2)", ["password"]),
+        ("form > :first-child", ["email-label"]),
+        ("input:not([required])", ["password"]),
+        ("li:not(.first) a", ["about", "docs"]),
+        ("button:disabled", ["submit"]),
+        ("p:empty", ["empty"]),
+        ("a:only-child", ["home", "about", "docs"]),
+    ])
+    def test_select(self, index, selector, expected):
+        """Selectors match the expected elements in document order."""
+        assert ids(select(index, selector)) == expected
+
+    def test_compiled_selectors_are_cached(self):
+        """Selectors are parsed once."""
+        assert compile_selector("nav a") is compile_selector("nav a")
+
+    @pytest.mark.parametrize("selector", ["", "a >", "a[href", "li:hover", "li:nth-child(x)", "> a", "a)"])
+    def test_invalid_selectors(self, selector):
+        """Invalid and unsupported selectors raise SelectorSyntaxError."""
+        with pytest.raises(SelectorSyntaxError):
+            compile_selector(selector)
@@ -0,0 +1,107 @@
+"""
+Tests for the token-budgeted DOM serializer.
+"""
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.dom.serializer import DOMSerializer, estimate_tokens
+from app.dom.service import DOMProcessingService
+from helpers import element
+
+
+def indexed(index, tag_name, children=None, attributes=None, text=None, interactive=False, y=0):
+    node = element(f"element-{index}", tag_name, children, attributes, index=index,
+                   xpath=f"/html/body/{tag_name}[{index}]",
+                   position={"x": 0, "y": y, "width": 100, "height": 20, "viewportX": 0, "viewportY": y})
+    if text:
+        node["children"].append({"type": "text", "content": text})
+    if interactive:
+        node["interactive"] = True
+        node["interactiveTypes"] = ["clickable"]
+    return node
+
+
+@pytest.fixture
+def dom_tree():
+    form = indexed(2, "form", attributes={"aria-label": "Newsletter"}, children=[
+        indexed(3, "input", attributes={"type": "email", "name": "email", "placeholder": "Your email"},
+                interactive=True),
+        indexed(4, "button", attributes={"type": "submit"}, text="Subscribe", interactive=True),
+    ])
+    body = indexed(0, "body", children=[
+        indexed(1, "h1", text="Weekly digest"),
+        indexed(5, "p", text="Get the best articles every week. " * 4),
+        form,
+        indexed(6, "a", attributes={"href": "/privacy"}, text="Privacy policy", interactive=True, y=3000),
+    ])
+    return {"url": "https://example.com", "title": "Digest", "tree": body}
+
+
+class TestDOMSerializer:
+    def test_lines_in_document_order(self, dom_tree):
+        """All lines fit a large budget and are emitted in document order."""
+        result = DOMSerializer().serialize(dom_tree, 1000)
+
+        assert result["text"].split("\n") == [
+            "# Digest - https://example.com",
+            "<h1>Weekly digest",
+            "Get the best articles every week. Get the best articles every week. Get the b...",
+            '<form aria-label="Newsletter">',
+            '[3]<input type="email" name="email" placeholder="Your email">',
+            '[4]<button type="submit">Subscribe',
+            '[6]<a href="/privacy">Privacy policy',
+        ]
+        assert result["elements"][4]["xpath"] == "/html/body/button[4]"
+        assert result["tokens_used"] == sum(estimate_tokens(line) for line in result["text"].split("\n")) + 6
+        assert not result["truncated"]
+
+    def test_interactive_elements_first(self, dom_tree):
+        """A small budget keeps interactive elements over containers and text."""
+        result = DOMSerializer().serialize(dom_tree, 45)
+
+        assert result["tokens_used"] <= 45
+        assert result["included"]["interactive"] == 3
+        assert result["omitted"]["text"] == 1
+        assert result["truncated"]
+
+    def test_viewport_and_query_ranking(self, dom_tree):
+        """Within a tier, elements in the viewport and matching the query come first."""
+        serializer = DOMSerializer()
+
+        in_viewport = serializer.serialize(dom_tree, 35)
+        assert "[3]" in in_viewport["text"]
+        assert "[6]" not in in_viewport["text"]
+
+        matching = serializer.serialize(dom_tree, 35, query="privacy policy")
+        assert "[6]" in matching["text"]
+
+    def test_duplicate_indexes(self, dom_tree):
+        """An element whose index is already shown gets another one instead of replacing the first."""
+        duplicate = indexed(3, "button", text="Frame button", interactive=True)
+        duplicate["id"] = "frame-1:element-3"
+        dom_tree["tree"]["children"].append(duplicate)
+
+        result = DOMSerializer().serialize(dom_tree, 1000)
+
+        lines = [line for line in result["text"].split("\n") if line.startswith("[")]
+        indexes = [line[1:line.index("]")] for line in lines]
+        assert len(set(indexes)) == len(lines) == 4
+        assert result["elements"][3]["id"] == "element-3"
+        assert sorted(element["id"] for element in result["elements"].values()) == [
+            "element-3", "element-4", "element-6", "frame-1:element-3"
+        ]
+
+    def test_custom_token_counter(self, dom_tree):
+        """The token counter can be replaced, e.g. by the tokenizer of the model."""
+        result = DOMSerializer(count_tokens=lambda text: len(text.split())).serialize(dom_tree, 10)
+
+        assert result["tokens_used"] <= 10
+        assert result["included"]["interactive"] >= 1
+
+    def test_service_default_budget(self, dom_tree):
+        """The service serializes with the configured budget and rejects invalid trees."""
+        service = DOMProcessingService(MagicMock())
+
+        assert service.serialize_for_llm(dom_tree)["token_budget"] > 0
+        assert "error" in service.serialize_for_llm({})
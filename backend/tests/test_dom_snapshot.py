@@ -0,0 +1,205 @@
+"""
+Tests for the CDP snapshot DOM extraction backend.
+"""
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.dom.snapshot import build_dom_tree_from_snapshot
+from app.dom.service import DOMProcessingService
+
+
+class SnapshotBuilder:
+    """Helper to build DOMSnapshot.captureSnapshot payloads."""
+
+    def __init__(self):
+        self.strings = []
+        self.nodes = {"parentIndex": [], "nodeType": [], "nodeName": [], "nodeValue": [],
+                      "backendNodeId": [], "attributes": [], "isClickable": {"index": []}}
+        self.layout = {"nodeIndex": [], "styles": [], "bounds": []}
+
+    def string(self, value):
+        if value not in self.strings:
+            self.strings.append(value)
+        return self.strings.index(value)
+
+    def add(self, parent, node_type, name, value=None, attributes=None, bounds=None,
+            style=("block", "visible", "1", "auto"), clickable=False):
+        index = len(self.nodes["parentIndex"])
+        self.nodes["parentIndex"].append(parent)
+        self.nodes["nodeType"].append(node_type)
+        self.nodes["nodeName"].append(self.string(name))
+        self.nodes["nodeValue"].append(self.string(value) if value is not None else -1)
+        self.nodes["backendNodeId"].append(100 + index)
+        flat = []
+        for key, attr_value in (attributes or {}).items():
+            flat.extend([self.string(key), self.string(attr_value)])
+        self.nodes["attributes"].append(flat)
+        if clickable:
+            self.nodes["isClickable"]["index"].append(index)
+        if bounds is not None:
+            self.layout["nodeIndex"].append(index)
+            self.layout["bounds"].append(list(bounds))
+            self.layout["styles"].append([self.string(s) for s in style])
+        return index
+
+    def element(self, parent, tag, attributes=None, bounds=(0, 0, 100, 20), **kwargs):
+        return self.add(parent, 1, tag.upper(), attributes=attributes, bounds=bounds, **kwargs)
+
+    def text(self, parent, value):
+        return self.add(parent, 3, "#text", value=value, bounds=(0, 0, 10, 10))
+
+    def snapshot(self):
+        return {
+            "documents": [{
+                "documentURL": self.string("https://example.com/"),
+                "title": self.string("Example"),
+                "nodes": self.nodes,
+                "layout": self.layout,
+                "scrollOffsetX": 0,
+                "scrollOffsetY": 50
+            }],
+            "strings": self.strings
+        }
+
+
+@pytest.fixture
+def sample_snapshot():
+    builder = SnapshotBuilder()
+    document = builder.add(-1, 9, "#document")
+    html = builder.element(document, "html")
+    builder.element(html, "head", bounds=None)
+    body = builder.element(html, "body", bounds=(0, 0, 1280, 2000))
+    nav = builder.element(body, "nav", {"class": "navbar"})
+    link = builder.element(nav, "a", {"href": "/about"})
+    builder.text(link, "About")
+    builder.element(nav, "a", {"href": "/contact"}, bounds=(0, 0, 50, 20))
+    form = builder.element(body, "form", {"id": "signup"})
+    builder.element(form, "input", {"type": "text", "name": "email"})
+    builder.element(body, "div", {"class": "hidden"}, style=("none", "visible", "1", "auto"))
+    card = builder.element(body, "div", {"class": "card"}, bounds=(0, 500, 200, 100), clickable=True,
+                           style=("block", "visible", "1", "pointer"))
+    builder.text(card, "Open card")
+    return builder.snapshot()
+
+
+class TestSnapshotTreeBuilder:
+    def test_builds_tree_schema(self, sample_snapshot):
+        """The snapshot is converted into the buildDomTree.js schema."""
+        ax_nodes = [{"backendDOMNodeId": 105, "role": {"value": "link"}, "name": {"value": "About"}}]
+        result = build_dom_tree_from_snapshot(sample_snapshot, ax_nodes)
+
+        assert result["url"] == "https://example.com/"
+        assert result["title"] == "Example"
+        assert result["backend"] == "snapshot"
+
+        body = result["tree"]
+        assert body["tagName"] == "body"
+        assert [child["tagName"] for child in body["children"]] == ["nav", "form", "div"]
+
+        nav = body["children"][0]
+        about, contact = nav["children"]
+        assert about["id"] == "el-2"
+        assert about["index"] == 2
+        assert about["backendNodeId"] == 105
+        assert about["textContent"] == "About"
+        assert about["xpath"] == "/html/body/nav/a[1]"
+        assert contact["xpath"] == "/html/body/nav/a[2]"
+        assert about["accessibility"]["computedRole"] == "link"
+        assert about["accessibility"]["computedName"] == "About"
+        assert "_path" not in about
+
+        form = body["children"][1]
+        assert form["id"] == "signup"
+        assert form["index"] == 4
+        assert form["css_selector"] == "form#signup"
+        assert form["xpath"] == '//*[@id="signup"]'
+        email = form["children"][0]
+        assert email["xpath"] == "/html/body/form/input"
+        assert email["css_selector"] == 'input[type="text"]'
+        assert email["interactiveTypes"] == ["clickable", "input", "form"]
+
+    def test_interactive_elements(self, sample_snapshot):
+        """Interactive elements are classified like the JavaScript walker, plus click listeners."""
+        result = build_dom_tree_from_snapshot(sample_snapshot)
+        interactive = result["interactiveElements"]
+
+        clickable_ids = [element["id"] for element in interactive["clickable"]]
+        assert "el-2" in clickable_ids
+        assert "el-6" in clickable_ids
+        card = next(element for element in interactive["clickable"] if element["id"] == "el-6")
+        assert "has click listener" in card["interactiveReasons"]
+        assert "cursor: pointer" in card["interactiveReasons"]
+
+        assert [element["id"] for element in interactive["inputs"]] == ["el-5"]
+        assert [element["id"] for element in interactive["navigational"]][:2] == ["el-1", "el-2"]
+
+    def test_viewport_only_and_positions(self, sample_snapshot):
+        """Positions are reported relative to the viewport and offscreen elements are pruned."""
+        result = build_dom_tree_from_snapshot(
+            sample_snapshot,
+            options={"viewportOnly": True, "viewportMargin": 100},
+            viewport={"width": 1280, "height": 300}
+        )
+        body = result["tree"]
+        assert [child["tagName"] for child in body["children"]] == ["nav", "form"]
+        assert body["children"][0]["position"]["viewportY"] == -50
+        assert result["truncation"]["prunedOffscreen"] == 1
+        assert result["truncation"]["truncated"] is True
+
+    def test_max_nodes(self, sample_snapshot):
+        """Extraction stops once the node budget is spent."""
+        result = build_dom_tree_from_snapshot(sample_snapshot, options={"maxNodes": 3})
+        assert result["truncation"]["nodeCount"] == 3
+        assert result["truncation"]["budgetExhausted"] is True
+
+    def test_interactive_reserve(self):
+        """Regular nodes stop at the soft limit, interactive elements use the reserved budget."""
+        builder = SnapshotBuilder()
+        document = builder.add(-1, 9, "#document")
+        html = builder.element(document, "html")
+        body = builder.element(html, "body", bounds=(0, 0, 1280, 800))
+        intro = builder.element(body, "div", {"class": "intro"})
+        builder.text(intro, "Welcome")
+        actions = builder.element(body, "div", {"class": "actions"})
+        builder.element(actions, "button")
+        snapshot = builder.snapshot()
+
+        result = build_dom_tree_from_snapshot(snapshot, options={"maxNodes": 4, "interactiveReserve": 0.5})
+        children = result["tree"]["children"]
+
+        # The dropped wrapper's button is attached to the body instead
+        assert [child["tagName"] for child in children] == ["div", "button"]
+        assert [child["id"] for child in children] == ["el-1", "el-2"]
+        assert children[1]["index"] == 2
+        assert children[0]["children"] == []
+        assert result["truncation"]["nodeCount"] == 3
+        assert result["truncation"]["droppedByBudget"] == 2
+
+        result = build_dom_tree_from_snapshot(snapshot, options={"maxNodes": 4, "interactiveReserve": 0})
+        assert [child["tagName"] for child in result["tree"]["children"]] == ["div", "div"]
+
+class TestSnapshotBackendSelection:
+    @pytest.mark.asyncio
+    async def test_snapshot_backend_selected(self):
+        """The snapshot backend is used when requested."""
+        executor = MagicMock()
+        executor.extract_dom_snapshot = AsyncMock(return_value={"url": "u", "tree": None})
+        executor.extract_dom_tree = AsyncMock()
+        service = DOMProcessingService(executor)
+
+        result = await service.extract_dom({"backend": "snapshot"})
+
+        assert result["url"] == "u"
+        executor.extract_dom_tree.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_snapshot_backend_falls_back(self):
+        """Script extraction is used when CDP is not available."""
+        executor = MagicMock()
+        executor.extract_dom_snapshot = AsyncMock(side_effect=RuntimeError("CDP not supported"))
+        executor.extract_dom_tree = AsyncMock(return_value={"url": "fallback", "tree": None})
+        service = DOMProcessingService(executor)
+
+        result = await service.extract_dom({"backend": "snapshot"})
+
+        assert result["url"] == "fallback"
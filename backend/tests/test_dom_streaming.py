@@ -0,0 +1,112 @@
+"""
+Tests for assembling DOM trees extracted in chunks.
+"""
+import pytest
+from unittest.mock import MagicMock
+
+from app.dom.service import DOMProcessingService
+from app.dom.streaming import DOMTreeAssembler
+
+
+@pytest.fixture
+def chunks():
+    """Chunks as produced by the page-side chunked walker."""
+    metadata = {"url": "https://example.com", "title": "Example", "timestamp": "2023-01-01T00:00:00.000Z"}
+    return [
+        {
+            **metadata, "sequence": 0, "done": False, "truncation": None,
+            "nodes": [
+                {"parentIndex": None,
+                 "node": {"id": "el-0", "index": 0, "type": "element", "tagName": "body", "children": []}},
+                {"parentIndex": 0,
+                 "node": {"id": "nav", "index": 1, "type": "element", "tagName": "nav", "children": []}},
+            ],
+            "interactiveElements": {"clickable": [], "inputs": [], "forms": [], "navigational": [{"id": "nav"}]}
+        },
+        {
+            **metadata, "sequence": 1, "done": True, "truncation": {"truncated": False, "nodeCount": 4},
+            "nodes": [
+                {"parentIndex": 1,
+                 "node": {"id": "el-2", "index": 2, "type": "element", "tagName": "a", "children": []}},
+                {"parentIndex": 0, "node": {"type": "text", "content": "Footer"}},
+            ],
+            "interactiveElements": {"clickable": [{"id": "el-2"}], "inputs": [], "forms": [], "navigational": []}
+        }
+    ]
+
+
+class TestDOMTreeAssembler:
+    def test_assembles_tree(self, chunks):
+        """Node records are attached to their parents in document order."""
+        assembler = DOMTreeAssembler()
+        added = assembler.add_chunk(chunks[0])
+
+        assert [node["id"] for node in added] == ["el-0", "nav"]
+        assert assembler.tree["children"][0]["id"] == "nav"
+        assert assembler.interactive_elements["navigational"] == [{"id": "nav"}]
+        assert assembler.done is False
+
+        assembler.add_chunk(chunks[1])
+        result = assembler.result()
+
+        assert result["url"] == "https://example.com"
+        assert [child.get("id", child.get("content")) for child in result["tree"]["children"]] == ["nav", "Footer"]
+        assert assembler.get_element("nav")["children"][0]["tagName"] == "a"
+        assert result["interactiveElements"]["clickable"] == [{"id": "el-2"}]
+        assert result["truncation"]["nodeCount"] == 4
+        assert assembler.node_count == 4
+        assert assembler.done is True
+
+    def test_unknown_parent_is_dropped(self):
+        """Records whose parent was never received are skipped."""
+        assembler = DOMTreeAssembler()
+        added = assembler.add_chunk({"nodes": [{"parentIndex": 9, "node": {"type": "text", "content": "x"}}]})
+        assert added == []
+        assert assembler.tree is None
+
+    def test_duplicate_ids(self):
+        """Children are attached by parent index, so elements sharing a document id stay apart."""
+        assembler = DOMTreeAssembler()
+        assembler.add_chunk({"nodes": [
+            {"parentIndex": None, "node": {"id": "el-0", "index": 0, "type": "element", "tagName": "body"}},
+            {"parentIndex": 0, "node": {"id": "card", "index": 1, "type": "element", "tagName": "div"}},
+            {"parentIndex": 0, "node": {"id": "card", "index": 2, "type": "element", "tagName": "div"}},
+            {"parentIndex": 2, "node": {"type": "text", "content": "Second"}},
+        ]})
+
+        first, second = assembler.tree["children"]
+        assert first["children"] == []
+        assert second["children"] == [{"type": "text", "content": "Second"}]
+
+
+class TestStreamedExtraction:
+    @pytest.mark.asyncio
+    async def test_extract_dom_streamed(self, chunks):
+        """The service assembles a streamed extraction into a regular result."""
+        async def stream_dom_tree(options, chunk_size):
+            assert options["maxDepth"] == 25
+            assert chunk_size == 2
+            for chunk in chunks:
+                yield chunk
+
+        executor = MagicMock()
+        executor.stream_dom_tree = stream_dom_tree
+        service = DOMProcessingService(executor)
+
+        result = await service.extract_dom_streamed(chunk_size=2)
+        assert result["tree"]["tagName"] == "body"
+        assert service.get_element_by_id(result, "el-2")["tagName"] == "a"
+
+    @pytest.mark.asyncio
+    async def test_stream_interactive_elements(self, chunks):
+        """Interactive elements are yielded chunk by chunk."""
+        async def stream_dom_tree(options, chunk_size):
+            for chunk in chunks:
+                yield chunk
+
+        executor = MagicMock()
+        executor.stream_dom_tree = stream_dom_tree
+        service = DOMProcessingService(executor)
+
+        elements = [element async for element in service.stream_interactive_elements()]
+        assert elements == [{"category": "navigational", "id": "nav"}, {"category": "clickable", "id": "el-2"}]
@@ -0,0 +1,76 @@
+"""
+Tests for the iterative DOM traversal primitives.
+"""
+import sys
+from unittest.mock import MagicMock
+
+from app.dom.service import DOMProcessingService
+from app.dom.traversal import iter_preorder, iter_postorder, iter_bfs, iter_events, iter_elements, find_first
+from helpers import element
+
+
+def sample_tree():
+    return element("a", children=[
+        element("b", children=[element("d"), {"type": "text", "content": "text"}]),
+        element("c", children=[element("e")]),
+    ])
+
+
+def deep_tree(depth):
+    root = node = element("n0")
+    for i in range(1, depth):
+        child = element(f"n{i}")
+        node["children"].append(child)
+        node = child
+    return root
+
+
+def ids(nodes):
+    return [node.get("id", "#text") for node, *_ in nodes]
+
+
+class TestTraversal:
+    def test_orders(self):
+        """Pre-order, post-order and breadth-first traversals visit nodes in their order."""
+        tree = sample_tree()
+
+        assert ids(iter_preorder(tree)) == ["a", "b", "d", "#text", "c", "e"]
+        assert ids(iter_postorder(tree)) == ["d", "#text", "b", "e", "c", "a"]
+        assert ids(iter_bfs(tree)) == ["a", "b", "c", "d", "#text", "e"]
+        assert [node["id"] for node in iter_elements(tree)] == ["a", "b", "d", "c", "e"]
+
+    def test_max_depth(self):
+        """Nodes deeper than max_depth are not visited."""
+        tree = sample_tree()
+
+        assert ids(iter_preorder(tree, max_depth=1)) == ["a", "b", "c"]
+        assert [depth for _, depth in iter_bfs(tree)] == [0, 1, 1, 2, 2, 2]
+
+    def test_events_are_balanced(self):
+        """Every entered node is left after its children."""
+        events = [(node.get("id", "#text"), leaving) for node, _, leaving in iter_events(sample_tree(), elements_only=True)]
+
+        assert events[:4] == [("a", False), ("b", False), ("d", False), ("d", True)]
+        assert events[-1] == ("a", True)
+        assert len(events) == 10
+
+    def test_early_exit(self):
+        """find_first stops at the first match."""
+        tree = sample_tree()
+        predicate = MagicMock(side_effect=lambda node: node.get("id") == "b")
+
+        assert find_first(tree, predicate)["id"] == "b"
+        assert predicate.call_count == 2
+
+    def test_deep_trees(self):
+        """Traversals and service queries do not hit the recursion limit."""
+        depth = sys.getrecursionlimit() * 2
+        tree = deep_tree(depth)
+
+        assert sum(1 for _ in iter_postorder(tree)) == depth
+
+        service = DOMProcessingService(MagicMock())
+        dom_tree = {"tree": tree}
+        assert len(service._get_all_elements(tree)) == depth
+        assert service.analyze_page_structure(dom_tree)["element_counts"] == {"div": depth}
+        assert service.create_simplified_dom(dom_tree, max_depth=depth)["tree"]["id"] == "n0"
@@ -0,0 +1,92 @@
+"""
+Tests for the indexed DOM tree.
+"""
+import pytest
+
+from app.dom.tree import DOMTree, DOMTreeIndex
+
+
+@pytest.fixture
+def tree():
+    return {
+        "url": "https://example.com",
+        "tree": {
+            "id": "body", "type": "element", "tagName": "body", "attributes": {}, "xpath": "/html/body",
+            "children": [
+                {
+                    "id": "nav", "type": "element", "tagName": "NAV", "attributes": {"class": "menu main"},
+                    "css_selector": "nav#nav",
+                    "children": [
+                        {"id": "home", "type": "element", "tagName": "a", "attributes": {"href": "/", "class": "menu"},
+                         "xpath": "/html/body/nav/a", "children": [{"type": "text", "content": "Home"}]},
+                    ]
+                },
+                {
+                    "id": "form", "type": "element", "tagName": "form", "attributes": {},
+                    "children": [
+                        {"id": "email-label", "type": "element", "tagName": "label", "attributes": {"for": "email"}, "children": []},
+                        {"id": "email", "type": "element", "tagName": "input", "attributes": {"name": "email"}, "children": []},
+                    ]
+                },
+                {"id": "home", "type": "element", "tagName": "a", "attributes": {}, "children": []},
+            ]
+        }
+    }
+
+
+class TestDOMTreeIndex:
+    def test_lookup_tables(self, tree):
+        """Elements are indexed by id, tag, class, attribute, xpath and css selector."""
+        index = DOMTreeIndex(tree["tree"])
+
+        assert [element["id"] for element in index.elements] == ["body", "nav", "home", "form", "email-label", "email", "home"]
+        assert len(index) == 7
+        # The first element in document order wins for duplicate ids
+        assert index.get_by_id("home")["attributes"]["href"] == "/"
+        assert index.get_by_id("missing") is None
+        assert [element["id"] for element in index.get_by_tag("nav")] == ["nav"]
+        assert [element["id"] for element in index.get_by_tag("A")] == ["home", "home"]
+        assert [element["id"] for element in index.get_by_class("menu")] == ["nav", "home"]
+        assert [element["id"] for element in index.get_by_attribute("for")] == ["email-label"]
+        assert index.get_by_attribute("name", "email")[0]["id"] == "email"
+        assert index.get_by_attribute("name", "other") == []
+        assert index.by_xpath["/html/body/nav/a"]["id"] == "home"
+        assert index.by_css_selector["nav#nav"][0]["id"] == "nav"
+        assert index.tag_counts == {"body": 1, "NAV": 1, "a": 2, "form": 1, "label": 1, "input": 1}
+
+    def test_ancestry_and_descendants(self, tree):
+        """Parents, ancestry paths and descendants come from the index."""
+        index = DOMTreeIndex(tree["tree"])
+        email = index.get_by_id("email")
+        form = index.get_by_id("form")
+
+        assert index.get_parent(email) is form
+        assert index.get_parent(tree["tree"]) is None
+        assert [element["id"] for element in index.get_ancestry_path(email)] == ["body", "form", "email"]
+        assert [element["id"] for element in index.get_descendants(form)] == ["email-label", "email"]
+        assert len(index.get_descendants(tree["tree"])) == 6
+        assert index.get_ancestry_path({"id": "email"}) == []
+
+    def test_empty_tree(self):
+        """An empty tree has an empty index."""
+        index = DOMTreeIndex(None)
+        assert len(index) == 0
+        assert index.get_by_id("body") is None
+
+
+class TestDOMTree:
+    def test_behaves_like_dict(self, tree):
+        """The indexed tree compares and serializes like the plain result."""
+        dom_tree = DOMTree(tree)
+        assert dom_tree == tree
+        assert dom_tree["url"] == "https://example.com"
+
+    def test_index_is_cached(self, tree):
+        """The index is built once and rebuilt on reindex."""
+        dom_tree = DOMTree(tree)
+        index = dom_tree.index
+        assert dom_tree.index is index
+
+        dom_tree["tree"]["children"].append({"id": "late", "type": "element", "tagName": "div", "children": []})
+        assert dom_tree.index.get_by_id("late") is None
+        assert dom_tree.reindex().get_by_id("late") is not None
@@ -1,12 +1,17 @@
 """
 Tests for the LLM DOM API endpoints.
 """
+import asyncio
+
 import pytest
+from fastapi.encoders import jsonable_encoder
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 
 from app.main import app
+from app.api.routes.llm import DOMQueryRequest, extract_dom_for_llm
 from app.dom.service import dom_processing_service
+from app.dom.tree import DOMTree
 
 client = TestClient(app)
 
@@ -247,4 +252,15 @@ class TestLLMDomAPI:
         mock_dom_processing_service.extract_dom.side_effect = Exception("Test error")
         response = client.post("/api/llm/suggest-action", json={"query": "log in"})
         assert response.status_code == 500
-        assert "error" in response.json()["detail"].lower() 
\ No newline at end of file
+        assert "error" in response.json()["detail"].lower()
+
+    def test_extract_full_compact_tree(self, mock_dom_processing_service, mock_dom_tree):
+        """The full DOM of a compact extraction is returned as plain, serializable dictionaries."""
+        mock_dom_processing_service.extract_dom = AsyncMock(return_value=DOMTree(mock_dom_tree).compact())
+        mock_dom_processing_service.get_interactive_elements.return_value = mock_dom_tree["interactiveElements"]
+        mock_dom_processing_service.classify_page_type.return_value = {}
+
+        response = asyncio.run(extract_dom_for_llm(DOMQueryRequest(simplify=False, include_page_analysis=False)))
+
+        assert type(response["dom"]["tree"]) is dict
+        assert jsonable_encoder(response)["dom"]["tree"]["children"][0]["tagName"] == "body"
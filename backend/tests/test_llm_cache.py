@@ -0,0 +1,150 @@
+"""
+Tests for the LLM response cache.
+"""
+import asyncio
+from unittest.mock import MagicMock, AsyncMock, patch
+
+from app.agent.message_manager import MessageManager
+from app.agent.service import AgentService
+from app.llm.cache import LLMResponseCache, planning_cache_input, prompt_fingerprint
+from app.llm.parser import LLMResponseParser
+
+
+class TestPromptFingerprint:
+    def test_whitespace_is_normalized(self):
+        """Prompts that only differ in indentation share a key."""
+        first = prompt_fingerprint("gpt-4", "system", "Current page:\n    Google\n\nUser task: search")
+        second = prompt_fingerprint("gpt-4", "system", "Current page: Google User task: search")
+
+        assert first == second
+
+    def test_prompt_parts_are_distinguished(self):
+        """The model, system prompt, input and history are all part of the key."""
+        base = prompt_fingerprint("gpt-4", "system", "task")
+
+        assert prompt_fingerprint("gpt-3.5", "system", "task") != base
+        assert prompt_fingerprint("gpt-4", "other system", "task") != base
+        assert prompt_fingerprint("gpt-4", "system", "other task") != base
+        assert prompt_fingerprint("gpt-4", "system", "task", [{"role": "user", "content": "hi"}]) != base
+
+
+class TestPlanningCacheInput:
+    def test_page_state_is_compacted(self):
+        """Planning calls are identified by their kind, task and page, whatever the formatting."""
+        page = {"url": "https://example.com/login#top", "title": "Login ",
+                "elements": [{"type": "button", "text": "Sign  in"}], "screenshot": "..."}
+        same_page = {"url": "https://example.com/login", "title": "Login",
+                     "elements": [{"type": "button", "text": "Sign in"}]}
+
+        assert planning_cache_input("plan", "Log in", page) == planning_cache_input("plan", " Log  in", same_page)
+        assert planning_cache_input("plan", "Log in", page) != planning_cache_input("interpret", "Log in", page)
+        assert planning_cache_input("plan", "Log in", page) != planning_cache_input("plan", "Log in")
+
+
+class TestLLMResponseCache:
+    def test_hits_and_eviction(self):
+        """Responses are returned until evicted by newer ones."""
+        cache = LLMResponseCache(maxsize=2)
+        cache.put("a", "response a")
+        cache.put("b", "response b")
+        assert cache.get("a") == "response a"
+        cache.put("c", "response c")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == "response a"
+        assert cache.stats()["evictions"] == 1
+
+    def test_expired(self, monkeypatch):
+        """Responses older than the time-to-live are dropped."""
+        now = [1000.0]
+        monkeypatch.setattr("app.llm.cache.time.time", lambda: now[0])
+        cache = LLMResponseCache(ttl=60.0)
+        cache.put("a", "response a")
+
+        now[0] += 61.0
+        assert cache.get("a") is None
+        assert cache.stats()["expired"] == 1
+
+    def test_disk_backend(self, tmp_path):
+        """Responses persisted to disk are found by a new cache."""
+        path = str(tmp_path / "cache" / "llm.sqlite")
+        LLMResponseCache(maxsize=1, path=path).put("a", "response a")
+        LLMResponseCache(maxsize=1, path=path).put("b", "response b")
+
+        cache = LLMResponseCache(maxsize=1, path=path)
+        assert cache.get("a") is None
+        assert cache.get("b") == "response b"
+        assert cache.stats()["disk_hits"] == 1
+
+        assert cache.invalidate() == 1
+        assert LLMResponseCache(path=path).get("b") is None
+
+
+class TestServiceResponseCache:
+    def test_cached_planning_response(self, make_llm_service):
+        """Only calls that opt in are cached; identical prompts skip the model."""
+        generation = MagicMock()
+        generation.text = '{"action": "done", "parameters": {}}'
+        llm = MagicMock()
+        llm.agenerate = AsyncMock(return_value=MagicMock(generations=[[generation]]))
+
+        with patch("app.llm.service.llm_response_cache", LLMResponseCache()):
+            service = make_llm_service(llm)
+
+            async def run():
+                for _ in range(2):
+                    await service.generate_response("system", "Log in and download the report", use_cache=True)
+                await service.generate_response("system", "Log in and download the report")
+                await service.generate_response("system", "Log  in and download the report ", use_cache=True)
+
+            asyncio.run(run())
+
+        assert llm.agenerate.call_count == 2
+
+    def test_invalid_response_is_not_cached(self, make_llm_service):
+        """Responses rejected by the validation function are asked for again."""
+        generation = MagicMock()
+        generation.text = "I cannot help with that."
+        llm = MagicMock()
+        llm.agenerate = AsyncMock(return_value=MagicMock(generations=[[generation]]))
+
+        cache = LLMResponseCache()
+        with patch("app.llm.service.llm_response_cache", cache):
+            service = make_llm_service(llm)
+
+            async def run():
+                for _ in range(2):
+                    await service.generate_response("system", "Log in", use_cache=True,
+                                                    validate=LLMResponseParser().parse_response)
+
+            asyncio.run(run())
+
+        assert llm.agenerate.call_count == 2
+        assert cache.stats()["size"] == 0
+
+    def test_repeated_plan_is_a_hit(self, make_llm_service):
+        """Planning the same task again is answered from the cache, whatever the agent did in between."""
+        generation = MagicMock()
+        generation.text = '{"action": "plan_task", "parameters": {"steps": ["Open the site"], "thought": "Go"}}'
+        llm = MagicMock()
+        llm.agenerate = AsyncMock(return_value=MagicMock(generations=[[generation]]))
+
+        cache = LLMResponseCache()
+        with patch("app.llm.service.llm_response_cache", cache):
+            agent = AgentService()
+            agent.llm_service = make_llm_service(llm)
+            agent.message_manager = MessageManager()
+            agent.response_parser = LLMResponseParser()
+            state = {"page_state": {"url": "https://example.com", "title": "Example", "elements": []}}
+
+            async def run():
+                first = await agent.create_task_plan("Download the monthly report", state)
+                agent.message_manager.add_system_message("Executing step: Open the site")
+                second = await agent.create_task_plan("Download the monthly report", state)
+                return first, second
+
+            first, second = asyncio.run(run())
+
+        assert first["status"] == second["status"] == "success"
+        assert llm.agenerate.call_count == 1
+        assert cache.stats()["hits"] == 1
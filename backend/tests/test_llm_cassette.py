@@ -0,0 +1,99 @@
+"""
+Tests for recording and replaying LLM traffic.
+"""
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app.llm.cache import LLMResponseCache
+from app.llm.cassette import CassetteMissError, LLMCassette, request_fingerprint
+from app.llm.client import LLMClientPool
+from app.llm.fake import FakeChatModel
+
+HISTORY = [{"role": "user", "content": "Search for cats"}, {"role": "assistant", "content": "{}"}]
+
+
+def run_trace(service):
+    async def run():
+        responses = [await service.generate_response("system", "Open the site", HISTORY),
+                     await service.generate_response("system", "Open the site", HISTORY)]
+        responses.append("".join([chunk async for chunk in service.stream_response("system", "Click search")]))
+        return responses
+
+    return asyncio.run(run())
+
+
+class TestLLMCassette:
+    def test_record_and_replay(self, tmp_path, make_llm_service):
+        """A recorded trace replays the same responses without a model."""
+        path = str(tmp_path / "cassette.jsonl")
+        llm = FakeChatModel(responses=["first", "second", "third"],
+                            latency={"distribution": "fixed", "mean": 0.01})
+
+        recorder = LLMCassette(path, "record")
+        with patch("app.llm.service.llm_cassette", recorder), \
+                patch("app.llm.service.llm_client_pool", LLMClientPool(requests_per_minute=0)):
+            recorded = run_trace(make_llm_service(llm))
+
+        with open(path) as f:
+            entries = [json.loads(line) for line in f]
+        assert [entry["output"] for entry in entries] == recorded == ["first", "second", "third"]
+        assert entries[0]["key"] == request_fingerprint("system", "Open the site", HISTORY)
+        assert entries[0]["messages"][0] == {"role": "system", "content": "system"}
+        assert entries[0]["token_usage"]["prompt_tokens"] > 0
+        assert entries[0]["latency"] >= 0.01
+        assert recorder.stats()["recorded"] == 3
+
+        player = LLMCassette(path, "replay")
+        with patch("app.llm.service.llm_cassette", player):
+            assert run_trace(make_llm_service(None)) == recorded
+
+        stats = player.stats()
+        assert stats["replayed"] == 3
+        assert stats["replayed_model_time"] == pytest.approx(sum(entry["latency"] for entry in entries))
+
+    def test_cache_hits_are_recorded(self, tmp_path, make_llm_service):
+        """Responses served from the response cache are part of the recording and its replay."""
+        path = str(tmp_path / "cassette.jsonl")
+        llm = FakeChatModel(responses=["plan"])
+
+        def plan_twice(service):
+            async def run():
+                return [await service.generate_response("system", "Plan the task", use_cache=True)
+                        for _ in range(2)]
+
+            return asyncio.run(run())
+
+        recorder = LLMCassette(path, "record")
+        with patch("app.llm.service.llm_cassette", recorder), \
+                patch("app.llm.service.llm_response_cache", LLMResponseCache(maxsize=8)), \
+                patch("app.llm.service.llm_client_pool", LLMClientPool(requests_per_minute=0)):
+            assert plan_twice(make_llm_service(llm)) == ["plan", "plan"]
+
+        with open(path) as f:
+            entries = [json.loads(line) for line in f]
+        assert [entry["output"] for entry in entries] == ["plan", "plan"]
+        assert entries[1]["latency"] == 0.0
+
+        player = LLMCassette(path, "replay")
+        with patch("app.llm.service.llm_cassette", player), \
+                patch("app.llm.service.llm_response_cache", LLMResponseCache(maxsize=8)):
+            assert plan_twice(make_llm_service(None)) == ["plan", "plan"]
+        assert player.stats()["replayed"] == 2
+
+    def test_replay_miss(self, tmp_path):
+        """Requests that were not recorded are not sent to a model."""
+        path = tmp_path / "cassette.jsonl"
+        path.write_text('{"key": "abc", "output": "done", "latency": 1.0}\n{"key": "trunc')
+        player = LLMCassette(str(path), "replay")
+
+        assert player.replay("abc")["output"] == "done"
+        with pytest.raises(CassetteMissError):
+            player.replay("other")
+        assert player.stats()["misses"] == 1
+
+    def test_invalid_mode(self, tmp_path):
+        with pytest.raises(ValueError):
+            LLMCassette(str(tmp_path / "cassette.jsonl"), "rewind")
@@ -0,0 +1,157 @@
+"""
+Tests for the shared LLM client pool.
+"""
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.core.config import settings
+from app.llm.client import LLMClientPool, TokenBucket, is_retryable
+from app.llm.service import LLMService
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class BadRequestError(Exception):
+    status_code = 400
+
+
+class APITimeoutError(Exception):
+    pass
+
+
+def make_pool(**kwargs):
+    options = {"max_concurrency": 2, "requests_per_minute": 0, "max_retries": 2, "retry_base_delay": 0}
+    options.update(kwargs)
+    return LLMClientPool(**options)
+
+
+class TestRetryable:
+    def test_retryable_errors(self):
+        """Rate limits, overload and timeouts are retried; client errors are not."""
+        assert is_retryable(RateLimitError())
+        assert is_retryable(APITimeoutError())
+        assert is_retryable(asyncio.TimeoutError())
+        assert not is_retryable(BadRequestError())
+        assert not is_retryable(ValueError("bad prompt"))
+
+
+class TestTokenBucket:
+    def test_rate_limit(self):
+        """Requests beyond the burst wait for the rate."""
+        async def run():
+            bucket = TokenBucket(rate=50.0, capacity=2)
+            started = time.monotonic()
+            waits = [await bucket.acquire() for _ in range(4)]
+            return waits, time.monotonic() - started
+
+        waits, elapsed = asyncio.run(run())
+
+        assert waits[:2] == [0.0, 0.0]
+        assert all(wait > 0 for wait in waits[2:])
+        assert elapsed >= 0.035
+
+
+class TestLLMClientPool:
+    def test_shared_models(self):
+        """One model is created per provider and model."""
+        pool = make_pool()
+        created = []
+
+        def factory():
+            created.append(object())
+            return created[-1]
+
+        first = pool.get_model("openai", "gpt-4", factory)
+        assert pool.get_model("openai", "gpt-4", factory) is first
+        assert pool.get_model("anthropic", "claude", factory) is not first
+        assert len(created) == 2
+
+    def test_retry_then_success(self):
+        """Retryable errors are retried and counted."""
+        pool = make_pool()
+        attempts = []
+
+        async def request():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise RateLimitError()
+            return "response"
+
+        assert asyncio.run(pool.call("openai", "gpt-4", request)) == "response"
+        stats = pool.stats()["openai/gpt-4"]
+        assert stats["retries"] == 2
+        assert stats["calls"] == 1
+        assert stats["errors"] == 0
+
+    def test_no_retry_for_client_errors(self):
+        """Errors that are not transient are raised at once."""
+        pool = make_pool()
+        attempts = []
+
+        async def request():
+            attempts.append(1)
+            raise BadRequestError()
+
+        with pytest.raises(BadRequestError):
+            asyncio.run(pool.call("openai", "gpt-4", request))
+        assert len(attempts) == 1
+        assert pool.stats()["openai/gpt-4"]["errors"] == 1
+
+    def test_concurrency_limit(self):
+        """No more than max_concurrency calls run at once; queue wait is reported."""
+        pool = make_pool(max_concurrency=2)
+        running = []
+        peak = []
+
+        async def request():
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+            return "response"
+
+        async def run():
+            return await asyncio.gather(*(pool.call("openai", "gpt-4", request) for _ in range(5)))
+
+        assert asyncio.run(run()) == ["response"] * 5
+        assert max(peak) == 2
+        stats = pool.stats()["openai/gpt-4"]
+        assert stats["calls"] == 5
+        assert stats["queue_wait_max"] > 0
+        assert stats["latency_avg"] > 0
+
+    def test_stream_retries_before_the_first_chunk(self):
+        """Streams are retried until they start, then errors are raised."""
+        pool = make_pool()
+        attempts = []
+
+        async def request():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RateLimitError()
+            yield "Hello"
+            yield " world"
+
+        async def run():
+            return [chunk async for chunk in pool.stream("openai", "gpt-4", request)]
+
+        assert asyncio.run(run()) == ["Hello", " world"]
+        assert pool.stats()["openai/gpt-4"]["retries"] == 1
+
+
+class TestServiceModels:
+    def test_provider_retries_are_disabled(self):
+        """The provider SDK does not retry on its own, so every attempt goes through the pool."""
+        with patch.object(settings, "ANTHROPIC_API_KEY", "test-key"), \
+                patch.object(settings, "LLM_PROVIDER", None), \
+                patch.object(settings, "LLM_FAST_MODEL", None), \
+                patch("app.llm.service.llm_client_pool", make_pool()):
+            service = LLMService()
+
+        assert service.provider == "anthropic"
+        assert service.llm.max_retries == 0
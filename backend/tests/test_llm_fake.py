@@ -0,0 +1,121 @@
+"""
+Tests for the scripted offline LLM stand-in.
+"""
+import asyncio
+import json
+import random
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from langchain.schema import HumanMessage, SystemMessage
+
+from app.agent.message_manager import MessageManager
+from app.agent.service import AgentService
+from app.llm.client import LLMClientPool
+from app.llm.fake import FakeChatModel, sample_latency
+from app.llm.parser import LLMResponseParser
+from app.llm.service import LLMService
+
+OPEN = {"action": "go_to_url", "parameters": {"url": "https://example.com"}, "thought": "Open the site"}
+
+
+def write_script(tmp_path, script):
+    path = tmp_path / "script.json"
+    path.write_text(json.dumps(script))
+    return str(path)
+
+
+class TestSampleLatency:
+    def test_distributions(self):
+        """Latencies follow the configured distribution and are never negative."""
+        rng = random.Random(1)
+
+        assert sample_latency({"distribution": "fixed", "mean": 0.5}, rng) == 0.5
+        assert all(0.1 <= sample_latency({"distribution": "uniform", "min": 0.1, "max": 0.2}, rng) <= 0.2
+                   for _ in range(20))
+        samples = [sample_latency({"distribution": "lognormal", "mean": 1.0, "stddev": 0.5}, rng)
+                   for _ in range(2000)]
+        assert abs(sum(samples) / len(samples) - 1.0) < 0.1
+        assert sample_latency({"distribution": "normal", "mean": 0.0, "stddev": 1.0}, rng) >= 0.0
+
+        with pytest.raises(ValueError):
+            sample_latency({"distribution": "pareto"}, rng)
+
+
+class TestFakeChatModel:
+    def test_scripted_responses(self, tmp_path):
+        """Matching responses answer first, the others are used in turn."""
+        model = FakeChatModel.from_file(write_script(tmp_path, {"responses": [
+            {"match": "search", "response": OPEN},
+            "first",
+            "second"
+        ]}))
+
+        async def ask(text):
+            result = await model.agenerate([[SystemMessage(content="system"), HumanMessage(content=text)]])
+            return result.generations[0][0].text
+
+        async def run():
+            return [await ask(text) for text in ("step", "search for cats", "step", "step")]
+
+        assert asyncio.run(run()) == ["first", json.dumps(OPEN), "second", "first"]
+
+    def test_default_response_and_usage(self):
+        """Calls the script does not answer finish the task; token usage is reported."""
+        model = FakeChatModel()
+
+        result = asyncio.run(model.agenerate([[HumanMessage(content="a" * 40)]]))
+
+        assert json.loads(result.generations[0][0].text)["action"] == "done"
+        assert result.llm_output["token_usage"]["prompt_tokens"] == 10
+
+    def test_streaming_throughput(self):
+        """Streamed chunks arrive after the latency, at the token throughput."""
+        model = FakeChatModel(responses=["x" * 40], latency={"distribution": "fixed", "mean": 0.02},
+                              tokens_per_second=500)
+
+        async def run():
+            started = time.monotonic()
+            chunks = [chunk.content async for chunk in model.astream([HumanMessage(content="go")])]
+            return chunks, time.monotonic() - started
+
+        chunks, elapsed = asyncio.run(run())
+
+        assert "".join(chunks) == "x" * 40
+        assert len(chunks) == 10
+        assert elapsed >= 0.04
+
+
+class TestFakeProvider:
+    def test_agent_loop_offline(self, tmp_path):
+        """The agent runs a task against the fake provider without an API key."""
+        path = write_script(tmp_path, [
+            {"action": "plan_actions", "parameters": {"actions": [
+                {"action": "go_to_url", "parameters": {"url": "https://example.com"}}
+            ]}, "thought": "Plan"}
+        ])
+        pool = LLMClientPool(requests_per_minute=0)
+
+        with patch("app.llm.service.settings.LLM_PROVIDER", "fake"), \
+                patch("app.llm.service.settings.LLM_FAKE_SCRIPT", path), \
+                patch("app.llm.service.llm_client_pool", pool):
+            agent = AgentService()
+            agent.ensure_initialized = AsyncMock(return_value={"status": "success"})
+            agent.capture_screenshot = AsyncMock(return_value={"status": "success", "screenshot": "base64screenshot"})
+            agent.get_dom = AsyncMock(return_value={"status": "success", "page_state": {}})
+            agent.browser = MagicMock()
+            agent.browser.get_page_state = AsyncMock(return_value={"url": "https://example.com", "title": "Example"})
+            agent.execute_action = AsyncMock(return_value={"status": "success"})
+            agent.llm_service = LLMService()
+            agent.message_manager = MessageManager()
+            agent.response_parser = LLMResponseParser()
+
+            result = asyncio.run(agent.execute_from_natural_language(
+                "Open example.com", planning_mode="actions", bypass_cache=True
+            ))
+
+        assert agent.llm_service.provider == "fake"
+        assert result["status"] == "success"
+        agent.execute_action.assert_called_once_with("go_to_url", {"url": "https://example.com"}, None)
+        assert pool.stats()[f"fake/{path}"]["calls"] == 1
@@ -0,0 +1,54 @@
+"""
+Tests for provider-side prompt prefix caching.
+"""
+import asyncio
+from unittest.mock import MagicMock, AsyncMock, patch
+
+from app.llm.prefix import PromptCacheUsage, extract_cache_usage
+from app.llm.service import LLMService
+
+
+class TestCacheUsage:
+    def test_openai_usage(self):
+        """OpenAI cached tokens are part of the prompt tokens."""
+        usage = extract_cache_usage({"token_usage": {
+            "prompt_tokens": 2000, "completion_tokens": 50, "prompt_tokens_details": {"cached_tokens": 1536}
+        }})
+
+        assert usage == {"prompt_tokens": 2000, "cached_tokens": 1536, "cache_write_tokens": 0}
+
+    def test_anthropic_usage(self):
+        """Anthropic cache reads and writes are added to the uncached input tokens."""
+        usage = extract_cache_usage({"usage": {
+            "input_tokens": 100, "cache_read_input_tokens": 1800, "cache_creation_input_tokens": 0
+        }})
+
+        assert usage == {"prompt_tokens": 1900, "cached_tokens": 1800, "cache_write_tokens": 0}
+        assert extract_cache_usage(None)["prompt_tokens"] == 0
+
+    def test_service_records_usage(self):
+        """Cached token counts of each call are recorded per model."""
+        generation = MagicMock()
+        generation.text = '{"action": "done", "parameters": {}}'
+        result = MagicMock(generations=[[generation]], llm_output={"token_usage": {
+            "prompt_tokens": 1200, "prompt_tokens_details": {"cached_tokens": 1024}
+        }})
+        llm = MagicMock()
+        llm.agenerate = AsyncMock(return_value=result)
+
+        def initialize(service):
+            service.provider = "test"
+            service.model_name = "test-model"
+            service.llm = llm
+
+        usage = PromptCacheUsage()
+        with patch.object(LLMService, "_initialize_llm", initialize), \
+                patch("app.llm.service.prompt_cache_usage", usage):
+            service = LLMService()
+            asyncio.run(service.generate_response("system", "Open the report"))
+            asyncio.run(service.generate_response("system", "Download the report"))
+
+        stats = usage.stats()["test/test-model"]
+        assert stats["calls"] == 2
+        assert stats["cached_tokens"] == 2048
+        assert abs(stats["cached_ratio"] - 2048 / 2400) < 1e-9
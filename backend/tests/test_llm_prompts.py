@@ -0,0 +1,71 @@
+"""
+Tests for the prompt registry.
+"""
+import os
+
+import pytest
+
+from app.llm.prompts import PromptRegistry, PromptValidationError, prompt_registry
+from app.agent.service import AGENT_SYSTEM_PROMPT
+
+
+def write(path, text, mtime):
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+class TestPromptRegistry:
+    def test_register_and_id(self, tmp_path):
+        """Prompts are loaded once and identified by their content."""
+        path = tmp_path / "system.md"
+        write(path, "You are a helpful agent.", 1000)
+        registry = PromptRegistry()
+
+        prompt = registry.register("system", str(path))
+
+        assert registry.text("system") == "You are a helpful agent."
+        assert prompt.id.startswith("system@")
+        assert PromptRegistry().register("system", str(path)).id == prompt.id
+        assert registry.versions()["system"]["sha256"] == prompt.sha256
+
+    def test_invalid_prompts(self, tmp_path):
+        """Missing and empty prompt files are rejected."""
+        registry = PromptRegistry()
+        empty = tmp_path / "empty.md"
+        write(empty, "  \n", 1000)
+
+        with pytest.raises(PromptValidationError):
+            registry.register("missing", str(tmp_path / "missing.md"))
+        with pytest.raises(PromptValidationError):
+            registry.register("empty", str(empty))
+
+    def test_hot_reload(self, tmp_path):
+        """Changed files are re-read with hot reload; invalid changes keep the loaded version."""
+        path = tmp_path / "system.md"
+        write(path, "Version one", 1000)
+        registry = PromptRegistry(hot_reload=True)
+        first = registry.register("system", str(path))
+
+        assert registry.get("system") is first
+
+        write(path, "Version two", 2000)
+        second = registry.get("system")
+        assert second.text == "Version two"
+        assert second.id != first.id
+
+        write(path, "", 3000)
+        assert registry.get("system") is second
+
+    def test_no_reload_by_default(self, tmp_path):
+        """Without hot reload, the registered version is kept."""
+        path = tmp_path / "system.md"
+        write(path, "Version one", 1000)
+        registry = PromptRegistry()
+        registry.register("system", str(path))
+
+        write(path, "Version two", 2000)
+        assert registry.text("system") == "Version one"
+
+    def test_agent_system_prompt_registered(self):
+        """The agent system prompt is registered when the agent is imported."""
+        assert "Response Format" in prompt_registry.text(AGENT_SYSTEM_PROMPT)
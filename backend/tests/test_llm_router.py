@@ -0,0 +1,122 @@
+"""
+Tests for routing LLM calls between the main and the fast model.
+"""
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app.llm.client import LLMClientPool
+from app.llm.fake import FakeChatModel
+from app.llm.parser import LLMResponseParser
+from app.llm.router import ModelRouter, ROUTE_DEFAULT, ROUTE_FAST, has_obvious_target
+
+CLICK = json.dumps({"action": "click_element", "parameters": {"selector": "#search"}, "thought": "Click search"})
+
+
+@pytest.fixture
+def router():
+    router = ModelRouter(fast_kinds=["step"], max_fast_tokens=50,
+                         prices={"large": {"input": 10.0, "output": 30.0}, "small": {"input": 1.0, "output": 2.0}})
+    with patch("app.llm.service.model_router", router), \
+            patch("app.llm.service.llm_client_pool", LLMClientPool(requests_per_minute=0)):
+        yield router
+
+
+class TestModelRouter:
+    def test_rules(self):
+        """Short steps with an obvious target go to the fast model, everything else to the main model."""
+        router = ModelRouter(fast_kinds=["step", "interpret"], max_fast_tokens=20, target_kinds=["step"])
+
+        assert router.route("step", "Click the #search button") == ROUTE_FAST
+        assert router.route("step", "Open https://example.com") == ROUTE_FAST
+        assert router.route("step", "Find the cheapest flight") == ROUTE_DEFAULT
+        assert router.route("step", "Click #search " + "and then continue " * 10) == ROUTE_DEFAULT
+        assert router.route("interpret", "Find the cheapest flight") == ROUTE_FAST
+        assert router.route("plan", "Click #search") == ROUTE_DEFAULT
+        assert router.route(None, "Click #search") == ROUTE_DEFAULT
+
+    def test_obvious_targets(self):
+        assert has_obvious_target('Type "cats" into the search box')
+        assert has_obvious_target("Click input[name=q]")
+        assert not has_obvious_target("Log in to the account")
+
+    def test_cost(self):
+        router = ModelRouter(prices={"small": {"input": 1.0, "output": 2.0}})
+
+        router.record(ROUTE_FAST, "small", 0.2, 1000, 500)
+        router.record(ROUTE_FAST, "unknown", 0.4, 1000, 500)
+
+        stats = router.stats()["routes"][ROUTE_FAST]
+        assert stats["cost"] == pytest.approx(0.002)
+        assert stats["latency_avg"] == pytest.approx(0.3)
+        assert stats["models"] == {"small": 1, "unknown": 1}
+
+
+class TestParserConfidence:
+    def test_confidence(self):
+        parser = LLMResponseParser()
+
+        assert parser.confidence(CLICK) == 1.0
+        assert parser.confidence(f"Sure, here it is: ```json\n{CLICK}\n```") < 1.0
+        assert parser.confidence(CLICK, expected_actions=["go_to_url"]) < 0.75
+        assert parser.confidence("I cannot do that") == 0.0
+
+
+class TestServiceRouting:
+    def test_fast_route(self, router, make_llm_service):
+        """Simple steps are answered by the fast model and recorded on its route."""
+        large = FakeChatModel(responses=["large"])
+        small = FakeChatModel(responses=[CLICK])
+        service = make_llm_service(large, small, model_name="large", fast_model_name="small")
+
+        async def run():
+            return [
+                await service.generate_response("system", "Execute this step: click #search", route_kind="step"),
+                await service.generate_response("system", "Plan the task: compare prices", route_kind="plan")
+            ]
+
+        assert asyncio.run(run()) == [CLICK, "large"]
+        stats = router.stats()["routes"]
+        assert stats[ROUTE_FAST]["models"] == {"small": 1}
+        assert stats[ROUTE_DEFAULT]["models"] == {"large": 1}
+        assert stats[ROUTE_DEFAULT]["cost"] > stats[ROUTE_FAST]["cost"] > 0
+
+    def test_route_input(self, router, make_llm_service):
+        """Calls are routed on the routing input, not on context appended to the prompt."""
+        service = make_llm_service(FakeChatModel(responses=["large"]), FakeChatModel(responses=["small"]),
+                                   model_name="large", fast_model_name="small")
+        step = "Click the thing that looks best"
+
+        response = asyncio.run(service.generate_response(
+            "system", f"Execute this step: {step}\nCurrent URL: https://example.com/shop",
+            route_kind="step", route_input=step
+        ))
+
+        assert response == "large"
+        assert not service.uses_fast_model("step", step)
+        assert service.uses_fast_model("step", f"{step}\nCurrent URL: https://example.com/shop")
+
+    def test_escalation(self, router, make_llm_service):
+        """A fast response the parser is not confident about is escalated to the main model."""
+        service = make_llm_service(FakeChatModel(responses=[CLICK]), FakeChatModel(responses=["I am not sure"]),
+                                   model_name="large", fast_model_name="small")
+        parser = LLMResponseParser()
+
+        response = asyncio.run(service.generate_response(
+            "system", "Execute this step: click #search", route_kind="step", confidence=parser.confidence
+        ))
+
+        assert response == CLICK
+        assert router.stats()["escalations"] == {"step": 1}
+        assert router.stats()["routes"][ROUTE_FAST]["calls"] == 1
+        assert router.stats()["routes"][ROUTE_DEFAULT]["calls"] == 1
+
+    def test_no_fast_model(self, router, make_llm_service):
+        """Without a fast model every call goes to the main model."""
+        service = make_llm_service(FakeChatModel(responses=[CLICK]), model_name="large")
+
+        asyncio.run(service.generate_response("system", "Execute this step: click #search", route_kind="step"))
+
+        assert list(router.stats()["routes"]) == [ROUTE_DEFAULT]
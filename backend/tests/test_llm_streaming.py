@@ -0,0 +1,172 @@
+"""
+Tests for the incremental parsing of streamed LLM responses.
+"""
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.agent.message_manager import MessageManager
+from app.agent.service import AgentService
+from app.core.config import settings
+from app.llm.parser import LLMResponseParser, ActionValidationError
+from app.llm.streaming import IncrementalJSONParser, StreamedActionPlan
+
+RESPONSE = """```json
+{
+  "action": "execute_step",
+  "parameters": {"step_index": 0, "action": "go_to_url", "parameters": {"url": "https://example.com/{x}"}},
+  "thought": "Open the \\"example\\" site, then look around"
+}
+```"""
+
+
+def feed_in_chunks(parser, text, size):
+    completed = []
+    for start in range(0, len(text), size):
+        completed.extend(parser.feed(text[start:start + size]))
+    return completed
+
+
+class TestIncrementalJSONParser:
+    @pytest.mark.parametrize("size", [1, 3, 7, 1000])
+    def test_fields_in_any_chunking(self, size):
+        """Fields are reported in order and parsed like the whole object."""
+        parser = IncrementalJSONParser()
+        completed = feed_in_chunks(parser, RESPONSE, size)
+
+        assert [key for key, _ in completed] == ["action", "parameters", "thought"]
+        assert parser.fields == json.loads(RESPONSE.strip("`json\n"))
+        assert parser.done
+
+    def test_fields_complete_before_the_end(self):
+        """A field is reported as soon as its value ends, before the object is closed."""
+        parser = IncrementalJSONParser()
+
+        assert parser.feed('Sure! {"action": "wait", "parameters": {"time": 500}') == [
+            ("action", "wait"), ("parameters", {"time": 500})
+        ]
+        assert parser.feed(', "thought": "Let the page') == []
+        assert parser.feed(' load", "retries": 2, "final": true}') == [
+            ("thought", "Let the page load"), ("retries", 2), ("final", True)
+        ]
+        assert parser.done
+
+    def test_text_after_the_object_is_ignored(self):
+        """Parsing stops at the end of the first object."""
+        parser = IncrementalJSONParser()
+        parser.feed('{"action": "done", "parameters": {}} {"action": "wait"}')
+
+        assert parser.fields == {"action": "done", "parameters": {}}
+
+
+async def stream(chunks, events=None):
+    for chunk in chunks:
+        if events is not None:
+            events.append(("chunk", chunk))
+        await asyncio.sleep(0)
+        yield chunk
+
+
+class TestStreamedActionPlan:
+    def test_plan_resolves_before_the_thought(self):
+        """The action plan is available before the thought has been streamed."""
+        async def run():
+            events = []
+            chunks = ['{"action": "go_to_url", ', '"parameters": {"url": "example.com"}', ', "thought": "Go', ' there"}']
+            response = StreamedActionPlan(stream(chunks, events), LLMResponseParser())
+
+            plan = await response.action_plan()
+            events.append(("plan", plan["parameters"]["url"]))
+            text = await response.text()
+            return response, events, text
+
+        response, events, text = asyncio.run(run())
+
+        assert response.dispatched_early
+        assert events.index(("plan", "https://example.com")) < events.index(("chunk", ' there"}'))
+        assert response.thought == "Go there"
+        assert text.endswith('there"}')
+
+    def test_fallback_to_the_full_response(self):
+        """Responses that cannot be read early are parsed once complete."""
+        async def run():
+            chunks = ['Waiting avoids {races}.\n```json\n', '{"action": "wait", "parameters": {"time": "50"}}\n```']
+            response = StreamedActionPlan(stream(chunks), LLMResponseParser())
+            return await response.action_plan(), response.dispatched_early
+
+        plan, dispatched_early = asyncio.run(run())
+
+        assert plan["parameters"]["time"] == 100
+        assert not dispatched_early
+
+    def test_invalid_response(self):
+        """A response without a valid action plan raises once complete."""
+        async def run():
+            response = StreamedActionPlan(stream(["I cannot ", "help with that."]), LLMResponseParser())
+            return await response.action_plan()
+
+        with pytest.raises(ActionValidationError):
+            asyncio.run(run())
+
+    def test_cancel(self):
+        """Cancelling stops the stream that is still being consumed."""
+        async def stalled():
+            yield '{"action": "wait", "parameters": {"time": 100}}'
+            await asyncio.Event().wait()
+
+        async def run():
+            response = StreamedActionPlan(stalled(), LLMResponseParser())
+            await response.action_plan()
+            await asyncio.wait_for(response.cancel(), timeout=1)
+            return response._task.cancelled()
+
+        assert asyncio.run(run())
+
+
+async def failing_stream(chunks):
+    async for chunk in stream(chunks):
+        yield chunk
+    raise ConnectionError("Stream dropped")
+
+
+def make_agent(chunks, execute_action):
+    agent = AgentService()
+    agent.execute_action = execute_action
+    agent.llm_service = MagicMock()
+    agent.llm_service.stream_response = MagicMock(return_value=failing_stream(chunks))
+    agent.message_manager = MessageManager()
+    agent.response_parser = LLMResponseParser()
+    return agent
+
+
+class TestExecuteStepStreaming:
+    @pytest.fixture(autouse=True)
+    def streaming(self):
+        with patch.object(settings, "LLM_STREAMING", True), patch.object(settings, "AGENT_STEP_FAST_PATH", False):
+            yield
+
+    def test_stream_failure_after_dispatch(self):
+        """A step whose action ran still succeeds when the stream fails afterwards."""
+        chunks = ['{"action": "click_element", ', '"parameters": {"selector": "#search"}', ', "thought": "Cli']
+        agent = make_agent(chunks, AsyncMock(return_value={"status": "success"}))
+
+        result = asyncio.run(agent.execute_step({"description": "Click the Search button"}))
+
+        assert result["status"] == "success"
+        agent.execute_action.assert_called_once_with("click_element", {"selector": "#search"}, None)
+        recorded = json.loads(agent.message_manager.get_messages()[-1]["content"])
+        assert recorded["parameters"] == {"selector": "#search"}
+
+    def test_action_failure_cancels_the_stream(self):
+        """The rest of the response is not left streaming when the action fails."""
+        chunks = ['{"action": "click_element", "parameters": {"selector": "#search"}', ', "thought": "Cli', 'ck"}']
+        agent = make_agent(chunks, AsyncMock(side_effect=RuntimeError("Element not found")))
+
+        with patch("app.agent.service.StreamedActionPlan.cancel", autospec=True,
+                   side_effect=StreamedActionPlan.cancel) as cancel:
+            result = asyncio.run(agent.execute_step({"description": "Click the Search button"}))
+
+        assert result["status"] == "error"
+        cancel.assert_called_once()